@@ -0,0 +1,64 @@
+from logging.config import fileConfig
+
+from sqlalchemy import create_engine, pool
+
+from alembic import context
+
+# Dùng chung DATABASE_URL và metadata với ứng dụng
+from app.database import SQLALCHEMY_DATABASE_URL
+from app import models
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = models.Base.metadata
+
+# Đối tượng tạo bằng SQL riêng theo từng DB (không khai báo trong models) -> autogenerate bỏ qua
+UNMANAGED_NAMES = {"ix_recipes_search_vector", "search_vector"}
+UNMANAGED_PREFIXES = ("recipes_fts",)
+
+
+def include_name(name, type_, parent_names):
+    if name in UNMANAGED_NAMES:
+        return False
+    return not (type_ == "table" and name.startswith(UNMANAGED_PREFIXES))
+
+
+def run_migrations_offline() -> None:
+    """Sinh SQL ra stdout (alembic upgrade head --sql) mà không cần kết nối DB"""
+    context.configure(
+        url=SQLALCHEMY_DATABASE_URL,
+        target_metadata=target_metadata,
+        include_name=include_name,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=SQLALCHEMY_DATABASE_URL.startswith("sqlite"),
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """Chạy migration trực tiếp trên DATABASE_URL"""
+    connectable = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=pool.NullPool)
+
+    with connectable.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_name=include_name,
+            # SQLite không hỗ trợ ALTER TABLE đầy đủ -> dùng batch mode
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
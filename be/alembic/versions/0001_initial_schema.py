@@ -0,0 +1,130 @@
+"""Schema ban đầu (tương đương create_all trước khi dùng Alembic)
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+
+DB đã được tạo bằng models.Base.metadata.create_all trước đây vẫn chạy được
+migration này: bảng nào đã tồn tại thì bỏ qua.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_table(name: str) -> bool:
+    # Chế độ offline (--sql) không có kết nối DB -> sinh đầy đủ CREATE TABLE
+    if op.get_context().as_sql:
+        return False
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not _has_table("users"):
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("email", sa.String(), nullable=True),
+            sa.Column("hashed_password", sa.String(), nullable=True),
+            sa.Column("full_name", sa.String(), nullable=True),
+            sa.Column("is_active", sa.Boolean(), nullable=True),
+            sa.Column("role", sa.String(), nullable=True),
+            sa.Column("gender", sa.String(), nullable=True),
+            sa.Column("date_of_birth", sa.Date(), nullable=True),
+            sa.Column("height", sa.Float(), nullable=True),
+            sa.Column("weight", sa.Float(), nullable=True),
+            sa.Column("dietary_preferences", sa.String(), nullable=True),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    if not _has_table("recipes"):
+        op.create_table(
+            "recipes",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=True),
+            sa.Column("description", sa.Text(), nullable=True),
+            sa.Column("instructions", sa.Text(), nullable=True),
+            sa.Column("image_url", sa.String(), nullable=True),
+            sa.Column("servings", sa.Integer(), nullable=True),
+            sa.Column("prep_time", sa.Integer(), nullable=True),
+            sa.Column("calories", sa.Float(), nullable=True),
+            sa.Column("protein", sa.Float(), nullable=True),
+            sa.Column("carbs", sa.Float(), nullable=True),
+            sa.Column("fat", sa.Float(), nullable=True),
+            sa.Column("tags", sa.String(), nullable=True),
+            sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+        )
+        op.create_index("ix_recipes_id", "recipes", ["id"])
+        op.create_index("ix_recipes_name", "recipes", ["name"])
+
+    if not _has_table("ingredients"):
+        op.create_table(
+            "ingredients",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=True),
+            sa.Column("amount", sa.Float(), nullable=True),
+            sa.Column("unit", sa.String(), nullable=True),
+            sa.Column("recipe_id", sa.Integer(), sa.ForeignKey("recipes.id"), nullable=True),
+        )
+        op.create_index("ix_ingredients_id", "ingredients", ["id"])
+
+    if not _has_table("meal_plans"):
+        op.create_table(
+            "meal_plans",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("date", sa.Date(), nullable=True),
+            sa.Column("meal_type", sa.String(), nullable=True),
+            sa.Column("servings", sa.Integer(), nullable=True),
+            sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+            sa.Column("recipe_id", sa.Integer(), sa.ForeignKey("recipes.id"), nullable=True),
+        )
+        op.create_index("ix_meal_plans_id", "meal_plans", ["id"])
+        op.create_index("ix_meal_plans_date", "meal_plans", ["date"])
+
+    if not _has_table("ratings"):
+        op.create_table(
+            "ratings",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("stars", sa.Integer(), nullable=True),
+            sa.Column("comment", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+            sa.Column("recipe_id", sa.Integer(), sa.ForeignKey("recipes.id"), nullable=True),
+        )
+        op.create_index("ix_ratings_id", "ratings", ["id"])
+
+    if not _has_table("shopping_list_items"):
+        op.create_table(
+            "shopping_list_items",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("ingredient_name", sa.String(), nullable=True),
+            sa.Column("amount", sa.Float(), nullable=True),
+            sa.Column("unit", sa.String(), nullable=True),
+            sa.Column("is_purchased", sa.Boolean(), nullable=True),
+            sa.Column("recipe_id", sa.Integer(), sa.ForeignKey("recipes.id"), nullable=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        )
+        op.create_index("ix_shopping_list_items_id", "shopping_list_items", ["id"])
+        op.create_index("ix_shopping_list_items_ingredient_name", "shopping_list_items", ["ingredient_name"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("shopping_list_items")
+    op.drop_table("ratings")
+    op.drop_table("meal_plans")
+    op.drop_table("ingredients")
+    op.drop_table("recipes")
+    op.drop_table("users")
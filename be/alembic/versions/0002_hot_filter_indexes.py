@@ -0,0 +1,70 @@
+"""Index cho các cột lọc thường dùng (composite + partial)
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+
+- meal_plans(owner_id, date, meal_type): lịch ăn theo user/khoảng ngày, kiểm tra trùng bữa
+- meal_plans(recipe_id): kiểm tra tham chiếu khi xóa món
+- ratings(recipe_id, user_id), ratings(user_id): đánh giá của user cho món, xóa user
+- shopping_list_items(user_id, recipe_id, is_purchased): danh sách mua sắm theo món
+- ingredients(recipe_id), recipes(owner_id): eager-load nguyên liệu, món của user
+- Partial: món công khai (owner_id IS NULL), item chưa mua (is_purchased = false)
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PUBLIC_RECIPES = sa.text("owner_id IS NULL")
+PENDING_ITEMS = sa.text("is_purchased = false")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_meal_plans_owner_date_meal_type", "meal_plans", ["owner_id", "date", "meal_type"])
+    op.create_index("ix_meal_plans_recipe_id", "meal_plans", ["recipe_id"])
+    op.create_index("ix_ratings_recipe_user", "ratings", ["recipe_id", "user_id"])
+    op.create_index("ix_ratings_user_id", "ratings", ["user_id"])
+    op.create_index(
+        "ix_shopping_items_user_recipe_purchased",
+        "shopping_list_items",
+        ["user_id", "recipe_id", "is_purchased"],
+    )
+    op.create_index("ix_ingredients_recipe_id", "ingredients", ["recipe_id"])
+    op.create_index("ix_recipes_owner_id", "recipes", ["owner_id"])
+
+    op.create_index(
+        "ix_recipes_public_name",
+        "recipes",
+        ["name"],
+        postgresql_where=PUBLIC_RECIPES,
+        sqlite_where=PUBLIC_RECIPES,
+    )
+    op.create_index(
+        "ix_shopping_items_pending",
+        "shopping_list_items",
+        ["user_id", "ingredient_name"],
+        postgresql_where=PENDING_ITEMS,
+        sqlite_where=PENDING_ITEMS,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_shopping_items_pending", table_name="shopping_list_items")
+    op.drop_index("ix_recipes_public_name", table_name="recipes")
+    op.drop_index("ix_recipes_owner_id", table_name="recipes")
+    op.drop_index("ix_ingredients_recipe_id", table_name="ingredients")
+    op.drop_index("ix_shopping_items_user_recipe_purchased", table_name="shopping_list_items")
+    op.drop_index("ix_ratings_user_id", table_name="ratings")
+    op.drop_index("ix_ratings_recipe_user", table_name="ratings")
+    op.drop_index("ix_meal_plans_recipe_id", table_name="meal_plans")
+    op.drop_index("ix_meal_plans_owner_date_meal_type", table_name="meal_plans")
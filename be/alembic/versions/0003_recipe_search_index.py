@@ -0,0 +1,105 @@
+"""Tìm kiếm không dấu: cột recipes.search_text + index tsvector (PostgreSQL) / FTS5 (SQLite)
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.services.search import build_search_text
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+
+def _backfill_search_text(bind) -> None:
+    """Tính search_text cho các món đã có (theo lô BATCH_SIZE món)"""
+    recipes = sa.table(
+        "recipes", sa.column("id"), sa.column("name"), sa.column("description"), sa.column("search_text")
+    )
+    ingredients = sa.table("ingredients", sa.column("recipe_id"), sa.column("name"))
+
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(recipes.c.id, recipes.c.name, recipes.c.description)
+            .where(recipes.c.id > last_id)
+            .order_by(recipes.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        ids = [row.id for row in rows]
+        names = {}
+        for recipe_id, name in bind.execute(
+            sa.select(ingredients.c.recipe_id, ingredients.c.name).where(ingredients.c.recipe_id.in_(ids))
+        ):
+            names.setdefault(recipe_id, []).append(name)
+        bind.execute(
+            recipes.update().where(recipes.c.id == sa.bindparam("rid")).values(search_text=sa.bindparam("text")),
+            [
+                {"rid": row.id, "text": build_search_text(row.name, row.description, names.get(row.id, []))}
+                for row in rows
+            ],
+        )
+        last_id = ids[-1]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("recipes", sa.Column("search_text", sa.Text(), nullable=True))
+
+    bind = op.get_bind()
+    if not op.get_context().as_sql:
+        _backfill_search_text(bind)
+
+    if bind.dialect.name == "postgresql":
+        # Cột tsvector sinh tự động (PostgreSQL 12+) để ts_rank không phải parse lại văn bản
+        op.execute(
+            "ALTER TABLE recipes ADD COLUMN search_vector tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(search_text, ''))) STORED"
+        )
+        op.execute("CREATE INDEX ix_recipes_search_vector ON recipes USING gin (search_vector)")
+    elif bind.dialect.name == "sqlite":
+        # Bảng FTS5 dạng external content: chỉ lưu index, nội dung đọc từ recipes.search_text
+        op.execute(
+            "CREATE VIRTUAL TABLE recipes_fts USING fts5("
+            "search_text, content='recipes', content_rowid='id')"
+        )
+        op.execute(
+            "CREATE TRIGGER recipes_fts_ai AFTER INSERT ON recipes BEGIN "
+            "INSERT INTO recipes_fts(rowid, search_text) VALUES (new.id, new.search_text); END"
+        )
+        op.execute(
+            "CREATE TRIGGER recipes_fts_ad AFTER DELETE ON recipes BEGIN "
+            "INSERT INTO recipes_fts(recipes_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); END"
+        )
+        op.execute(
+            "CREATE TRIGGER recipes_fts_au AFTER UPDATE OF search_text ON recipes BEGIN "
+            "INSERT INTO recipes_fts(recipes_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); "
+            "INSERT INTO recipes_fts(rowid, search_text) VALUES (new.id, new.search_text); END"
+        )
+        op.execute("INSERT INTO recipes_fts(recipes_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_recipes_search_vector")
+        op.execute("ALTER TABLE recipes DROP COLUMN IF EXISTS search_vector")
+    elif bind.dialect.name == "sqlite":
+        for trigger in ("recipes_fts_ai", "recipes_fts_ad", "recipes_fts_au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS recipes_fts")
+    with op.batch_alter_table("recipes") as batch_op:
+        batch_op.drop_column("search_text")
@@ -0,0 +1,65 @@
+"""Bảng recipe_tags: thẻ phân loại chuẩn hóa + backfill từ recipes.tags
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.services.tags import parse_tags
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+
+def _backfill_recipe_tags(bind) -> None:
+    """Tách recipes.tags của các món đã có thành từng dòng recipe_tags (theo lô)"""
+    recipes = sa.table("recipes", sa.column("id"), sa.column("tags"))
+    recipe_tags = sa.table("recipe_tags", sa.column("recipe_id"), sa.column("tag"))
+
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(recipes.c.id, recipes.c.tags)
+            .where(recipes.c.id > last_id)
+            .order_by(recipes.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        links = [
+            {"recipe_id": row.id, "tag": tag}
+            for row in rows
+            for tag in parse_tags(row.tags)
+        ]
+        if links:
+            bind.execute(recipe_tags.insert(), links)
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "recipe_tags",
+        sa.Column("recipe_id", sa.Integer(), sa.ForeignKey("recipes.id"), primary_key=True),
+        sa.Column("tag", sa.String(), primary_key=True),
+    )
+    op.create_index("ix_recipe_tags_tag_recipe", "recipe_tags", ["tag", "recipe_id"])
+
+    if not op.get_context().as_sql:
+        _backfill_recipe_tags(op.get_bind())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_recipe_tags_tag_recipe", table_name="recipe_tags")
+    op.drop_table("recipe_tags")
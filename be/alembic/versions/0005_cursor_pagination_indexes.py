@@ -0,0 +1,32 @@
+"""Index cho phân trang cursor (keyset)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+
+- meal_plans(date, id): /admin/meal-plans sắp theo ngày mới nhất
+- ratings(recipe_id, id): /recipes/{id}/ratings sắp theo đánh giá mới nhất
+Các danh sách sắp theo id (users, recipes, ratings) dùng luôn primary key.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_meal_plans_date_id", "meal_plans", ["date", "id"])
+    op.create_index("ix_ratings_recipe_id_id", "ratings", ["recipe_id", "id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_ratings_recipe_id_id", table_name="ratings")
+    op.drop_index("ix_meal_plans_date_id", table_name="meal_plans")
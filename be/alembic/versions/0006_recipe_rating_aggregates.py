@@ -0,0 +1,68 @@
+"""Tổng hợp đánh giá trên recipes (rating_count, rating_sum, rating_avg)
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+
+- Thêm 3 cột và tính giá trị ban đầu từ bảng ratings (1 câu UPDATE)
+- Partial index cho /recipes/rated: (id) và (rating_avg, id) WHERE rating_count > 0
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+RATED_RECIPES = sa.text("rating_count > 0")
+
+
+def _backfill_rating_aggregates() -> None:
+    recipes = sa.table(
+        "recipes",
+        sa.column("id"), sa.column("rating_count"), sa.column("rating_sum"), sa.column("rating_avg"),
+    )
+    ratings = sa.table("ratings", sa.column("recipe_id"), sa.column("stars"))
+    of_recipe = ratings.c.recipe_id == recipes.c.id
+
+    op.execute(
+        recipes.update().values(
+            rating_count=sa.select(sa.func.count()).where(of_recipe).scalar_subquery(),
+            rating_sum=sa.select(sa.func.coalesce(sa.func.sum(ratings.c.stars), 0)).where(of_recipe).scalar_subquery(),
+            rating_avg=sa.select(sa.cast(sa.func.avg(ratings.c.stars), sa.Float)).where(of_recipe).scalar_subquery(),
+        ).where(sa.exists().where(of_recipe))
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("recipes", sa.Column("rating_count", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("recipes", sa.Column("rating_sum", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("recipes", sa.Column("rating_avg", sa.Float(), nullable=True))
+
+    _backfill_rating_aggregates()
+
+    op.create_index(
+        "ix_recipes_rated_id", "recipes", ["id"],
+        postgresql_where=RATED_RECIPES, sqlite_where=RATED_RECIPES,
+    )
+    op.create_index(
+        "ix_recipes_rated_avg", "recipes", ["rating_avg", "id"],
+        postgresql_where=RATED_RECIPES, sqlite_where=RATED_RECIPES,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_recipes_rated_avg", table_name="recipes")
+    op.drop_index("ix_recipes_rated_id", table_name="recipes")
+    # Không dùng batch_alter_table: trên SQLite batch tạo lại bảng recipes và làm mất
+    # các trigger đồng bộ recipes_fts (migration 0003). SQLite >= 3.35 hỗ trợ DROP COLUMN.
+    op.drop_column("recipes", "rating_avg")
+    op.drop_column("recipes", "rating_sum")
+    op.drop_column("recipes", "rating_count")
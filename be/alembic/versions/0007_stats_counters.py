@@ -0,0 +1,168 @@
+"""Bảng stats_counters + trigger giữ bộ đếm cho thống kê admin
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+
+- Tạo bảng, điền giá trị ban đầu bằng COUNT(*)
+- Trigger cập nhật bộ đếm khi INSERT/DELETE (users: cả UPDATE is_active/role)
+  + PostgreSQL: trigger theo câu lệnh (FOR EACH STATEMENT + transition table),
+    ghi hàng loạt 10.000 dòng chỉ cập nhật bộ đếm 1 lần
+  + SQLite: trigger theo dòng (SQLite không có trigger theo câu lệnh)
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, Sequence[str], None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Bộ đếm tổng số dòng: tên bộ đếm -> bảng
+TABLE_COUNTERS = {
+    "total_users": "users",
+    "total_recipes": "recipes",
+    "total_meal_plans": "meal_plans",
+    "total_ratings": "ratings",
+    "total_shopping_items": "shopping_list_items",
+}
+# Bộ đếm có điều kiện trên bảng users: tên bộ đếm -> điều kiện (trên 1 dòng)
+USER_COUNTERS = {
+    "active_users": "{row}.is_active = true",
+    "admin_users": "{row}.role = 'admin'",
+}
+
+
+def _create_postgresql_triggers() -> None:
+    op.execute("""
+        CREATE FUNCTION stats_counters_inserted() RETURNS trigger AS $$
+        BEGIN
+            UPDATE stats_counters SET value = value + (SELECT count(*) FROM new_rows)
+            WHERE name = TG_ARGV[0];
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE FUNCTION stats_counters_deleted() RETURNS trigger AS $$
+        BEGIN
+            UPDATE stats_counters SET value = value - (SELECT count(*) FROM old_rows)
+            WHERE name = TG_ARGV[0];
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql
+    """)
+    for name, table in TABLE_COUNTERS.items():
+        op.execute(
+            f"CREATE TRIGGER {table}_stats_insert AFTER INSERT ON {table} "
+            f"REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+            f"EXECUTE FUNCTION stats_counters_inserted('{name}')"
+        )
+        op.execute(
+            f"CREATE TRIGGER {table}_stats_delete AFTER DELETE ON {table} "
+            f"REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+            f"EXECUTE FUNCTION stats_counters_deleted('{name}')"
+        )
+
+    # users: is_active/role thay đổi -> cộng phần mới, trừ phần cũ
+    def delta(sign: str, rows: str, condition: str) -> str:
+        return f"{sign} (SELECT count(*) FROM {rows} r WHERE {condition.format(row='r')})"
+
+    for event, parts in (
+        ("INSERT", [("+", "new_rows")]),
+        ("DELETE", [("-", "old_rows")]),
+        ("UPDATE", [("+", "new_rows"), ("-", "old_rows")]),
+    ):
+        cases = " ".join(
+            f"WHEN '{name}' THEN 0 " + " ".join(delta(sign, rows, condition) for sign, rows in parts)
+            for name, condition in USER_COUNTERS.items()
+        )
+        referencing = {
+            "INSERT": "NEW TABLE AS new_rows",
+            "DELETE": "OLD TABLE AS old_rows",
+            "UPDATE": "OLD TABLE AS old_rows NEW TABLE AS new_rows",
+        }[event]
+        op.execute(f"""
+            CREATE FUNCTION stats_counters_users_{event.lower()}() RETURNS trigger AS $$
+            BEGIN
+                UPDATE stats_counters SET value = value + CASE name {cases} END
+                WHERE name IN ({", ".join(f"'{name}'" for name in USER_COUNTERS)});
+                RETURN NULL;
+            END $$ LANGUAGE plpgsql
+        """)
+        op.execute(
+            f"CREATE TRIGGER users_stats_flags_{event.lower()} AFTER {event} ON users "
+            f"REFERENCING {referencing} FOR EACH STATEMENT "
+            f"EXECUTE FUNCTION stats_counters_users_{event.lower()}()"
+        )
+
+
+def _create_sqlite_triggers() -> None:
+    for name, table in TABLE_COUNTERS.items():
+        op.execute(
+            f"CREATE TRIGGER {table}_stats_insert AFTER INSERT ON {table} BEGIN "
+            f"UPDATE stats_counters SET value = value + 1 WHERE name = '{name}'; END"
+        )
+        op.execute(
+            f"CREATE TRIGGER {table}_stats_delete AFTER DELETE ON {table} BEGIN "
+            f"UPDATE stats_counters SET value = value - 1 WHERE name = '{name}'; END"
+        )
+
+    def flag(row: str, condition: str) -> str:
+        return f"(CASE WHEN {condition.format(row=row)} THEN 1 ELSE 0 END)"
+
+    for event, expression in (
+        ("INSERT", lambda condition: flag("NEW", condition)),
+        ("DELETE", lambda condition: f"-{flag('OLD', condition)}"),
+        ("UPDATE OF is_active, role", lambda condition: f"{flag('NEW', condition)} - {flag('OLD', condition)}"),
+    ):
+        suffix = event.split()[0].lower()
+        statements = " ".join(
+            f"UPDATE stats_counters SET value = value + {expression(condition)} WHERE name = '{name}';"
+            for name, condition in USER_COUNTERS.items()
+        )
+        op.execute(f"CREATE TRIGGER users_stats_flags_{suffix} AFTER {event} ON users BEGIN {statements} END")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "stats_counters",
+        sa.Column("name", sa.String(), primary_key=True),
+        sa.Column("value", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+
+    counters = [
+        (name, f"SELECT count(*) FROM {table}") for name, table in TABLE_COUNTERS.items()
+    ] + [
+        (name, f"SELECT count(*) FROM users u WHERE {condition.format(row='u')}")
+        for name, condition in USER_COUNTERS.items()
+    ]
+    for name, count_sql in counters:
+        op.execute(f"INSERT INTO stats_counters (name, value) SELECT '{name}', ({count_sql})")
+
+    dialect = op.get_context().dialect.name
+    if dialect == "postgresql":
+        _create_postgresql_triggers()
+    elif dialect == "sqlite":
+        _create_sqlite_triggers()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_context().dialect.name
+    for table in TABLE_COUNTERS.values():
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_stats_insert" + (f" ON {table}" if dialect == "postgresql" else ""))
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_stats_delete" + (f" ON {table}" if dialect == "postgresql" else ""))
+    for suffix in ("insert", "delete", "update"):
+        op.execute(f"DROP TRIGGER IF EXISTS users_stats_flags_{suffix}" + (" ON users" if dialect == "postgresql" else ""))
+
+    if dialect == "postgresql":
+        op.execute("DROP FUNCTION IF EXISTS stats_counters_inserted()")
+        op.execute("DROP FUNCTION IF EXISTS stats_counters_deleted()")
+        for suffix in ("insert", "delete", "update"):
+            op.execute(f"DROP FUNCTION IF EXISTS stats_counters_users_{suffix}()")
+
+    op.drop_table("stats_counters")
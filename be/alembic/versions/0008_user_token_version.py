@@ -0,0 +1,31 @@
+"""Phiên bản token của user (users.token_version) để thu hồi JWT
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17
+
+JWT mang sẵn id, role, is_active và token_version của user -> xác thực không cần đọc bảng users.
+Tăng token_version (đổi role, khóa tài khoản) -> mọi token cũ của user bị từ chối.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, Sequence[str], None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("users", sa.Column("token_version", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # SQLite >= 3.35 hỗ trợ DROP COLUMN (không dùng batch để giữ các trigger của bảng users)
+    op.drop_column("users", "token_version")
@@ -0,0 +1,39 @@
+"""Bảng ai_cache: kết quả AI dùng lại cho các yêu cầu giống nhau (sau khi chuẩn hóa)
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17
+
+Tầng lưu bền của app/services/ai_cache.py (tầng trong bộ nhớ là LRU của từng process).
+Mục hết hạn (expires_at) bị bỏ qua khi đọc và được dọn bằng DELETE /admin/ai-cache?expired_only=true.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, Sequence[str], None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "ai_cache",
+        sa.Column("key", sa.String(length=64), primary_key=True),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("payload", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_ai_cache_expires_at", "ai_cache", ["expires_at"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_ai_cache_expires_at", table_name="ai_cache")
+    op.drop_table("ai_cache")
@@ -0,0 +1,50 @@
+"""Bảng ai_jobs: hàng đợi việc AI chạy nền (POST /ai/jobs/weekly-plan -> worker.py)
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17
+
+Worker lấy job bằng SELECT ... WHERE status = 'queued' ORDER BY id FOR UPDATE SKIP LOCKED
+(PostgreSQL) -> index (status, id) để không phải quét cả bảng.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0010"
+down_revision: Union[str, Sequence[str], None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "ai_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("status", sa.String(), nullable=False, server_default="queued"),
+        sa.Column("payload", sa.Text(), nullable=False),
+        sa.Column("result", sa.Text(), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("locked_by", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_ai_jobs_id", "ai_jobs", ["id"])
+    op.create_index("ix_ai_jobs_user_id", "ai_jobs", ["user_id"])
+    op.create_index("ix_ai_jobs_status_id", "ai_jobs", ["status", "id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_ai_jobs_status_id", table_name="ai_jobs")
+    op.drop_index("ix_ai_jobs_user_id", table_name="ai_jobs")
+    op.drop_index("ix_ai_jobs_id", table_name="ai_jobs")
+    op.drop_table("ai_jobs")
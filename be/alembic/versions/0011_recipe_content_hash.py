@@ -0,0 +1,75 @@
+"""Cột recipes.content_hash (dấu vân tay tên + nguyên liệu) + bộ đếm số dòng tránh được khi dùng lại món AI
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17
+
+- Món AI tạo trùng content_hash với món user đã có -> dùng lại món cũ (app/services/recipe_writer.py)
+- Index (owner_id, content_hash) để tìm món trùng của 1 user không phải quét bảng
+- Tính content_hash cho các món đã có (theo lô, như search_text ở 0003)
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.services.recipe_writer import content_hash
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0011"
+down_revision: Union[str, Sequence[str], None] = "0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+COUNTERS = ("ai_recipes_reused", "ai_ingredients_reused")
+
+
+def _backfill_content_hash(bind) -> None:
+    """Tính content_hash cho các món đã có (theo lô BATCH_SIZE món)"""
+    recipes = sa.table("recipes", sa.column("id"), sa.column("name"), sa.column("content_hash"))
+    ingredients = sa.table("ingredients", sa.column("recipe_id"), sa.column("name"))
+
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(recipes.c.id, recipes.c.name)
+            .where(recipes.c.id > last_id)
+            .order_by(recipes.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        ids = [row.id for row in rows]
+        names = {}
+        for recipe_id, name in bind.execute(
+            sa.select(ingredients.c.recipe_id, ingredients.c.name).where(ingredients.c.recipe_id.in_(ids))
+        ):
+            names.setdefault(recipe_id, []).append(name)
+        bind.execute(
+            recipes.update().where(recipes.c.id == sa.bindparam("rid")).values(content_hash=sa.bindparam("hash")),
+            [{"rid": row.id, "hash": content_hash(row.name, names.get(row.id, []))} for row in rows],
+        )
+        last_id = ids[-1]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("recipes", sa.Column("content_hash", sa.String(length=64), nullable=True))
+
+    if not op.get_context().as_sql:
+        _backfill_content_hash(op.get_bind())
+
+    op.create_index("ix_recipes_owner_content_hash", "recipes", ["owner_id", "content_hash"])
+    for name in COUNTERS:
+        op.execute(f"INSERT INTO stats_counters (name, value) VALUES ('{name}', 0)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in COUNTERS:
+        op.execute(f"DELETE FROM stats_counters WHERE name = '{name}'")
+    op.drop_index("ix_recipes_owner_content_hash", table_name="recipes")
+    with op.batch_alter_table("recipes") as batch_op:
+        batch_op.drop_column("content_hash")
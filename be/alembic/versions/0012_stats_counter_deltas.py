@@ -0,0 +1,173 @@
+"""Bộ đếm thống kê admin: trigger ghi thêm dòng vào stats_counter_deltas thay vì UPDATE stats_counters
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-18
+
+Trigger của 0007 UPDATE 1 dòng dùng chung của stats_counters trong transaction của người ghi
+(PostgreSQL: cả khi DELETE không xóa dòng nào) -> mọi request ghi vào cùng bảng xếp hàng chờ khóa dòng đó
+tới khi commit, 2 transaction ghi các bảng theo thứ tự ngược nhau có thể deadlock.
+- Bảng stats_counter_deltas: mỗi câu lệnh (PostgreSQL) / mỗi dòng (SQLite) thay đổi số dòng -> INSERT 1 dòng
+  (tên bộ đếm, chênh lệch); không đổi gì (DELETE 0 dòng, UPDATE users không đổi is_active/role) -> không ghi.
+  INSERT không khóa dòng nào có sẵn nên các transaction không chờ nhau.
+- app/services/stats.py gộp các dòng này vào stats_counters khi đọc thống kê (fold_deltas).
+"""
+import importlib.util
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0012"
+down_revision: Union[str, Sequence[str], None] = "0011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Hàm trigger (PostgreSQL) của 0007 / của migration này
+OLD_FUNCTIONS = ("stats_counters_inserted", "stats_counters_deleted", "stats_counters_users_insert",
+                 "stats_counters_users_delete", "stats_counters_users_update")
+NEW_FUNCTIONS = ("stats_deltas_inserted", "stats_deltas_deleted", "stats_deltas_users_insert",
+                 "stats_deltas_users_delete", "stats_deltas_users_update")
+
+
+def _stats_counters_0007():
+    """Module migration 0007 (TABLE_COUNTERS, USER_COUNTERS, trigger cũ để downgrade)"""
+    path = os.path.join(os.path.dirname(__file__), "0007_stats_counters.py")
+    spec = importlib.util.spec_from_file_location("stats_counters_0007", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _drop_triggers(dialect: str, functions: Sequence[str]) -> None:
+    base = _stats_counters_0007()
+    on = (lambda table: f" ON {table}") if dialect == "postgresql" else (lambda table: "")
+    for table in base.TABLE_COUNTERS.values():
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_stats_insert{on(table)}")
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_stats_delete{on(table)}")
+    for suffix in ("insert", "delete", "update"):
+        op.execute(f"DROP TRIGGER IF EXISTS users_stats_flags_{suffix}{on('users')}")
+    if dialect == "postgresql":
+        for function in functions:
+            op.execute(f"DROP FUNCTION IF EXISTS {function}()")
+
+
+def _create_postgresql_triggers(base) -> None:
+    for function, sign, rows in (("stats_deltas_inserted", "", "new_rows"), ("stats_deltas_deleted", "-", "old_rows")):
+        op.execute(f"""
+            CREATE FUNCTION {function}() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO stats_counter_deltas (name, delta)
+                SELECT TG_ARGV[0], {sign}count(*) FROM {rows} HAVING count(*) > 0;
+                RETURN NULL;
+            END $$ LANGUAGE plpgsql
+        """)
+    for name, table in base.TABLE_COUNTERS.items():
+        op.execute(
+            f"CREATE TRIGGER {table}_stats_insert AFTER INSERT ON {table} "
+            f"REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+            f"EXECUTE FUNCTION stats_deltas_inserted('{name}')"
+        )
+        op.execute(
+            f"CREATE TRIGGER {table}_stats_delete AFTER DELETE ON {table} "
+            f"REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+            f"EXECUTE FUNCTION stats_deltas_deleted('{name}')"
+        )
+
+    # users: is_active/role thay đổi -> cộng phần mới, trừ phần cũ (chênh lệch 0 -> không ghi)
+    def delta(sign: str, rows: str, condition: str) -> str:
+        return f"{sign} (SELECT count(*) FROM {rows} r WHERE {condition.format(row='r')})"
+
+    for event, parts in (
+        ("INSERT", [("+", "new_rows")]),
+        ("DELETE", [("-", "old_rows")]),
+        ("UPDATE", [("+", "new_rows"), ("-", "old_rows")]),
+    ):
+        values = ", ".join(
+            f"('{name}', 0 " + " ".join(delta(sign, rows, condition) for sign, rows in parts) + ")"
+            for name, condition in base.USER_COUNTERS.items()
+        )
+        referencing = {
+            "INSERT": "NEW TABLE AS new_rows",
+            "DELETE": "OLD TABLE AS old_rows",
+            "UPDATE": "OLD TABLE AS old_rows NEW TABLE AS new_rows",
+        }[event]
+        op.execute(f"""
+            CREATE FUNCTION stats_deltas_users_{event.lower()}() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO stats_counter_deltas (name, delta)
+                SELECT name, delta FROM (VALUES {values}) AS changes (name, delta) WHERE delta <> 0;
+                RETURN NULL;
+            END $$ LANGUAGE plpgsql
+        """)
+        op.execute(
+            f"CREATE TRIGGER users_stats_flags_{event.lower()} AFTER {event} ON users "
+            f"REFERENCING {referencing} FOR EACH STATEMENT "
+            f"EXECUTE FUNCTION stats_deltas_users_{event.lower()}()"
+        )
+
+
+def _create_sqlite_triggers(base) -> None:
+    for name, table in base.TABLE_COUNTERS.items():
+        op.execute(
+            f"CREATE TRIGGER {table}_stats_insert AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO stats_counter_deltas (name, delta) VALUES ('{name}', 1); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER {table}_stats_delete AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO stats_counter_deltas (name, delta) VALUES ('{name}', -1); END"
+        )
+
+    def flag(row: str, condition: str) -> str:
+        return f"(CASE WHEN {condition.format(row=row)} THEN 1 ELSE 0 END)"
+
+    for event, expression in (
+        ("INSERT", lambda condition: flag("NEW", condition)),
+        ("DELETE", lambda condition: f"-{flag('OLD', condition)}"),
+        ("UPDATE OF is_active, role", lambda condition: f"{flag('NEW', condition)} - {flag('OLD', condition)}"),
+    ):
+        suffix = event.split()[0].lower()
+        statements = " ".join(
+            f"INSERT INTO stats_counter_deltas (name, delta) SELECT '{name}', {expression(condition)} "
+            f"WHERE {expression(condition)} <> 0;"
+            for name, condition in base.USER_COUNTERS.items()
+        )
+        op.execute(f"CREATE TRIGGER users_stats_flags_{suffix} AFTER {event} ON users BEGIN {statements} END")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "stats_counter_deltas",
+        sa.Column("id", sa.BigInteger().with_variant(sa.Integer(), "sqlite"), primary_key=True, autoincrement=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("delta", sa.BigInteger(), nullable=False),
+    )
+
+    dialect = op.get_context().dialect.name
+    base = _stats_counters_0007()
+    _drop_triggers(dialect, OLD_FUNCTIONS)
+    if dialect == "postgresql":
+        _create_postgresql_triggers(base)
+    elif dialect == "sqlite":
+        _create_sqlite_triggers(base)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_context().dialect.name
+    base = _stats_counters_0007()
+    _drop_triggers(dialect, NEW_FUNCTIONS)
+    # Gộp các thay đổi chưa gộp vào bộ đếm trước khi xóa bảng
+    op.execute(
+        "UPDATE stats_counters SET value = value + COALESCE("
+        "(SELECT SUM(d.delta) FROM stats_counter_deltas d WHERE d.name = stats_counters.name), 0)"
+    )
+    op.drop_table("stats_counter_deltas")
+    if dialect == "postgresql":
+        base._create_postgresql_triggers()
+    elif dialect == "sqlite":
+        base._create_sqlite_triggers()
@@ -0,0 +1,89 @@
+"""
+Cache trong bộ nhớ (in-process) có thời hạn (TTL)
+
+Dùng cho các số liệu đọc nhiều, chấp nhận trễ vài giây (VD: thống kê trang admin).
+Mỗi worker uvicorn có cache riêng; an toàn khi gọi từ nhiều thread (threadpool của FastAPI).
+- TTLCache: ít key, chỉ giới hạn theo thời gian
+- LRUCache: nhiều key (VD: kết quả AI), giới hạn thêm số mục - đầy thì bỏ mục lâu không dùng nhất
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """Cache key -> value, mỗi giá trị hết hạn sau ttl_seconds giây"""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._items: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """Trả về (value, tuổi tính bằng giây) hoặc None nếu chưa có/đã hết hạn"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            stored_at, value = item
+            age = time.monotonic() - stored_at
+            if age >= self.ttl_seconds:
+                del self._items[key]
+                return None
+            return value, age
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._items[key] = (time.monotonic(), value)
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Xóa 1 key, hoặc toàn bộ cache nếu không truyền key"""
+        with self._lock:
+            if key is None:
+                self._items.clear()
+            else:
+                self._items.pop(key, None)
+
+
+class LRUCache:
+    """Cache key -> value tối đa max_entries mục (bỏ mục ít dùng gần đây nhất), mỗi mục hết hạn sau ttl_seconds"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._items: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Trả về value hoặc None nếu chưa có/đã hết hạn"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            stored_at, value = item
+            if time.monotonic() - stored_at >= self.ttl_seconds:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._items[key] = (time.monotonic(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Xóa 1 key, hoặc toàn bộ cache nếu không truyền key"""
+        with self._lock:
+            if key is None:
+                self._items.clear()
+            else:
+                self._items.pop(key, None)
@@ -1,8 +1,15 @@
+from typing import Optional
+from fastapi import Request
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 import os
 from dotenv import load_dotenv
+from app import db_pool
+from app.db_routing import read_from_primary, replica_health
 
 # 1. Load biến môi trường
 load_dotenv()
@@ -12,8 +19,13 @@ SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 if not SQLALCHEMY_DATABASE_URL:
     raise ValueError("❌ LỖI: Chưa cấu hình DATABASE_URL trong file .env")
 
-# 2. Tạo Engine (Động cơ kết nối)
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# 2. Tạo Engine (Động cơ kết nối) - cấu hình pool đọc từ .env (xem app/db_pool.py)
+database_url = make_url(SQLALCHEMY_DATABASE_URL)
+engine_options = db_pool.engine_options(database_url)
+if database_url.drivername == "postgresql+psycopg2":
+    # UPDATE/DELETE nhiều dòng (VD: diff nguyên liệu khi sửa món) gửi theo lô thay vì từng dòng
+    engine_options["executemany_mode"] = "values_plus_batch"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options)
 
 # 3. Tạo SessionLocal (Phiên làm việc)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -27,4 +39,115 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# 6. Engine + session ASYNC (asyncpg cho PostgreSQL, aiosqlite cho SQLite) - cùng DATABASE_URL
+# Route `async def` dùng get_async_db: chờ DB bằng await, không chặn event loop và không chiếm thread.
+# Code đồng bộ dùng Query (services, pagination) chạy qua `await db.run_sync(fn)` - vẫn không chặn.
+async_engine = create_async_engine(
+    db_pool.async_database_url(database_url),
+    **db_pool.engine_options(database_url, is_async=True)
+)
+# expire_on_commit=False: sau commit vẫn đọc được thuộc tính (async không lazy-load ngầm được)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# 7. Read replica (DATABASE_REPLICA_URL, không bắt buộc) - định tuyến đọc, xem app/db_routing.py
+# Route chỉ đọc dùng get_read_db / get_async_read_db: vào replica nếu có, trừ khi client vừa ghi
+# (đọc từ primary để thấy ngay dữ liệu của mình) hoặc replica đang lỗi. Chưa cấu hình -> luôn primary.
+SQLALCHEMY_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+replica_engine = None
+async_replica_engine = None
+if SQLALCHEMY_REPLICA_URL:
+    replica_url = make_url(SQLALCHEMY_REPLICA_URL)
+    replica_engine = create_engine(replica_url, **db_pool.engine_options(replica_url))
+    async_replica_engine = create_async_engine(
+        db_pool.async_database_url(replica_url),
+        **db_pool.engine_options(replica_url, is_async=True)
+    )
+    ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+    AsyncReplicaSessionLocal = async_sessionmaker(
+        async_replica_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+
+def _use_replica(request: Request) -> bool:
+    return (
+        replica_engine is not None
+        and replica_health.is_available()
+        and not read_from_primary(request)
+    )
+
+def _open_replica_session():
+    """Mở session replica và lấy kết nối ngay (pre-ping) - replica lỗi -> None (dùng primary)"""
+    db = ReplicaSessionLocal()
+    try:
+        db.connection()
+        return db
+    except (DBAPIError, OSError) as error:
+        db.close()
+        replica_health.mark_down(error)
+        return None
+
+async def _open_async_replica_session() -> Optional[AsyncSession]:
+    db = AsyncReplicaSessionLocal()
+    try:
+        await db.connection()
+        return db
+    except (DBAPIError, OSError) as error:
+        await db.close()
+        replica_health.mark_down(error)
+        return None
+
+def _check_replica_lost(replica, error: DBAPIError) -> None:
+    """Replica mất kết nối giữa chừng truy vấn -> đánh dấu hỏng (request này vẫn lỗi, các request sau dùng primary)"""
+    if replica is not None and error.connection_invalidated:
+        replica_health.mark_down(error)
+
+def get_read_db(request: Request):
+    """Session chỉ đọc (route đồng bộ): replica nếu dùng được, ngược lại primary"""
+    replica = _open_replica_session() if _use_replica(request) else None
+    db = replica or SessionLocal()
+    try:
+        yield db
+    except DBAPIError as error:
+        _check_replica_lost(replica, error)
+        raise
+    finally:
+        db.close()
+
+async def get_async_read_db(request: Request):
+    """Session chỉ đọc (route async): replica nếu dùng được, ngược lại primary"""
+    replica = await _open_async_replica_session() if _use_replica(request) else None
+    db = replica or AsyncSessionLocal()
+    async with db:
+        try:
+            yield db
+        except DBAPIError as error:
+            _check_replica_lost(replica, error)
+            raise
+
+# 8. Kiểm tra phiên bản schema (Alembic) khi khởi động - KHÔNG chạy DDL
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+
+def check_schema_version():
+    """
+    So sánh revision đang lưu trong DB (bảng alembic_version) với head của thư mục migrations.
+    Nếu khác nhau -> báo lỗi, yêu cầu chạy `alembic upgrade head` trước khi start server.
+    """
+    from alembic.config import Config
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    heads = set(ScriptDirectory.from_config(Config(ALEMBIC_INI)).get_heads())
+    with engine.connect() as connection:
+        current = set(MigrationContext.configure(connection).get_current_heads())
+
+    if current != heads:
+        raise RuntimeError(
+            f"❌ LỖI: Schema database chưa được cập nhật "
+            f"(hiện tại: {', '.join(sorted(current)) or 'chưa có'}, cần: {', '.join(sorted(heads))}). "
+            f"Chạy `alembic upgrade head` trong thư mục be/ trước khi khởi động server."
+        )
@@ -0,0 +1,208 @@
+"""
+Cấu hình connection pool của SQLAlchemy (đọc từ biến môi trường) + đo thời gian chờ lấy kết nối
+
+FastAPI chạy các route `def` (đồng bộ) trên threadpool (mặc định 40 thread), mỗi request giữ
+1 kết nối DB suốt thời gian xử lý. Pool mặc định của SQLAlchemy chỉ có 5 + 10 overflow
+-> khi tải cao, thread thứ 16 trở đi phải XẾP HÀNG chờ kết nối (tối đa pool_timeout giây rồi lỗi).
+Mặc định ở đây: pool_size + max_overflow = số thread (APP_THREADPOOL_SIZE), nên mỗi thread luôn có kết nối.
+
+Biến môi trường (đều không bắt buộc):
+- APP_THREADPOOL_SIZE      số thread xử lý route đồng bộ (mặc định 40, giống AnyIO)
+- DB_POOL_SIZE             số kết nối giữ thường trực (mặc định 10)
+- DB_MAX_OVERFLOW          số kết nối mở thêm lúc cao điểm (mặc định APP_THREADPOOL_SIZE - DB_POOL_SIZE)
+- DB_POOL_TIMEOUT          số giây chờ kết nối rảnh trước khi báo lỗi (mặc định 30)
+- DB_POOL_RECYCLE          đóng và mở lại kết nối sau N giây (mặc định 1800) - PostgreSQL hosted
+                           (Supabase, Neon, ...) hay tự ngắt kết nối nhàn rỗi
+- DB_POOL_PRE_PING         kiểm tra kết nối còn sống trước khi dùng (mặc định true)
+- DB_STATEMENT_TIMEOUT_MS  PostgreSQL hủy câu lệnh chạy quá N ms (mặc định 30000, 0 = tắt)
+- DB_ASYNC_POOL_SIZE, DB_ASYNC_MAX_OVERFLOW  pool của engine async (mặc định 10 + 10)
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict
+from sqlalchemy.engine import URL
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+# Số lần chờ gần nhất giữ lại để tính p95
+RECENT_WAITS = 1000
+# Tham số libpq trên DATABASE_URL mà engine async truyền qua connect_args thay vì URL
+ASYNCPG_CONNECT_ARGS = ("connect_timeout", "application_name")
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name, "").strip()
+    return int(value) if value else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name, "").strip().lower()
+    return value in ("1", "true", "yes", "on") if value else default
+
+
+THREADPOOL_SIZE = _env_int("APP_THREADPOOL_SIZE", 40)
+
+
+class PoolWaitStats:
+    """Thống kê thời gian chờ lấy kết nối từ pool (an toàn khi gọi từ nhiều thread)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=RECENT_WAITS)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+            self._recent.append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            recent = sorted(self._recent)
+            count = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.total_wait / count * 1000, 3) if count else 0.0,
+                "p95_wait_ms": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000, 3) if recent else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+            }
+
+
+class _TimedPoolMixin:
+    """Đo thời gian chờ mỗi lần lấy kết nối (gồm cả lúc phải xếp hàng)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.wait_stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.wait_stats.record(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        # Giữ nguyên thống kê khi pool được tạo lại (VD: engine.dispose())
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats
+        return pool
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    """QueuePool (engine đồng bộ) có đo thời gian chờ"""
+
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool (engine async) có đo thời gian chờ"""
+
+
+def engine_options(url: URL, is_async: bool = False) -> Dict[str, Any]:
+    """
+    Tham số create_engine / create_async_engine cho pool theo dialect của DATABASE_URL
+    - Engine đồng bộ: pool_size + max_overflow khớp với số thread (APP_THREADPOOL_SIZE)
+    - Engine async: không chiếm thread, nhiều request chờ chung 1 pool -> chỉ giới hạn theo sức
+      chịu của DB (DB_ASYNC_POOL_SIZE, DB_ASYNC_MAX_OVERFLOW, mặc định 10 + 10)
+    """
+    if url.get_backend_name() != "postgresql":
+        # SQLite: giữ pool mặc định của SQLAlchemy (file DB nằm trong process)
+        return {"pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True)}
+
+    if is_async:
+        pool_size = _env_int("DB_ASYNC_POOL_SIZE", 10)
+        max_overflow = _env_int("DB_ASYNC_MAX_OVERFLOW", 10)
+    else:
+        pool_size = _env_int("DB_POOL_SIZE", min(10, THREADPOOL_SIZE))
+        max_overflow = _env_int("DB_MAX_OVERFLOW", max(0, THREADPOOL_SIZE - pool_size))
+        if pool_size + max_overflow < THREADPOOL_SIZE:
+            print(
+                f"[DB] CẢNH BÁO: pool tối đa {pool_size + max_overflow} kết nối < {THREADPOOL_SIZE} thread "
+                f"-> request có thể phải chờ kết nối (DB_POOL_TIMEOUT)"
+            )
+
+    options: Dict[str, Any] = {
+        "poolclass": TimedAsyncQueuePool if is_async else TimedQueuePool,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+    }
+    connect_args: Dict[str, Any] = {}
+    server_settings: Dict[str, str] = {}
+    statement_timeout = _env_int("DB_STATEMENT_TIMEOUT_MS", 30000)
+    if statement_timeout > 0:
+        if is_async:
+            # asyncpg không nhận tham số "options" của libpq
+            server_settings["statement_timeout"] = str(statement_timeout)
+        else:
+            connect_args["options"] = f"-c statement_timeout={statement_timeout}"
+    if is_async:
+        # Tham số libpq trên URL mà asyncpg không nhận (đã bỏ khỏi URL trong async_database_url)
+        if "connect_timeout" in url.query:
+            connect_args["timeout"] = float(url.query["connect_timeout"])
+        if "application_name" in url.query:
+            server_settings["application_name"] = url.query["application_name"]
+        if server_settings:
+            connect_args["server_settings"] = server_settings
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+
+def async_database_url(url: URL) -> URL:
+    """
+    DATABASE_URL (driver đồng bộ) -> URL cho engine async
+    - postgresql / postgresql+psycopg2 -> postgresql+asyncpg (sslmode=... đổi thành ssl=...,
+      connect_timeout, application_name chuyển sang connect_args - xem engine_options)
+    - sqlite -> sqlite+aiosqlite
+    """
+    if url.get_backend_name() == "postgresql":
+        query = dict(url.query)
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        for name in ASYNCPG_CONNECT_ARGS:
+            query.pop(name, None)
+        return url.set(drivername="postgresql+asyncpg", query=query)
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    return url
+
+
+def pool_status(engine) -> Dict[str, Any]:
+    """Trạng thái pool hiện tại: đang cho mượn, overflow, thời gian chờ, cấu hình"""
+    pool = engine.pool
+    status: Dict[str, Any] = {
+        "dialect": engine.dialect.name,
+        "pool_class": type(pool).__name__,
+        "pre_ping": pool._pre_ping,
+        "recycle_seconds": pool._recycle,
+    }
+    if isinstance(pool, QueuePool):
+        status.update({
+            "pool_size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "timeout_seconds": pool.timeout(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(0, pool.overflow()),
+        })
+    else:
+        status["status"] = pool.status()
+    if isinstance(pool, _TimedPoolMixin):
+        status["wait"] = pool.wait_stats.snapshot()
+    return status
@@ -0,0 +1,124 @@
+"""
+Định tuyến truy vấn đọc sang read replica (DATABASE_REPLICA_URL, không bắt buộc)
+
+- Route chỉ đọc (GET) dùng get_read_db / get_async_read_db (app/database.py) -> replica.
+  Route ghi và xác thực user vẫn dùng DB chính (primary).
+- Read-your-writes: replica luôn trễ hơn primary một chút. Sau khi 1 client ghi thành công
+  (POST/PUT/PATCH/DELETE), các request đọc của CHÍNH client đó đi vào primary trong
+  DB_REPLICA_STICKY_SECONDS giây (mặc định 5) -> thấy ngay dữ liệu vừa ghi.
+  Response của request ghi mang token ký HMAC (SECRET_KEY) ghi thời điểm hết hạn, trong header
+  X-Read-Your-Writes và cookie read_your_writes; client gửi lại (fe/js/api.js gửi header, trình duyệt
+  cùng domain tự gửi cookie) -> worker / máy chủ NÀO nhận request đọc cũng biết phải dùng primary.
+  Ngoài ra process đã nhận request ghi còn nhớ client (theo header Authorization, không có thì theo IP)
+  cho client không gửi lại token (curl, script).
+  Response stream (SSE) gửi header trước khi ghi gì: mỗi lần commit giữa stream gọi record_write và gửi
+  token mới trong dữ liệu sự kiện (trường read_your_writes, fe/js/api.js lưu lại như token của header).
+- Replica lỗi khi mở kết nối: chuyển sang primary và bỏ qua replica trong DB_REPLICA_RETRY_SECONDS giây
+  (mặc định 30) rồi mới thử lại. Mất kết nối giữa chừng 1 truy vấn: request đó lỗi (không chạy lại route),
+  replica bị đánh dấu hỏng như trên -> các request sau dùng primary.
+Trạng thái replica hỏng lưu trong bộ nhớ của từng process (mỗi worker tự phát hiện).
+"""
+import hashlib
+import hmac
+import os
+import threading
+import time
+from typing import Dict
+
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+STICKY_SECONDS = float(os.getenv("DB_REPLICA_STICKY_SECONDS", "5"))
+RETRY_SECONDS = float(os.getenv("DB_REPLICA_RETRY_SECONDS", "30"))
+# Số client tối đa được ghi nhớ (dọn các mục hết hạn khi vượt quá)
+MAX_TRACKED_CLIENTS = 10_000
+STICKY_HEADER = "X-Read-Your-Writes"
+STICKY_COOKIE = "read_your_writes"
+
+
+def client_key(request) -> str:
+    """Khóa nhận diện client: hash của header Authorization, không có thì theo IP"""
+    authorization = request.headers.get("authorization")
+    if authorization:
+        return hashlib.sha256(authorization.encode()).hexdigest()
+    return f"ip:{request.client.host if request.client else ''}"
+
+
+def _signature(expires: str) -> str:
+    from app.utils import SECRET_KEY  # app.utils import app.database -> import khi dùng
+
+    return hmac.new(SECRET_KEY.encode(), f"read-your-writes:{expires}".encode(), hashlib.sha256).hexdigest()
+
+
+def issue_sticky_token(ttl_seconds: float = STICKY_SECONDS) -> str:
+    """Token "<hết hạn (unix time)>.<chữ ký>" gửi kèm response của request ghi"""
+    expires = f"{time.time() + ttl_seconds:.3f}"
+    return f"{expires}.{_signature(expires)}"
+
+
+def record_write(key: str) -> str:
+    """Client vừa ghi thành công: process này nhớ client + token mới để gửi cho client"""
+    sticky_writes.record(key)
+    return issue_sticky_token()
+
+
+def has_sticky_token(request) -> bool:
+    """Request mang token read-your-writes (header hoặc cookie) còn hạn và đúng chữ ký"""
+    token = request.headers.get(STICKY_HEADER) or request.cookies.get(STICKY_COOKIE)
+    if not token:
+        return False
+    expires, _, signature = token.rpartition(".")
+    try:
+        return float(expires) > time.time() and hmac.compare_digest(signature, _signature(expires))
+    except ValueError:
+        return False
+
+
+class StickyWrites:
+    """Ghi nhớ client vừa ghi dữ liệu -> đọc từ primary tới khi hết hạn"""
+
+    def __init__(self, ttl_seconds: float = STICKY_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._until: Dict[str, float] = {}
+
+    def record(self, key: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if len(self._until) >= MAX_TRACKED_CLIENTS:
+                self._until = {k: until for k, until in self._until.items() if until > now}
+            self._until[key] = now + self.ttl_seconds
+
+    def is_sticky(self, key: str) -> bool:
+        with self._lock:
+            until = self._until.get(key)
+            if until is None:
+                return False
+            if until <= time.monotonic():
+                del self._until[key]
+                return False
+            return True
+
+
+class ReplicaHealth:
+    """Đánh dấu replica tạm hỏng để các request sau không phải thử kết nối lại ngay"""
+
+    def __init__(self, retry_seconds: float = RETRY_SECONDS):
+        self.retry_seconds = retry_seconds
+        self._down_until = 0.0
+        self.failures = 0
+
+    def is_available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def mark_down(self, error: Exception) -> None:
+        self.failures += 1
+        self._down_until = time.monotonic() + self.retry_seconds
+        print(f"[DB] Replica lỗi, dùng primary trong {self.retry_seconds:.0f}s: {error}")
+
+
+sticky_writes = StickyWrites()
+replica_health = ReplicaHealth()
+
+
+def read_from_primary(request) -> bool:
+    """Client vừa ghi (token gửi kèm, hoặc process này còn nhớ) -> đọc từ primary"""
+    return has_sticky_token(request) or sticky_writes.is_sticky(client_key(request))
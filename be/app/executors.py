@@ -0,0 +1,102 @@
+"""
+Executor riêng, có giới hạn, cho các việc chặn (blocking) gọi từ route async
+
+Route `async def` chạy trên event loop: gọi thẳng hàm chặn (bcrypt, SDK gọi mạng đồng bộ, ...)
+sẽ làm đứng MỌI request khác. BoundedExecutor chạy hàm đó trên thread pool riêng:
+- workers: số việc chạy cùng lúc tối đa (giới hạn đồng thời toàn process)
+- max_pending: số việc đang chạy + đang chờ tối đa, vượt quá -> ExecutorBusy ngay (main.py trả 503)
+  thay vì xếp hàng vô hạn
+- stats(): số việc đang chạy / đang chờ / bị từ chối, thời gian chờ và thời gian chạy
+"""
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+# Thông báo cho client khi executor đầy hàng đợi (503 - main.py, sự kiện lỗi của stream AI)
+BUSY_DETAIL = "Hệ thống đang bận, vui lòng thử lại sau ít giây"
+
+
+class ExecutorBusy(Exception):
+    """Quá nhiều việc đang chờ trên executor"""
+
+    def __init__(self, name: str):
+        super().__init__(f"Executor '{name}' đang quá tải")
+        self.name = name
+
+
+class BoundedExecutor:
+    """ThreadPoolExecutor có giới hạn hàng đợi + số liệu"""
+
+    def __init__(self, name: str, workers: int, max_pending: int):
+        self.name = name
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.pending = 0   # Đang chờ + đang chạy
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    def _timed(self, submitted_at: float, call):
+        started = time.perf_counter()
+        with self._lock:
+            self.running += 1
+            wait = started - submitted_at
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        ok = False
+        try:
+            result = call()
+            ok = True
+            return result
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.failed += not ok
+                self.total_run += time.perf_counter() - started
+
+    async def run(self, fn, *args, **kwargs):
+        """Chạy fn(*args, **kwargs) trên executor và chờ kết quả (không chặn event loop)"""
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise ExecutorBusy(self.name)
+            self.pending += 1
+        try:
+            call = functools.partial(fn, *args, **kwargs)
+            future = self._executor.submit(self._timed, time.perf_counter(), call)
+        except BaseException:
+            self._release()
+            raise
+        # Trả chỗ khi việc trên thread thật sự xong (hoặc bị hủy khi còn chờ), không phải khi coroutine chờ nó
+        # bị hủy (asyncio.wait_for hết giờ, client ngắt kết nối): thread vẫn chạy tiếp -> vẫn tính vào max_pending
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, future=None) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "running": self.running,
+                "queued": self.pending - self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.total_wait / self.completed * 1000, 1) if self.completed else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 1),
+                "avg_run_ms": round(self.total_run / self.completed * 1000, 1) if self.completed else 0.0,
+            }
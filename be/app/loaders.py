@@ -0,0 +1,39 @@
+"""
+Các loader options dùng chung cho mọi router
+
+Schema trả về lồng nhau (Recipe -> ingredients, MealPlan -> recipe -> ingredients,
+Rating -> user/recipe) nên nếu để lazy-load thì mỗi dòng kết quả sẽ sinh thêm
+1 query (N+1). Các hàm dưới đây trả về options để eager-load toàn bộ cây quan hệ
+mà schema cần, giúp mỗi API danh sách chạy một số query cố định.
+
+Cách dùng:
+    db.query(models.Recipe).options(*loaders.recipe_options())
+"""
+from sqlalchemy.orm import joinedload, selectinload
+from app import models
+
+
+# --- 1. RECIPE (schemas.Recipe lồng ingredients) ---
+def recipe_options():
+    """Recipe + ingredients (1 query SELECT ... IN cho toàn bộ ingredients)"""
+    return (
+        selectinload(models.Recipe.ingredients),
+    )
+
+
+# --- 2. MEAL PLAN (schemas.MealPlan lồng recipe -> ingredients và owner) ---
+def meal_plan_options():
+    """MealPlan + recipe + recipe.ingredients + owner"""
+    return (
+        joinedload(models.MealPlan.recipe).selectinload(models.Recipe.ingredients),
+        joinedload(models.MealPlan.owner),
+    )
+
+
+# --- 3. RATING (schemas.Rating lồng user và recipe -> ingredients) ---
+def rating_options():
+    """Rating + user + recipe + recipe.ingredients"""
+    return (
+        joinedload(models.Rating.user),
+        joinedload(models.Rating.recipe).selectinload(models.Recipe.ingredients),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Text, Date, Boolean, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Float, ForeignKey, Text, Date, Boolean, DateTime, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func # Để lấy thời gian hiện tại
 from .database import Base
@@ -13,6 +13,7 @@ class User(Base):
     full_name = Column(String, nullable=True)  # Họ và tên
     is_active = Column(Boolean, default=True)  # Trạng thái tài khoản (active/banned)
     role = Column(String, default="user")  # Vai trò: "user" hoặc "admin"
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")  # Tăng lên -> thu hồi mọi JWT cũ
 
     # Thông tin nhân trắc học (Tính BMR)
     gender = Column(String, nullable=True)  # Giới tính: "male" hoặc "female"
@@ -50,12 +51,38 @@ class Recipe(Base):
     tags = Column(String, nullable=True)  # Thẻ phân loại (VD: "Breakfast,Low-Carb")
     # --------------------------------------------
 
-    owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # ID người tạo món ăn
+    # Văn bản tìm kiếm đã bỏ dấu: tên + mô tả + tên nguyên liệu (xem app/services/search.py)
+    search_text = Column(Text, nullable=True)
+
+    # Dấu vân tay nội dung: sha256 của tên + tập tên nguyên liệu đã chuẩn hóa - món AI tạo trùng
+    # với món user đã có thì dùng lại món cũ (xem app/services/recipe_writer.py)
+    content_hash = Column(String(64), nullable=True)
+
+    # Tổng hợp đánh giá, cập nhật nguyên tử khi thêm/sửa/xóa rating (xem app/services/ratings.py)
+    rating_count = Column(Integer, nullable=False, default=0, server_default="0")  # Số lượt đánh giá
+    rating_sum = Column(Integer, nullable=False, default=0, server_default="0")  # Tổng số sao
+    rating_avg = Column(Float, nullable=True)  # Số sao trung bình (NULL nếu chưa có đánh giá)
+
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)  # ID người tạo món ăn
     
     owner = relationship("User", back_populates="recipes")
     ingredients = relationship("Ingredient", back_populates="recipe", cascade="all, delete-orphan")
     meal_plans = relationship("MealPlan", back_populates="recipe")
     ratings = relationship("Rating", back_populates="recipe")
+    tag_links = relationship("RecipeTag", back_populates="recipe", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # Món công khai (owner_id = NULL) - partial index
+        Index("ix_recipes_public_name", "name",
+              postgresql_where=text("owner_id IS NULL"), sqlite_where=text("owner_id IS NULL")),
+        # Món đã được đánh giá (/recipes/rated) - theo id và theo điểm trung bình
+        Index("ix_recipes_rated_id", "id",
+              postgresql_where=text("rating_count > 0"), sqlite_where=text("rating_count > 0")),
+        Index("ix_recipes_rated_avg", "rating_avg", "id",
+              postgresql_where=text("rating_count > 0"), sqlite_where=text("rating_count > 0")),
+        # Tìm món trùng nội dung của 1 user
+        Index("ix_recipes_owner_content_hash", "owner_id", "content_hash"),
+    )
 
 # --- 3. INGREDIENTS (nguyên liệu) ---
 class Ingredient(Base):
@@ -66,7 +93,7 @@ class Ingredient(Base):
     amount = Column(Float)  # Số lượng (VD: 200, 300)
     unit = Column(String)  # Đơn vị (VD: gram, ml, muỗng)
 
-    recipe_id = Column(Integer, ForeignKey("recipes.id"))  # ID món ăn chứa nguyên liệu này
+    recipe_id = Column(Integer, ForeignKey("recipes.id"), index=True)  # ID món ăn chứa nguyên liệu này
     recipe = relationship("Recipe", back_populates="ingredients")
 
 # --- 4. MEAL PLANS (KẾ HOẠCH ĂN UỐNG)---
@@ -82,11 +109,18 @@ class MealPlan(Base):
     # -------------------------------------------------------
 
     owner_id = Column(Integer, ForeignKey("users.id"))  # ID người tạo lịch ăn
-    recipe_id = Column(Integer, ForeignKey("recipes.id"))  # ID món ăn trong lịch
+    recipe_id = Column(Integer, ForeignKey("recipes.id"), index=True)  # ID món ăn trong lịch
 
     owner = relationship("User", back_populates="meal_plans")
     recipe = relationship("Recipe", back_populates="meal_plans")
 
+    __table_args__ = (
+        # Lịch ăn theo user + khoảng ngày, kiểm tra trùng bữa
+        Index("ix_meal_plans_owner_date_meal_type", "owner_id", "date", "meal_type"),
+        # Phân trang cursor (date, id) cho admin
+        Index("ix_meal_plans_date_id", "date", "id"),
+    )
+
 # --- 5. RATINGS (đánh giá) ---
 class Rating(Base):
     __tablename__ = "ratings"
@@ -99,12 +133,19 @@ class Rating(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())  # Thời gian đánh giá (tự động)
     # -------------------------------
 
-    user_id = Column(Integer, ForeignKey("users.id"))  # ID người đánh giá
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)  # ID người đánh giá
     recipe_id = Column(Integer, ForeignKey("recipes.id"))  # ID món ăn được đánh giá
 
     user = relationship("User", back_populates="ratings")
     recipe = relationship("Recipe", back_populates="ratings")
 
+    __table_args__ = (
+        # Đánh giá của 1 user cho 1 món
+        Index("ix_ratings_recipe_user", "recipe_id", "user_id"),
+        # Phân trang cursor đánh giá của 1 món (mới nhất trước)
+        Index("ix_ratings_recipe_id_id", "recipe_id", "id"),
+    )
+
 # --- 6. SHOPPING LIST ITEMS (danh sách mua sắm) ---
 class ShoppingListItem(Base):
     __tablename__ = "shopping_list_items"
@@ -123,4 +164,72 @@ class ShoppingListItem(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())  # Thời gian cập nhật
 
     user = relationship("User")
-    recipe = relationship("Recipe")
\ No newline at end of file
+    recipe = relationship("Recipe")
+
+    __table_args__ = (
+        # Danh sách mua sắm theo user/món
+        Index("ix_shopping_items_user_recipe_purchased", "user_id", "recipe_id", "is_purchased"),
+        # Item chưa mua - partial index
+        Index("ix_shopping_items_pending", "user_id", "ingredient_name",
+              postgresql_where=text("is_purchased = false"), sqlite_where=text("is_purchased = false")),
+    )
+
+# --- 7. RECIPE TAGS (thẻ phân loại đã chuẩn hóa, xem app/services/tags.py) ---
+class RecipeTag(Base):
+    __tablename__ = "recipe_tags"
+
+    recipe_id = Column(Integer, ForeignKey("recipes.id"), primary_key=True)  # ID món ăn
+    tag = Column(String, primary_key=True)  # Thẻ đã chuẩn hóa (VD: "breakfast", "low carb")
+
+    recipe = relationship("Recipe", back_populates="tag_links")
+
+    __table_args__ = (
+        # Lọc món theo thẻ
+        Index("ix_recipe_tags_tag_recipe", "tag", "recipe_id"),
+    )
+
+# --- 8. STATS COUNTERS (bộ đếm cho trang admin, cập nhật bằng trigger - xem app/services/stats.py) ---
+class StatsCounter(Base):
+    __tablename__ = "stats_counters"
+
+    name = Column(String, primary_key=True)  # Tên chỉ số (VD: "total_users", "active_users")
+    value = Column(BigInteger, nullable=False, default=0, server_default="0")  # Giá trị hiện tại
+
+# Thay đổi chưa gộp vào stats_counters: trigger / add_to_counter chỉ INSERT (không khóa dòng chung của bộ đếm)
+class StatsCounterDelta(Base):
+    __tablename__ = "stats_counter_deltas"
+
+    id = Column(BigInteger().with_variant(Integer(), "sqlite"), primary_key=True, autoincrement=True)
+    name = Column(String, nullable=False)  # Tên bộ đếm
+    delta = Column(BigInteger, nullable=False)  # Chênh lệch (+ thêm dòng, - xóa dòng)
+# --- 9. AI CACHE (kết quả AI đã chuẩn hóa, dùng lại cho yêu cầu giống nhau - xem app/services/ai_cache.py) ---
+class AICacheEntry(Base):
+    __tablename__ = "ai_cache"
+
+    key = Column(String(64), primary_key=True)  # sha256 của yêu cầu đã chuẩn hóa
+    kind = Column(String, nullable=False)  # Loại lời gọi: "recipe", "suggestions", "weekly_plan"
+    payload = Column(Text, nullable=False)  # Kết quả AI (JSON)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())  # Thời điểm lưu
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)  # Hết hạn sau AI_CACHE_TTL giây
+
+# --- 10. AI JOBS (hàng đợi việc AI chạy nền bởi worker.py - xem app/services/ai_jobs.py) ---
+class AIJob(Base):
+    __tablename__ = "ai_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)  # ID job (tự tăng, cũng là thứ tự trong hàng đợi)
+    kind = Column(String, nullable=False)  # Loại việc: "weekly_plan"
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)  # Người tạo job
+    status = Column(String, nullable=False, default="queued", server_default="queued")  # queued/running/succeeded/failed
+    payload = Column(Text, nullable=False)  # Tham số của job (JSON)
+    result = Column(Text)  # Kết quả khi thành công (JSON)
+    error = Column(Text)  # Thông báo lỗi khi thất bại
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")  # Số lần worker đã nhận job
+    locked_by = Column(String)  # Worker đang / đã chạy job (host:pid)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())  # Thời điểm tạo
+    started_at = Column(DateTime(timezone=True))  # Lần nhận job gần nhất
+    finished_at = Column(DateTime(timezone=True))  # Thời điểm xong (thành công / thất bại)
+
+    __table_args__ = (
+        # Worker lấy job queued cũ nhất: WHERE status = 'queued' ORDER BY id
+        Index("ix_ai_jobs_status_id", "status", "id"),
+    )
@@ -0,0 +1,111 @@
+"""
+Phân trang bằng cursor (keyset pagination) cho các API danh sách
+
+OFFSET càng về trang sau càng chậm (DB vẫn phải đọc rồi bỏ qua skip dòng đầu) và trang bị
+lệch khi có dòng mới chèn vào giữa 2 lần gọi. Keyset "seek" tiếp từ dòng cuối trang trước:
+    WHERE (date, id) > (:date_cuoi, :id_cuoi) ORDER BY date, id LIMIT :limit
+-> luôn đi thẳng vào index (sort_key, id), trang 1000 nhanh như trang 1.
+
+Quy ước cho client:
+- Gửi cursor="" để lấy trang đầu, kết quả dạng {"items": [...], "next_cursor": "..."}
+- Gửi lại next_cursor để lấy trang tiếp theo; next_cursor = null nghĩa là đã hết
+- Cursor là chuỗi "mờ" (opaque), client không cần (và không nên) đọc nội dung
+- Không gửi cursor -> API trả về list như cũ (skip/limit) để tương thích ngược
+"""
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Sequence
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(payload: Dict[str, Any]) -> str:
+    """dict -> chuỗi base64 an toàn cho URL"""
+    raw = json.dumps(payload, separators=(",", ":"), default=lambda v: v.isoformat())
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Chuỗi cursor -> dict, cursor hỏng/bị sửa -> 400"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, binascii.Error, UnicodeError):
+        payload = None
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="Cursor không hợp lệ")
+    return payload
+
+
+def _page_size(limit: int) -> int:
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def _parse_key_value(column, value):
+    """Đổi giá trị trong cursor (JSON) về đúng kiểu của cột sắp xếp"""
+    python_type = column.type.python_type
+    if python_type in (date, datetime):
+        return python_type.fromisoformat(value)
+    if python_type is int and not isinstance(value, bool):
+        return int(value)
+    return python_type(value)
+
+
+def keyset_order(keys: Sequence, descending: bool = False) -> List:
+    """ORDER BY tương ứng với keys - dùng chung cho skip/limit để 2 kiểu phân trang cùng thứ tự"""
+    return [key.desc() if descending else key for key in keys]
+
+
+def keyset_page(query: Query, keys: Sequence, cursor: str, limit: int, descending: bool = False) -> Dict[str, Any]:
+    """
+    Lấy 1 trang theo keyset
+    - keys: các cột sắp xếp, cột CUỐI phải duy nhất (thường là id) để thứ tự không bị trùng
+    - descending: True = mới nhất trước (ORDER BY ... DESC)
+    Cần có index khớp với keys (VD: (date, id)) để seek không phải quét bảng.
+    """
+    limit = _page_size(limit)
+
+    if cursor:
+        values = decode_cursor(cursor).get("k")
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise HTTPException(status_code=400, detail="Cursor không hợp lệ")
+        try:
+            values = [_parse_key_value(key, value) for key, value in zip(keys, values)]
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Cursor không hợp lệ")
+
+        row, last = (keys[0], values[0]) if len(keys) == 1 else (tuple_(*keys), tuple_(*values))
+        query = query.filter(row < last if descending else row > last)
+
+    rows = query.order_by(*keyset_order(keys, descending)).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor({"k": [getattr(rows[-1], key.key) for key in keys]})
+    return {"items": rows, "next_cursor": next_cursor}
+
+
+def offset_page(query: Query, cursor: str, limit: int) -> Dict[str, Any]:
+    """
+    Lấy 1 trang theo vị trí - chỉ dùng khi thứ tự KHÔNG phải cột có index
+    (VD: tìm kiếm sắp xếp theo độ liên quan, điểm được tính lúc query)
+    """
+    limit = _page_size(limit)
+
+    offset = decode_cursor(cursor).get("o", 0) if cursor else 0
+    if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0:
+        raise HTTPException(status_code=400, detail="Cursor không hợp lệ")
+
+    rows: List = query.offset(offset).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor({"o": offset + limit})
+    return {"items": rows, "next_cursor": next_cursor}
@@ -1,10 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import func, desc
-from typing import List, Optional
-from datetime import date, datetime
-from app.database import get_db
-from app import models, schemas, utils
+from typing import List, Optional, Union
+import os
+from datetime import date, datetime, timezone
+from anyio import to_thread
+from app.database import get_db, get_read_db, get_async_db, engine, async_engine, replica_engine, async_replica_engine
+from app.db_routing import replica_health
+from app import models, schemas, utils, loaders, pagination, db_pool
+from app.cache import TTLCache
+from app.services import ratings as recipe_ratings
+from app.services import stats as admin_stats
+from app.services import deletion as recipe_deletion
+from app.services import passwords
+from app.services import ai_service
+from app.services import ai_cache
+from app.services import ai_jobs
 
 router = APIRouter(
     prefix="/admin",
@@ -12,44 +24,146 @@ router = APIRouter(
 )
 
 # --- HELPER: Kiểm tra admin ---
-def require_admin(current_user: models.User = Depends(utils.get_admin_user)):
+def require_admin(current_user: utils.TokenUser = Depends(utils.get_admin_user)):
     return current_user
 
 # --- 1. THỐNG KÊ TỔNG QUAN ---
+# Cache ngắn hạn trước bảng stats_counters (mặc định 10 giây, đặt 0 để tắt)
+_stats_cache = TTLCache(ttl_seconds=float(os.getenv("ADMIN_STATS_CACHE_TTL", "10")))
+
 @router.get("/stats")
 def get_admin_stats(
+    refresh: bool = False,
+    db: Session = Depends(get_db),
+    admin: utils.TokenUser = Depends(require_admin)
+):
+    """
+    Lấy thống kê tổng quan cho admin (gộp thay đổi chờ trong stats_counter_deltas rồi đọc bộ đếm stats_counters)
+    - refresh: True = bỏ qua cache, đọc lại từ DB (VD: ngay sau khi xóa dữ liệu)
+    Độ "tươi" của số liệu: generated_at (thời điểm đọc từ DB), age_seconds, cached
+    """
+    cached = None if refresh else _stats_cache.get("stats")
+    if cached:
+        stats, age = cached
+        return {**stats, "age_seconds": round(age, 1), "cached": True}
+    
+    stats = admin_stats.read_stats(db)
+    db.commit()  # Lưu phần đã gộp vào stats_counters
+    stats["generated_at"] = datetime.now(timezone.utc).isoformat()
+    _stats_cache.set("stats", stats)
+    return {**stats, "age_seconds": 0.0, "cached": False}
+
+@router.post("/stats/recount")
+def recount_admin_stats(
     db: Session = Depends(get_db),
-    admin: models.User = Depends(require_admin)
+    admin: utils.TokenUser = Depends(require_admin)
 ):
-    """Lấy thống kê tổng quan cho admin"""
-    stats = {
-        "total_users": db.query(models.User).count(),
-        "total_recipes": db.query(models.Recipe).count(),
-        "total_meal_plans": db.query(models.MealPlan).count(),
-        "total_ratings": db.query(models.Rating).count(),
-        "total_shopping_items": db.query(models.ShoppingListItem).count(),
-        "active_users": db.query(models.User).filter(models.User.is_active == True).count(),
-        "admin_users": db.query(models.User).filter(models.User.role == "admin").count(),
-    }
-    return stats
+    """Đếm lại chính xác bằng COUNT(*) và sửa bộ đếm (chậm trên bảng lớn - chỉ dùng khi nghi ngờ lệch)"""
+    stats = admin_stats.recount_stats(db)
+    db.commit()
+    _stats_cache.invalidate()
+    return {"message": "Đã đếm lại thống kê", **stats}
+
+@router.get("/db-pool")
+async def get_db_pool_status(admin: utils.TokenUser = Depends(require_admin)):
+    """
+    Trạng thái connection pool của DB (để chỉnh DB_POOL_SIZE / DB_MAX_OVERFLOW / APP_THREADPOOL_SIZE)
+    - checked_out: số kết nối đang được request dùng, overflow: số kết nối mở thêm ngoài pool_size
+    - wait: thời gian chờ lấy kết nối (p95/max cao -> pool quá nhỏ so với tải), timeouts: số lần chờ quá hạn
+    - threadpool: số thread đang bận / tổng số thread chạy route đồng bộ
+    - async: pool của engine async (asyncpg) dùng cho các route async
+    - replica: pool của read replica (nếu cấu hình DATABASE_REPLICA_URL), available = false khi đang lỗi
+    """
+    limiter = to_thread.current_default_thread_limiter()
+    status = db_pool.pool_status(engine)
+    status["threadpool"] = {"size": int(limiter.total_tokens), "busy": limiter.borrowed_tokens}
+    status["async"] = db_pool.pool_status(async_engine)
+    if replica_engine is not None:
+        status["replica"] = {
+            "available": replica_health.is_available(),
+            "failures": replica_health.failures,
+            "sync": db_pool.pool_status(replica_engine),
+            "async": db_pool.pool_status(async_replica_engine),
+        }
+    return status
+
+@router.get("/password-hashing")
+async def get_password_hashing_status(admin: utils.TokenUser = Depends(require_admin)):
+    """
+    Hàng đợi mã hóa mật khẩu (đăng ký / đăng nhập) - xem app/services/passwords.py
+    - queued / max_wait_ms cao -> tăng PASSWORD_HASH_WORKERS (nếu còn CPU) hoặc giảm PASSWORD_BCRYPT_ROUNDS
+    - rejected: số request bị trả 503 vì hàng đợi đầy (PASSWORD_HASH_MAX_PENDING)
+    """
+    return passwords.stats()
+
+@router.get("/ai-queue")
+async def get_ai_queue_status(admin: utils.TokenUser = Depends(require_admin)):
+    """
+    Hàng đợi gọi AI (Gemini) - xem app/services/ai_service.py
+    - running: số lời gọi AI đang chạy (tối đa AI_MAX_CONCURRENCY), queued: số lời gọi đang chờ
+    - rejected: số request bị trả 503 vì hàng đợi đầy (AI_MAX_PENDING)
+    """
+    return ai_service.ai_executor.stats()
+
+@router.get("/ai-backends")
+async def get_ai_backends_status(admin: utils.TokenUser = Depends(require_admin)):
+    """
+    Pool key x model AI - xem app/services/llm_pool.py
+    - failovers: số lần đổi sang backend khác vì lỗi, unavailable: số lời gọi bị trả 503 vì hết backend
+    - backends: trạng thái circuit breaker (closed / open / half_open), số request trong phút / ngày so với
+      giới hạn, số lỗi theo loại (quota / auth / transient / fatal), lỗi gần nhất của từng (model, key)
+    """
+    return ai_service.model.stats()
+
+@router.get("/ai-cache")
+async def get_ai_cache_status(admin: utils.TokenUser = Depends(require_admin)):
+    """
+    Cache kết quả AI - xem app/services/ai_cache.py
+    - kinds: memory_hits / db_hits / misses / bypassed (no_cache) / hit_rate theo từng loại lời gọi AI
+    - db.expired: số mục đã hết hạn còn trong bảng (dọn bằng DELETE /admin/ai-cache?expired_only=true)
+    """
+    return await ai_cache.stats()
+
+@router.delete("/ai-cache")
+async def clear_ai_cache(expired_only: bool = False, admin: utils.TokenUser = Depends(require_admin)):
+    """Xóa cache AI: expired_only=true chỉ dọn mục hết hạn, mặc định xóa toàn bộ (VD: sau khi sửa prompt)"""
+    deleted = await ai_cache.clear(expired_only=expired_only)
+    return {"message": f"Đã xóa {deleted} mục cache AI", "deleted": deleted}
+
+@router.get("/ai-jobs")
+async def get_ai_jobs_status(db: AsyncSession = Depends(get_async_db), admin: utils.TokenUser = Depends(require_admin)):
+    """
+    Hàng đợi job AI (bảng ai_jobs, chạy bởi worker.py) - xem app/services/ai_jobs.py
+    - counts: số job queued / running / succeeded / failed
+    - oldest_queued_at: job chờ lâu nhất - tăng mãi nghĩa là thiếu worker (hoặc worker chưa chạy)
+    """
+    return await ai_jobs.stats(db)
 
 # --- 2. QUẢN LÝ USERS ---
-@router.get("/users", response_model=List[schemas.User])
+@router.get("/users", response_model=Union[List[schemas.User], schemas.Page[schemas.User]])
 def get_all_users(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    admin: models.User = Depends(require_admin)
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    admin: utils.TokenUser = Depends(require_admin)
 ):
-    """Lấy danh sách tất cả users"""
-    users = db.query(models.User).offset(skip).limit(limit).all()
+    """
+    Lấy danh sách tất cả users
+    - cursor: Phân trang cursor ("" = trang đầu), trả về {items, next_cursor}. Bỏ trống -> dùng skip/limit
+    """
+    query = db.query(models.User)
+    if cursor is not None:
+        return pagination.keyset_page(query, [models.User.id], cursor, limit)
+    
+    users = query.offset(skip).limit(limit).all()
     return users
 
 @router.get("/users/{user_id}", response_model=schemas.User)
 def get_user(
     user_id: int,
-    db: Session = Depends(get_db),
-    admin: models.User = Depends(require_admin)
+    db: Session = Depends(get_read_db),
+    admin: utils.TokenUser = Depends(require_admin)
 ):
     """Lấy thông tin chi tiết 1 user"""
     user = db.query(models.User).filter(models.User.id == user_id).first()
@@ -62,7 +176,7 @@ def update_user(
     user_id: int,
     update_data: schemas.UserUpdate,
     db: Session = Depends(get_db),
-    admin: models.User = Depends(require_admin)
+    admin: utils.TokenUser = Depends(require_admin)
 ):
     """Cập nhật role hoặc trạng thái active của user"""
     user = db.query(models.User).filter(models.User.id == user_id).first()
@@ -77,17 +191,28 @@ def update_user(
     if update_data.is_active is not None:
         user.is_active = update_data.is_active
     
+    # role / is_active nằm trong JWT -> đổi thì thu hồi các token cũ (user đăng nhập lại để nhận quyền mới)
+    changed = db.is_modified(user)
+    if changed:
+        utils.bump_token_version(user)
     db.commit()
+    if changed:
+        utils.invalidate_token_version(user.id)
     db.refresh(user)
     return user
 
 @router.delete("/users/{user_id}")
 def delete_user(
     user_id: int,
+    cascade: bool = False,
     db: Session = Depends(get_db),
-    admin: models.User = Depends(require_admin)
+    admin: utils.TokenUser = Depends(require_admin)
 ):
-    """Xóa user (chỉ xóa nếu không phải admin hiện tại và không có dữ liệu liên kết)"""
+    """
+    Xóa user (không được xóa chính mình)
+    - cascade=False (mặc định): chỉ xóa nếu không có dữ liệu liên kết
+    - cascade=True: xóa luôn công thức, lịch ăn, đánh giá, danh sách mua sắm của user (1 transaction)
+    """
     if user_id == admin.id:
         raise HTTPException(status_code=400, detail="Không thể xóa chính mình")
     
@@ -95,87 +220,75 @@ def delete_user(
     if not user:
         raise HTTPException(status_code=404, detail="User không tồn tại")
     
-    # Kiểm tra dữ liệu liên kết
-    related_data = []
-    
-    # Kiểm tra recipes
-    recipes_count = db.query(models.Recipe).filter(models.Recipe.owner_id == user_id).count()
-    if recipes_count > 0:
-        related_data.append(f"{recipes_count} công thức món ăn")
-    
-    # Kiểm tra meal plans
-    meal_plans_count = db.query(models.MealPlan).filter(models.MealPlan.owner_id == user_id).count()
-    if meal_plans_count > 0:
-        related_data.append(f"{meal_plans_count} lịch ăn")
-    
-    # Kiểm tra ratings
-    ratings_count = db.query(models.Rating).filter(models.Rating.user_id == user_id).count()
-    if ratings_count > 0:
-        related_data.append(f"{ratings_count} đánh giá")
-    
-    # Kiểm tra shopping list items
-    shopping_items_count = db.query(models.ShoppingListItem).filter(models.ShoppingListItem.user_id == user_id).count()
-    if shopping_items_count > 0:
-        related_data.append(f"{shopping_items_count} mục danh sách mua sắm")
-    
-    # Nếu có dữ liệu liên kết, không cho xóa
-    if related_data:
-        detail_msg = f"Không thể xóa user này vì đang có dữ liệu liên kết: {', '.join(related_data)}. Vui lòng xóa hoặc chuyển quyền sở hữu các dữ liệu này trước khi xóa user."
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=detail_msg
-        )
+    if not cascade:
+        # Kiểm tra dữ liệu liên kết (recipes, meal plans, ratings, shopping items) trong 1 câu EXISTS
+        related_data = recipe_deletion.find_references(db, recipe_deletion.USER_REFERENCES, user_id)
+        
+        # Nếu có dữ liệu liên kết, không cho xóa
+        if related_data:
+            detail_msg = f"Không thể xóa user này vì đang có dữ liệu liên kết: {', '.join(related_data)}. Vui lòng xóa hoặc chuyển quyền sở hữu các dữ liệu này trước khi xóa user (hoặc dùng cascade=true)."
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=detail_msg
+            )
     
-    # Nếu không có dữ liệu liên kết, cho phép xóa
-    db.delete(user)
+    deleted = recipe_deletion.delete_user(db, user_id, cascade=cascade)
     db.commit()
-    return {"message": "Đã xóa user thành công"}
+    utils.invalidate_token_version(user_id)
+    return {"message": "Đã xóa user thành công", "deleted": deleted}
 
 # --- 3. QUẢN LÝ RECIPES ---
-@router.get("/recipes", response_model=List[schemas.Recipe])
+@router.get("/recipes", response_model=Union[List[schemas.Recipe], schemas.Page[schemas.Recipe]])
 def get_all_recipes(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    admin: models.User = Depends(require_admin)
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    admin: utils.TokenUser = Depends(require_admin)
 ):
-    """Lấy danh sách tất cả recipes"""
-    recipes = db.query(models.Recipe).offset(skip).limit(limit).all()
+    """
+    Lấy danh sách tất cả recipes
+    - cursor: Phân trang cursor ("" = trang đầu), trả về {items, next_cursor}. Bỏ trống -> dùng skip/limit
+    """
+    query = db.query(models.Recipe).options(*loaders.recipe_options())
+    if cursor is not None:
+        return pagination.keyset_page(query, [models.Recipe.id], cursor, limit)
+    
+    recipes = query.offset(skip).limit(limit).all()
     return recipes
 
 @router.delete("/recipes/{recipe_id}")
 def delete_recipe(
     recipe_id: int,
+    cascade: bool = False,
     db: Session = Depends(get_db),
-    admin: models.User = Depends(require_admin)
+    admin: utils.TokenUser = Depends(require_admin)
 ):
-    """Xóa recipe (admin có thể xóa bất kỳ recipe nào)"""
+    """
+    Xóa recipe (admin có thể xóa bất kỳ recipe nào)
+    - cascade=False (mặc định): chỉ xóa nếu không có lịch ăn/đánh giá tham chiếu
+    - cascade=True: xóa luôn lịch ăn và đánh giá của món (1 transaction)
+    """
     from sqlalchemy.exc import IntegrityError
     
     recipe = db.query(models.Recipe).filter(models.Recipe.id == recipe_id).first()
     if not recipe:
         raise HTTPException(status_code=404, detail="Recipe không tồn tại")
     
-    # Kiểm tra xem recipe có đang được sử dụng không
-    meal_plans_count = db.query(models.MealPlan).filter(models.MealPlan.recipe_id == recipe_id).count()
-    ratings_count = db.query(models.Rating).filter(models.Rating.recipe_id == recipe_id).count()
-    
-    if meal_plans_count > 0 or ratings_count > 0:
-        references = []
-        if meal_plans_count > 0:
-            references.append(f"{meal_plans_count} lịch ăn")
-        if ratings_count > 0:
-            references.append(f"{ratings_count} đánh giá")
-        
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Không thể xóa món ăn này vì đang được tham chiếu bởi {' và '.join(references)}. Vui lòng xóa các tham chiếu trước."
-        )
+    # Kiểm tra xem recipe có đang được sử dụng không (1 câu EXISTS)
+    if not cascade:
+        references = recipe_deletion.find_references(db, recipe_deletion.RECIPE_REFERENCES, recipe_id)
+        if references:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Không thể xóa món ăn này vì đang được tham chiếu bởi {' và '.join(references)}. Vui lòng xóa các tham chiếu trước (hoặc dùng cascade=true)."
+            )
     
+    recipe_name = recipe.name
     try:
-        db.delete(recipe)
+        deleted = recipe_deletion.delete_recipe(db, recipe_id, cascade=cascade)
         db.commit()
-        return {"message": f"Đã xóa recipe '{recipe.name}' thành công"}
+        return {"message": f"Đã xóa recipe '{recipe_name}' thành công", "deleted": deleted}
     except IntegrityError as e:
         db.rollback()
         raise HTTPException(
@@ -184,28 +297,35 @@ def delete_recipe(
         )
 
 # --- 4. QUẢN LÝ MEAL PLANS ---
-@router.get("/meal-plans", response_model=List[schemas.MealPlan])
+@router.get("/meal-plans", response_model=Union[List[schemas.MealPlan], schemas.Page[schemas.MealPlan]])
 def get_all_meal_plans(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    admin: models.User = Depends(require_admin)
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    admin: utils.TokenUser = Depends(require_admin)
 ):
-    """Lấy danh sách tất cả meal plans"""
+    """
+    Lấy danh sách tất cả meal plans
+    - cursor: Phân trang cursor ("" = trang đầu, ngày mới nhất trước), trả về {items, next_cursor}. Bỏ trống -> dùng skip/limit
+    """
     # Filter ra những meal plan có owner_id hợp lệ (không null)
-    plans = db.query(models.MealPlan).options(
-        joinedload(models.MealPlan.recipe),
-        joinedload(models.MealPlan.owner)
-    ).filter(
+    query = db.query(models.MealPlan).options(*loaders.meal_plan_options()).filter(
         models.MealPlan.owner_id.isnot(None)
-    ).offset(skip).limit(limit).all()
+    )
+    if cursor is not None:
+        return pagination.keyset_page(
+            query, [models.MealPlan.date, models.MealPlan.id], cursor, limit, descending=True
+        )
+    
+    plans = query.offset(skip).limit(limit).all()
     return plans
 
 @router.delete("/meal-plans/{plan_id}")
 def delete_meal_plan(
     plan_id: int,
     db: Session = Depends(get_db),
-    admin: models.User = Depends(require_admin)
+    admin: utils.TokenUser = Depends(require_admin)
 ):
     """Xóa meal plan"""
     plan = db.query(models.MealPlan).filter(models.MealPlan.id == plan_id).first()
@@ -217,37 +337,58 @@ def delete_meal_plan(
     return {"message": "Đã xóa meal plan thành công"}
 
 # --- 5. QUẢN LÝ RATINGS ---
-@router.get("/ratings", response_model=List[schemas.Rating])
+@router.get("/ratings", response_model=Union[List[schemas.Rating], schemas.Page[schemas.Rating]])
 def get_all_ratings(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    admin: models.User = Depends(require_admin)
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    admin: utils.TokenUser = Depends(require_admin)
 ):
-    """Lấy danh sách tất cả ratings"""
+    """
+    Lấy danh sách tất cả ratings
+    - cursor: Phân trang cursor ("" = trang đầu, mới nhất trước), trả về {items, next_cursor}. Bỏ trống -> dùng skip/limit
+    """
     # Filter ra những rating có recipe_id và user_id hợp lệ (không null)
     # và eager load relationships
-    ratings = db.query(models.Rating).options(
-        joinedload(models.Rating.user),
-        joinedload(models.Rating.recipe)
-    ).filter(
+    query = db.query(models.Rating).options(*loaders.rating_options()).filter(
         models.Rating.recipe_id.isnot(None),
         models.Rating.user_id.isnot(None)
-    ).offset(skip).limit(limit).all()
+    )
+    if cursor is not None:
+        return pagination.keyset_page(query, [models.Rating.id], cursor, limit, descending=True)
+    
+    ratings = query.offset(skip).limit(limit).all()
     return ratings
 
 @router.delete("/ratings/{rating_id}")
 def delete_rating(
     rating_id: int,
     db: Session = Depends(get_db),
-    admin: models.User = Depends(require_admin)
+    admin: utils.TokenUser = Depends(require_admin)
 ):
     """Xóa rating"""
     rating = db.query(models.Rating).filter(models.Rating.id == rating_id).first()
+    if rating and rating.recipe_id is not None:
+        # Khóa tổng hợp đánh giá của món rồi đọc lại: số sao trừ đi là giá trị mới nhất, không trừ 2 lần
+        recipe_ratings.lock_recipe_ratings(db, rating.recipe_id)
+        rating = db.query(models.Rating).filter(models.Rating.id == rating_id).populate_existing().first()
     if not rating:
         raise HTTPException(status_code=404, detail="Rating không tồn tại")
     
     db.delete(rating)
+    if rating.recipe_id is not None:
+        recipe_ratings.apply_rating_delta(db, rating.recipe_id, -1, -rating.stars)
     db.commit()
     return {"message": "Đã xóa rating thành công"}
 
+@router.post("/ratings/reconcile")
+def reconcile_ratings(
+    db: Session = Depends(get_db),
+    admin: utils.TokenUser = Depends(require_admin)
+):
+    """Tính lại số lượt/điểm trung bình đánh giá của các món từ bảng ratings (sửa các món bị lệch)"""
+    fixed = recipe_ratings.reconcile_rating_aggregates(db)
+    db.commit()
+    return {"message": f"Đã đồng bộ lại đánh giá của {fixed} món", "fixed_recipes": fixed}
+
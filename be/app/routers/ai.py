@@ -1,12 +1,24 @@
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from typing import List
-from app.database import get_db
-from app import models
-from app.utils import get_current_user
+from typing import List, Optional
+from datetime import date, datetime, timedelta
+import json
+import time
+from app.database import get_async_db, AsyncSessionLocal, replica_engine
+from app.db_routing import client_key, record_write
+from app import models, schemas
+from app.utils import TokenUser, get_current_user_async, get_current_user_profile_async
+from app.executors import BUSY_DETAIL, ExecutorBusy
+from app.services import ai_jobs
 from app.services import ai_service
+from app.services import local_planner
+from app.services import meal_plan_writer
+from app.services import recipe_writer
+from app.services.recipe_resolver import RecipeResolver, user_catalog
 
 router = APIRouter(
     prefix="/ai",
@@ -16,88 +28,130 @@ router = APIRouter(
 # --- SCHEMAS CHO AI APIs ---
 class RecipeFromIngredientsRequest(BaseModel):
     ingredients: List[str]  # VD: ["chicken", "rice", "tomato"]
+    no_cache: bool = False  # True = bỏ qua kết quả đã cache, luôn gọi AI
 
 class WeeklyMealPlanRequest(BaseModel):
     activity_level: str = "moderate"  # sedentary, light, moderate, active, very_active
     goal: str = "maintain"  # maintain, lose, gain
     notes: str = ""  # Ghi chú của user
     start_date: str = ""  # Ngày bắt đầu tuần (YYYY-MM-DD), nếu rỗng thì dùng hôm nay
+    no_cache: bool = False  # True = tạo thực đơn mới thay vì dùng thực đơn đã cache
+    mode: str = "ai"  # "ai" = Gemini tạo món mới, "local" = chọn từ các món có sẵn (không gọi AI)
 
 class RecipeSearchRequest(BaseModel):
     query: str  # VD: "món giảm cân", "món chay protein cao"
+    no_cache: bool = False  # True = bỏ qua kết quả đã cache, luôn gọi AI
+
+# --- HELPER: Thông tin user cho thực đơn tuần ---
+def weekly_plan_user_data(current_user: models.User, request: WeeklyMealPlanRequest) -> dict:
+    if not current_user.date_of_birth or not current_user.weight or not current_user.height:
+        raise HTTPException(
+            status_code=400, 
+            detail="Cần cập nhật đầy đủ thông tin: ngày sinh, cân nặng, chiều cao trong profile"
+        )
+    return {
+        "gender": current_user.gender,
+        "weight": current_user.weight,
+        "height": current_user.height,
+        "date_of_birth": str(current_user.date_of_birth),
+        "dietary_preferences": current_user.dietary_preferences or "",
+        "activity_level": request.activity_level,
+        "goal": request.goal,
+        "notes": request.notes
+    }
+
+def weekly_plan_start_date(request: WeeklyMealPlanRequest) -> date:
+    """Ngày bắt đầu tuần từ request, nếu rỗng thì dùng hôm nay"""
+    if not request.start_date:
+        return datetime.today().date()
+    try:
+        return datetime.fromisoformat(request.start_date).date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start_date không hợp lệ (định dạng YYYY-MM-DD)")
+
+WEEKLY_PLAN_MODES = ("ai", "local")
+
+def require_ai_mode(request: WeeklyMealPlanRequest) -> None:
+    """Stream / job nền chỉ dành cho chế độ AI (chế độ local trả kết quả ngay)"""
+    if request.mode == "local":
+        raise HTTPException(
+            status_code=400,
+            detail="mode=local trả kết quả ngay, không cần stream / job - dùng POST /ai/suggest-weekly-plan"
+        )
+    if request.mode not in WEEKLY_PLAN_MODES:
+        raise HTTPException(status_code=400, detail=f"mode không hợp lệ (chọn: {', '.join(WEEKLY_PLAN_MODES)})")
+
+# --- HELPER: Server-Sent Events ---
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # nginx: không gom response, gửi từng sự kiện ngay
+}
+
+def sse_event(event: str, data: dict) -> str:
+    """1 sự kiện SSE: `event: <tên>` + `data: <json>` + dòng trống"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+def sticky_fields(sticky_key: Optional[str]) -> dict:
+    """
+    Sau mỗi commit giữa stream: làm mới read-your-writes (xem app/db_routing.py) - header X-Read-Your-Writes
+    đã gửi từ đầu stream và hết hạn trước khi stream xong -> token mới đi trong dữ liệu sự kiện
+    """
+    if sticky_key is None or replica_engine is None:
+        return {}
+    return {"read_your_writes": record_write(sticky_key)}
+
+def sse_error(error: Exception) -> str:
+    """Lỗi giữa stream: status HTTP đã gửi (200) nên báo lỗi bằng sự kiện `error`"""
+    if isinstance(error, ExecutorBusy):
+        print(f"[BUSY] {error}")
+        return sse_event("error", {"status": 503, "detail": BUSY_DETAIL})
+    return sse_event("error", {"status": 500, "detail": str(error)})
 
 # --- 1. TẠO CÔNG THỨC TỪ NGUYÊN LIỆU ---
 @router.post("/generate-recipe")
 async def generate_recipe_from_ingredients(
     request: RecipeFromIngredientsRequest,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_profile_async)
 ):
     """
     AI tạo công thức món ăn từ các nguyên liệu có sẵn
     
     Request body:
     {
-        "ingredients": ["chicken breast", "rice", "broccoli", "soy sauce"]
+        "ingredients": ["chicken breast", "rice", "broccoli", "soy sauce"],
+        "no_cache": false
     }
+    Nguyên liệu giống nhau (không kể thứ tự, dấu, hoa thường) -> trả kết quả đã cache, không gọi AI
     """
+    # Lời gọi AI mất nhiều giây: kết thúc transaction đọc (profile) để trả kết nối DB về pool trước
+    await db.commit()
     try:
         recipe_data = await ai_service.generate_recipe_from_ingredients(
             ingredients=request.ingredients,
-            dietary_preferences=current_user.dietary_preferences or ""
+            dietary_preferences=current_user.dietary_preferences or "",
+            use_cache=not request.no_cache
         )
         
-        # Lưu vào database
-        new_recipe = models.Recipe(
-            name=recipe_data["name"],
-            description=recipe_data["description"],
-            instructions=recipe_data["instructions"],
-            servings=recipe_data["servings"],
-            prep_time=recipe_data["prep_time"],
-            calories=recipe_data["nutrition"]["calories"],
-            protein=recipe_data["nutrition"]["protein"],
-            carbs=recipe_data["nutrition"]["carbs"],
-            fat=recipe_data["nutrition"]["fat"],
-            tags=recipe_data["tags"],
-            owner_id=current_user.id
+        # Lưu vào database - recipe + ingredients + tags trong 1 transaction
+        new_recipe = recipe_writer.build_recipe(
+            current_user.id,
+            recipe_writer.ingredients_from_ai(recipe_data),
+            **recipe_writer.recipe_fields_from_ai(recipe_data)
         )
-        db.add(new_recipe)
-        db.commit()
-        db.refresh(new_recipe)
-        
-        # Thêm ingredients
-        for ing in recipe_data.get("ingredients", []):
-            # Xử lý amount - có thể là string như "vừa ăn", "tùy ý"
-            amount_value = ing.get("amount", 0)
-            if isinstance(amount_value, str):
-                # Nếu là string không phải số, đặt về 1
-                try:
-                    amount_value = float(amount_value)
-                except (ValueError, TypeError):
-                    # Các trường hợp như "vừa ăn", "tùy ý", "theo khẩu vị"
-                    amount_value = 1.0  # Giá trị mặc định
-            
-            # Đảm bảo amount là số
-            try:
-                amount_value = float(amount_value)
-            except (ValueError, TypeError):
-                amount_value = 1.0
-            
-            ingredient = models.Ingredient(
-                name=ing.get("name", "Nguyên liệu"),
-                amount=amount_value,
-                unit=ing.get("unit", ""),
-                recipe_id=new_recipe.id
-            )
-            db.add(ingredient)
-        
-        db.commit()
-        db.refresh(new_recipe)
+        # Trùng nội dung (tên + nguyên liệu) với món user đã có -> dùng lại món cũ
+        [(recipe, reused)] = await db.run_sync(recipe_writer.add_or_reuse_recipes, [new_recipe])
+        await db.commit()
+        if not reused:
+            await db.refresh(recipe)
         
         return {
-            "message": "Đã tạo công thức món ăn thành công!",
-            "recipe": new_recipe
+            "message": "Món này đã có trong công thức của bạn!" if reused else "Đã tạo công thức món ăn thành công!",
+            "recipe": recipe,
+            "reused": reused
         }
+    except ExecutorBusy:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -105,8 +159,8 @@ async def generate_recipe_from_ingredients(
 @router.post("/suggest-weekly-plan")
 async def suggest_weekly_meal_plan(
     request: WeeklyMealPlanRequest,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_profile_async)
 ):
     """
     AI gợi ý thực đơn 7 ngày và TỰ ĐỘNG LƯU recipes + meal_plans vào database
@@ -115,269 +169,79 @@ async def suggest_weekly_meal_plan(
     {
         "activity_level": "moderate",
         "goal": "maintain",
-        "notes": "Muốn nhiều rau xanh"
+        "notes": "Muốn nhiều rau xanh",
+        "mode": "ai"
     }
+    "mode": "local" -> không gọi AI: chọn từ các món có sẵn theo calories / chất mục tiêu và
+    dietary_preferences, trả về ngay (không tạo món mới, recipes_created = 0)
     """
-    if not current_user.date_of_birth or not current_user.weight or not current_user.height:
-        raise HTTPException(
-            status_code=400, 
-            detail="Cần cập nhật đầy đủ thông tin: ngày sinh, cân nặng, chiều cao trong profile"
-        )
+    user_data = weekly_plan_user_data(current_user, request)
+    start_date = weekly_plan_start_date(request)
+    if request.mode == "local":
+        return await _local_weekly_plan(db, current_user.id, user_data, start_date)
+    require_ai_mode(request)
     
     try:
-        user_data = {
-            "gender": current_user.gender,
-            "weight": current_user.weight,
-            "height": current_user.height,
-            "date_of_birth": str(current_user.date_of_birth),
-            "dietary_preferences": current_user.dietary_preferences or "",
-            "activity_level": request.activity_level,
-            "goal": request.goal,
-            "notes": request.notes
-        }
-        
-        # Gọi AI service để tạo thực đơn
+        # Gọi AI service để tạo thực đơn (trả kết nối DB về pool trong lúc chờ AI)
+        await db.commit()
         print(f"[AI] Bắt đầu tạo thực đơn cho user {current_user.id}")
-        ai_result = await ai_service.suggest_weekly_meal_plan_with_recipes(user_data)
+        ai_result = await ai_service.suggest_weekly_meal_plan_with_recipes(user_data, use_cache=not request.no_cache)
         print(f"[AI] Đã nhận kết quả từ AI: {len(ai_result.get('recipes', []))} recipes")
         
-        # Log để debug: Kiểm tra tên recipes vs meal_plan
-        recipe_names = [r["name"] for r in ai_result.get("recipes", [])]
-        print(f"[AI] Tên recipes từ AI: {recipe_names}")
-        
-        meal_plan_names = []
-        for day in ai_result.get("meal_plan", []):
-            meal_plan_names.extend([
-                day.get("breakfast", {}).get("name"),
-                day.get("lunch", {}).get("name"),
-                day.get("dinner", {}).get("name")
-            ])
-        print(f"[AI] Tên meal_plan từ AI: {meal_plan_names}")
-        
-        # Kiểm tra xem có tên nào trong meal_plan không có trong recipes không
-        missing_names = [name for name in meal_plan_names if name and name not in recipe_names]
-        if missing_names:
-            print(f"[AI] CẢNH BÁO: Có {len(missing_names)} tên trong meal_plan không khớp với recipes: {missing_names}")
-        
-        # Lưu recipes vào database
-        saved_recipes = {}
+        # Lưu recipes + meal plans (dùng chung với job nền - xem meal_plan_writer)
         try:
-            for recipe_data in ai_result["recipes"]:
-                # Tạo recipe
-                new_recipe = models.Recipe(
-                    name=recipe_data["name"],
-                    description=recipe_data.get("description", ""),
-                    instructions=recipe_data.get("instructions", ""),
-                    servings=recipe_data.get("servings", 1),
-                    prep_time=recipe_data.get("prep_time"),
-                    calories=recipe_data["nutrition"]["calories"],
-                    protein=recipe_data["nutrition"]["protein"],
-                    carbs=recipe_data["nutrition"]["carbs"],
-                    fat=recipe_data["nutrition"]["fat"],
-                    tags=recipe_data.get("tags", ""),
-                    owner_id=current_user.id
-                )
-                db.add(new_recipe)
-                db.flush()  # Để lấy ID
-                
-                # Thêm ingredients
-                for ing in recipe_data.get("ingredients", []):
-                    # Xử lý amount - có thể là string như "vừa ăn", "tùy ý"
-                    amount_value = ing.get("amount", 0)
-                    if isinstance(amount_value, str):
-                        # Nếu là string không phải số, đặt về 0 hoặc 1
-                        try:
-                            amount_value = float(amount_value)
-                        except (ValueError, TypeError):
-                            # Các trường hợp như "vừa ăn", "tùy ý", "theo khẩu vị"
-                            amount_value = 1.0  # Giá trị mặc định
-                    
-                    # Đảm bảo amount là số
-                    try:
-                        amount_value = float(amount_value)
-                    except (ValueError, TypeError):
-                        amount_value = 1.0
-                    
-                    ingredient = models.Ingredient(
-                        name=ing.get("name", "Nguyên liệu"),
-                        amount=amount_value,
-                        unit=ing.get("unit", ""),
-                        recipe_id=new_recipe.id
-                    )
-                    db.add(ingredient)
-                
-                # Lưu recipe với tên gốc
-                recipe_name = recipe_data["name"]
-                saved_recipes[recipe_name] = new_recipe.id
-                print(f"[AI] Đã lưu recipe: '{recipe_name}' (ID: {new_recipe.id})")
-            
-            print(f"[AI] Đã lưu {len(saved_recipes)} recipes vào database")
-            print(f"[AI] Danh sách tên recipes đã lưu: {list(saved_recipes.keys())}")
-        except Exception as e:
-            db.rollback()
-            print(f"[AI] Lỗi khi lưu recipes: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Lỗi khi lưu recipes vào database: {str(e)}")
-        
-        # Lưu meal_plans vào database
-        from datetime import datetime, timedelta
-        # Sử dụng start_date từ request, nếu không có thì dùng hôm nay
-        if request.start_date:
-            start_date = datetime.fromisoformat(request.start_date).date()
-        else:
-            start_date = datetime.today().date()
-        
-        try:
-            # XÓA các meal plans cũ trong khoảng 7 ngày này (nếu có)
-            end_date = start_date + timedelta(days=6)
-            old_plans = db.query(models.MealPlan).filter(
-                models.MealPlan.owner_id == current_user.id,
-                models.MealPlan.date >= start_date,
-                models.MealPlan.date <= end_date
-            ).all()
-            deleted_count = len(old_plans)
-            for plan in old_plans:
-                db.delete(plan)
-            db.flush()  # Xóa ngay để tránh conflict
-            print(f"[AI] Đã xóa {deleted_count} meal plans cũ")
-            
-            # Hàm helper để tìm recipe_id từ tên (tìm gần đúng)
-            def find_recipe_id(recipe_name, saved_recipes):
-                """Tìm recipe_id từ tên, hỗ trợ tìm gần đúng"""
-                recipe_name = recipe_name.strip()
-                print(f"[AI] Đang tìm recipe: '{recipe_name}'")
-                
-                # Tìm chính xác
-                if recipe_name in saved_recipes:
-                    print(f"[AI] Tìm thấy chính xác: '{recipe_name}'")
-                    return saved_recipes[recipe_name]
-                
-                # Tìm không phân biệt hoa thường
-                for name, recipe_id in saved_recipes.items():
-                    if name.lower().strip() == recipe_name.lower().strip():
-                        print(f"[AI] Tìm thấy (case-insensitive): '{recipe_name}' -> '{name}'")
-                        return recipe_id
-                
-                # Tìm chứa tên (fuzzy match) - kiểm tra từng từ
-                recipe_words = set(recipe_name.lower().split())
-                best_match = None
-                best_score = 0
-                
-                for name, recipe_id in saved_recipes.items():
-                    name_words = set(name.lower().split())
-                    # Đếm số từ trùng
-                    common_words = recipe_words.intersection(name_words)
-                    score = len(common_words)
-                    
-                    # Nếu có nhiều từ trùng, ưu tiên
-                    if score > best_score and score >= 2:  # Ít nhất 2 từ trùng
-                        best_score = score
-                        best_match = (name, recipe_id)
-                
-                if best_match:
-                    print(f"[AI] Fuzzy match (score {best_score}): '{recipe_name}' -> '{best_match[0]}'")
-                    return best_match[1]
-                
-                # Tìm chứa tên (substring match) - fallback
-                for name, recipe_id in saved_recipes.items():
-                    if recipe_name.lower() in name.lower() or name.lower() in recipe_name.lower():
-                        print(f"[AI] Substring match: '{recipe_name}' -> '{name}'")
-                        return recipe_id
-                
-                # Nếu không tìm thấy, trả về None
-                print(f"[AI] KHÔNG tìm thấy recipe: '{recipe_name}'")
-                return None
-            
-            for day_index, day_plan in enumerate(ai_result["meal_plan"]):
-                current_date = start_date + timedelta(days=day_index)
-                
-                # Tìm recipe_id cho từng bữa
-                breakfast_name = day_plan["breakfast"]["name"]
-                lunch_name = day_plan["lunch"]["name"]
-                dinner_name = day_plan["dinner"]["name"]
-                
-                breakfast_id = find_recipe_id(breakfast_name, saved_recipes)
-                lunch_id = find_recipe_id(lunch_name, saved_recipes)
-                dinner_id = find_recipe_id(dinner_name, saved_recipes)
-                
-                if breakfast_id is None:
-                    raise HTTPException(
-                        status_code=500, 
-                        detail=f"Không tìm thấy recipe: '{breakfast_name}'. Các recipes có sẵn: {', '.join(list(saved_recipes.keys())[:5])}"
-                    )
-                if lunch_id is None:
-                    raise HTTPException(
-                        status_code=500, 
-                        detail=f"Không tìm thấy recipe: '{lunch_name}'. Các recipes có sẵn: {', '.join(list(saved_recipes.keys())[:5])}"
-                    )
-                if dinner_id is None:
-                    raise HTTPException(
-                        status_code=500, 
-                        detail=f"Không tìm thấy recipe: '{dinner_name}'. Các recipes có sẵn: {', '.join(list(saved_recipes.keys())[:5])}"
-                    )
-                
-                # Breakfast
-                breakfast_plan = models.MealPlan(
-                    date=current_date,
-                    meal_type="Breakfast",
-                    servings=1,
-                    owner_id=current_user.id,
-                    recipe_id=breakfast_id
-                )
-                db.add(breakfast_plan)
-                
-                # Lunch
-                lunch_plan = models.MealPlan(
-                    date=current_date,
-                    meal_type="Lunch",
-                    servings=1,
-                    owner_id=current_user.id,
-                    recipe_id=lunch_id
-                )
-                db.add(lunch_plan)
-                
-                # Dinner
-                dinner_plan = models.MealPlan(
-                    date=current_date,
-                    meal_type="Dinner",
-                    servings=1,
-                    owner_id=current_user.id,
-                    recipe_id=dinner_id
-                )
-                db.add(dinner_plan)
-            
-            print(f"[AI] Đã tạo {len(ai_result['meal_plan']) * 3} meal plans")
-            
-            # Commit tất cả
-            db.commit()
+            result = await db.run_sync(meal_plan_writer.save_weekly_plan, current_user.id, ai_result, start_date)
+            await db.commit()
             print(f"[AI] Đã commit thành công vào database")
-            
-        except Exception as e:
-            db.rollback()
-            print(f"[AI] Lỗi khi lưu meal plans: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Lỗi khi lưu meal plans vào database: {str(e)}")
+        except meal_plan_writer.WeeklyPlanSaveError as e:
+            await db.rollback()
+            raise HTTPException(status_code=500, detail=str(e))
         
-        return {
-            "message": "✅ Đã tạo thực đơn tuần và lưu vào database!",
-            "total_calories_per_day": ai_result["total_calories_per_day"],
-            "meal_plan": ai_result["meal_plan"],
-            "recipes_created": len(saved_recipes),
-            "meal_plans_created": len(ai_result["meal_plan"]) * 3
-        }
-    except HTTPException:
+        return result
+    except (HTTPException, ExecutorBusy):
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         import traceback
         error_detail = traceback.format_exc()
         print(f"[AI] Lỗi tổng quát: {str(e)}")
         print(f"[AI] Traceback: {error_detail}")
         raise HTTPException(status_code=500, detail=f"Lỗi tạo thực đơn: {str(e)}")
 
+async def _local_weekly_plan(db: AsyncSession, user_id: int, user_data: dict, start_date: date) -> dict:
+    """
+    "mode": "local" - chọn sáng / trưa / tối từ các món user xem được (món công khai + món của user),
+    theo calories / chất mục tiêu và hạn chế ăn uống, không gọi AI (xem app/services/local_planner.py)
+    """
+    started = time.perf_counter()
+    await db.commit()  # Trả kết nối DB về pool trong lúc lập thực đơn
+    try:
+        # Đọc danh mục + chọn món trên executor riêng (không chặn event loop), chỉ phần lưu dùng session này
+        plan = await local_planner.plan_week_async(user_id, user_data, start_date)
+        meal_plans_created = await db.run_sync(
+            meal_plan_writer.save_local_plan, user_id, plan["meal_plan"], start_date
+        )
+        await db.commit()
+    except local_planner.LocalPlanError as e:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+    print(f"[PLANNER] Lập thực đơn cho user {user_id} từ {plan['candidates']} món trong {elapsed_ms} ms")
+    return {
+        "message": "✅ Đã lập thực đơn tuần từ các món có sẵn và lưu vào database!",
+        "mode": "local",
+        **plan,
+        "recipes_created": 0,
+        "meal_plans_created": meal_plans_created,
+        "elapsed_ms": elapsed_ms
+    }
+
 # --- 3. TÌM KIẾM GỢI Ý MÓN ĂN ---
 @router.post("/search-recipes")
 async def search_recipe_suggestions(
     request: RecipeSearchRequest,
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_profile_async)
 ):
     """
     AI gợi ý món ăn theo yêu cầu
@@ -387,15 +251,223 @@ async def search_recipe_suggestions(
         "query": "món ăn giảm cân cho bữa sáng"
     }
     """
+    await db.commit()  # Trả kết nối DB về pool trước khi chờ AI
     try:
         suggestions = await ai_service.get_recipe_suggestions(
             query=request.query,
-            dietary_preferences=current_user.dietary_preferences or ""
+            dietary_preferences=current_user.dietary_preferences or "",
+            use_cache=not request.no_cache
         )
         
         return {
             "message": f"Tìm thấy {len(suggestions)} món ăn phù hợp",
             "suggestions": suggestions
         }
+    except ExecutorBusy:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+# --- 4. STREAM: TẠO CÔNG THỨC TỪ NGUYÊN LIỆU (Server-Sent Events) ---
+async def _recipe_events(user_id: int, request: RecipeFromIngredientsRequest, dietary_preferences: str,
+                         sticky_key: Optional[str] = None):
+    async with AsyncSessionLocal() as db:
+        try:
+            async for event, data in ai_service.stream_recipe_from_ingredients(
+                request.ingredients, dietary_preferences, use_cache=not request.no_cache
+            ):
+                if event != "recipe":
+                    yield sse_event(event, data)
+                    continue
+                new_recipe = recipe_writer.build_recipe(
+                    user_id,
+                    recipe_writer.ingredients_from_ai(data),
+                    **recipe_writer.recipe_fields_from_ai(data)
+                )
+                [(saved, reused)] = await db.run_sync(recipe_writer.add_or_reuse_recipes, [new_recipe])
+                await db.commit()
+                recipe = await db.run_sync(lambda _: schemas.Recipe.model_validate(saved).model_dump(mode="json"))
+                yield sse_event("recipe", {**recipe, "reused": reused, **sticky_fields(sticky_key)})
+            yield sse_event("done", {"message": "Đã tạo công thức món ăn thành công!"})
+        except Exception as e:
+            await db.rollback()
+            print(f"[AI] Lỗi stream tạo công thức: {str(e)}")
+            yield sse_error(e)
+
+@router.post("/generate-recipe/stream")
+async def stream_recipe_from_ingredients(
+    request: RecipeFromIngredientsRequest,
+    http_request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_profile_async)
+):
+    """
+    Như POST /ai/generate-recipe nhưng trả về text/event-stream:
+    - start: {cached}
+    - delta: {text} - đoạn văn bản model vừa viết (hiển thị tiến trình)
+    - recipe: công thức đã lưu vào database (như "recipe" của bản thường) + reused (true = dùng lại món đã có)
+      + read_your_writes khi có read replica (token mới, xem sticky_fields)
+    - done / error: {status, detail} (lỗi giữa chừng không đổi được HTTP status)
+    """
+    await db.commit()  # Trả kết nối DB về pool, stream dùng session riêng
+    return StreamingResponse(
+        _recipe_events(current_user.id, request, current_user.dietary_preferences or "", client_key(http_request)),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+# --- 5. STREAM: THỰC ĐƠN CẢ TUẦN (Server-Sent Events) ---
+async def _weekly_plan_events(user_id: int, user_data: dict, start_date: date, use_cache: bool,
+                              sticky_key: Optional[str] = None):
+    """
+    Lưu từng món / từng ngày ngay khi AI viết xong (mỗi phần 1 transaction ngắn, không giữ kết nối DB
+    trong lúc chờ model). Lịch cũ được thay theo từng ngày: ngày nào có thực đơn mới thì xóa lịch cũ của ngày đó.
+    Stream bị ngắt giữa chừng -> các món / ngày đã gửi vẫn được giữ.
+    """
+    resolver = RecipeResolver()
+    catalog = None  # Món user đã có - chỉ đọc khi AI đặt tên món không có trong các recipe đã gửi
+    recipes_reused = 0
+    days_saved = 0
+    meal_plans_created = 0
+    total_calories = None
+    async with AsyncSessionLocal() as db:
+        try:
+            async for event, data in ai_service.stream_weekly_meal_plan_with_recipes(user_data, use_cache=use_cache):
+                if event == "start":
+                    total_calories = data["total_calories_per_day"]
+                    yield sse_event(event, {**data, "start_date": start_date})
+                elif event == "recipe":
+                    new_recipe = recipe_writer.build_recipe(
+                        user_id,
+                        recipe_writer.ingredients_from_ai(data),
+                        **recipe_writer.recipe_fields_from_ai(data)
+                    )
+                    [(recipe, reused)] = await db.run_sync(recipe_writer.add_or_reuse_recipes, [new_recipe])
+                    await db.commit()
+                    resolver.add(new_recipe.name, recipe.id)
+                    recipes_reused += reused
+                    yield sse_event("recipe", {
+                        "index": len(resolver) - 1,
+                        "id": recipe.id,
+                        "name": recipe.name,
+                        "calories": recipe.calories,
+                        "protein": recipe.protein,
+                        "carbs": recipe.carbs,
+                        "fat": recipe.fat,
+                        "tags": recipe.tags,
+                        "reused": reused,
+                        **sticky_fields(sticky_key),
+                    })
+                elif event == "day":
+                    if days_saved >= 7:
+                        continue
+                    current_date = start_date + timedelta(days=days_saved)
+                    meals, missing = [], []
+                    for meal_type, key in meal_plan_writer.MEAL_TYPES:
+                        recipe_name = (data.get(key) or {}).get("name") or ""
+                        found = resolver.match(recipe_name)
+                        if found is None and recipe_name:
+                            if catalog is None:
+                                catalog = await db.run_sync(user_catalog, user_id)
+                            found = meal_plan_writer.match_existing(catalog, recipe_name)
+                        if found is None:
+                            missing.append(recipe_name)
+                            continue
+                        meals.append({"meal_type": meal_type, "recipe_id": found.recipe_id, "name": recipe_name})
+                    await db.execute(
+                        delete(models.MealPlan).where(
+                            models.MealPlan.owner_id == user_id,
+                            models.MealPlan.date == current_date
+                        ).execution_options(synchronize_session=False)
+                    )
+                    db.add_all([
+                        models.MealPlan(date=current_date, meal_type=meal["meal_type"], servings=1,
+                                        owner_id=user_id, recipe_id=meal["recipe_id"])
+                        for meal in meals
+                    ])
+                    await db.commit()
+                    days_saved += 1
+                    meal_plans_created += len(meals)
+                    yield sse_event("day", {"index": days_saved - 1, "date": current_date, "day": data.get("day"),
+                                            "meals": meals, "missing": missing, **sticky_fields(sticky_key)})
+                else:
+                    yield sse_event(event, data)
+            yield sse_event("done", {
+                "message": "✅ Đã tạo thực đơn tuần và lưu vào database!",
+                "total_calories_per_day": total_calories,
+                "recipes_created": len(resolver) - recipes_reused,
+                "recipes_reused": recipes_reused,
+                "meal_plans_created": meal_plans_created,
+                "days": days_saved,
+                **sticky_fields(sticky_key),
+            })
+        except Exception as e:
+            await db.rollback()
+            print(f"[AI] Lỗi stream thực đơn tuần: {str(e)}")
+            yield sse_error(e)
+
+@router.post("/suggest-weekly-plan/stream")
+async def stream_weekly_meal_plan(
+    request: WeeklyMealPlanRequest,
+    http_request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_profile_async)
+):
+    """
+    Như POST /ai/suggest-weekly-plan nhưng trả về text/event-stream - món đầu tiên xuất hiện sau ~1 giây
+    thay vì sau khi AI viết xong cả tuần:
+    - start: {total_calories_per_day, cached, start_date}
+    - progress: {chars} - số ký tự AI đã viết
+    - recipe: {index, id, name, calories, ..., reused} - món vừa được lưu (reused = dùng lại món trùng đã có)
+    - day: {index, date, day, meals: [{meal_type, recipe_id, name}], missing} - ngày vừa được lưu vào lịch
+    - warning: {detail}, done: {recipes_created, recipes_reused, meal_plans_created, ...}, error: {status, detail}
+    recipe / day / done mang thêm read_your_writes khi có read replica (token mới sau mỗi commit, xem sticky_fields)
+    """
+    user_data = weekly_plan_user_data(current_user, request)
+    start_date = weekly_plan_start_date(request)
+    require_ai_mode(request)
+    await db.commit()  # Trả kết nối DB về pool, stream dùng session riêng
+    return StreamingResponse(
+        _weekly_plan_events(current_user.id, user_data, start_date, use_cache=not request.no_cache,
+                            sticky_key=client_key(http_request)),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+# --- 6. JOB NỀN: THỰC ĐƠN CẢ TUẦN (hàng đợi ai_jobs + worker.py) ---
+@router.post("/jobs/weekly-plan", status_code=202)
+async def enqueue_weekly_meal_plan(
+    request: WeeklyMealPlanRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_profile_async)
+):
+    """
+    Như POST /ai/suggest-weekly-plan nhưng trả về ngay (202) - worker.py gọi AI và lưu thực đơn ở nền.
+    Theo dõi bằng GET /ai/jobs/{job_id} (status_url). Gửi lại đúng yêu cầu đang chờ -> nhận lại job cũ.
+    """
+    user_data = weekly_plan_user_data(current_user, request)
+    start_date = weekly_plan_start_date(request)
+    require_ai_mode(request)
+    job, created = await ai_jobs.enqueue(db, current_user.id, ai_jobs.KIND_WEEKLY_PLAN, {
+        "user_data": user_data,
+        "start_date": start_date.isoformat(),
+        "use_cache": not request.no_cache,
+    })
+    view = ai_jobs.job_view(job, await ai_jobs.queue_position(db, job))
+    view["created"] = created
+    return view
+
+# --- 7. TRẠNG THÁI JOB NỀN ---
+@router.get("/jobs/{job_id}")
+async def get_ai_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: TokenUser = Depends(get_current_user_async)
+):
+    """
+    Trạng thái job: queued (kèm queue_position) -> running -> succeeded (kèm result, giống response
+    của POST /ai/suggest-weekly-plan) hoặc failed (kèm error)
+    """
+    job = await ai_jobs.get_job(db, job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy job")
+    return ai_jobs.job_view(job, await ai_jobs.queue_position(db, job))
@@ -1,8 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db, get_async_db
 from app import models, schemas, utils
+from app.services import passwords
 
 router = APIRouter(
     prefix="/auth",
@@ -10,18 +14,21 @@ router = APIRouter(
 )
 
 # --- API 1: ĐĂNG KÝ TÀI KHOẢN ---
+# register / login là route async: hash mật khẩu chạy trên executor riêng (app/services/passwords.py),
+# không chiếm threadpool và không chặn event loop (hàng đợi đầy -> 503, xem main.py)
 @router.post("/register", response_model=schemas.User)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
     # 1. Kiểm tra Email trùng
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+    db_user = await db.scalar(select(models.User.id).where(models.User.email == user.email))
     if db_user:
         raise HTTPException(
             status_code=400, 
             detail="Email này đã được sử dụng!"
         )
     
-    # 2. Mã hóa mật khẩu
-    hashed_password = utils.get_password_hash(user.password)
+    # 2. Mã hóa mật khẩu (kết thúc transaction đọc trước -> không giữ kết nối DB trong lúc chờ hash)
+    await db.commit()
+    hashed_password = await passwords.hash_password(user.password)
     
     # 3. Tạo User mới (Full thông tin theo Database mới)
     new_user = models.User(
@@ -36,17 +43,24 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
         dietary_preferences=user.dietary_preferences
     )
     
-    # 4. Lưu vào DB
+    # 4. Lưu vào DB (2 request cùng email lọt qua bước 1 trong lúc hash -> unique constraint chặn, báo như bước 1)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=400, 
+            detail="Email này đã được sử dụng!"
+        )
+    await db.refresh(new_user)
     
     return new_user
 
 
 # --- API 2: ĐĂNG NHẬP (Lấy Token) ---
 @router.post("/login", response_model=schemas.Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     """
     Lưu ý: OAuth2PasswordRequestForm sẽ gửi dữ liệu dưới dạng form-data.
     Nó có trường 'username' và 'password'.
@@ -54,18 +68,31 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     """
     
     # 1. Tìm user trong DB theo email
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
+    user = await db.scalar(select(models.User).where(models.User.email == form_data.username))
     
     # 2. Kiểm tra: User không tồn tại HOẶC Mật khẩu sai
-    if not user or not utils.verify_password(form_data.password, user.hashed_password):
+    # (kết thúc transaction đọc trước -> không giữ kết nối DB trong lúc chờ hash)
+    await db.commit()
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = await passwords.verify_and_update(form_data.password, user.hashed_password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email hoặc mật khẩu không chính xác",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # 3. Nếu đúng hết -> Tạo Token
-    access_token = utils.create_access_token(data={"sub": user.email})
+    # Hash cũ (scheme/cost cũ) -> lưu hash mới theo cấu hình hiện tại
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+    
+    if user.is_active is False:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Tài khoản đã bị khóa")
+    
+    # 3. Nếu đúng hết -> Tạo Token (mang sẵn id, role, trạng thái, token_version)
+    access_token = utils.create_user_token(user)
     
     # 4. Trả về Token cho Frontend dùng
     return {"access_token": access_token, "token_type": "bearer"}
@@ -73,7 +100,7 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
 
 # --- API 3: LẤY THÔNG TIN USER HIỆN TẠI ---
 @router.get("/me", response_model=schemas.User)
-def get_current_user_info(current_user: models.User = Depends(utils.get_current_user)):
+def get_current_user_info(current_user: models.User = Depends(utils.get_current_user_profile)):
     """
     Lấy thông tin chi tiết của user đang đăng nhập
     """
@@ -85,7 +112,7 @@ def get_current_user_info(current_user: models.User = Depends(utils.get_current_
 def update_user_profile(
     profile_update: schemas.UserProfileUpdate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(utils.get_current_user)
+    current_user: models.User = Depends(utils.get_current_user_profile)
 ):
     """
     Cập nhật thông tin profile của user (tên, chiều cao, cân nặng, ngày sinh, giới tính)
@@ -1,47 +1,57 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from datetime import date
-from app.database import get_db
-from app import models, schemas
-from app.utils import get_current_user
+from app.database import get_async_db, get_async_read_db
+from app import models, schemas, loaders
+from app.utils import TokenUser, get_current_user_async
 
 router = APIRouter(
     prefix="/plans",
     tags=["Meal Plans"]
 )
 
+async def _load_plan(db: AsyncSession, plan_id: int) -> models.MealPlan:
+    """Đọc 1 meal plan kèm recipe -> ingredients và owner (schema trả về lồng nhau)"""
+    result = await db.execute(
+        select(models.MealPlan).options(*loaders.meal_plan_options())
+        .where(models.MealPlan.id == plan_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
+
 # --- 1. LẤY KẾ HOẠCH BỮA ĂN CỦA USER ---
 @router.get("/", response_model=List[schemas.MealPlan])
-def get_meal_plans(
+async def get_meal_plans(
     start_date: date = None,
     end_date: date = None,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: TokenUser = Depends(get_current_user_async)
 ):
     """
     Lấy kế hoạch bữa ăn của user
     - start_date: Ngày bắt đầu (YYYY-MM-DD)
     - end_date: Ngày kết thúc (YYYY-MM-DD)
     """
-    query = db.query(models.MealPlan).options(
-        joinedload(models.MealPlan.recipe)
-    ).filter(models.MealPlan.owner_id == current_user.id)
+    query = select(models.MealPlan).options(*loaders.meal_plan_options()).where(
+        models.MealPlan.owner_id == current_user.id
+    )
     
     if start_date:
-        query = query.filter(models.MealPlan.date >= start_date)
+        query = query.where(models.MealPlan.date >= start_date)
     if end_date:
-        query = query.filter(models.MealPlan.date <= end_date)
+        query = query.where(models.MealPlan.date <= end_date)
     
-    plans = query.order_by(models.MealPlan.date, models.MealPlan.meal_type).all()
+    plans = (await db.execute(query.order_by(models.MealPlan.date, models.MealPlan.meal_type))).scalars().all()
     return plans
 
 # --- 2. THÊM MÓN ĂN VÀO LỊCH (Drag & Drop từ Frontend) ---
 @router.post("/", response_model=schemas.MealPlan)
-def create_meal_plan(
+async def create_meal_plan(
     plan: schemas.MealPlanCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: TokenUser = Depends(get_current_user_async)
 ):
     """
     Thêm món ăn vào kế hoạch
@@ -51,16 +61,18 @@ def create_meal_plan(
     - servings: Số khẩu phần (mặc định 1)
     """
     # Kiểm tra recipe tồn tại
-    recipe = db.query(models.Recipe).filter(models.Recipe.id == plan.recipe_id).first()
+    recipe = await db.get(models.Recipe, plan.recipe_id)
     if not recipe:
         raise HTTPException(status_code=404, detail="Không tìm thấy công thức món ăn")
     
     # Kiểm tra trùng lặp (cùng ngày, cùng bữa)
-    existing = db.query(models.MealPlan).filter(
-        models.MealPlan.owner_id == current_user.id,
-        models.MealPlan.date == plan.date,
-        models.MealPlan.meal_type == plan.meal_type
-    ).first()
+    existing = (await db.execute(
+        select(models.MealPlan.id).where(
+            models.MealPlan.owner_id == current_user.id,
+            models.MealPlan.date == plan.date,
+            models.MealPlan.meal_type == plan.meal_type
+        ).limit(1)
+    )).first()
     
     if existing:
         raise HTTPException(
@@ -78,19 +90,18 @@ def create_meal_plan(
     )
     
     db.add(new_plan)
-    db.commit()
-    db.refresh(new_plan)
-    return new_plan
+    await db.commit()
+    return await _load_plan(db, new_plan.id)
 
 # --- 3. CẬP NHẬT KẾ HOẠCH (Thay đổi món hoặc số khẩu phần) ---
 @router.put("/{plan_id}", response_model=schemas.MealPlan)
-def update_meal_plan(
+async def update_meal_plan(
     plan_id: int,
     plan_update: schemas.MealPlanCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: TokenUser = Depends(get_current_user_async)
 ):
-    plan = db.query(models.MealPlan).filter(models.MealPlan.id == plan_id).first()
+    plan = await db.get(models.MealPlan, plan_id)
     if not plan:
         raise HTTPException(status_code=404, detail="Không tìm thấy kế hoạch")
     
@@ -103,24 +114,23 @@ def update_meal_plan(
     plan.recipe_id = plan_update.recipe_id
     plan.servings = plan_update.servings
     
-    db.commit()
-    db.refresh(plan)
-    return plan
+    await db.commit()
+    return await _load_plan(db, plan_id)
 
 # --- 4. XÓA KẾ HOẠCH ---
 @router.delete("/{plan_id}")
-def delete_meal_plan(
+async def delete_meal_plan(
     plan_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: TokenUser = Depends(get_current_user_async)
 ):
-    plan = db.query(models.MealPlan).filter(models.MealPlan.id == plan_id).first()
+    plan = await db.get(models.MealPlan, plan_id)
     if not plan:
         raise HTTPException(status_code=404, detail="Không tìm thấy kế hoạch")
     
     if plan.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Bạn không có quyền xóa kế hoạch này")
     
-    db.delete(plan)
-    db.commit()
+    await db.delete(plan)
+    await db.commit()
     return {"message": "Đã xóa kế hoạch bữa ăn"}
\ No newline at end of file
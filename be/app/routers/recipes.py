@@ -1,159 +1,195 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from app.database import get_db
-from app import models, schemas
-from app.utils import get_current_user
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
+from app.database import get_async_db, get_async_read_db
+from app import models, schemas, loaders, pagination
+from app.utils import TokenUser, get_current_user_async
+from app.services import search as recipe_search
+from app.services import tags as recipe_tags
+from app.services import ratings as recipe_ratings
+from app.services import recipe_writer
+from app.services import deletion as recipe_deletion
 
 router = APIRouter(
     prefix="/recipes",
     tags=["Recipes"]
 )
 
+# Các route dùng AsyncSession (app/database.py): truy vấn đơn giản viết bằng select() + await,
+# phần dùng chung code đồng bộ (search, tags, pagination, ...) chạy qua `await db.run_sync(...)`.
+
+async def _load_recipe(db: AsyncSession, recipe_id: int) -> Optional[models.Recipe]:
+    """Đọc 1 món kèm ingredients (populate_existing: lấy lại cả cột do DB sinh sau khi commit)"""
+    result = await db.execute(
+        select(models.Recipe).options(*loaders.recipe_options())
+        .where(models.Recipe.id == recipe_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
+
+async def _load_rating(db: AsyncSession, rating_id: int) -> models.Rating:
+    """Đọc 1 rating kèm user, recipe -> ingredients"""
+    result = await db.execute(
+        select(models.Rating).options(*loaders.rating_options())
+        .where(models.Rating.id == rating_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
+
 # --- 1. LẤY CÔNG THỨC (Của tôi hoặc tất cả) ---
-@router.get("/", response_model=List[schemas.Recipe])
-def get_recipes(
+@router.get("/", response_model=Union[List[schemas.Recipe], schemas.Page[schemas.Recipe]])
+async def get_recipes(
     skip: int = 0,
     limit: int = 100,
     search: str = "",
     tags: str = "",
+    tag_mode: str = "all",
     my_only: bool = False,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: TokenUser = Depends(get_current_user_async)
 ):
     """
     Lấy công thức món ăn
     - skip: Bỏ qua bao nhiêu bản ghi
     - limit: Giới hạn số lượng trả về
-    - search: Tìm kiếm theo tên món
-    - tags: Lọc theo tags (VD: "Breakfast,Low-Carb")
+    - search: Tìm kiếm theo tên, mô tả, nguyên liệu (không phân biệt dấu, sắp xếp theo độ liên quan)
+    - tags: Lọc theo tags, phân cách bằng dấu phẩy (VD: "Breakfast,Low-Carb")
+    - tag_mode: "all" = có tất cả các tags (mặc định), "any" = có ít nhất 1 tag
     - my_only: Nếu True, chỉ lấy recipes của user hiện tại. Nếu False, lấy tất cả (của user + công khai)
+    - cursor: Phân trang cursor ("" = trang đầu), trả về {items, next_cursor}. Bỏ trống -> dùng skip/limit
     """
+    if tag_mode not in recipe_tags.TAG_MODES:
+        raise HTTPException(status_code=400, detail="tag_mode phải là 'all' hoặc 'any'")
+    
     from sqlalchemy import or_
     
-    if my_only:
-        # Chỉ lấy recipes của user hiện tại
-        query = db.query(models.Recipe).filter(models.Recipe.owner_id == current_user.id)
-    else:
-        # Lấy recipes của user HOẶC recipes công khai (owner_id = NULL)
-        query = db.query(models.Recipe).filter(
-            or_(
-                models.Recipe.owner_id == current_user.id,
-                models.Recipe.owner_id.is_(None)
+    def load(session: Session):
+        if my_only:
+            # Chỉ lấy recipes của user hiện tại
+            query = session.query(models.Recipe).options(*loaders.recipe_options()).filter(
+                models.Recipe.owner_id == current_user.id
             )
-        )
-    
-    if search:
-        query = query.filter(models.Recipe.name.ilike(f"%{search}%"))
-    
-    if tags:
-        query = query.filter(models.Recipe.tags.ilike(f"%{tags}%"))
+        else:
+            # Lấy recipes của user HOẶC recipes công khai (owner_id = NULL)
+            query = session.query(models.Recipe).options(*loaders.recipe_options()).filter(
+                or_(
+                    models.Recipe.owner_id == current_user.id,
+                    models.Recipe.owner_id.is_(None)
+                )
+            )
+        
+        if search:
+            query = recipe_search.apply_search(query, search)
+        
+        if tags:
+            query = recipe_tags.apply_tag_filter(query, tags, tag_mode)
+        
+        if cursor is not None:
+            # Có search -> đã sắp theo độ liên quan, phân trang theo vị trí; không thì seek theo id
+            if search:
+                return pagination.offset_page(query, cursor, limit)
+            return pagination.keyset_page(query, [models.Recipe.id], cursor, limit)
+        
+        return query.offset(skip).limit(limit).all()
     
-    recipes = query.offset(skip).limit(limit).all()
-    return recipes
+    return await db.run_sync(load)
 
 # --- 1b. LẤY TẤT CẢ CÁC MÓN ĂN ĐÃ ĐƯỢC ĐÁNH GIÁ (BỞI BẤT KỲ USER NÀO) ---
-@router.get("/rated", response_model=List[schemas.Recipe])
-def get_rated_recipes(
+@router.get("/rated", response_model=Union[List[schemas.Recipe], schemas.Page[schemas.Recipe]])
+async def get_rated_recipes(
     skip: int = 0,
     limit: int = 100,
     search: str = "",
     tags: str = "",
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    tag_mode: str = "all",
+    sort: str = "id",
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: TokenUser = Depends(get_current_user_async)
 ):
     """
     Lấy TẤT CẢ các món ăn đã được đánh giá (bởi bất kỳ user nào)
     - skip: Bỏ qua bao nhiêu bản ghi
     - limit: Giới hạn số lượng trả về
-    - search: Tìm kiếm theo tên món
-    - tags: Lọc theo tags (VD: "Breakfast,Low-Carb")
+    - search: Tìm kiếm theo tên, mô tả, nguyên liệu (không phân biệt dấu, sắp xếp theo độ liên quan)
+    - tags: Lọc theo tags, phân cách bằng dấu phẩy (VD: "Breakfast,Low-Carb")
+    - tag_mode: "all" = có tất cả các tags (mặc định), "any" = có ít nhất 1 tag
+    - sort: "id" (mặc định) hoặc "avg" = điểm trung bình cao nhất trước (bỏ qua khi có search)
+    - cursor: Phân trang cursor ("" = trang đầu), trả về {items, next_cursor}. Bỏ trống -> dùng skip/limit
     """
-    from sqlalchemy import distinct
-    
-    # Lấy các recipe_id đã có rating (bởi bất kỳ user nào)
-    rated_recipe_ids = db.query(distinct(models.Rating.recipe_id)).filter(
-        models.Rating.recipe_id.isnot(None)
-    ).all()
-    
-    # Extract recipe IDs từ kết quả
-    recipe_ids = [r[0] for r in rated_recipe_ids] if rated_recipe_ids else []
-    
-    if not recipe_ids:
-        return []
+    if tag_mode not in recipe_tags.TAG_MODES:
+        raise HTTPException(status_code=400, detail="tag_mode phải là 'all' hoặc 'any'")
+    if sort not in recipe_ratings.RATED_SORTS:
+        raise HTTPException(status_code=400, detail="sort phải là 'id' hoặc 'avg'")
     
-    # Query recipes đã được đánh giá
-    query = db.query(models.Recipe).filter(
-        models.Recipe.id.in_(recipe_ids)
-    )
-    
-    if search:
-        query = query.filter(models.Recipe.name.ilike(f"%{search}%"))
-    
-    if tags:
-        query = query.filter(models.Recipe.tags.ilike(f"%{tags}%"))
+    def load(session: Session):
+        # Món đã có rating (bởi bất kỳ user nào): rating_count > 0, dùng partial index
+        query = session.query(models.Recipe).options(*loaders.recipe_options()).filter(
+            recipe_ratings.is_rated
+        )
+        
+        if tags:
+            query = recipe_tags.apply_tag_filter(query, tags, tag_mode)
+        
+        if search:
+            # Có search -> sắp theo độ liên quan, phân trang cursor theo vị trí
+            query = recipe_search.apply_search(query, search)
+            if cursor is not None:
+                return pagination.offset_page(query, cursor, limit)
+            return query.offset(skip).limit(limit).all()
+        
+        keys, descending = recipe_ratings.rated_sort_keys(sort)
+        if cursor is not None:
+            return pagination.keyset_page(query, keys, cursor, limit, descending=descending)
+        
+        return query.order_by(*pagination.keyset_order(keys, descending)).offset(skip).limit(limit).all()
     
-    recipes = query.offset(skip).limit(limit).all()
-    return recipes
+    return await db.run_sync(load)
 
 # --- 2. LẤY CHI TIẾT 1 CÔNG THỨC ---
 @router.get("/{recipe_id}", response_model=schemas.Recipe)
-def get_recipe(recipe_id: int, db: Session = Depends(get_db)):
-    recipe = db.query(models.Recipe).filter(models.Recipe.id == recipe_id).first()
+async def get_recipe(recipe_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    recipe = await _load_recipe(db, recipe_id)
     if not recipe:
         raise HTTPException(status_code=404, detail="Không tìm thấy công thức này")
     return recipe
 
 # --- 3. TẠO CÔNG THỨC MỚI (Cần đăng nhập) ---
 @router.post("/", response_model=schemas.Recipe)
-def create_recipe(
+async def create_recipe(
     recipe: schemas.RecipeCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: TokenUser = Depends(get_current_user_async)
 ):
-    """Tạo công thức món ăn mới"""
-    # Tạo recipe
-    new_recipe = models.Recipe(
-        name=recipe.name,
-        description=recipe.description,
-        instructions=recipe.instructions,
-        image_url=recipe.image_url,
-        servings=recipe.servings,
-        prep_time=recipe.prep_time,
-        calories=recipe.calories,
-        protein=recipe.protein,
-        carbs=recipe.carbs,
-        fat=recipe.fat,
-        tags=recipe.tags,
-        owner_id=current_user.id
+    """Tạo công thức món ăn mới (recipe + ingredients + tags trong 1 transaction)"""
+    fields = recipe.model_dump(exclude={"ingredients"})
+    new_recipe = recipe_writer.build_recipe(
+        current_user.id,
+        [ing.model_dump() for ing in recipe.ingredients],
+        **fields
     )
     db.add(new_recipe)
-    db.commit()
-    db.refresh(new_recipe)
-    
-    # Thêm ingredients
-    for ing in recipe.ingredients:
-        new_ingredient = models.Ingredient(
-            name=ing.name,
-            amount=ing.amount,
-            unit=ing.unit,
-            recipe_id=new_recipe.id
-        )
-        db.add(new_ingredient)
-    
-    db.commit()
-    db.refresh(new_recipe)
-    return new_recipe
+    await db.commit()
+    return await _load_recipe(db, new_recipe.id)
 
 # --- 4. CẬP NHẬT CÔNG THỨC (Chỉ owner) ---
 @router.put("/{recipe_id}", response_model=schemas.Recipe)
-def update_recipe(
+async def update_recipe(
     recipe_id: int,
     recipe_update: schemas.RecipeCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: TokenUser = Depends(get_current_user_async)
 ):
-    recipe = db.query(models.Recipe).filter(models.Recipe.id == recipe_id).first()
+    # Nạp sẵn ingredients và tag_links để diff trong bộ nhớ
+    recipe = (await db.execute(
+        select(models.Recipe).options(
+            selectinload(models.Recipe.ingredients),
+            selectinload(models.Recipe.tag_links)
+        ).where(models.Recipe.id == recipe_id)
+    )).scalars().first()
     if not recipe:
         raise HTTPException(status_code=404, detail="Không tìm thấy công thức")
     
@@ -172,60 +208,45 @@ def update_recipe(
     recipe.carbs = recipe_update.carbs
     recipe.fat = recipe_update.fat
     recipe.tags = recipe_update.tags
+    recipe_tags.sync_recipe_tags(recipe)
     
-    # Xóa ingredients cũ và thêm mới
-    db.query(models.Ingredient).filter(models.Ingredient.recipe_id == recipe_id).delete()
-    for ing in recipe_update.ingredients:
-        new_ingredient = models.Ingredient(
-            name=ing.name,
-            amount=ing.amount,
-            unit=ing.unit,
-            recipe_id=recipe.id
-        )
-        db.add(new_ingredient)
+    # Chỉ ghi phần nguyên liệu thay đổi (không xóa hết rồi thêm lại)
+    recipe_writer.apply_ingredient_diff(recipe, [ing.model_dump() for ing in recipe_update.ingredients])
     
-    db.commit()
-    db.refresh(recipe)
-    return recipe
+    await db.commit()
+    return await _load_recipe(db, recipe_id)
 
 # --- 5. XÓA CÔNG THỨC (Chỉ owner) ---
 @router.delete("/{recipe_id}")
-def delete_recipe(
+async def delete_recipe(
     recipe_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: TokenUser = Depends(get_current_user_async)
 ):
     from sqlalchemy.exc import IntegrityError
     
-    recipe = db.query(models.Recipe).filter(models.Recipe.id == recipe_id).first()
+    recipe = await db.get(models.Recipe, recipe_id)
     if not recipe:
         raise HTTPException(status_code=404, detail="Không tìm thấy công thức")
     
     if recipe.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Bạn không có quyền xóa công thức này")
     
-    # Kiểm tra xem recipe có đang được sử dụng không
-    meal_plans_count = db.query(models.MealPlan).filter(models.MealPlan.recipe_id == recipe_id).count()
-    ratings_count = db.query(models.Rating).filter(models.Rating.recipe_id == recipe_id).count()
-    
-    if meal_plans_count > 0 or ratings_count > 0:
-        references = []
-        if meal_plans_count > 0:
-            references.append(f"{meal_plans_count} lịch ăn")
-        if ratings_count > 0:
-            references.append(f"{ratings_count} đánh giá")
-        
+    # Kiểm tra xem recipe có đang được sử dụng không (1 câu EXISTS)
+    references = await db.run_sync(recipe_deletion.find_references, recipe_deletion.RECIPE_REFERENCES, recipe_id)
+    if references:
         raise HTTPException(
             status_code=400, 
             detail=f"Không thể xóa món ăn '{recipe.name}' vì đang được tham chiếu bởi {' và '.join(references)}. Vui lòng xóa các tham chiếu trước."
         )
     
+    recipe_name = recipe.name
     try:
-        db.delete(recipe)
-        db.commit()
-        return {"message": f"Đã xóa công thức: {recipe.name}"}
+        await db.run_sync(recipe_deletion.delete_recipe, recipe_id)
+        await db.commit()
+        return {"message": f"Đã xóa công thức: {recipe_name}"}
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=400,
             detail="Không thể xóa món ăn này vì đang được tham chiếu bởi dữ liệu khác trong hệ thống."
@@ -233,33 +254,36 @@ def delete_recipe(
 
 # --- 6. ĐÁNH GIÁ CÔNG THỨC ---
 @router.post("/{recipe_id}/ratings", response_model=schemas.Rating)
-def rate_recipe(
+async def rate_recipe(
     recipe_id: int,
     rating: schemas.RatingCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: TokenUser = Depends(get_current_user_async)
 ):
     """
     Đánh giá món ăn (1-5 sao + comment)
     """
-    # Kiểm tra recipe tồn tại
-    recipe = db.query(models.Recipe).filter(models.Recipe.id == recipe_id).first()
-    if not recipe:
+    # Kiểm tra recipe tồn tại + khóa tổng hợp đánh giá của món tới khi commit (đọc rating cũ bên dưới là mới nhất)
+    if not await db.run_sync(recipe_ratings.lock_recipe_ratings, recipe_id):
         raise HTTPException(status_code=404, detail="Không tìm thấy công thức")
     
     # Kiểm tra đã đánh giá chưa
-    existing_rating = db.query(models.Rating).filter(
-        models.Rating.user_id == current_user.id,
-        models.Rating.recipe_id == recipe_id
-    ).first()
+    existing_rating = (await db.execute(
+        select(models.Rating).where(
+            models.Rating.user_id == current_user.id,
+            models.Rating.recipe_id == recipe_id
+        )
+    )).scalars().first()
     
     if existing_rating:
-        # Cập nhật rating cũ
+        # Cập nhật rating cũ (tổng hợp chỉ đổi tổng số sao)
+        await db.run_sync(recipe_ratings.apply_rating_delta, recipe_id, 0, rating.stars - existing_rating.stars)
         existing_rating.stars = rating.stars
         existing_rating.comment = rating.comment
-        db.commit()
-        db.refresh(existing_rating)
-        return existing_rating
+        await db.flush()
+        saved = await _load_rating(db, existing_rating.id)  # Đọc trước commit (còn giữ khóa): chưa bị xóa cùng lúc
+        await db.commit()
+        return saved
     
     # Tạo rating mới
     new_rating = models.Rating(
@@ -269,33 +293,50 @@ def rate_recipe(
         recipe_id=recipe_id
     )
     db.add(new_rating)
-    db.commit()
-    db.refresh(new_rating)
-    return new_rating
+    await db.run_sync(recipe_ratings.apply_rating_delta, recipe_id, 1, rating.stars)
+    await db.flush()
+    saved = await _load_rating(db, new_rating.id)
+    await db.commit()
+    return saved
 
 # --- 7. LẤY ĐÁNH GIÁ CỦA MÓN ĂN ---
-@router.get("/{recipe_id}/ratings", response_model=List[schemas.Rating])
-def get_recipe_ratings(recipe_id: int, db: Session = Depends(get_db)):
-    """Lấy tất cả đánh giá của món ăn (của tất cả users)"""
-    # Filter ra những rating có user_id hợp lệ (không null)
-    ratings = db.query(models.Rating).filter(
-        models.Rating.recipe_id == recipe_id,
-        models.Rating.user_id.isnot(None)
-    ).all()
-    return ratings
+@router.get("/{recipe_id}/ratings", response_model=Union[List[schemas.Rating], schemas.Page[schemas.Rating]])
+async def get_recipe_ratings(
+    recipe_id: int,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Lấy tất cả đánh giá của món ăn (của tất cả users)
+    - cursor: Phân trang cursor ("" = trang đầu, mới nhất trước). Bỏ trống -> trả về tất cả
+    """
+    def load(session: Session):
+        # Filter ra những rating có user_id hợp lệ (không null)
+        query = session.query(models.Rating).options(*loaders.rating_options()).filter(
+            models.Rating.recipe_id == recipe_id,
+            models.Rating.user_id.isnot(None)
+        )
+        if cursor is not None:
+            return pagination.keyset_page(query, [models.Rating.id], cursor, limit, descending=True)
+        return query.all()
+    
+    return await db.run_sync(load)
 
 # --- 8. LẤY ĐÁNH GIÁ CỦA USER HIỆN TẠI CHO MÓN ĂN ---
 @router.get("/{recipe_id}/ratings/my", response_model=schemas.Rating)
-def get_my_rating(
+async def get_my_rating(
     recipe_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: TokenUser = Depends(get_current_user_async)
 ):
     """Lấy đánh giá của user hiện tại cho món ăn"""
-    rating = db.query(models.Rating).filter(
-        models.Rating.recipe_id == recipe_id,
-        models.Rating.user_id == current_user.id
-    ).first()
+    rating = (await db.execute(
+        select(models.Rating).options(*loaders.rating_options()).where(
+            models.Rating.recipe_id == recipe_id,
+            models.Rating.user_id == current_user.id
+        )
+    )).scalars().first()
     
     if not rating:
         raise HTTPException(status_code=404, detail="Bạn chưa đánh giá món ăn này")
@@ -304,20 +345,24 @@ def get_my_rating(
 
 # --- 9. XÓA ĐÁNH GIÁ CỦA USER HIỆN TẠI CHO MÓN ĂN ---
 @router.delete("/{recipe_id}/ratings/my")
-def delete_my_rating(
+async def delete_my_rating(
     recipe_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: TokenUser = Depends(get_current_user_async)
 ):
     """Xóa đánh giá của user hiện tại cho món ăn"""
-    rating = db.query(models.Rating).filter(
-        models.Rating.recipe_id == recipe_id,
-        models.Rating.user_id == current_user.id
-    ).first()
+    await db.run_sync(recipe_ratings.lock_recipe_ratings, recipe_id)
+    rating = (await db.execute(
+        select(models.Rating).where(
+            models.Rating.recipe_id == recipe_id,
+            models.Rating.user_id == current_user.id
+        )
+    )).scalars().first()
     
     if not rating:
         raise HTTPException(status_code=404, detail="Bạn chưa đánh giá món ăn này")
     
-    db.delete(rating)
-    db.commit()
+    await db.delete(rating)
+    await db.run_sync(recipe_ratings.apply_rating_delta, recipe_id, -1, -rating.stars)
+    await db.commit()
     return {"message": "Đã xóa đánh giá của bạn"}
\ No newline at end of file
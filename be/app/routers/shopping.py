@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from datetime import date
-from app.database import get_db
+from app.database import get_async_db, get_async_read_db
 from app import models, schemas
-from app.utils import get_current_user
+from app.utils import TokenUser, get_current_user_async
 from app.services.shopping import generate_shopping_list
 
 router = APIRouter(
@@ -13,11 +15,11 @@ router = APIRouter(
 )
 
 @router.get("/list")
-def get_shopping_list(
+async def get_shopping_list(
     start_date: date,
     end_date: date,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: TokenUser = Depends(get_current_user_async)
 ):
     """
     Tạo shopping list tự động từ meal plans
@@ -29,7 +31,7 @@ def get_shopping_list(
     Trả về danh sách nguyên liệu đã gộp theo tên + đơn vị
     """
     try:
-        shopping_list = generate_shopping_list(db, current_user.id, start_date, end_date)
+        shopping_list = await db.run_sync(generate_shopping_list, current_user.id, start_date, end_date)
         return shopping_list
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -37,25 +39,27 @@ def get_shopping_list(
 # --- SHOPPING LIST ITEMS (Lưu trạng thái đã mua) ---
 
 @router.post("/items", response_model=schemas.ShoppingListItem)
-def create_shopping_list_item(
+async def create_shopping_list_item(
     item: schemas.ShoppingListItemCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: TokenUser = Depends(get_current_user_async)
 ):
     """Tạo shopping list item từ nguyên liệu của món ăn"""
     # Kiểm tra nếu đã có item tương tự chưa mua
-    existing = db.query(models.ShoppingListItem).filter(
-        models.ShoppingListItem.user_id == current_user.id,
-        models.ShoppingListItem.ingredient_name == item.ingredient_name,
-        models.ShoppingListItem.recipe_id == item.recipe_id,
-        models.ShoppingListItem.is_purchased == False
-    ).first()
+    existing = (await db.execute(
+        select(models.ShoppingListItem).where(
+            models.ShoppingListItem.user_id == current_user.id,
+            models.ShoppingListItem.ingredient_name == item.ingredient_name,
+            models.ShoppingListItem.recipe_id == item.recipe_id,
+            models.ShoppingListItem.is_purchased == False
+        )
+    )).scalars().first()
     
     if existing:
         # Cập nhật số lượng nếu đã có
         existing.amount += item.amount
-        db.commit()
-        db.refresh(existing)
+        await db.commit()
+        await db.refresh(existing)
         return existing
     
     # Tạo mới
@@ -68,27 +72,33 @@ def create_shopping_list_item(
         is_purchased=False
     )
     db.add(new_item)
-    db.commit()
-    db.refresh(new_item)
+    await db.commit()
+    await db.refresh(new_item)
     return new_item
 
 @router.post("/items/from-recipe/{recipe_id}")
-def create_shopping_list_from_recipe(
+async def create_shopping_list_from_recipe(
     recipe_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: TokenUser = Depends(get_current_user_async)
 ):
     """Tạo shopping list items từ tất cả nguyên liệu của một món ăn"""
-    # Kiểm tra recipe tồn tại
-    recipe = db.query(models.Recipe).filter(models.Recipe.id == recipe_id).first()
+    # Kiểm tra recipe tồn tại (nạp luôn ingredients trong cùng lượt)
+    recipe = (await db.execute(
+        select(models.Recipe).options(
+            selectinload(models.Recipe.ingredients)
+        ).where(models.Recipe.id == recipe_id)
+    )).scalars().first()
     if not recipe:
         raise HTTPException(status_code=404, detail="Không tìm thấy công thức")
     
     # Kiểm tra xem đã có items cho recipe này chưa (không phân biệt purchased)
-    existing_items = db.query(models.ShoppingListItem).filter(
-        models.ShoppingListItem.user_id == current_user.id,
-        models.ShoppingListItem.recipe_id == recipe_id
-    ).all()
+    existing_items = (await db.execute(
+        select(models.ShoppingListItem).where(
+            models.ShoppingListItem.user_id == current_user.id,
+            models.ShoppingListItem.recipe_id == recipe_id
+        )
+    )).scalars().all()
     
     # Nếu đã có items rồi, không tạo lại
     if existing_items:
@@ -98,10 +108,9 @@ def create_shopping_list_from_recipe(
             "already_exists": True
         }
     
-    # Tạo mới items
-    created_items = []
-    for ingredient in recipe.ingredients:
-        new_item = models.ShoppingListItem(
+    # Tạo mới items - add_all + 1 lần flush = 1 câu INSERT theo lô
+    created_items = [
+        models.ShoppingListItem(
             ingredient_name=ingredient.name,
             amount=ingredient.amount,
             unit=ingredient.unit,
@@ -109,86 +118,98 @@ def create_shopping_list_from_recipe(
             user_id=current_user.id,
             is_purchased=False
         )
-        db.add(new_item)
-        created_items.append(new_item)
-    
-    db.commit()
-    for item in created_items:
-        db.refresh(item)
+        for ingredient in recipe.ingredients
+    ]
+    db.add_all(created_items)
+    await db.flush()
+    item_ids = [item.id for item in created_items]
+    await db.commit()
+    
+    # Đọc lại 1 lần bằng IN (...) thay vì refresh từng item (lấy created_at do DB sinh)
+    created_items = (await db.execute(
+        select(models.ShoppingListItem).where(
+            models.ShoppingListItem.id.in_(item_ids)
+        ).order_by(models.ShoppingListItem.id).execution_options(populate_existing=True)
+    )).scalars().all() if item_ids else []
     
     return {"message": f"Đã thêm {len(created_items)} nguyên liệu vào danh sách mua sắm", "items": created_items, "already_exists": False}
 
 @router.get("/items", response_model=List[schemas.ShoppingListItem])
-def get_shopping_list_items(
+async def get_shopping_list_items(
     recipe_id: int = None,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: TokenUser = Depends(get_current_user_async)
 ):
     """Lấy danh sách shopping list items của user"""
-    query = db.query(models.ShoppingListItem).filter(
+    query = select(models.ShoppingListItem).where(
         models.ShoppingListItem.user_id == current_user.id
     )
     
     if recipe_id:
-        query = query.filter(models.ShoppingListItem.recipe_id == recipe_id)
+        query = query.where(models.ShoppingListItem.recipe_id == recipe_id)
     
-    items = query.order_by(models.ShoppingListItem.created_at.desc()).all()
+    items = (await db.execute(query.order_by(models.ShoppingListItem.created_at.desc()))).scalars().all()
     return items
 
 @router.put("/items/{item_id}", response_model=schemas.ShoppingListItem)
-def update_shopping_list_item(
+async def update_shopping_list_item(
     item_id: int,
     item_update: schemas.ShoppingListItemUpdate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: TokenUser = Depends(get_current_user_async)
 ):
     """Cập nhật trạng thái đã mua của shopping list item"""
-    item = db.query(models.ShoppingListItem).filter(
-        models.ShoppingListItem.id == item_id,
-        models.ShoppingListItem.user_id == current_user.id
-    ).first()
+    item = (await db.execute(
+        select(models.ShoppingListItem).where(
+            models.ShoppingListItem.id == item_id,
+            models.ShoppingListItem.user_id == current_user.id
+        )
+    )).scalars().first()
     
     if not item:
         raise HTTPException(status_code=404, detail="Không tìm thấy item")
     
     item.is_purchased = item_update.is_purchased
-    db.commit()
-    db.refresh(item)
+    await db.commit()
+    await db.refresh(item)
     return item
 
 @router.delete("/items/{item_id}")
-def delete_shopping_list_item(
+async def delete_shopping_list_item(
     item_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: TokenUser = Depends(get_current_user_async)
 ):
     """Xóa shopping list item"""
-    item = db.query(models.ShoppingListItem).filter(
-        models.ShoppingListItem.id == item_id,
-        models.ShoppingListItem.user_id == current_user.id
-    ).first()
+    item = (await db.execute(
+        select(models.ShoppingListItem).where(
+            models.ShoppingListItem.id == item_id,
+            models.ShoppingListItem.user_id == current_user.id
+        )
+    )).scalars().first()
     
     if not item:
         raise HTTPException(status_code=404, detail="Không tìm thấy item")
     
-    db.delete(item)
-    db.commit()
+    await db.delete(item)
+    await db.commit()
     return {"message": "Đã xóa item"}
 
 @router.delete("/items/recipe/{recipe_id}")
-def clear_shopping_list_for_recipe(
+async def clear_shopping_list_for_recipe(
     recipe_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: TokenUser = Depends(get_current_user_async)
 ):
     """Xóa tất cả shopping list items của một món ăn"""
-    items = db.query(models.ShoppingListItem).filter(
-        models.ShoppingListItem.recipe_id == recipe_id,
-        models.ShoppingListItem.user_id == current_user.id
-    ).all()
-    
-    for item in items:
-        db.delete(item)
+    # 1 câu DELETE ... WHERE thay vì nạp rồi xóa từng item
+    result = await db.execute(
+        delete(models.ShoppingListItem).where(
+            models.ShoppingListItem.recipe_id == recipe_id,
+            models.ShoppingListItem.user_id == current_user.id
+        ).execution_options(synchronize_session=False)
+    )
+    deleted_count = result.rowcount
     
-    db.commit()
-    return {"message": f"Đã xóa {len(items)} items"}
\ No newline at end of file
+    await db.commit()
+    return {"message": f"Đã xóa {deleted_count} items"}
\ No newline at end of file
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from pydantic import AliasChoices, BaseModel, EmailStr, Field
+from typing import Generic, List, Optional, TypeVar
 from datetime import date, datetime
 
 # --- 1. SCHEMAS CHO TOKEN (PHẦN BẠN ĐANG THIẾU) ---
@@ -79,6 +79,11 @@ class RecipeCreate(RecipeBase):
 class Recipe(RecipeBase):
     id: int
     owner_id: Optional[int] = None
+    rating_count: int = 0  # Số lượt đánh giá
+    # Số sao trung bình - đọc từ cột recipes.rating_avg, frontend dùng tên average_rating
+    average_rating: Optional[float] = Field(
+        default=None, validation_alias=AliasChoices("rating_avg", "average_rating")
+    )
     ingredients: List[Ingredient] = []
     class Config:
         from_attributes = True
@@ -139,4 +144,11 @@ class ShoppingListItem(ShoppingListItemBase):
     created_at: datetime
     updated_at: datetime
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# --- 8. SCHEMAS CHO PHÂN TRANG (CURSOR) ---
+T = TypeVar("T")
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None  # None = đã hết dữ liệu
\ No newline at end of file
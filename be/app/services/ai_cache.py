@@ -0,0 +1,196 @@
+"""
+Cache kết quả AI theo yêu cầu đã chuẩn hóa - yêu cầu giống nhau không gọi Gemini lại
+
+Khóa cache = sha256 của các tham số ĐÃ CHUẨN HÓA (không phải của prompt thô):
+- nguyên liệu / hạn chế ăn uống: bỏ dấu, chữ thường, bỏ trùng, SẮP XẾP
+  ("Thịt gà, cơm" == "com, thit ga")
+- từ khóa tìm kiếm, ghi chú: bỏ dấu, chữ thường, bỏ ký tự thừa ("Món giảm cân!" == "mon giam can")
+- calories mục tiêu: làm tròn theo AI_CACHE_CALORIE_BUCKET kcal (mặc định 100)
+- tên model + CACHE_VERSION (tăng khi đổi prompt) -> kết quả cũ tự mất hiệu lực
+2 tầng:
+- bộ nhớ: LRU của từng process (AI_CACHE_MEMORY_SIZE mục), không tốn truy vấn DB
+- DB: bảng ai_cache (migration 0009), dùng chung giữa các worker và giữ qua lần khởi động lại
+Mỗi mục hết hạn sau AI_CACHE_TTL giây (mặc định 7 ngày). AI_CACHE_ENABLED=0 để tắt hẳn.
+Lỗi cache (VD: chưa chạy migration) chỉ được ghi log - request vẫn gọi AI bình thường.
+"""
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Optional, Union
+from sqlalchemy import delete, func, select
+from app import models
+from app.cache import LRUCache
+from app.database import AsyncSessionLocal
+from app.services.search import fold_text
+
+CACHE_VERSION = 1
+ENABLED = os.getenv("AI_CACHE_ENABLED", "1") != "0"
+TTL_SECONDS = float(os.getenv("AI_CACHE_TTL", str(7 * 24 * 3600)))
+MEMORY_SIZE = int(os.getenv("AI_CACHE_MEMORY_SIZE", "256"))
+CALORIE_BUCKET = int(os.getenv("AI_CACHE_CALORIE_BUCKET", "100"))
+
+COUNTERS = ("memory_hits", "db_hits", "misses", "bypassed", "stores", "errors")
+
+_memory = LRUCache(max_entries=MEMORY_SIZE, ttl_seconds=TTL_SECONDS)
+_lock = threading.Lock()
+_counters: Dict[str, Dict[str, int]] = {}
+
+
+# --- 1. CHUẨN HÓA YÊU CẦU ---
+def normalize_list(values: Union[str, Iterable[str], None]) -> list:
+    """Danh sách (hoặc chuỗi cách nhau bởi dấu phẩy) -> các mục đã bỏ dấu, bỏ trùng, sắp xếp"""
+    if not values:
+        return []
+    if isinstance(values, str):
+        values = values.split(",")
+    return sorted({folded for folded in (fold_text(value) for value in values) if folded})
+
+
+def normalize_text(value: Optional[str]) -> str:
+    return fold_text(value or "")
+
+
+def calorie_bucket(calories: float) -> int:
+    """Làm tròn calories mục tiêu theo bước AI_CACHE_CALORIE_BUCKET (VD: 2149 -> 2100)"""
+    if CALORIE_BUCKET <= 0:
+        return round(calories)
+    return int(round(calories / CALORIE_BUCKET) * CALORIE_BUCKET)
+
+
+def make_key(kind: str, **parts: Any) -> str:
+    """Khóa cache từ loại lời gọi + các tham số đã chuẩn hóa"""
+    raw = json.dumps({"kind": kind, "version": CACHE_VERSION, **parts}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# --- 2. ĐỌC / GHI ---
+def _count(kind: str, counter: str) -> None:
+    with _lock:
+        counters = _counters.setdefault(kind, dict.fromkeys(COUNTERS, 0))
+        counters[counter] += 1
+
+
+def _upsert(dialect: str, values: dict):
+    """INSERT ... ON CONFLICT (key) DO UPDATE (PostgreSQL / SQLite), None với DB khác"""
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    statement = insert(models.AICacheEntry).values(**values)
+    return statement.on_conflict_do_update(
+        index_elements=["key"],
+        set_={name: statement.excluded[name] for name in ("kind", "payload", "created_at", "expires_at")},
+    )
+
+
+async def get(kind: str, key: str, bypass: bool = False) -> Optional[Any]:
+    """
+    Kết quả đã lưu cho khóa này hoặc None
+    - bypass: True = bỏ qua cache (người dùng muốn kết quả mới), kết quả mới vẫn được lưu lại
+    """
+    if not ENABLED:
+        return None
+    if bypass:
+        _count(kind, "bypassed")
+        return None
+
+    payload = _memory.get(key)
+    if payload is not None:
+        _count(kind, "memory_hits")
+        return json.loads(payload)
+
+    try:
+        async with AsyncSessionLocal() as db:
+            payload = (await db.execute(
+                select(models.AICacheEntry.payload).where(
+                    models.AICacheEntry.key == key,
+                    models.AICacheEntry.expires_at > datetime.now(timezone.utc),
+                )
+            )).scalar_one_or_none()
+    except Exception as e:
+        _count(kind, "errors")
+        print(f"[CACHE] Lỗi đọc ai_cache: {e}")
+        return None
+
+    if payload is None:
+        _count(kind, "misses")
+        return None
+    _count(kind, "db_hits")
+    _memory.set(key, payload)
+    return json.loads(payload)
+
+
+async def put(kind: str, key: str, value: Any) -> None:
+    """Lưu kết quả AI vào cả 2 tầng (lỗi DB chỉ ghi log)"""
+    if not ENABLED:
+        return
+    payload = json.dumps(value, ensure_ascii=False)
+    _memory.set(key, payload)
+    now = datetime.now(timezone.utc)
+    values = {
+        "key": key,
+        "kind": kind,
+        "payload": payload,
+        "created_at": now,
+        "expires_at": now + timedelta(seconds=TTL_SECONDS),
+    }
+    try:
+        async with AsyncSessionLocal() as db:
+            statement = _upsert(db.bind.dialect.name, values)
+            if statement is None:
+                await db.merge(models.AICacheEntry(**values))
+            else:
+                await db.execute(statement)
+            await db.commit()
+        _count(kind, "stores")
+    except Exception as e:
+        _count(kind, "errors")
+        print(f"[CACHE] Lỗi ghi ai_cache: {e}")
+
+
+# --- 3. QUẢN TRỊ ---
+async def clear(expired_only: bool = False) -> int:
+    """Xóa các mục đã hết hạn (expired_only) hoặc toàn bộ cache, trả về số dòng đã xóa trong DB"""
+    statement = delete(models.AICacheEntry)
+    if expired_only:
+        statement = statement.where(models.AICacheEntry.expires_at <= datetime.now(timezone.utc))
+    else:
+        _memory.invalidate()
+    async with AsyncSessionLocal() as db:
+        deleted = (await db.execute(statement)).rowcount
+        await db.commit()
+    return deleted
+
+
+async def stats() -> Dict[str, Any]:
+    """Số liệu hit/miss theo loại lời gọi + số mục trong bộ nhớ và trong DB"""
+    with _lock:
+        kinds = {kind: dict(counters) for kind, counters in _counters.items()}
+    for counters in kinds.values():
+        hits = counters["memory_hits"] + counters["db_hits"]
+        lookups = hits + counters["misses"]
+        counters["hit_rate"] = round(hits / lookups, 3) if lookups else 0.0
+
+    db_entries = None
+    try:
+        async with AsyncSessionLocal() as db:
+            total, expired = (await db.execute(select(
+                func.count(),
+                func.count().filter(models.AICacheEntry.expires_at <= datetime.now(timezone.utc)),
+            ).select_from(models.AICacheEntry))).one()
+        db_entries = {"entries": total, "expired": expired}
+    except Exception as e:
+        print(f"[CACHE] Lỗi đọc ai_cache: {e}")
+
+    return {
+        "enabled": ENABLED,
+        "ttl_seconds": TTL_SECONDS,
+        "calorie_bucket": CALORIE_BUCKET,
+        "memory": {"entries": len(_memory), "max_entries": MEMORY_SIZE},
+        "db": db_entries,
+        "kinds": kinds,
+    }
@@ -0,0 +1,254 @@
+"""
+Hàng đợi việc AI chạy nền trên bảng ai_jobs - request HTTP không phải chờ Gemini
+
+- POST /ai/jobs/weekly-plan: enqueue() ghi 1 dòng status='queued', trả job_id ngay (202)
+- worker.py (process riêng, chạy được nhiều process / nhiều máy): claim_next() lấy job queued cũ nhất
+  bằng SELECT ... FOR UPDATE SKIP LOCKED (PostgreSQL) - các worker không tranh nhau cùng 1 job,
+  không chờ khóa của nhau. UPDATE ... WHERE status = 'queued' kiểm tra lại nên SQLite (bỏ qua
+  FOR UPDATE) cũng không chạy trùng job.
+- run(): gọi AI, lưu recipes + meal plans (meal_plan_writer) và đánh dấu succeeded trong CÙNG
+  1 transaction -> job thành công thì dữ liệu chắc chắn đã lưu, lỗi thì không lưu gì
+- Lỗi -> thử lại tới AI_JOB_MAX_ATTEMPTS lần (lần thử lại luôn gọi AI mới, bỏ qua cache), sau đó failed
+- Worker chết giữa chừng: job 'running' quá AI_JOB_TIMEOUT giây được reclaim_stale() trả về hàng đợi
+- GET /ai/jobs/{id}: job_view() - trạng thái, vị trí trong hàng đợi, kết quả / lỗi
+Mỗi user chỉ có 1 job đang chờ / đang chạy cho cùng 1 yêu cầu: gửi lại -> nhận lại job cũ.
+"""
+import json
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models
+from app.database import AsyncSessionLocal
+from app.services import ai_service
+from app.services import meal_plan_writer
+
+MAX_ATTEMPTS = int(os.getenv("AI_JOB_MAX_ATTEMPTS", "2"))
+JOB_TIMEOUT = float(os.getenv("AI_JOB_TIMEOUT", "600"))
+
+KIND_WEEKLY_PLAN = "weekly_plan"
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+STATUSES = (QUEUED, RUNNING, SUCCEEDED, FAILED)
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# --- 1. TẠO / ĐỌC JOB (route) ---
+async def enqueue(db: AsyncSession, user_id: int, kind: str, payload: Dict[str, Any]) -> Tuple[models.AIJob, bool]:
+    """
+    Thêm job vào hàng đợi và commit, trả về (job, True)
+    User đã có job giống hệt đang chờ / đang chạy -> (job đó, False), không tạo thêm
+    """
+    payload_text = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    existing = (await db.execute(
+        select(models.AIJob).where(
+            models.AIJob.user_id == user_id,
+            models.AIJob.kind == kind,
+            models.AIJob.status.in_(ACTIVE_STATUSES),
+            models.AIJob.payload == payload_text,
+        ).order_by(models.AIJob.id).limit(1)
+    )).scalar_one_or_none()
+    if existing is not None:
+        return existing, False
+
+    job = models.AIJob(kind=kind, user_id=user_id, status=QUEUED, payload=payload_text, attempts=0)
+    db.add(job)
+    await db.commit()
+    print(f"[JOB] Đã thêm job {job.id} ({kind}) cho user {user_id}")
+    return job, True
+
+
+async def get_job(db: AsyncSession, job_id: int, user_id: int) -> Optional[models.AIJob]:
+    """Job của user (None nếu không có hoặc là job của người khác)"""
+    return (await db.execute(
+        select(models.AIJob).where(models.AIJob.id == job_id, models.AIJob.user_id == user_id)
+    )).scalar_one_or_none()
+
+
+async def queue_position(db: AsyncSession, job: models.AIJob) -> Optional[int]:
+    """Vị trí trong hàng đợi (1 = job tiếp theo được chạy), None nếu job không còn chờ"""
+    if job.status != QUEUED:
+        return None
+    ahead = (await db.execute(
+        select(func.count()).select_from(models.AIJob).where(
+            models.AIJob.status == QUEUED,
+            models.AIJob.id < job.id,
+        )
+    )).scalar_one()
+    return ahead + 1
+
+
+def job_view(job: models.AIJob, position: Optional[int] = None) -> Dict[str, Any]:
+    """Nội dung response của GET /ai/jobs/{id}"""
+    view = {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "status_url": f"/ai/jobs/{job.id}",
+    }
+    if job.status == QUEUED:
+        view["queue_position"] = position
+    if job.status == SUCCEEDED and job.result:
+        view["result"] = json.loads(job.result)
+    if job.error:
+        # Job đang chờ thử lại vẫn hiện lỗi của lần trước
+        view["error"] = job.error
+    return view
+
+
+# --- 2. NHẬN JOB (worker) ---
+async def claim_next(worker_id: str) -> Optional[models.AIJob]:
+    """Nhận job queued cũ nhất (status -> running, attempts + 1), None nếu hàng đợi trống"""
+    async with AsyncSessionLocal() as db:
+        job_id = (await db.execute(
+            select(models.AIJob.id)
+            .where(models.AIJob.status == QUEUED)
+            .order_by(models.AIJob.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )).scalar_one_or_none()
+        if job_id is None:
+            await db.commit()
+            return None
+
+        claimed = (await db.execute(
+            update(models.AIJob)
+            .where(models.AIJob.id == job_id, models.AIJob.status == QUEUED)
+            .values(status=RUNNING, attempts=models.AIJob.attempts + 1, locked_by=worker_id, started_at=_now())
+            .execution_options(synchronize_session=False)
+        )).rowcount
+        await db.commit()
+        if claimed != 1:
+            # Worker khác vừa nhận job này (SQLite không có SKIP LOCKED) - lần sau thử job khác
+            return None
+        return await db.get(models.AIJob, job_id)
+
+
+async def reclaim_stale() -> int:
+    """
+    Job 'running' quá AI_JOB_TIMEOUT giây (worker chết / bị kill) -> trả về hàng đợi,
+    hoặc failed nếu đã hết số lần thử. Trả về số job đã xử lý.
+    """
+    stale = [
+        models.AIJob.status == RUNNING,
+        models.AIJob.started_at < _now() - timedelta(seconds=JOB_TIMEOUT),
+    ]
+    async with AsyncSessionLocal() as db:
+        failed = (await db.execute(
+            update(models.AIJob)
+            .where(*stale, models.AIJob.attempts >= MAX_ATTEMPTS)
+            .values(status=FAILED, error="Quá thời gian xử lý", finished_at=_now())
+            .execution_options(synchronize_session=False)
+        )).rowcount
+        requeued = (await db.execute(
+            update(models.AIJob)
+            .where(*stale)
+            .values(status=QUEUED, locked_by=None)
+            .execution_options(synchronize_session=False)
+        )).rowcount
+        await db.commit()
+    if failed or requeued:
+        print(f"[JOB] Job quá hạn: {requeued} được chạy lại, {failed} thất bại")
+    return failed + requeued
+
+
+# --- 3. CHẠY JOB (worker) ---
+def _owned_by(job: models.AIJob):
+    """Điều kiện job vẫn thuộc lần nhận này (chưa bị reclaim_stale trả về hàng đợi / xóa)"""
+    return (
+        models.AIJob.id == job.id,
+        models.AIJob.status == RUNNING,
+        models.AIJob.locked_by == job.locked_by,
+        models.AIJob.attempts == job.attempts,
+    )
+
+
+async def _run_weekly_plan(job: models.AIJob) -> None:
+    payload = json.loads(job.payload)
+    # Lần thử lại: kết quả cache có thể chính là nguyên nhân lỗi -> gọi AI mới
+    use_cache = payload.get("use_cache", True) and job.attempts <= 1
+    ai_result = await ai_service.suggest_weekly_meal_plan_with_recipes(payload["user_data"], use_cache=use_cache)
+
+    async with AsyncSessionLocal() as db:
+        result = await db.run_sync(
+            meal_plan_writer.save_weekly_plan, job.user_id, ai_result, date.fromisoformat(payload["start_date"])
+        )
+        finished = (await db.execute(
+            update(models.AIJob)
+            .where(*_owned_by(job))
+            .values(status=SUCCEEDED, result=json.dumps(result, ensure_ascii=False, default=str),
+                    error=None, finished_at=_now())
+            .execution_options(synchronize_session=False)
+        )).rowcount
+        if finished != 1:
+            # Job đã bị trả về hàng đợi (quá hạn) hoặc bị xóa - không lưu kết quả trùng
+            await db.rollback()
+            print(f"[JOB] Job {job.id} không còn thuộc worker {job.locked_by}, bỏ kết quả")
+            return
+        await db.commit()
+
+
+RUNNERS = {
+    KIND_WEEKLY_PLAN: _run_weekly_plan,
+}
+
+
+async def _record_failure(job: models.AIJob, error: str) -> None:
+    retry = job.attempts < MAX_ATTEMPTS
+    values = {"status": QUEUED, "locked_by": None} if retry else {"status": FAILED, "finished_at": _now()}
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(models.AIJob)
+            .where(*_owned_by(job))
+            .values(error=error, **values)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    print(f"[JOB] Job {job.id} lỗi (lần {job.attempts}/{MAX_ATTEMPTS}"
+          f"{', sẽ thử lại' if retry else ''}): {error}")
+
+
+async def run(job: models.AIJob) -> bool:
+    """Chạy 1 job đã nhận, ghi kết quả / lỗi vào ai_jobs. Trả về True nếu thành công."""
+    print(f"[JOB] Bắt đầu job {job.id} ({job.kind}) của user {job.user_id}, lần {job.attempts}")
+    runner = RUNNERS.get(job.kind)
+    try:
+        if runner is None:
+            raise ValueError(f"Loại job không hỗ trợ: {job.kind}")
+        await runner(job)
+    except meal_plan_writer.WeeklyPlanSaveError as e:
+        await _record_failure(job, str(e))
+        return False
+    except Exception as e:
+        await _record_failure(job, f"Lỗi tạo thực đơn: {str(e)}")
+        return False
+    print(f"[JOB] Xong job {job.id}")
+    return True
+
+
+# --- 4. QUẢN TRỊ ---
+async def stats(db: AsyncSession) -> Dict[str, Any]:
+    """Số job theo trạng thái + job đang chờ lâu nhất (cho GET /admin/ai-jobs)"""
+    counts = dict.fromkeys(STATUSES, 0)
+    rows = await db.execute(
+        select(models.AIJob.status, func.count()).group_by(models.AIJob.status)
+    )
+    for status, count in rows:
+        counts[status] = count
+    oldest_queued = (await db.execute(
+        select(func.min(models.AIJob.created_at)).where(models.AIJob.status == QUEUED)
+    )).scalar_one()
+    return {
+        "counts": counts,
+        "oldest_queued_at": oldest_queued,
+        "max_attempts": MAX_ATTEMPTS,
+        "timeout_seconds": JOB_TIMEOUT,
+    }
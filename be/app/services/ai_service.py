@@ -1,129 +1,117 @@
-import google.generativeai as genai
+import asyncio
 import os
 import json
-import re
+import threading
 from dotenv import load_dotenv
 from datetime import date
+from app.executors import BoundedExecutor, ExecutorBusy
+from app.services import ai_cache
+from app.services import json_repair
+from app.services import llm
+from app.services import llm_pool
+from app.services.json_stream import JSONStreamParser
+from app.services.nutrition import calculate_age, calculate_bmr, calculate_tdee, daily_calorie_target
 
 load_dotenv()
 
-# Cấu hình Google Gemini
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("❌ Chưa cấu hình GEMINI_API_KEY trong .env")
+# Model: pool các key (GEMINI_API_KEYS) x model (LLM_MODELS, mặc định Gemma còn quota) - tự chuyển key / model
+# khi hết quota hoặc lỗi (app/services/llm_pool.py). Mỗi backend là Gemini (cần key) hoặc bản giả offline khi
+# LLM_BACKEND=fake (app/services/llm.py)
+model = llm_pool.create_pool('gemma-3-4b-it')
+if isinstance(model.members[0].backend, llm.FakeBackend):
+    fake = model.members[0].backend
+    print(f"[AI] Dùng model giả {fake.model_name} (LLM_BACKEND=fake): độ trễ {fake.latency}s, "
+          f"lỗi {fake.error_rate:.0%}")
 
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel('gemma-3-4b-it')  # Model Gemma còn quota
+# model.generate_content là lời gọi mạng ĐỒNG BỘ (10-30 giây với thực đơn tuần). Gọi thẳng trong
+# hàm async sẽ làm đứng event loop -> mọi request khác phải chờ. Tất cả lời gọi AI chạy trên
+# executor riêng (app/executors.py):
+# - AI_MAX_CONCURRENCY: số lời gọi AI cùng lúc tối đa (toàn process)
+# - AI_MAX_PENDING: số lời gọi đang chạy + đang chờ tối đa, vượt quá -> 503
+# - AI_REQUEST_TIMEOUT: giây chờ tối đa mỗi lời gọi (không để thread bị treo mãi)
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+AI_MAX_PENDING = int(os.getenv("AI_MAX_PENDING", "32"))
+AI_REQUEST_TIMEOUT = float(os.getenv("AI_REQUEST_TIMEOUT", "120"))
 
-def _generate_with_config(prompt: str):
+ai_executor = BoundedExecutor("ai", AI_MAX_CONCURRENCY, AI_MAX_PENDING)
+
+async def _generate(prompt: str, generation_config: dict = None):
+    """Gọi model.generate_content trên executor AI (không chặn event loop)"""
+    return await ai_executor.run(
+        model.generate_content,
+        prompt,
+        generation_config=generation_config,
+        request_options={"timeout": AI_REQUEST_TIMEOUT},
+    )
+
+# Config tối ưu cho JSON
+JSON_GENERATION_CONFIG = {
+    "temperature": 0.3,  # Giảm temperature để output ổn định hơn
+    "top_p": 0.8,
+    "top_k": 40,
+}
+
+async def _generate_with_config(prompt: str):
     """
     Wrapper để generate content với config tối ưu cho JSON
     """
-    generation_config = {
-        "temperature": 0.3,  # Giảm temperature để output ổn định hơn
-        "top_p": 0.8,
-        "top_k": 40,
-    }
-    return model.generate_content(prompt, generation_config=generation_config)
-
-def _fix_json_at_position(text: str, error_pos: int) -> str:
-    """
-    Cố gắng sửa lỗi JSON tại vị trí cụ thể
-    """
-    # Lấy context xung quanh vị trí lỗi
-    start = max(0, error_pos - 100)
-    end = min(len(text), error_pos + 100)
-    context = text[start:end]
-    
-    print(f"[FIX] Trying to fix JSON at position {error_pos}")
-    print(f"[FIX] Context: ...{context}...")
-    
-    # Nếu lỗi "Expecting ','" thì thử thêm dấu phẩy
-    # Tìm ký tự tại vị trí lỗi
-    if error_pos < len(text):
-        char_at_error = text[error_pos]
-        prev_char = text[error_pos - 1] if error_pos > 0 else ''
-        
-        print(f"[FIX] Char at error: '{char_at_error}', Prev char: '{prev_char}'")
-        
-        # Nếu ký tự hiện tại là " và trước đó là } hoặc ] hoặc số
-        if char_at_error == '"' and prev_char in ['}', ']', '0', '1', '2', '3', '4', '5', '6', '7', '8', '9']:
-            # Thêm dấu phẩy trước ký tự này
-            text = text[:error_pos] + ',' + text[error_pos:]
-            print(f"[FIX] Added comma before quote at position {error_pos}")
-            return text
-        
-        # Nếu ký tự hiện tại là { và trước đó là } 
-        if char_at_error == '{' and prev_char == '}':
-            text = text[:error_pos] + ',' + text[error_pos:]
-            print(f"[FIX] Added comma between }} and {{ at position {error_pos}")
-            return text
-    
-    return text
+    return await _generate(prompt, generation_config=JSON_GENERATION_CONFIG)
 
-def _clean_json_text(text: str) -> str:
-    """
-    Làm sạch JSON text để tránh lỗi parsing
-    - Loại bỏ trailing commas (dấu phẩy thừa trước } hoặc ])
-    - Loại bỏ comments (//, /* */)
-    - Sửa các lỗi JSON phổ biến
-    """
-    # Loại bỏ BOM (Byte Order Mark) nếu có
-    if text.startswith('\ufeff'):
-        text = text[1:]
-    
-    # Loại bỏ single-line comments (// ...)
-    text = re.sub(r'//.*?$', '', text, flags=re.MULTILINE)
-    
-    # Loại bỏ multi-line comments (/* ... */)
-    text = re.sub(r'/\*.*?\*/', '', text, flags=re.DOTALL)
-    
-    # Loại bỏ trailing commas trước } hoặc ]
-    text = re.sub(r',(\s*[}\]])', r'\1', text)
-    
-    # Sửa lỗi thiếu dấu phẩy giữa các elements trong array hoặc object
-    text = re.sub(r'"\s*\n\s*"', '",\n"', text)  # Sửa thiếu dấu phẩy giữa các strings
-    text = re.sub(r'}\s*\n\s*{', '},\n{', text)  # Sửa thiếu dấu phẩy giữa các objects
-    text = re.sub(r']\s*\n\s*\[', '],\n[', text)  # Sửa thiếu dấu phẩy giữa các arrays
-    
-    # Sửa lỗi thiếu dấu phẩy sau đóng ngoặc nhọn hoặc vuông, trước mở ngoặc nhọn
-    # Pattern: }{ hoặc }[ hoặc ]{ (không có dấu phẩy giữa)
-    text = re.sub(r'}\s*{', '},{', text)
-    text = re.sub(r'}\s*\[', '},[', text)
-    text = re.sub(r']\s*{', '],{', text)
-    
-    # Sửa lỗi với key-value: "key": value "key2" (thiếu dấu phẩy)
-    # Tìm pattern: số hoặc false/true/null theo sau bởi whitespace và "
-    text = re.sub(r'(\d|true|false|null)\s+(")', r'\1,\2', text)
-    text = re.sub(r'(})\s+(")', r'\1,\2', text)
-    text = re.sub(r'(])\s+(")', r'\1,\2', text)
-    
-    return text
-
-def calculate_bmr(gender: str, weight: float, height: float, age: int) -> float:
-    """Tính BMR (Basal Metabolic Rate) theo công thức Mifflin-St Jeor"""
-    if gender.lower() == "male":
-        bmr = (10 * weight) + (6.25 * height) - (5 * age) + 5
-    else:
-        bmr = (10 * weight) + (6.25 * height) - (5 * age) - 161
-    return round(bmr, 2)
-
-def calculate_age(date_of_birth: date) -> int:
-    """Tính tuổi từ ngày sinh"""
-    today = date.today()
-    return today.year - date_of_birth.year - ((today.month, today.day) < (date_of_birth.month, date_of_birth.day))
-
-async def generate_recipe_from_ingredients(ingredients: list[str], dietary_preferences: str = "") -> dict:
+def _chunk_text(chunk) -> str:
+    """Văn bản của 1 chunk stream (chunk cuối / bị chặn có thể không có text)"""
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+async def _stream_generate(prompt: str, generation_config: dict = None):
     """
-    Tạo công thức món ăn từ danh sách nguyên liệu
-    
-    Args:
-        ingredients: Danh sách nguyên liệu có sẵn
-        dietary_preferences: Hạn chế ăn uống (vegan, vegetarian, gluten_free...)
-    
-    Returns:
-        dict chứa tên món, mô tả, hướng dẫn, dinh dưỡng
+    Gọi model với stream=True, trả về dần từng đoạn văn bản ngay khi model viết ra
+    Vòng lặp đọc stream (chặn) chạy trên executor AI như _generate: chiếm 1 slot AI_MAX_CONCURRENCY
+    trong suốt thời gian stream. Người nhận dừng sớm (client ngắt kết nối) -> thread dừng đọc ở chunk kế tiếp.
     """
+    loop = asyncio.get_running_loop()
+    chunks: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+    finished = object()
+
+    def pump():
+        response = model.generate_content(
+            prompt,
+            generation_config=generation_config,
+            stream=True,
+            request_options={"timeout": AI_REQUEST_TIMEOUT},
+        )
+        for chunk in response:
+            if stop.is_set():
+                break
+            text = _chunk_text(chunk)
+            if text:
+                loop.call_soon_threadsafe(chunks.put_nowait, text)
+
+    task = asyncio.ensure_future(ai_executor.run(pump))
+    # Chạy xong (hoặc bị từ chối vì hàng đợi đầy) -> báo hết; các chunk đã được đưa vào hàng đợi trước đó
+    task.add_done_callback(lambda _: chunks.put_nowait(finished))
+    try:
+        while True:
+            text = await chunks.get()
+            if text is finished:
+                break
+            yield text
+        await task  # Ném lại lỗi của model / ExecutorBusy
+    finally:
+        stop.set()
+        if not task.done():
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+def _recipe_request(ingredients: list[str], dietary_preferences: str = "") -> tuple[str, str]:
+    """(khóa cache, prompt) để tạo công thức từ nguyên liệu - dùng chung cho bản thường và bản stream"""
+    cache_key = ai_cache.make_key(
+        "recipe",
+        model=model.model_name,
+        ingredients=ai_cache.normalize_list(ingredients),
+        dietary_preferences=ai_cache.normalize_list(dietary_preferences),
+    )
     prompt = f"""
 Bạn là đầu bếp chuyên nghiệp. Hãy tạo 1 công thức món ăn từ các nguyên liệu sau:
 
@@ -151,31 +139,41 @@ Trả về JSON với cấu trúc SAU (KHÔNG thêm markdown ```json):
     "tags": "Lunch,High-Protein"
 }}
 """
+    return cache_key, prompt
+
+def _recipe_from_text(result_text: str) -> dict:
+    """Parse công thức từ văn bản model trả về (bỏ markdown, sửa JSON lỗi - xem json_repair)"""
+    return json_repair.loads(result_text, root="{")
+
+async def generate_recipe_from_ingredients(ingredients: list[str], dietary_preferences: str = "", use_cache: bool = True) -> dict:
+    """
+    Tạo công thức món ăn từ danh sách nguyên liệu
+    
+    Args:
+        ingredients: Danh sách nguyên liệu có sẵn
+        dietary_preferences: Hạn chế ăn uống (vegan, vegetarian, gluten_free...)
+        use_cache: False = bỏ qua cache, luôn gọi AI (xem app/services/ai_cache.py)
+    
+    Returns:
+        dict chứa tên món, mô tả, hướng dẫn, dinh dưỡng
+    """
+    cache_key, prompt = _recipe_request(ingredients, dietary_preferences)
+    cached = await ai_cache.get("recipe", cache_key, bypass=not use_cache)
+    if cached is not None:
+        return cached
     
     try:
-        response = model.generate_content(prompt)
+        response = await _generate(prompt)
         result_text = response.text.strip()
-        
-        # Xử lý markdown và text thừa
-        if "```" in result_text:
-            start = result_text.find("{")
-            end = result_text.rfind("}") + 1
-            if start != -1 and end != 0:
-                result_text = result_text[start:end]
-        
-        # Đảm bảo encoding UTF-8
-        if isinstance(result_text, bytes):
-            result_text = result_text.decode('utf-8')
-        
-        # Làm sạch JSON
-        result_text = _clean_json_text(result_text)
-        
-        recipe_data = json.loads(result_text)
+        recipe_data = _recipe_from_text(result_text)
+        await ai_cache.put("recipe", cache_key, recipe_data)
         return recipe_data
     except json.JSONDecodeError as e:
         print(f"[ERROR] JSON Parse Error in generate_recipe: {str(e)}")
         print(f"[ERROR] Response: {result_text[:500]}")
         raise Exception(f"AI trả về JSON không hợp lệ: {str(e)}")
+    except ExecutorBusy:
+        raise
     except Exception as e:
         raise Exception(f"Lỗi khi gọi Gemini API: {str(e)}")
 
@@ -199,15 +197,8 @@ async def suggest_weekly_meal_plan(user_data: dict) -> dict:
     age = calculate_age(date.fromisoformat(user_data["date_of_birth"]))
     bmr = calculate_bmr(user_data["gender"], user_data["weight"], user_data["height"], age)
     
-    # Tính TDEE (Total Daily Energy Expenditure)
-    activity_multipliers = {
-        "sedentary": 1.2,
-        "light": 1.375,
-        "moderate": 1.55,
-        "active": 1.725,
-        "very_active": 1.9
-    }
-    tdee = bmr * activity_multipliers.get(user_data.get("activity_level", "moderate"), 1.55)
+    # Tính TDEE (Total Daily Energy Expenditure) - xem app/services/nutrition.py
+    tdee = calculate_tdee(user_data)
     
     prompt = f"""
 Bạn là chuyên gia dinh dưỡng. Hãy lên thực đơn 7 ngày cho người sau:
@@ -241,43 +232,43 @@ Lưu ý:
 """
     
     try:
-        response = model.generate_content(prompt)
+        response = await _generate(prompt)
         result_text = response.text.strip()
         
-        # Xử lý markdown và text thừa
-        if "```" in result_text:
-            start = result_text.find("{")
-            end = result_text.rfind("}") + 1
-            if start != -1 and end != 0:
-                result_text = result_text[start:end]
-        
-        # Đảm bảo encoding UTF-8
-        if isinstance(result_text, bytes):
-            result_text = result_text.decode('utf-8')
-        
-        # Làm sạch JSON
-        result_text = _clean_json_text(result_text)
-        
-        meal_plan = json.loads(result_text)
+        # Bỏ markdown, sửa JSON lỗi (comment, dấu phẩy thừa/thiếu, ...) trong 1 lượt đọc
+        meal_plan = json_repair.loads(result_text, root="{")
         return meal_plan
     except json.JSONDecodeError as e:
         print(f"[ERROR] JSON Parse Error in suggest_weekly_meal_plan: {str(e)}")
         print(f"[ERROR] Response: {result_text[:500]}")
         raise Exception(f"AI trả về JSON không hợp lệ: {str(e)}")
+    except ExecutorBusy:
+        raise
     except Exception as e:
         raise Exception(f"Lỗi khi tạo thực đơn: {str(e)}")
 
-async def get_recipe_suggestions(query: str, dietary_preferences: str = "") -> list[dict]:
+async def get_recipe_suggestions(query: str, dietary_preferences: str = "", use_cache: bool = True) -> list[dict]:
     """
     Tìm kiếm gợi ý món ăn theo từ khóa
     
     Args:
         query: Từ khóa tìm kiếm (VD: "món ăn giảm cân", "món chay protein cao")
         dietary_preferences: Hạn chế ăn uống
+        use_cache: False = bỏ qua cache, luôn gọi AI
     
     Returns:
         list chứa 5 món ăn gợi ý
     """
+    cache_key = ai_cache.make_key(
+        "suggestions",
+        model=model.model_name,
+        query=ai_cache.normalize_text(query),
+        dietary_preferences=ai_cache.normalize_list(dietary_preferences),
+    )
+    cached = await ai_cache.get("suggestions", cache_key, bypass=not use_cache)
+    if cached is not None:
+        return cached
+
     prompt = f"""
 Gợi ý 5 món ăn cho yêu cầu: "{query}"
 Hạn chế: {dietary_preferences if dietary_preferences else "Không có"}
@@ -297,77 +288,41 @@ Trả về JSON (KHÔNG markdown):
 """
     
     try:
-        response = model.generate_content(prompt)
+        response = await _generate(prompt)
         result_text = response.text.strip()
         
-        # Xử lý markdown và text thừa
-        if "```" in result_text:
-            # Tìm array JSON [...]
-            start = result_text.find("[")
-            end = result_text.rfind("]") + 1
-            if start != -1 and end != 0:
-                result_text = result_text[start:end]
-        
-        # Đảm bảo encoding UTF-8
-        if isinstance(result_text, bytes):
-            result_text = result_text.decode('utf-8')
-        
-        # Làm sạch JSON
-        result_text = _clean_json_text(result_text)
-        
-        suggestions = json.loads(result_text)
+        # Bỏ markdown, sửa JSON lỗi trong 1 lượt đọc - kết quả là mảng [...]
+        suggestions = json_repair.loads(result_text, root="[")
+        await ai_cache.put("suggestions", cache_key, suggestions)
         return suggestions
     except json.JSONDecodeError as e:
         print(f"[ERROR] JSON Parse Error in get_recipe_suggestions: {str(e)}")
         print(f"[ERROR] Response: {result_text[:500]}")
         raise Exception(f"AI trả về JSON không hợp lệ: {str(e)}")
+    except ExecutorBusy:
+        raise
     except Exception as e:
         raise Exception(f"Lỗi khi tìm kiếm món ăn: {str(e)}")
 
-async def suggest_weekly_meal_plan_with_recipes(user_data: dict) -> dict:
+def _weekly_plan_request(user_data: dict) -> tuple[int, str, str]:
     """
-    Tạo thực đơn 7 ngày KÈM THEO CÔNG THỨC CHI TIẾT để lưu vào database
-    
-    Args:
-        user_data: {
-            "gender": "male",
-            "weight": 70,
-            "height": 175,
-            "date_of_birth": "2000-01-15",
-            "dietary_preferences": "vegetarian",
-            "activity_level": "moderate",
-            "goal": "maintain",  # maintain, lose, gain
-            "notes": "Muốn nhiều rau xanh"
-        }
-    
-    Returns:
-        {
-            "total_calories_per_day": 2200,
-            "recipes": [list of full recipe objects],
-            "meal_plan": [7 days with breakfast/lunch/dinner]
-        }
+    (calories mục tiêu, khóa cache, prompt) cho thực đơn tuần - dùng chung cho bản thường và bản stream
+    Cache theo calories mục tiêu (làm tròn AI_CACHE_CALORIE_BUCKET), hạn chế ăn uống và ghi chú:
+    2 người cùng mức calories + cùng hạn chế dùng chung 1 thực đơn.
     """
     age = calculate_age(date.fromisoformat(user_data["date_of_birth"]))
-    bmr = calculate_bmr(user_data["gender"], user_data["weight"], user_data["height"], age)
     
-    # Tính TDEE
-    activity_multipliers = {
-        "sedentary": 1.2,
-        "light": 1.375,
-        "moderate": 1.55,
-        "active": 1.725,
-        "very_active": 1.9
-    }
-    tdee = bmr * activity_multipliers.get(user_data.get("activity_level", "moderate"), 1.55)
-    
-    # Điều chỉnh theo mục tiêu
-    goal_adjustments = {
-        "maintain": 0,
-        "lose": -500,
-        "gain": 500
-    }
-    target_calories = round(tdee + goal_adjustments.get(user_data.get("goal", "maintain"), 0))
+    # TDEE + điều chỉnh theo mục tiêu (app/services/nutrition.py)
+    # Làm tròn theo bước của cache: prompt và khóa cache dùng cùng 1 giá trị
+    target_calories = ai_cache.calorie_bucket(daily_calorie_target(user_data))
     
+    cache_key = ai_cache.make_key(
+        "weekly_plan",
+        model=model.model_name,
+        target_calories=target_calories,
+        dietary_preferences=ai_cache.normalize_list(user_data.get("dietary_preferences")),
+        notes=ai_cache.normalize_text(user_data.get("notes")),
+    )
     prompt = f"""
 Bạn là chuyên gia dinh dưỡng. Tạo thực đơn 7 ngày KÈM CÔNG THỨC CHI TIẾT.
 
@@ -428,75 +383,58 @@ Bạn là chuyên gia dinh dưỡng. Tạo thực đơn 7 ngày KÈM CÔNG THỨ
 - Tổng calories/ngày ≈ {target_calories}
 - CHỈ trả về JSON, không thêm text nào khác
 """
+    return target_calories, cache_key, prompt
+
+async def suggest_weekly_meal_plan_with_recipes(user_data: dict, use_cache: bool = True) -> dict:
+    """
+    Tạo thực đơn 7 ngày KÈM THEO CÔNG THỨC CHI TIẾT để lưu vào database
+    
+    Kết quả được cache (xem _weekly_plan_request), use_cache=False để tạo thực đơn mới.
+    
+    Args:
+        user_data: {
+            "gender": "male",
+            "weight": 70,
+            "height": 175,
+            "date_of_birth": "2000-01-15",
+            "dietary_preferences": "vegetarian",
+            "activity_level": "moderate",
+            "goal": "maintain",  # maintain, lose, gain
+            "notes": "Muốn nhiều rau xanh"
+        }
+    
+    Returns:
+        {
+            "total_calories_per_day": 2200,
+            "recipes": [list of full recipe objects],
+            "meal_plan": [7 days with breakfast/lunch/dinner]
+        }
+    """
+    _, cache_key, prompt = _weekly_plan_request(user_data)
+    cached = await ai_cache.get("weekly_plan", cache_key, bypass=not use_cache)
+    if cached is not None:
+        return cached
     
     try:
-        response = _generate_with_config(prompt)
+        response = await _generate_with_config(prompt)
         result_text = response.text.strip()
         
-        # Xử lý markdown và text thừa
-        # Loại bỏ markdown wrapper (```json ... ``` hoặc ``` ... ```)
-        if "```" in result_text:
-            # Tìm vị trí bắt đầu và kết thúc của JSON
-            start = result_text.find("{")
-            end = result_text.rfind("}") + 1
-            if start != -1 and end != 0:
-                result_text = result_text[start:end]
-        
-        # Đảm bảo encoding UTF-8
-        if isinstance(result_text, bytes):
-            result_text = result_text.decode('utf-8')
-        
-        # Làm sạch JSON: loại bỏ comments, trailing commas
-        result_text = _clean_json_text(result_text)
-        
-        # Log để debug
+        # Bỏ markdown, sửa JSON lỗi (comment, dấu phẩy thừa/thiếu, dấu nháy, văn bản bị cắt...)
+        # trong 1 lượt đọc - xem app/services/json_repair.py
+        fixes = []
+        result = json_repair.loads(result_text, fixes=fixes, root="{")
         print(f"[AI] Response length: {len(result_text)} chars")
-        print(f"[AI] First 500 chars: {result_text[:500]}")
-        
-        # Parse JSON (mặc định Python json.loads() đã hỗ trợ UTF-8)
-        try:
-            result = json.loads(result_text)
-        except json.JSONDecodeError as parse_error:
-            # Nếu vẫn lỗi, thử sửa tại vị trí lỗi
-            print(f"[WARN] First JSON parse failed: {str(parse_error)}")
-            print(f"[WARN] Error at line {parse_error.lineno}, column {parse_error.colno}, position {parse_error.pos}")
-            
-            # Thử sửa tại vị trí lỗi
-            result_text = _fix_json_at_position(result_text, parse_error.pos)
-            
-            # Thử parse lại
-            try:
-                result = json.loads(result_text)
-                print(f"[SUCCESS] JSON parsed after position fix")
-            except json.JSONDecodeError as second_error:
-                # Thử thêm một lần nữa với cleanup bổ sung
-                print(f"[WARN] Second parse failed, trying additional cleanup...")
-                result_text = result_text.encode('utf-8', 'ignore').decode('utf-8')
-                
-                try:
-                    result = json.loads(result_text)
-                    print(f"[SUCCESS] JSON parsed after encoding cleanup")
-                except json.JSONDecodeError as third_error:
-                    # Log chi tiết lỗi
-                    print(f"[ERROR] JSON Parse Error (final): {str(third_error)}")
-                    print(f"[ERROR] Line {third_error.lineno}, Column {third_error.colno}")
-                    print(f"[ERROR] Error position {third_error.pos}")
-                    print(f"[ERROR] Context (300 chars around error):")
-                    error_start = max(0, third_error.pos - 150)
-                    error_end = min(len(result_text), third_error.pos + 150)
-                    print(f"[ERROR] ...{result_text[error_start:error_end]}...")
-                    
-                    # Lưu full response để debug (nếu có quyền ghi file)
-                    try:
-                        import tempfile
-                        with tempfile.NamedTemporaryFile(mode='w', encoding='utf-8', suffix='.json', delete=False) as f:
-                            f.write(result_text)
-                            print(f"[ERROR] Full response saved to: {f.name}")
-                    except:
-                        pass
-                    
-                    raise Exception(f"AI trả về JSON không hợp lệ. Vui lòng thử lại. Chi tiết: {str(third_error)}")
+        if fixes:
+            print(f"[FIX] Đã sửa {len(fixes)} lỗi JSON: {'; '.join(fixes[:5])}{' ...' if len(fixes) > 5 else ''}")
+        if not isinstance(result, dict):
+            raise json.JSONDecodeError("Kết quả không phải object JSON", result_text, 0)
         
+        # Văn bản bị cắt -> vẫn dùng các ngày đã đủ, nhưng không cache thực đơn thiếu ngày
+        if result.get("recipes") and len(result.get("meal_plan", [])) >= 7:
+            await ai_cache.put("weekly_plan", cache_key, result)
+        else:
+            print(f"[WARN] Thực đơn chưa đủ: {len(result.get('recipes', []))} recipes, "
+                  f"{len(result.get('meal_plan', []))} ngày - không lưu cache")
         return result
     except json.JSONDecodeError as e:
         # Log lỗi chi tiết
@@ -506,6 +444,79 @@ Bạn là chuyên gia dinh dưỡng. Tạo thực đơn 7 ngày KÈM CÔNG THỨ
         print(f"[ERROR] {result_text[max(0, e.pos-100):e.pos+100]}")
         print(f"[ERROR] Full response:\n{result_text}")
         raise Exception(f"AI trả về JSON không hợp lệ. Vui lòng thử lại. Chi tiết: {str(e)}")
+    except ExecutorBusy:
+        raise
     except Exception as e:
         print(f"[ERROR] General error: {str(e)}")
         raise Exception(f"Lỗi khi gọi AI: {str(e)}")
+
+# --- STREAM (Server-Sent Events - xem các route /ai/.../stream) ---
+# Model viết JSON từ từ (thực đơn tuần: 10-30 giây). Thay vì chờ hết văn bản, các hàm dưới đây trả về
+# dần từng sự kiện (tên, dữ liệu) để route lưu và gửi cho trình duyệt ngay khi từng phần hoàn chỉnh.
+
+async def stream_recipe_from_ingredients(ingredients: list[str], dietary_preferences: str = "", use_cache: bool = True):
+    """
+    Bản stream của generate_recipe_from_ingredients, trả về dần (sự kiện, dữ liệu):
+    - ("start", {"cached": bool})
+    - ("delta", {"text": đoạn văn bản model vừa viết})
+    - ("recipe", recipe_data): công thức hoàn chỉnh (cuối stream)
+    """
+    cache_key, prompt = _recipe_request(ingredients, dietary_preferences)
+    cached = await ai_cache.get("recipe", cache_key, bypass=not use_cache)
+    yield "start", {"cached": cached is not None}
+    if cached is not None:
+        yield "recipe", cached
+        return
+
+    parts = []
+    async for text in _stream_generate(prompt):
+        parts.append(text)
+        yield "delta", {"text": text}
+    result_text = "".join(parts).strip()
+    try:
+        recipe_data = _recipe_from_text(result_text)
+    except json.JSONDecodeError as e:
+        print(f"[ERROR] JSON Parse Error in stream_recipe: {str(e)}")
+        print(f"[ERROR] Response: {result_text[:500]}")
+        raise Exception(f"AI trả về JSON không hợp lệ: {str(e)}")
+    await ai_cache.put("recipe", cache_key, recipe_data)
+    yield "recipe", recipe_data
+
+async def stream_weekly_meal_plan_with_recipes(user_data: dict, use_cache: bool = True):
+    """
+    Bản stream của suggest_weekly_meal_plan_with_recipes, trả về dần (sự kiện, dữ liệu):
+    - ("start", {"total_calories_per_day": ..., "cached": bool})
+    - ("progress", {"chars": số ký tự model đã viết})
+    - ("recipe", recipe_data): mỗi món trong "recipes", ngay khi object của món đóng ngoặc
+    - ("day", day_plan): mỗi ngày trong "meal_plan" (breakfast/lunch/dinner theo tên món)
+    - ("warning", {"detail": ...}): object JSON hỏng đã bị bỏ qua
+    Nhận đủ món + 7 ngày -> lưu vào cache như bản không stream.
+    """
+    target_calories, cache_key, prompt = _weekly_plan_request(user_data)
+    cached = await ai_cache.get("weekly_plan", cache_key, bypass=not use_cache)
+    yield "start", {"total_calories_per_day": target_calories, "cached": cached is not None}
+    if cached is not None:
+        for recipe_data in cached.get("recipes", []):
+            yield "recipe", recipe_data
+        for day_plan in cached.get("meal_plan", []):
+            yield "day", day_plan
+        return
+
+    events = {"recipes": "recipe", "meal_plan": "day"}
+    parser = JSONStreamParser(events, parse=json_repair.loads)
+    result = {"total_calories_per_day": target_calories, "recipes": [], "meal_plan": []}
+    chars = 0
+    skipped = 0
+    async for text in _stream_generate(prompt, generation_config=JSON_GENERATION_CONFIG):
+        chars += len(text)
+        yield "progress", {"chars": chars}
+        for array_name, item in parser.feed(text):
+            result[array_name].append(item)
+            yield events[array_name], item
+        if parser.skipped > skipped:
+            skipped = parser.skipped
+            yield "warning", {"detail": f"Bỏ qua {skipped} phần JSON không hợp lệ trong kết quả AI"}
+
+    print(f"[AI] Stream xong: {chars} ký tự, {len(result['recipes'])} recipes, {len(result['meal_plan'])} ngày")
+    if result["recipes"] and len(result["meal_plan"]) >= 7 and not skipped:
+        await ai_cache.put("weekly_plan", cache_key, result)
@@ -0,0 +1,112 @@
+"""
+Xóa user / công thức món ăn bằng câu lệnh theo tập (set-based)
+
+- Kiểm tra tham chiếu: 1 câu SELECT EXISTS(...), EXISTS(...) - dừng ngay ở dòng đầu tiên tìm thấy,
+  không COUNT cả bảng. Chỉ khi bị chặn mới đếm (1 câu) để hiển thị thông báo lỗi.
+- Xóa: mỗi bảng 1 câu DELETE ... WHERE (không nạp từng dòng vào session rồi db.delete).
+- cascade=True (chỉ admin): xóa luôn dữ liệu tham chiếu trong cùng transaction.
+  Bộ đếm stats_counters do trigger cập nhật nên không cần xử lý ở đây.
+Các hàm không commit - người gọi tự commit.
+"""
+from typing import Dict, List, Sequence, Tuple
+from sqlalchemy import delete, exists, func, or_, select, update
+from sqlalchemy.orm import Session
+from app import models
+from app.services import ratings as recipe_ratings
+
+# (mô tả, cột tham chiếu) - dùng cho thông báo "đang được tham chiếu bởi ..."
+RECIPE_REFERENCES = (
+    ("lịch ăn", models.MealPlan.recipe_id),
+    ("đánh giá", models.Rating.recipe_id),
+)
+USER_REFERENCES = (
+    ("công thức món ăn", models.Recipe.owner_id),
+    ("lịch ăn", models.MealPlan.owner_id),
+    ("đánh giá", models.Rating.user_id),
+    ("mục danh sách mua sắm", models.ShoppingListItem.user_id),
+)
+
+
+def find_references(db: Session, references: Sequence[Tuple[str, object]], key: int) -> List[str]:
+    """
+    Trả về danh sách mô tả các tham chiếu tới key (VD: ["3 lịch ăn", "1 đánh giá"]), rỗng nếu không có
+    """
+    flags = db.query(*[exists().where(column == key) for _, column in references]).one()
+    used = [(label, column) for (label, column), flag in zip(references, flags) if flag]
+    if not used:
+        return []
+
+    counts = db.query(*[
+        select(func.count()).where(column == key).scalar_subquery() for _, column in used
+    ]).one()
+    return [f"{count} {label}" for (label, _), count in zip(used, counts)]
+
+
+def _execute(db: Session, statement) -> int:
+    return db.execute(statement.execution_options(synchronize_session=False)).rowcount
+
+
+def _delete_recipe_rows(db: Session, recipe_ids) -> int:
+    """
+    Xóa các món (recipe_ids: subquery/list id) cùng ingredients và recipe_tags
+    Shopping items của món được giữ lại, chỉ bỏ liên kết (recipe_id = NULL).
+    """
+    _execute(db, update(models.ShoppingListItem)
+             .where(models.ShoppingListItem.recipe_id.in_(recipe_ids))
+             .values(recipe_id=None))
+    _execute(db, delete(models.Ingredient).where(models.Ingredient.recipe_id.in_(recipe_ids)))
+    _execute(db, delete(models.RecipeTag).where(models.RecipeTag.recipe_id.in_(recipe_ids)))
+    return _execute(db, delete(models.Recipe).where(models.Recipe.id.in_(recipe_ids)))
+
+
+def delete_recipe(db: Session, recipe_id: int, cascade: bool = False) -> Dict[str, int]:
+    """
+    Xóa 1 món
+    - cascade=False: người gọi phải kiểm tra find_references(RECIPE_REFERENCES) trước
+    - cascade=True: xóa luôn lịch ăn và đánh giá của món
+    Trả về số dòng đã xóa theo bảng.
+    """
+    deleted = {"meal_plans": 0, "ratings": 0}
+    if cascade:
+        deleted["meal_plans"] = _execute(db, delete(models.MealPlan).where(models.MealPlan.recipe_id == recipe_id))
+        deleted["ratings"] = _execute(db, delete(models.Rating).where(models.Rating.recipe_id == recipe_id))
+    deleted["recipes"] = _delete_recipe_rows(db, [recipe_id])
+    return deleted
+
+
+def delete_user(db: Session, user_id: int, cascade: bool = False) -> Dict[str, int]:
+    """
+    Xóa 1 user
+    - cascade=False: người gọi phải kiểm tra find_references(USER_REFERENCES) trước
+    - cascade=True: xóa luôn công thức (kèm lịch ăn/đánh giá của người khác trỏ tới các món đó),
+      lịch ăn, đánh giá và danh sách mua sắm của user; tổng hợp đánh giá của các món
+      user từng đánh giá được tính lại
+    Các job AI (ai_jobs) của user luôn bị xóa - chỉ là lịch sử chạy nền, không cần xác nhận.
+    Trả về số dòng đã xóa theo bảng.
+    """
+    deleted = {"recipes": 0, "meal_plans": 0, "ratings": 0, "shopping_items": 0}
+    if cascade:
+        own_recipes = select(models.Recipe.id).where(models.Recipe.owner_id == user_id)
+        rated_recipe_ids = [
+            recipe_id for (recipe_id,) in db.query(models.Rating.recipe_id).filter(
+                models.Rating.user_id == user_id,
+                models.Rating.recipe_id.isnot(None)
+            ).distinct()
+        ]
+
+        deleted["meal_plans"] = _execute(db, delete(models.MealPlan).where(or_(
+            models.MealPlan.owner_id == user_id, models.MealPlan.recipe_id.in_(own_recipes)
+        )))
+        deleted["ratings"] = _execute(db, delete(models.Rating).where(or_(
+            models.Rating.user_id == user_id, models.Rating.recipe_id.in_(own_recipes)
+        )))
+        deleted["shopping_items"] = _execute(
+            db, delete(models.ShoppingListItem).where(models.ShoppingListItem.user_id == user_id)
+        )
+        deleted["recipes"] = _delete_recipe_rows(db, own_recipes)
+        if rated_recipe_ids:
+            recipe_ratings.reconcile_rating_aggregates(db, rated_recipe_ids)
+
+    deleted["ai_jobs"] = _execute(db, delete(models.AIJob).where(models.AIJob.user_id == user_id))
+    deleted["users"] = _execute(db, delete(models.User).where(models.User.id == user_id))
+    return deleted
@@ -0,0 +1,297 @@
+"""
+Đọc JSON "gần đúng" do model trả về - 1 lượt duy nhất, thời gian tuyến tính theo độ dài văn bản
+
+Thay cho chuỗi ~12 lần re.sub trên cả văn bản (_clean_json_text cũ) + sửa từng lỗi tại vị trí
+json.loads báo rồi parse lại cả văn bản: đọc từng token 1 lần, gặp lỗi thì sửa ngay tại chỗ.
+Chịu được:
+- markdown (```json ... ```), lời dẫn trước / sau JSON, BOM
+- comment // và /* */ NGOÀI chuỗi ("https://..." trong chuỗi được giữ nguyên)
+- dấu phẩy thừa ([1, 2,] {"a": 1,}) hoặc thiếu (}{, "a": 1 "b": 2, ...)
+- xuống dòng thật trong chuỗi, dấu " không escape giữa chuỗi (VD: "Món "ngon" lắm"), escape sai
+- key không có dấu nháy, chuỗi trong dấu ', True/False/None, đơn vị dính sau số (25g)
+- văn bản bị cắt (hết token / hết quota): đóng các ngoặc còn mở, bỏ phần tử dở dang cuối mảng
+JSON hợp lệ đi đường nhanh (json của C), chỉ văn bản lỗi mới qua bộ đọc Python.
+"""
+import json
+import re
+from json.decoder import scanstring
+from typing import Any, List, Optional, Tuple
+
+_WHITESPACE = re.compile(r"[ \t\r\n\ufeff]*")
+# Khoảng trắng + comment trong 1 lần match (comment /* chưa đóng -> tới hết văn bản)
+_SKIP = re.compile(r"(?:[ \t\r\n\ufeff]+|//[^\n]*|/\*.*?(?:\*/|\Z))*", re.DOTALL)
+_STRING_CHUNKS = {'"': re.compile(r'[^"\\]*'), "'": re.compile(r"[^'\\]*")}
+_NUMBER = re.compile(r"[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?")
+_UNIT = re.compile(r"[^\W\d]\w*|%")
+_WORD = re.compile(r"[^\W\d][\w$-]*")
+_BARE_TEXT = re.compile(r"[^,}\]\n]*")
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+# Ký tự có thể đứng sau dấu nháy đóng chuỗi (còn lại -> dấu nháy nằm trong chuỗi, trừ khi xuống dòng)
+_AFTER_STRING = set(",:}]\"'/")
+
+_decoder = json.JSONDecoder(strict=False)
+
+
+class _Reader:
+    """Bộ đọc đệ quy trên text[pos:end]; mỗi hàm parse_* trả về (giá trị, đã đọc trọn vẹn?)"""
+
+    def __init__(self, text: str, start: int, end: int, fixes: Optional[List[str]]):
+        self.text = text
+        self.pos = start
+        self.end = end
+        self.fixes = fixes
+
+    def fix(self, message: str) -> None:
+        if self.fixes is not None:
+            self.fixes.append(f"{message} (vị trí {self.pos})")
+
+    def peek(self) -> str:
+        return self.text[self.pos] if self.pos < self.end else ""
+
+    def skip(self) -> None:
+        """Bỏ khoảng trắng và comment"""
+        skipped = _SKIP.match(self.text, self.pos, self.end).end()
+        if skipped > self.pos and "/" in self.text[self.pos:skipped]:
+            self.fix("bỏ comment")
+        self.pos = skipped
+
+    def parse_value(self) -> Tuple[Any, bool]:
+        while True:
+            self.skip()
+            char = self.peek()
+            if char == "{":
+                return self.parse_object()
+            if char == "[":
+                return self.parse_array()
+            if char in ('"', "'"):
+                return self.parse_string(char)
+            if char == "":
+                return None, False
+            if char in ",}]":
+                self.fix("thiếu giá trị")
+                return None, True
+
+            match = _NUMBER.match(self.text, self.pos, self.end)
+            if match:
+                self.pos = match.end()
+                number = match.group()
+                value = float(number) if any(c in number for c in ".eE") else int(number)
+                unit = _UNIT.match(self.text, self.pos, self.end)
+                if unit:
+                    self.fix(f"bỏ đơn vị '{unit.group()}' sau số")
+                    self.pos = unit.end()
+                # Số nằm sát cuối văn bản có thể bị cắt dở (VD: 45 của 450)
+                return value, self.pos < self.end
+
+            match = _WORD.match(self.text, self.pos, self.end)
+            if match and match.group() in _LITERALS:
+                self.pos = match.end()
+                return _LITERALS[match.group()], self.pos < self.end
+            if match:
+                # Chữ không có dấu nháy -> chuỗi tới dấu phân cách tiếp theo
+                bare = _BARE_TEXT.match(self.text, self.pos, self.end)
+                self.fix("chuỗi không có dấu nháy")
+                self.pos = bare.end()
+                return bare.group().strip(), self.pos < self.end
+
+            self.fix(f"bỏ ký tự lạ '{char}'")
+            self.pos += 1
+
+    def _closes_string(self, pos: int) -> bool:
+        """Dấu nháy tại pos đóng chuỗi? (sau nó là dấu phân cách, xuống dòng hoặc hết văn bản)"""
+        after = _WHITESPACE.match(self.text, pos + 1, self.end).end()
+        return after >= self.end or self.text[after] in _AFTER_STRING or "\n" in self.text[pos + 1:after]
+
+    def parse_string(self, quote: str) -> Tuple[str, bool]:
+        text, end = self.text, self.end
+        if quote == '"':
+            # Đường nhanh: chuỗi hợp lệ đọc bằng json (C), lỗi / nghi dấu nháy trong chuỗi -> đọc từng đoạn
+            try:
+                value, after = scanstring(text, self.pos + 1, False)
+                if after <= end and self._closes_string(after - 1):
+                    self.pos = after
+                    return value, True
+            except json.JSONDecodeError:
+                pass
+        chunk = _STRING_CHUNKS[quote]
+        pos = self.pos + 1
+        parts = []
+        surrogates = False
+        while True:
+            match = chunk.match(text, pos, end)
+            parts.append(match.group())
+            pos = match.end()
+            if pos >= end:
+                self.pos = end
+                return "".join(parts), False
+
+            if text[pos] == "\\":
+                escape = text[pos + 1] if pos + 1 < end else ""
+                if escape == "u":
+                    code = text[pos + 2:pos + 6]
+                    if len(code) == 4 and all(c in "0123456789abcdefABCDEF" for c in code):
+                        parts.append(chr(int(code, 16)))
+                        surrogates = surrogates or 0xD800 <= int(code, 16) <= 0xDFFF
+                        pos += 6
+                        continue
+                    self.pos = pos
+                    self.fix("escape \\u không hợp lệ")
+                    parts.append("u")
+                    pos += 2
+                elif escape in _ESCAPES:
+                    parts.append(_ESCAPES[escape])
+                    pos += 2
+                elif escape == "":
+                    self.pos = end
+                    return "".join(parts), False
+                else:
+                    self.pos = pos
+                    self.fix(f"escape không hợp lệ '\\{escape}'")
+                    parts.append(escape)
+                    pos += 2
+                continue
+
+            # Dấu nháy: đóng chuỗi nếu sau nó là dấu phân cách, ngược lại là dấu nháy nằm trong chuỗi
+            if self._closes_string(pos):
+                self.pos = pos + 1
+                value = "".join(parts)
+                if surrogates:
+                    # Ghép cặp surrogate (\ud83c\udf5c -> 1 emoji) giống json.loads
+                    value = value.encode("utf-16", "surrogatepass").decode("utf-16", "replace")
+                return value, True
+            self.pos = pos
+            self.fix("dấu nháy không escape trong chuỗi")
+            parts.append(quote)
+            pos += 1
+
+    def parse_object(self) -> Tuple[dict, bool]:
+        self.pos += 1
+        result = {}
+        need_comma = False
+        after_comma = False
+        while True:
+            self.skip()
+            char = self.peek()
+            if char == "":
+                return result, False
+            if char in "}]":
+                if char == "]":
+                    self.fix("] thay cho }")
+                if after_comma:
+                    self.fix("bỏ dấu phẩy thừa")
+                self.pos += 1
+                return result, True
+            if char == ",":
+                if not need_comma:
+                    self.fix("bỏ dấu phẩy thừa")
+                self.pos += 1
+                need_comma, after_comma = False, True
+                continue
+
+            if char in ('"', "'"):
+                key, complete = self.parse_string(char)
+                if not complete:
+                    return result, False
+            else:
+                match = _WORD.match(self.text, self.pos, self.end)
+                if not match:
+                    self.fix(f"bỏ ký tự lạ '{char}'")
+                    self.pos += 1
+                    continue
+                self.fix("key không có dấu nháy")
+                key = match.group()
+                self.pos = match.end()
+            if need_comma:
+                self.fix("thêm dấu phẩy thiếu")
+
+            self.skip()
+            if self.peek() == ":":
+                self.pos += 1
+            else:
+                self.fix("thêm dấu : thiếu")
+            value, complete = self.parse_value()
+            # Văn bản bị cắt giữa giá trị: giữ mảng / object dở dang (đã bỏ phần tử hỏng), bỏ giá trị đơn
+            if complete or isinstance(value, (dict, list)):
+                result[key] = value
+            if not complete:
+                return result, False
+            need_comma, after_comma = True, False
+
+    def parse_array(self) -> Tuple[list, bool]:
+        self.pos += 1
+        items = []
+        need_comma = False
+        after_comma = False
+        while True:
+            self.skip()
+            char = self.peek()
+            if char == "":
+                return items, False
+            if char in "]}":
+                if char == "}":
+                    self.fix("} thay cho ]")
+                if after_comma:
+                    self.fix("bỏ dấu phẩy thừa")
+                self.pos += 1
+                return items, True
+            if char == ",":
+                if not need_comma:
+                    self.fix("bỏ dấu phẩy thừa")
+                self.pos += 1
+                need_comma, after_comma = False, True
+                continue
+
+            if need_comma:
+                self.fix("thêm dấu phẩy thiếu")
+            value, complete = self.parse_value()
+            if not complete:
+                # Phần tử cuối bị cắt dở (VD: món ăn thiếu nửa sau) -> bỏ
+                self.fix("bỏ phần tử dở dang cuối mảng")
+                return items, False
+            items.append(value)
+            need_comma, after_comma = True, False
+
+
+def _find_root(text: str, root: str, start: int, end: int) -> int:
+    positions = [position for position in (text.find(char, start, end) for char in root) if position != -1]
+    return min(positions) if positions else -1
+
+
+def _json_bounds(text: str, root: str) -> Tuple[int, int]:
+    """(vị trí ngoặc mở của giá trị gốc, vị trí kết thúc) - ưu tiên nội dung trong khối ```"""
+    fence = text.find("```")
+    if fence != -1:
+        close = text.find("```", fence + 3)
+        end = len(text) if close == -1 else close
+        start = _find_root(text, root, fence + 3, end)
+        if start != -1:
+            return start, end
+    return _find_root(text, root, 0, len(text)), len(text)
+
+
+def loads(text: str, fixes: Optional[List[str]] = None, root: str = "{[") -> Any:
+    """
+    Parse JSON trong văn bản model trả về, sửa lỗi trên đường đọc
+    - fixes: danh sách nhận mô tả các chỗ đã sửa (để ghi log), None = không ghi
+    - root: ký tự mở của giá trị gốc cần tìm ("{" = object, "[" = mảng, mặc định cả 2)
+    Không tìm thấy JSON -> json.JSONDecodeError (như json.loads).
+    """
+    if isinstance(text, bytes):
+        text = text.decode("utf-8", "replace")
+    start, end = _json_bounds(text, root)
+    if start == -1:
+        raise json.JSONDecodeError("Không tìm thấy JSON trong văn bản", text, 0)
+
+    # Đường nhanh: JSON hợp lệ (cho phép xuống dòng thật trong chuỗi, bỏ qua phần thừa phía sau)
+    try:
+        value, _ = _decoder.raw_decode(text[:end], start)
+        return value
+    except json.JSONDecodeError:
+        pass
+
+    reader = _Reader(text, start, end, fixes)
+    value, complete = reader.parse_value()
+    if not complete:
+        reader.fix("văn bản bị cắt - đóng các ngoặc còn mở")
+    return value
@@ -0,0 +1,83 @@
+"""
+Đọc dần JSON do model trả về theo từng đoạn (stream) - lấy ra từng object ngay khi nó đóng ngoặc
+
+VD với thực đơn tuần {"total_calories_per_day": 2100, "recipes": [{...}, {...}], "meal_plan": [{...}]}:
+món đầu tiên được trả về ngay khi "}" của nó tới, không cần chờ model viết xong cả văn bản.
+- Chỉ lấy phần tử object của các mảng cấp 1 được chỉ định (arrays)
+- Bỏ qua văn bản trước "{" đầu tiên (VD: ```json)
+- Phần tử không parse được (kể cả sau khi làm sạch bằng hàm parse) -> bỏ qua, đếm trong skipped
+"""
+import json
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+
+class JSONStreamParser:
+    """Nhận từng đoạn văn bản qua feed(), trả về [(tên mảng, object)] vừa hoàn chỉnh"""
+
+    def __init__(self, arrays: Iterable[str], parse: Callable[[str], Any] = json.loads):
+        self.arrays = set(arrays)
+        self.parse = parse
+        self.text = ""
+        self.skipped = 0
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None  # Chuỗi vừa đóng ở cấp 1 (có thể là key)
+        self._key: Optional[str] = None
+        self._array: Optional[str] = None  # Mảng cấp 1 đang đọc (nằm trong arrays)
+        self._item_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        self.text += chunk
+        items = []
+        text = self.text
+        for pos in range(self._pos, len(text)):
+            char = text[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_string = text[self._string_start:pos + 1]
+                continue
+            if self._depth == 0:
+                # Chưa vào object gốc: bỏ qua mọi thứ (markdown, lời dẫn) trừ "{"
+                if char == "{":
+                    self._depth = 1
+                continue
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif char == ":" and self._depth == 1 and self._last_string is not None:
+                self._key = json.loads(self._last_string)
+                self._last_string = None
+            elif char in "{[":
+                self._depth += 1
+                if char == "[" and self._depth == 2 and self._key in self.arrays:
+                    self._array = self._key
+                elif char == "{" and self._depth == 3 and self._array is not None:
+                    self._item_start = pos
+            elif char in "}]":
+                self._depth -= 1
+                if char == "}" and self._depth == 2 and self._item_start is not None:
+                    item = self._parse_item(text[self._item_start:pos + 1])
+                    if item is not None:
+                        items.append((self._array, item))
+                    self._item_start = None
+                elif char == "]" and self._depth == 1:
+                    self._array = None
+        self._pos = len(text)
+        return items
+
+    def _parse_item(self, item_text: str) -> Optional[Any]:
+        try:
+            return self.parse(item_text)
+        except (ValueError, TypeError) as e:
+            self.skipped += 1
+            print(f"[AI] Bỏ qua object JSON hỏng trong stream: {e}")
+            return None
@@ -0,0 +1,275 @@
+"""
+Backend gọi model (LLM) cho ai_service: Gemini thật hoặc bản giả chạy offline
+
+Mọi backend có cùng giao diện mà ai_service đang dùng (như genai.GenerativeModel của SDK cũ):
+- model_name
+- generate_content(prompt, generation_config=None, stream=False, request_options=None)
+  -> object có .text; stream=True -> iterator các chunk có .text
+- list_models() -> tên các model gọi được (test_ai.py, test_all_models.py)
+
+Chọn backend bằng LLM_BACKEND:
+- "gemini" (mặc định): gọi Gemini, bắt buộc GEMINI_API_KEY
+- "fake": phát lại các phản hồi đã ghi (LLM_FAKE_RECORDINGS, mặc định recordings/ai_responses.jsonl -
+  gồm cả JSON lỗi: markdown, comment, dấu phẩy thừa, văn bản bị cắt) theo loại prompt, không cần mạng / key.
+  LLM_FAKE_LATENCY (giây mỗi lời gọi, ± LLM_FAKE_JITTER), LLM_FAKE_ERROR_RATE (tỷ lệ lời gọi lỗi 429 / 500 /
+  timeout; stream lỗi 500 / timeout giữa chừng), LLM_FAKE_SEED (cùng seed -> cùng chuỗi lỗi / độ trễ)
+LLM_RECORD_PATH: ghi thêm mọi phản hồi của backend vào file JSONL (cùng định dạng LLM_FAKE_RECORDINGS)
+-> chạy thật 1 lần với Gemini để thu phản hồi, sau đó phát lại offline.
+"""
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()
+DEFAULT_RECORDINGS = Path(__file__).resolve().parents[2] / "recordings" / "ai_responses.jsonl"
+LLM_FAKE_RECORDINGS = os.getenv("LLM_FAKE_RECORDINGS", str(DEFAULT_RECORDINGS))
+LLM_FAKE_LATENCY = float(os.getenv("LLM_FAKE_LATENCY", "1.0"))
+LLM_FAKE_JITTER = float(os.getenv("LLM_FAKE_JITTER", "0.2"))
+LLM_FAKE_ERROR_RATE = float(os.getenv("LLM_FAKE_ERROR_RATE", "0"))
+LLM_FAKE_SEED = os.getenv("LLM_FAKE_SEED")
+LLM_FAKE_CHUNK_CHARS = int(os.getenv("LLM_FAKE_CHUNK_CHARS", "80"))
+LLM_FAKE_MODELS = os.getenv("LLM_FAKE_MODELS", "models/gemini-2.0-flash,models/gemma-3-4b-it")
+LLM_RECORD_PATH = os.getenv("LLM_RECORD_PATH", "")
+
+# Loại prompt (theo đoạn văn bản đặc trưng trong prompt của ai_service) - khớp "kind" trong file ghi
+PROMPT_KINDS = (
+    ("weekly_plan", "KÈM CÔNG THỨC CHI TIẾT"),
+    ("weekly", "lên thực đơn 7 ngày"),
+    ("recipe", "tạo 1 công thức"),
+    ("suggestions", "Gợi ý 5 món"),
+)
+# Lỗi giả (giống thông báo của Gemini: test_ai.py phân loại theo "429" / "quota")
+FAKE_ERRORS = (
+    "429 Resource has been exhausted (e.g. check quota).",
+    "500 An internal error has occurred. Please retry or report in https://developers.generativeai.google/guide/troubleshooting",
+    "504 Deadline Exceeded",
+)
+
+
+class LLMError(Exception):
+    """Lỗi từ backend giả (lỗi được tiêm theo LLM_FAKE_ERROR_RATE hoặc quá timeout)"""
+
+
+class LLMResponse:
+    """Phản hồi / chunk có .text như của genai"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+def classify_prompt(prompt: str) -> str:
+    """Loại prompt: weekly_plan / weekly / recipe / suggestions, không nhận ra -> "text" """
+    for kind, marker in PROMPT_KINDS:
+        if marker in prompt:
+            return kind
+    return "text"
+
+
+def load_recordings(path: str) -> Dict[str, List[str]]:
+    """File JSONL {"kind": ..., "text": ..., "note": ...} -> {kind: [text, ...]} (giữ thứ tự trong file)"""
+    recordings: Dict[str, List[str]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                recordings.setdefault(entry["kind"], []).append(entry["text"])
+    return recordings
+
+
+# --- 1. GEMINI ---
+class GeminiBackend:
+    """
+    Gemini qua google-genai (google.genai.Client; google-generativeai đã ngừng hỗ trợ), import khi dùng
+    -> backend giả không cần cài / cấu hình SDK
+    Mỗi backend 1 Client theo api_key (nhiều key trong app/services/llm_pool.py không ghi đè nhau).
+    SDK không tự thử lại (không đặt retry_options): thử lại / đổi key do llm_pool quyết định.
+    """
+
+    def __init__(self, model_name: str, api_key: str):
+        from google import genai
+        from google.genai import types
+
+        self._types = types
+        self._client = genai.Client(api_key=api_key)
+        # Giữ dạng "models/..." như genai.GenerativeModel trước đây (khóa ai_cache không đổi)
+        self.model_name = model_name if model_name.startswith("models/") else f"models/{model_name}"
+
+    def _config(self, generation_config: Optional[dict], request_options: Optional[dict]):
+        config = dict(generation_config or {})
+        timeout = (request_options or {}).get("timeout")
+        if timeout is not None:
+            config["http_options"] = self._types.HttpOptions(timeout=int(timeout * 1000))  # Mili giây
+        return self._types.GenerateContentConfig(**config)
+
+    @staticmethod
+    def _reraise(error: Exception):
+        """Lỗi mạng của httpx -> TimeoutError / ConnectionError, lỗi khác (errors.APIError có .code) giữ nguyên"""
+        import httpx
+
+        if isinstance(error, httpx.TimeoutException):
+            raise TimeoutError(str(error) or "timed out") from error
+        if isinstance(error, httpx.TransportError):
+            raise ConnectionError(str(error)) from error
+        raise error
+
+    def generate_content(self, prompt: str, generation_config: dict = None, stream: bool = False,
+                         request_options: dict = None):
+        config = self._config(generation_config, request_options)
+        if stream:
+            return self._stream(prompt, config)
+        try:
+            response = self._client.models.generate_content(model=self.model_name, contents=prompt, config=config)
+        except Exception as error:
+            self._reraise(error)
+        return LLMResponse(response.text or "")
+
+    def _stream(self, prompt: str, config) -> Iterator[LLMResponse]:
+        try:
+            for chunk in self._client.models.generate_content_stream(
+                model=self.model_name, contents=prompt, config=config
+            ):
+                yield LLMResponse(chunk.text or "")  # Chunk cuối / bị chặn có thể không có text
+        except Exception as error:
+            self._reraise(error)
+
+    def list_models(self) -> List[str]:
+        try:
+            return [
+                m.name for m in self._client.models.list()
+                if "generateContent" in (m.supported_actions or [])
+            ]
+        except Exception as error:
+            self._reraise(error)
+
+
+# --- 2. BẢN GIẢ OFFLINE ---
+class FakeBackend:
+    """
+    Phát lại phản hồi đã ghi theo loại prompt (lần lượt xoay vòng từng loại), chặn thread gọi trong
+    latency giây như SDK thật; stream chia văn bản thành chunk đều nhau trong cùng khoảng thời gian
+    """
+
+    def __init__(self, model_name: str, recordings: Dict[str, List[str]], latency: float = LLM_FAKE_LATENCY,
+                 jitter: float = LLM_FAKE_JITTER, error_rate: float = LLM_FAKE_ERROR_RATE,
+                 seed: Optional[int] = None, chunk_chars: int = LLM_FAKE_CHUNK_CHARS,
+                 models: Optional[List[str]] = None, errors: Sequence[str] = FAKE_ERRORS):
+        self.model_name = f"fake/{model_name}"  # Khóa ai_cache khác model thật -> không lẫn kết quả giả
+        self.recordings = recordings
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.chunk_chars = chunk_chars
+        self.fake_errors = tuple(errors)  # Lỗi chọn ngẫu nhiên khi tiêm (VD: chỉ 429 = key hết quota)
+        self.models = models if models is not None else [name for name in LLM_FAKE_MODELS.split(",") if name]
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._cursors = {kind: itertools.cycle(texts) for kind, texts in recordings.items()}
+        self.calls = 0
+        self.errors = 0
+
+    def _next(self, prompt: str):
+        """(văn bản, độ trễ, lỗi hoặc None) cho 1 lời gọi"""
+        kind = classify_prompt(prompt)
+        with self._lock:
+            self.calls += 1
+            cursor = self._cursors.get(kind) or self._cursors.get("text")
+            text = next(cursor) if cursor else ""
+            latency = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            error = self._random.choice(self.fake_errors) if self._random.random() < self.error_rate else None
+            self.errors += error is not None
+        return text, latency, error
+
+    def generate_content(self, prompt: str, generation_config: dict = None, stream: bool = False,
+                         request_options: dict = None):
+        text, latency, error = self._next(prompt)
+        timeout = (request_options or {}).get("timeout")
+        if timeout is not None and latency > timeout:
+            latency, error = timeout, FAKE_ERRORS[2]
+        if not stream:
+            time.sleep(latency)
+            if error:
+                raise LLMError(error)
+            return LLMResponse(text)
+        return self._stream(text, latency, error)
+
+    def _stream(self, text: str, latency: float, error: Optional[str]) -> Iterator[LLMResponse]:
+        chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)] or [""]
+        # 429 bị từ chối ngay (chưa có chunk nào), lỗi khác xảy ra giữa chừng: client đã nhận một phần văn bản
+        stop_at = len(chunks) if not error else 0 if error.startswith("429") else len(chunks) // 2
+        for chunk in chunks[:stop_at]:
+            time.sleep(latency / len(chunks))
+            yield LLMResponse(chunk)
+        if error:
+            time.sleep(latency / len(chunks))
+            raise LLMError(error)
+
+    def list_models(self) -> List[str]:
+        return list(self.models)
+
+
+# --- 3. GHI PHẢN HỒI ---
+class RecordingBackend:
+    """Bọc 1 backend, ghi thêm mỗi phản hồi (kind, text) vào file JSONL để phát lại bằng FakeBackend"""
+
+    def __init__(self, backend, path: str):
+        self._backend = backend
+        self.model_name = backend.model_name
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _write(self, prompt: str, text: str) -> None:
+        entry = {"kind": classify_prompt(prompt), "text": text, "note": f"ghi từ {self.model_name}"}
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def generate_content(self, prompt: str, generation_config: dict = None, stream: bool = False,
+                         request_options: dict = None):
+        response = self._backend.generate_content(
+            prompt, generation_config=generation_config, stream=stream, request_options=request_options
+        )
+        if not stream:
+            self._write(prompt, response.text)
+            return response
+        return self._record_stream(prompt, response)
+
+    def _record_stream(self, prompt: str, response) -> Iterator:
+        parts = []
+        for chunk in response:
+            try:
+                parts.append(chunk.text)
+            except ValueError:
+                pass
+            yield chunk
+        self._write(prompt, "".join(parts))
+
+    def list_models(self) -> List[str]:
+        return self._backend.list_models()
+
+
+def create_backend(model_name: str, api_key: Optional[str] = None, backend: Optional[str] = None):
+    """
+    Backend theo LLM_BACKEND (hoặc tham số backend); api_key mặc định = GEMINI_API_KEY
+    Gemini không có key -> ValueError (như trước: app không khởi động được khi thiếu cấu hình)
+    """
+    backend = (backend or LLM_BACKEND).lower()
+    if backend == "fake":
+        seed = int(LLM_FAKE_SEED) if LLM_FAKE_SEED else None
+        result = FakeBackend(model_name, load_recordings(LLM_FAKE_RECORDINGS), seed=seed)
+    elif backend == "gemini":
+        api_key = api_key or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("❌ Chưa cấu hình GEMINI_API_KEY trong .env (hoặc đặt LLM_BACKEND=fake để chạy offline)")
+        result = GeminiBackend(model_name, api_key)
+    else:
+        raise ValueError(f"❌ LLM_BACKEND không hợp lệ: {backend} (chọn: gemini, fake)")
+    if LLM_RECORD_PATH:
+        result = RecordingBackend(result, LLM_RECORD_PATH)
+    return result
@@ -0,0 +1,368 @@
+"""
+Pool nhiều key x nhiều model cho ai_service: tự chuyển sang key / model khác khi 1 key hết quota hoặc lỗi
+
+Trước đây chỉ có 1 key + 1 model: key hết quota (429) -> SDK tự thử lại tới hết AI_REQUEST_TIMEOUT rồi user nhận
+500; muốn đổi key phải chạy test_ai.py / test_all_models.py rồi sửa .env bằng tay.
+
+- Thành viên = (model, key) theo thứ tự ưu tiên: model đầu tiên của LLM_MODELS với lần lượt các key của
+  GEMINI_API_KEYS, rồi tới model sau. Không có GEMINI_API_KEYS -> dùng GEMINI_API_KEY (pool 1 key).
+- Giới hạn tốc độ / quota của từng thành viên (theo free tier của model): LLM_MODELS="gemini-2.0-flash:15:1500"
+  = tối đa 15 request/phút, 1500 request/ngày cho MỖI key. Đã chạm giới hạn -> bỏ qua, dùng thành viên kế tiếp
+  (không gọi để nhận 429).
+- Circuit breaker của từng thành viên:
+  - 429 / hết quota, key không hợp lệ -> mở ngay (nghỉ LLM_QUOTA_COOLDOWN giây, hoặc theo "retry in Ns" của lỗi)
+  - lỗi tạm thời (5xx, timeout, mất kết nối) LLM_BREAKER_THRESHOLD lần liên tiếp -> mở LLM_BREAKER_COOLDOWN giây
+  - mở lại liên tiếp -> thời gian nghỉ nhân đôi (tối đa LLM_BREAKER_MAX_COOLDOWN), có jitter để các process
+    không cùng thử lại 1 lúc; hết thời gian nghỉ -> half-open: cho đúng 1 request thử, thành công -> đóng
+- Mỗi lời gọi: thử thành viên khả dụng đầu tiên, lỗi tạm thời / quota -> chuyển ngay sang thành viên kế tiếp
+  (tối đa LLM_MAX_ATTEMPTS lần). Đã thử hết -> chờ backoff lũy thừa có jitter (LLM_BACKOFF_BASE, tối đa
+  LLM_BACKOFF_MAX giây) rồi thử lại. SDK (google-genai) không tự thử lại: pool quyết định.
+- Không còn thành viên nào dùng được trong LLM_BACKOFF_MAX giây -> LLMUnavailable ngay (503 + Retry-After,
+  như khi hàng đợi AI đầy) thay vì chờ hết timeout. Hết LLM_MAX_ATTEMPTS lần thử vì lỗi tạm thời cũng vậy.
+- Stream: chỉ chuyển thành viên khi chưa nhận được chunk nào (đã gửi văn bản cho client thì không làm lại).
+Trạng thái lưu trong bộ nhớ của từng process; xem GET /admin/ai-backends.
+"""
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from app.executors import ExecutorBusy
+from app.services import llm
+
+LLM_MODELS = os.getenv("LLM_MODELS", "")
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "3"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+LLM_BREAKER_MAX_COOLDOWN = float(os.getenv("LLM_BREAKER_MAX_COOLDOWN", "600"))
+LLM_QUOTA_COOLDOWN = float(os.getenv("LLM_QUOTA_COOLDOWN", "60"))
+
+# Loại lỗi -> cách xử lý
+QUOTA, AUTH, TRANSIENT, FATAL = "quota", "auth", "transient", "fatal"
+_STATUS_RE = re.compile(r"^\s*(\d{3})\b")
+_RETRY_DELAY_RE = re.compile(r"retry in ([\d.]+)\s*s|retry_delay\s*\{\s*seconds:\s*(\d+)", re.IGNORECASE)
+
+
+class LLMUnavailable(ExecutorBusy):
+    """Mọi key / model đều đang hết quota, bị ngắt hoặc lỗi - trả 503 như khi hàng đợi AI đầy (main.py)"""
+
+    def __init__(self, retry_after: float, last_error: Optional[Exception] = None):
+        super().__init__("llm")
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.last_error = last_error
+        self.args = (f"Không có key / model AI nào khả dụng, thử lại sau {self.retry_after}s"
+                     + (f" (lỗi cuối: {last_error})" if last_error else ""),)
+
+
+def classify_error(error: Exception) -> str:
+    """
+    quota: 429 / hết quota -> đổi key ngay; auth: key sai / bị khóa (400 API key, 401, 403) -> bỏ key;
+    transient: 5xx, timeout, mất kết nối -> thử lại / đổi key; fatal: lỗi của chính request -> báo lỗi luôn
+    """
+    message = str(error)
+    lowered = message.lower()
+    status = getattr(error, "code", None)
+    if not isinstance(status, int):
+        match = _STATUS_RE.match(message)
+        status = int(match.group(1)) if match else None
+    if status == 429 or "quota" in lowered or "exhausted" in lowered:
+        return QUOTA
+    if status in (401, 403) or "api key" in lowered or "api_key" in lowered or "permission" in lowered:
+        return AUTH
+    if (status is not None and status >= 500) or isinstance(error, (TimeoutError, ConnectionError)) \
+            or "deadline" in lowered or "timeout" in lowered or "timed out" in lowered or "unavailable" in lowered:
+        return TRANSIENT
+    return FATAL
+
+
+def retry_delay_hint(error: Exception) -> Optional[float]:
+    """Số giây Gemini gợi ý chờ trong lỗi 429 ("Please retry in 41.2s" / retry_delay { seconds: 41 })"""
+    match = _RETRY_DELAY_RE.search(str(error))
+    if not match:
+        return None
+    return float(match.group(1) or match.group(2))
+
+
+def _jittered(seconds: float) -> float:
+    """Jitter "equal": nửa cố định + nửa ngẫu nhiên -> không dồn cùng lúc nhưng vẫn chờ ít nhất 1/2"""
+    return seconds / 2 + random.uniform(0, seconds / 2)
+
+
+# --- 1. THÀNH VIÊN: GIỚI HẠN TỐC ĐỘ + CIRCUIT BREAKER ---
+class PoolMember:
+    """1 backend (model, key) + số liệu; mọi thay đổi trạng thái được gọi dưới lock của LLMPool"""
+
+    def __init__(self, backend, label: str, rpm: int = 0, rpd: int = 0,
+                 breaker_threshold: int = LLM_BREAKER_THRESHOLD, cooldown: float = LLM_BREAKER_COOLDOWN,
+                 quota_cooldown: float = LLM_QUOTA_COOLDOWN, max_cooldown: float = LLM_BREAKER_MAX_COOLDOWN):
+        self.backend = backend
+        self.label = label  # "model#số thứ tự key" - không in key ra log / API
+        self.rpm = rpm
+        self.rpd = rpd
+        self.breaker_threshold = breaker_threshold
+        self.cooldown = cooldown
+        self.quota_cooldown = quota_cooldown
+        self.max_cooldown = max_cooldown
+
+        self.state = "closed"  # closed / open / half_open
+        self._open_until = 0.0
+        self._opens = 0  # Số lần mở liên tiếp (thời gian nghỉ nhân đôi)
+        self._consecutive_failures = 0
+        self._trial_in_flight = False
+        self._recent: deque = deque()  # Thời điểm các request trong 60 giây gần nhất
+        self._day = date.today()
+        self.requests_today = 0
+
+        self.requests = 0
+        self.successes = 0
+        self.failures: Dict[str, int] = {QUOTA: 0, AUTH: 0, TRANSIENT: 0, FATAL: 0}
+        self.skipped_rate_limit = 0
+        self.total_latency = 0.0
+        self.last_error: Optional[str] = None
+
+    def wait_seconds(self, now: float) -> float:
+        """0 = gọi được ngay; > 0 = số giây tới khi gọi được (breaker đang mở / đã chạm giới hạn)"""
+        if self.state == "open" and now < self._open_until:
+            return self._open_until - now
+        if self.state == "half_open" and self._trial_in_flight:
+            return 1.0  # Đang chờ kết quả request thử
+        while self._recent and now - self._recent[0] >= 60:
+            self._recent.popleft()
+        if self.rpm and len(self._recent) >= self.rpm:
+            return 60 - (now - self._recent[0])
+        if date.today() != self._day:
+            self._day, self.requests_today = date.today(), 0
+        if self.rpd and self.requests_today >= self.rpd:
+            return 3600.0  # Hết quota ngày: thử lại sau (quota reset theo giờ Pacific, không đoán chính xác)
+        return 0.0
+
+    def acquire(self, now: float) -> None:
+        """Đánh dấu bắt đầu 1 request (đã kiểm tra wait_seconds == 0)"""
+        if self.state == "open":
+            self.state = "half_open"
+            print(f"[AI] {self.label}: hết thời gian nghỉ, cho 1 request thử (half-open)")
+        if self.state == "half_open":
+            self._trial_in_flight = True
+        self._recent.append(now)
+        self.requests_today += 1
+        self.requests += 1
+
+    def record_success(self, latency: float) -> None:
+        if self.state != "closed":
+            print(f"[AI] {self.label}: request thử thành công, dùng lại bình thường")
+        self.state = "closed"
+        self._opens = 0
+        self._consecutive_failures = 0
+        self._trial_in_flight = False
+        self.successes += 1
+        self.total_latency += latency
+
+    def record_failure(self, kind: str, error: Exception) -> None:
+        self.failures[kind] += 1
+        self.last_error = str(error)[:200]
+        self._trial_in_flight = False
+        if kind == FATAL:
+            return  # Lỗi của request (prompt bị chặn...), không phải của key / model
+        self._consecutive_failures += 1
+        if kind in (QUOTA, AUTH) or self.state == "half_open" or self._consecutive_failures >= self.breaker_threshold:
+            self._open(kind, error)
+
+    def _open(self, kind: str, error: Exception) -> None:
+        self._opens += 1
+        if kind == AUTH:
+            seconds = self.max_cooldown
+        else:
+            base = self.quota_cooldown if kind == QUOTA else self.cooldown
+            seconds = _jittered(min(self.max_cooldown, base * 2 ** (self._opens - 1)))
+            hint = retry_delay_hint(error) if kind == QUOTA else None
+            if hint is not None:
+                seconds = max(seconds, hint)
+        self.state = "open"
+        self._open_until = time.monotonic() + seconds
+        print(f"[AI] {self.label}: ngắt {seconds:.0f}s sau lỗi {kind} - {self.last_error}")
+
+    def release(self) -> None:
+        """Request kết thúc không rõ thành / bại (client dừng đọc stream sớm)"""
+        self._trial_in_flight = False
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        return {
+            "backend": self.label,
+            "model": self.backend.model_name,
+            "state": self.state,
+            "available_in_seconds": round(self.wait_seconds(now), 1),
+            "requests": self.requests,
+            "successes": self.successes,
+            "failures": dict(self.failures),
+            "requests_last_minute": len(self._recent),
+            "rpm_limit": self.rpm or None,
+            "requests_today": self.requests_today,
+            "rpd_limit": self.rpd or None,
+            "skipped_rate_limit": self.skipped_rate_limit,
+            "avg_latency_ms": round(self.total_latency / self.successes * 1000, 1) if self.successes else None,
+            "last_error": self.last_error,
+        }
+
+
+# --- 2. POOL: CHỌN THÀNH VIÊN + CHUYỂN KHI LỖI ---
+class LLMPool:
+    """Cùng giao diện với backend trong app/services/llm.py (generate_content, model_name, list_models)"""
+
+    def __init__(self, members: Sequence[PoolMember], max_attempts: int = LLM_MAX_ATTEMPTS,
+                 backoff_base: float = LLM_BACKOFF_BASE, backoff_max: float = LLM_BACKOFF_MAX):
+        if not members:
+            raise ValueError("❌ Pool AI cần ít nhất 1 backend")
+        self.members = list(members)
+        # Khóa ai_cache theo model ưu tiên: kết quả từ model dự phòng dùng chung cache với model chính
+        self.model_name = self.members[0].backend.model_name
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failovers = 0
+        self.unavailable = 0
+
+    def _acquire(self, tried: set) -> Tuple[Optional[PoolMember], float]:
+        """(thành viên khả dụng đầu tiên chưa thử, 0) hoặc (None, số giây tới khi có thành viên dùng được)"""
+        now = time.monotonic()
+        with self._lock:
+            waits = []
+            for member in self.members:
+                wait = member.wait_seconds(now)
+                if wait == 0 and member not in tried:
+                    member.acquire(now)
+                    return member, 0.0
+                if wait > 0 and member.state == "closed":
+                    member.skipped_rate_limit += 1
+                waits.append(wait)
+            return None, min(waits)
+
+    def _record(self, member: PoolMember, started: float, error: Optional[Exception] = None) -> str:
+        with self._lock:
+            if error is None:
+                member.record_success(time.monotonic() - started)
+                return ""
+            kind = classify_error(error)
+            member.record_failure(kind, error)
+            return kind
+
+    def generate_content(self, prompt: str, generation_config: dict = None, stream: bool = False,
+                         request_options: dict = None):
+        request_options = dict(request_options or {})
+        timeout = request_options.get("timeout")
+        deadline = time.monotonic() + timeout if timeout else None
+        with self._lock:
+            self.calls += 1
+
+        tried: set = set()
+        attempts, rounds = 0, 0
+        last_error = None
+        while attempts < self.max_attempts:
+            member, wait = self._acquire(tried)
+            remaining = deadline - time.monotonic() if deadline else None
+            if member is None:
+                # Đã thử mọi thành viên đang dùng được -> backoff; không ai dùng được sớm -> báo 503 ngay
+                delay = max(wait, _jittered(min(self.backoff_max, self.backoff_base * 2 ** rounds)))
+                if wait > self.backoff_max or (remaining is not None and delay >= remaining):
+                    break
+                time.sleep(delay)
+                tried.clear()
+                rounds += 1
+                continue
+
+            attempts += 1
+            started = time.monotonic()
+            options = dict(request_options)
+            if remaining is not None:
+                options["timeout"] = max(remaining, 1.0)
+            try:
+                response = member.backend.generate_content(
+                    prompt, generation_config=generation_config, stream=stream, request_options=options
+                )
+                if not stream:
+                    self._record(member, started)
+                    return response
+                chunks = iter(response)
+                first = next(chunks, None)  # Lỗi trước chunk đầu tiên -> vẫn chuyển được thành viên khác
+                return self._stream(member, started, first, chunks)
+            except Exception as error:
+                kind = self._record(member, started, error)
+                if kind == FATAL:
+                    raise
+                last_error = error
+                tried.add(member)
+                with self._lock:
+                    self.failovers += 1
+                print(f"[AI] {member.label} lỗi {kind} sau {time.monotonic() - started:.1f}s -> thử backend khác")
+
+        # Hết lượt thử (quota / lỗi tạm thời đều vậy) -> 503 + Retry-After, lỗi gốc giữ trong last_error
+        with self._lock:
+            self.unavailable += 1
+            now = time.monotonic()
+            retry_after = min(member.wait_seconds(now) for member in self.members)
+        raise LLMUnavailable(retry_after or self.backoff_base, last_error)
+
+    def _stream(self, member: PoolMember, started: float, first, chunks) -> Iterator:
+        finished = False
+        try:
+            if first is not None:
+                yield first
+            for chunk in chunks:
+                yield chunk
+            finished = True
+        except GeneratorExit:
+            with self._lock:
+                member.release()
+            raise
+        except Exception as error:
+            self._record(member, started, error)
+            raise
+        if finished:
+            self._record(member, started)
+
+    def list_models(self) -> List[str]:
+        return self.members[0].backend.list_models()
+
+    def stats(self) -> Dict[str, Any]:
+        """Số liệu cho GET /admin/ai-backends"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "failovers": self.failovers,
+                "unavailable": self.unavailable,
+                "backends": [member.stats(now) for member in self.members],
+            }
+
+
+def parse_models(value: str, default_model: str) -> List[Tuple[str, int, int]]:
+    """"gemini-2.0-flash:15:1500, gemma-3-4b-it" -> [(model, rpm, rpd), ...] (0 = không giới hạn)"""
+    models = []
+    for item in (value or default_model).split(","):
+        parts = [part.strip() for part in item.split(":")]
+        if parts[0]:
+            rpm = int(parts[1]) if len(parts) > 1 and parts[1] else 0
+            rpd = int(parts[2]) if len(parts) > 2 and parts[2] else 0
+            models.append((parts[0], rpm, rpd))
+    return models
+
+
+def create_pool(default_model: str) -> LLMPool:
+    """Pool theo LLM_MODELS (mặc định default_model) x GEMINI_API_KEYS (mặc định GEMINI_API_KEY)"""
+    keys = [key.strip() for key in os.getenv("GEMINI_API_KEYS", "").split(",") if key.strip()]
+    keys = keys or [os.getenv("GEMINI_API_KEY")]
+    members = [
+        PoolMember(llm.create_backend(model, api_key=key), f"{model}#{index}", rpm, rpd)
+        for model, rpm, rpd in parse_models(LLM_MODELS, default_model)
+        for index, key in enumerate(keys, 1)
+    ]
+    if len(members) > 1:
+        print(f"[AI] Pool {len(members)} backend: {', '.join(member.label for member in members)}")
+    return LLMPool(members)
@@ -0,0 +1,368 @@
+"""
+Lập thực đơn tuần KHÔNG gọi AI - chọn món có sẵn (món công khai + món của user) cho 7 ngày x 3 bữa
+(POST /ai/suggest-weekly-plan với "mode": "local")
+
+- Mục tiêu mỗi ngày: calories = TDEE ± điều chỉnh theo goal (app/services/nutrition.py, như bản AI);
+  protein / carbs / fat theo tỷ lệ năng lượng của goal (MACRO_SPLITS), "low carb" / "giàu đạm"... đổi tỷ lệ
+- Hạn chế ăn uống (dietary_preferences, cách nhau bởi dấu phẩy): bỏ các món có từ cấm trong tên món / tên
+  nguyên liệu - chế độ quen thuộc (chay, thuần chay, không hải sản, không sữa, không gluten) theo DIET_RULES,
+  mọi mục "không X" / "dị ứng X" / "no X" cấm X. So khớp GIỮ dấu ("bò" khác "bơ", "cá" khác "cà") khi từ cấm
+  có dấu, mục không dấu thì so khớp không dấu. Mục không hiểu được trả về trong ignored_preferences.
+- Chọn món: mỗi bữa chấm điểm TOÀN BỘ danh mục bằng phép toán vector NumPy (độ lệch dinh dưỡng so với phần còn
+  lại của ngày + phạt món không hợp bữa theo tags + phạt món đã dùng trong tuần) rồi lấy argmin. Bữa sau bù
+  sai số của bữa trước nên tổng ngày bám sát mục tiêu. Cùng dữ liệu -> cùng thực đơn (không ngẫu nhiên).
+- Danh mục món công khai được giữ trong bộ nhớ dạng mảng + index từ -> món (dựng lại khi số món / id lớn nhất
+  thay đổi hoặc sau LOCAL_PLANNER_CACHE_TTL giây); món của user đọc mỗi lần (ít dòng, có index owner_id).
+50.000 món: mỗi request (đọc món của user + lập 21 bữa + lưu) ~25-40 ms, nạp danh mục lần đầu ~2-3 s
+(xem bench_local_planner.py). Đọc danh mục + lập thực đơn chạy trên executor riêng (plan_week_async,
+LOCAL_PLANNER_WORKERS / LOCAL_PLANNER_MAX_PENDING) để không chặn event loop; chỉ 1 thread nạp lại danh mục,
+các request khác chờ rồi dùng chung.
+"""
+import functools
+import os
+import re
+import threading
+from datetime import date, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app import models
+from app.cache import TTLCache
+from app.database import SessionLocal
+from app.executors import BoundedExecutor
+from app.services import nutrition
+from app.services.meal_plan_writer import MEAL_TYPES
+from app.services.recipe_writer import normalize_name
+from app.services.search import fold_text
+from app.services.tags import parse_tags
+
+CACHE_TTL = float(os.getenv("LOCAL_PLANNER_CACHE_TTL", "300"))
+PLANNER_WORKERS = int(os.getenv("LOCAL_PLANNER_WORKERS", "2"))
+PLANNER_MAX_PENDING = int(os.getenv("LOCAL_PLANNER_MAX_PENDING", "32"))
+
+DAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+NUTRIENTS = ("calories", "protein", "carbs", "fat")
+KCAL_PER_GRAM = np.array([4.0, 4.0, 9.0])  # protein, carbs, fat
+MEAL_SHARES = np.array([0.25, 0.40, 0.35])  # Tỷ lệ năng lượng sáng / trưa / tối
+WEIGHTS = np.array([4.0, 1.0, 1.0, 1.0])  # Calories quan trọng hơn từng chất
+SLOT_PENALTY = 0.05  # Món gắn thẻ bữa khác (VD: "Dinner" cho bữa sáng) ~ lệch 11% calories cả ngày
+REPEAT_PENALTY = 0.25  # Mỗi lần món đã xuất hiện trong tuần ~ lệch 25% calories cả ngày
+
+# Tỷ lệ năng lượng protein / carbs / fat
+MACRO_SPLITS = {
+    "maintain": (0.25, 0.50, 0.25),
+    "lose": (0.30, 0.40, 0.30),
+    "gain": (0.25, 0.50, 0.25),
+}
+# Mục trong dietary_preferences (đã bỏ dấu) -> tỷ lệ năng lượng thay cho tỷ lệ của goal
+MACRO_RULES = {
+    "low carb": (0.30, 0.20, 0.50),
+    "it tinh bot": (0.30, 0.20, 0.50),
+    "keto": (0.25, 0.05, 0.70),
+    "high protein": (0.35, 0.40, 0.25),
+    "giau dam": (0.35, 0.40, 0.25),
+    "nhieu dam": (0.35, 0.40, 0.25),
+    "tang co": (0.35, 0.40, 0.25),
+}
+
+_MEAT = ("thịt", "bò", "heo", "lợn", "gà", "vịt", "ngan", "ngỗng", "dê", "cừu", "sườn", "xúc xích", "giăm bông",
+         "lạp xưởng", "chả", "pate", "meat", "beef", "pork", "chicken", "duck", "lamb", "bacon", "ham", "sausage")
+_SEAFOOD = ("cá", "tôm", "cua", "ghẹ", "mực", "bạch tuộc", "nghêu", "sò", "ốc", "hàu", "hến", "hải sản",
+            "fish", "shrimp", "prawn", "crab", "squid", "salmon", "tuna", "oyster", "clam", "seafood")
+_DAIRY = ("sữa", "phô mai", "bơ lạt", "milk", "cheese", "butter", "yogurt", "cream")
+_VEGETARIAN = _MEAT + _SEAFOOD + ("mắm",)
+_VEGAN = _VEGETARIAN + _DAIRY + ("trứng", "mật ong", "egg", "honey")
+_GLUTEN = ("mì", "bột mì", "lúa mì", "wheat", "flour", "bread", "pasta", "noodle")
+
+# Mục trong dietary_preferences (đã bỏ dấu, khớp nguyên cụm từ) -> các từ cấm
+DIET_RULES = {
+    "chay": _VEGETARIAN,
+    "an chay": _VEGETARIAN,
+    "vegetarian": _VEGETARIAN,
+    "thuan chay": _VEGAN,
+    "vegan": _VEGAN,
+    "khong thit": _MEAT,
+    "no meat": _MEAT,
+    "khong hai san": _SEAFOOD,
+    "di ung hai san": _SEAFOOD,
+    "no seafood": _SEAFOOD,
+    "khong sua": _DAIRY,
+    "khong lactose": _DAIRY,
+    "lactose free": _DAIRY,
+    "dairy free": _DAIRY,
+    "khong gluten": _GLUTEN,
+    "gluten free": _GLUTEN,
+}
+# "không X", "dị ứng X"... (đã bỏ dấu) -> cấm X
+_EXCLUDE_PREFIX = re.compile(r"^(khong an|khong dung|khong|kieng|di ung|tranh|no|without|avoid) (.+)$")
+
+# Thẻ (đã chuẩn hóa như recipe_tags) cho biết món hợp bữa sáng / trưa / tối
+SLOT_TAGS = (
+    {"breakfast", "sang", "bua sang", "an sang"},
+    {"lunch", "trua", "bua trua", "an trua"},
+    {"dinner", "toi", "bua toi", "an toi"},
+)
+
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+class LocalPlanError(Exception):
+    """Không lập được thực đơn (thông báo dùng làm detail của lỗi 400)"""
+
+
+@functools.lru_cache(maxsize=65536)
+def _fold_word(word: str) -> str:
+    return fold_text(word)
+
+
+@functools.lru_cache(maxsize=4096)
+def _slot_flags(tags: Optional[str]) -> Tuple[bool, ...]:
+    """Chuỗi tags ("Lunch,Dinner") -> món hợp bữa sáng / trưa / tối? (chuỗi tags lặp lại rất nhiều -> cache)"""
+    parsed = set(parse_tags(tags))
+    return tuple(not parsed.isdisjoint(aliases) for aliases in SLOT_TAGS)
+
+
+def _words(text: str) -> List[str]:
+    """Các từ còn dấu (chữ thường, NFC)"""
+    return _WORD_RE.findall(normalize_name(text))
+
+
+# --- 1. DANH MỤC MÓN DẠNG MẢNG ---
+class Catalog:
+    """
+    Danh mục món cho planner: nutrition (N x 4: calories, protein, carbs, fat - NaN nếu thiếu),
+    thẻ bữa (N x 3) và index từ -> món (còn dấu / bỏ dấu) để lọc theo hạn chế ăn uống
+    """
+
+    def __init__(self, recipes: Sequence[Tuple], ingredients: Sequence[Tuple[int, str]] = ()):
+        """
+        - recipes: (id, name, calories, protein, carbs, fat, tags)
+        - ingredients: (recipe_id, tên nguyên liệu)
+        """
+        self.ids = np.array([row[0] for row in recipes], dtype=np.int64)
+        self.names = [row[1] or "" for row in recipes]
+        self.nutrition = np.array(
+            [[np.nan if value is None else value for value in row[2:6]] for row in recipes], dtype=np.float64
+        ).reshape(len(recipes), 4)
+        self.slot_tags = np.array([_slot_flags(row[6]) for row in recipes], dtype=bool).reshape(len(recipes), len(SLOT_TAGS))
+
+        position = {recipe_id: index for index, recipe_id in enumerate(self.ids.tolist())}
+        texts = [[name] for name in self.names]
+        for recipe_id, name in ingredients:
+            index = position.get(recipe_id)
+            if index is not None and name:
+                texts[index].append(name)
+
+        accented: Dict[str, List[int]] = {}
+        folded: Dict[str, List[int]] = {}
+        for index, text in enumerate(texts):
+            words = set(_words(" ".join(text)))
+            for word in words:
+                accented.setdefault(word, []).append(index)
+            for word in {_fold_word(word) for word in words}:
+                folded.setdefault(word, []).append(index)
+        # Danh sách index tăng dần (duyệt món theo thứ tự) -> mảng để lọc bằng NumPy
+        self._accented = {word: np.array(indexes, dtype=np.int64) for word, indexes in accented.items()}
+        self._folded = {word: np.array(indexes, dtype=np.int64) for word, indexes in folded.items()}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def matching(self, phrase: str) -> np.ndarray:
+        """Index các món có đủ mọi từ của phrase (phrase có dấu -> so khớp có dấu, ngược lại bỏ dấu)"""
+        words = _words(phrase)
+        if not words:
+            return np.empty(0, dtype=np.int64)
+        plain = [_fold_word(word) for word in words]
+        index, words = (self._folded, plain) if plain == words else (self._accented, words)
+        found = None
+        for word in words:
+            postings = index.get(word)
+            if postings is None:
+                return np.empty(0, dtype=np.int64)
+            found = postings if found is None else np.intersect1d(found, postings, assume_unique=True)
+        return found
+
+    def excluded(self, phrases: Sequence[str]) -> np.ndarray:
+        """Mask các món chứa ít nhất 1 từ cấm"""
+        mask = np.zeros(len(self), dtype=bool)
+        for phrase in phrases:
+            mask[self.matching(phrase)] = True
+        return mask
+
+
+def _load_catalog(db: Session, *conditions) -> Catalog:
+    """Các món có calories > 0 thỏa conditions + tên nguyên liệu (2 câu SELECT)"""
+    conditions = conditions + (models.Recipe.calories > 0,)
+    recipes = db.execute(
+        select(models.Recipe.id, models.Recipe.name, models.Recipe.calories, models.Recipe.protein,
+               models.Recipe.carbs, models.Recipe.fat, models.Recipe.tags)
+        .where(*conditions)
+        .order_by(models.Recipe.id)
+    ).all()
+    if not recipes:
+        return Catalog([])
+    ingredients = db.execute(
+        select(models.Ingredient.recipe_id, models.Ingredient.name)
+        .join(models.Recipe, models.Ingredient.recipe_id == models.Recipe.id)
+        .where(*conditions)
+    ).all()
+    return Catalog(recipes, ingredients)
+
+
+_public_cache = TTLCache(ttl_seconds=CACHE_TTL)
+_public_load_lock = threading.Lock()
+
+
+def load_catalogs(db: Session, user_id: int) -> List[Catalog]:
+    """[món công khai (cache trong bộ nhớ), món của user] - các món user xem được"""
+    is_public = models.Recipe.owner_id.is_(None)
+    # Thêm / xóa món công khai -> số món hoặc id lớn nhất đổi -> dựng lại danh mục (sửa món: chờ hết TTL)
+    version = tuple(db.execute(select(func.count(), func.max(models.Recipe.id)).where(is_public)).one())
+    with _public_load_lock:  # Cache hết hạn: 1 thread nạp lại, các thread khác chờ rồi dùng kết quả đó
+        cached = _public_cache.get("public")
+        if cached is not None and cached[0][0] == version:
+            public = cached[0][1]
+        else:
+            public = _load_catalog(db, is_public)
+            _public_cache.set("public", (version, public))
+            print(f"[PLANNER] Đã nạp {len(public)} món công khai vào bộ nhớ")
+    return [public, _load_catalog(db, models.Recipe.owner_id == user_id)]
+
+
+# --- 2. MỤC TIÊU DINH DƯỠNG + HẠN CHẾ ĂN UỐNG ---
+class Preferences(NamedTuple):
+    excluded: List[str]  # Từ / cụm từ cấm
+    macro_split: Optional[Tuple[float, float, float]]  # Tỷ lệ năng lượng protein / carbs / fat (None = theo goal)
+    ignored: List[str]  # Mục không hiểu được
+
+
+def _contains(text: str, phrase: str) -> bool:
+    return f" {phrase} " in f" {text} "
+
+
+def parse_preferences(dietary_preferences: Optional[str]) -> Preferences:
+    """Tách dietary_preferences ("Ăn chay, không nấm, low carb") thành từ cấm + tỷ lệ chất"""
+    excluded: List[str] = []
+    macro_split = None
+    ignored: List[str] = []
+    for item in (dietary_preferences or "").replace(";", ",").split(","):
+        plain = fold_text(item)
+        if not plain:
+            continue
+        rules = [phrases for key, phrases in DIET_RULES.items() if _contains(plain, key)]
+        splits = [split for key, split in MACRO_RULES.items() if _contains(plain, key)]
+        if rules:
+            excluded.extend(phrase for phrases in rules for phrase in phrases)
+        elif _EXCLUDE_PREFIX.match(plain):
+            # Giữ dấu của phần sau tiền tố: "Không ăn bơ" -> cấm "bơ" (không cấm "bò")
+            prefix_words = len(_EXCLUDE_PREFIX.match(plain).group(1).split())
+            excluded.append(" ".join(_words(item)[prefix_words:]))
+        if splits:
+            macro_split = splits[0]
+        if not rules and not splits and not _EXCLUDE_PREFIX.match(plain):
+            ignored.append(item.strip())
+    return Preferences(list(dict.fromkeys(excluded)), macro_split, ignored)
+
+
+def daily_targets(user_data: dict, preferences: Preferences) -> np.ndarray:
+    """[calories, protein (g), carbs (g), fat (g)] mỗi ngày"""
+    calories = nutrition.daily_calorie_target(user_data)
+    split = preferences.macro_split or MACRO_SPLITS.get(user_data.get("goal", "maintain"), MACRO_SPLITS["maintain"])
+    return np.concatenate([[calories], calories * np.array(split) / KCAL_PER_GRAM])
+
+
+# --- 3. LẬP THỰC ĐƠN ---
+def _nutrition_view(values: np.ndarray) -> Dict[str, Optional[float]]:
+    return {name: None if np.isnan(value) else round(float(value), 1) for name, value in zip(NUTRIENTS, values)}
+
+
+def plan_week(catalogs: Sequence[Catalog], user_data: dict, start_date: date, days: int = 7) -> Dict[str, Any]:
+    """
+    Chọn sáng / trưa / tối cho `days` ngày từ start_date
+    Trả về {total_calories_per_day, targets, meal_plan: [{day, date, breakfast, lunch, dinner, totals}], ...};
+    mỗi bữa: {recipe_id, name, calories, protein, carbs, fat}. Không đủ món -> LocalPlanError.
+    """
+    preferences = parse_preferences(user_data.get("dietary_preferences"))
+    targets = daily_targets(user_data, preferences)
+    if targets[0] <= 0:
+        raise LocalPlanError("Calories mục tiêu không hợp lệ - kiểm tra cân nặng, chiều cao, ngày sinh trong profile")
+
+    excluded = np.concatenate([catalog.excluded(preferences.excluded) for catalog in catalogs])
+    raw = np.concatenate([catalog.nutrition for catalog in catalogs])
+    allowed = np.flatnonzero(~excluded & (raw[:, 0] > 0))
+    if len(allowed) < len(MEAL_TYPES):
+        raise LocalPlanError(
+            f"Không đủ món phù hợp để lập thực đơn ({len(allowed)} món có calories và hợp hạn chế ăn uống, "
+            f"cần ít nhất {len(MEAL_TYPES)}) - thêm món hoặc dùng chế độ AI"
+        )
+    ids = np.concatenate([catalog.ids for catalog in catalogs])[allowed]
+    offsets = np.cumsum([0] + [len(catalog) for catalog in catalogs])
+    raw = raw[allowed]
+    slot_tags = np.concatenate([catalog.slot_tags for catalog in catalogs])[allowed]
+
+    # Món thiếu protein / carbs / fat -> coi như đúng tỷ lệ mục tiêu (không được lợi / bị phạt)
+    filled = raw.copy()
+    default = filled[:, :1] * (targets[1:] / targets[0])
+    filled[:, 1:] = np.where(np.isnan(filled[:, 1:]), default, filled[:, 1:])
+
+    # Đơn vị = phần của mục tiêu cả ngày. Chi phí = sum(w * (x - g)^2) = sum(w * x^2) - 2 x.(w * g) + sum(w * g^2):
+    # phần không phụ thuộc g tính 1 lần cho mỗi bữa, mỗi lần chọn chỉ còn 1 phép nhân ma trận - vector + argmin
+    # (sum(w * g^2) như nhau với mọi món -> bỏ)
+    scaled = filled / targets
+    weighted = scaled * WEIGHTS
+    squared = (scaled * weighted).sum(axis=1)
+    slot_penalty = SLOT_PENALTY * (slot_tags.any(axis=1, keepdims=True) & ~slot_tags)
+    base_costs = [np.ascontiguousarray(squared + slot_penalty[:, slot]) for slot in range(len(MEAL_TYPES))]
+    used: Dict[int, int] = {}  # Món đã dùng trong tuần -> số lần (phạt lặp lại)
+
+    meal_plan = []
+    for day_index in range(days):
+        current_date = start_date + timedelta(days=day_index)
+        consumed = np.zeros(len(NUTRIENTS))
+        chosen = []
+        day = {"day": DAY_NAMES[current_date.weekday()], "date": current_date.isoformat()}
+        for slot, (_, key) in enumerate(MEAL_TYPES):
+            # Bữa này nhận phần còn lại của ngày theo tỷ lệ MEAL_SHARES của các bữa còn lại
+            goal = np.maximum(1.0 - consumed, 0.0) * (MEAL_SHARES[slot] / MEAL_SHARES[slot:].sum())
+            cost = base_costs[slot] - 2.0 * (weighted @ goal)
+            for index, count in used.items():
+                cost[index] += REPEAT_PENALTY * count
+            cost[chosen] = np.inf  # Không lặp món trong cùng 1 ngày
+            best = int(np.argmin(cost))
+            consumed += scaled[best]
+            used[best] = used.get(best, 0) + 1
+            chosen.append(best)
+            position = int(allowed[best])
+            catalog_index = int(np.searchsorted(offsets, position, side="right")) - 1
+            name = catalogs[catalog_index].names[position - offsets[catalog_index]]
+            day[key] = {"recipe_id": int(ids[best]), "name": name, **_nutrition_view(raw[best])}
+        day["totals"] = _nutrition_view(filled[chosen].sum(axis=0))
+        meal_plan.append(day)
+
+    return {
+        "total_calories_per_day": round(float(targets[0])),
+        "targets": _nutrition_view(targets),
+        "meal_plan": meal_plan,
+        "candidates": len(allowed),
+        "excluded_by_preferences": int(excluded.sum()),
+        "ignored_preferences": preferences.ignored,
+    }
+
+
+# --- 4. CHẠY NGOÀI EVENT LOOP ---
+planner_executor = BoundedExecutor("local-planner", PLANNER_WORKERS, PLANNER_MAX_PENDING)
+
+
+def _plan_with_new_session(user_id: int, user_data: dict, start_date: date) -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        return plan_week(load_catalogs(db, user_id), user_data, start_date)
+    finally:
+        db.close()
+
+
+async def plan_week_async(user_id: int, user_data: dict, start_date: date) -> Dict[str, Any]:
+    """Đọc danh mục (session đồng bộ riêng) + plan_week trên planner_executor; đầy hàng đợi -> ExecutorBusy (503)"""
+    return await planner_executor.run(_plan_with_new_session, user_id, user_data, start_date)
@@ -0,0 +1,161 @@
+"""
+Lưu thực đơn tuần do AI tạo (recipes + meal_plans) - dùng chung cho route /ai/suggest-weekly-plan
+và job nền (app/services/ai_jobs.py, worker.py); save_local_plan lưu thực đơn của local_planner
+
+- Recipes: tạo tất cả rồi flush 1 lần (mỗi bảng 1 câu INSERT theo lô - xem recipe_writer); món trùng
+  nội dung (content_hash) với món user đã có -> dùng lại món cũ, không INSERT
+- Meal plans: 1 câu DELETE các lịch cũ trong 7 ngày, rồi INSERT theo lô
+- Tên món trong meal_plan được khớp với tên món đã lưu qua RecipeResolver (recipe_resolver.py, index
+  dựng 1 lần cho cả thực đơn); AI đặt tên món không có trong recipes -> tìm trong các món user đã có
+  (match_existing), vẫn không khớp được -> WeeklyPlanSaveError
+Các hàm không commit - người gọi tự commit (1 transaction).
+"""
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+from app import models
+from app.services import recipe_writer
+from app.services.recipe_resolver import Match, RecipeResolver, user_catalog
+
+MEAL_TYPES = (("Breakfast", "breakfast"), ("Lunch", "lunch"), ("Dinner", "dinner"))
+
+
+class WeeklyPlanSaveError(Exception):
+    """Không lưu được thực đơn (thông báo dùng làm detail của lỗi 500 / lỗi của job)"""
+
+
+def match_existing(catalog: RecipeResolver, name: str) -> Optional[Match]:
+    """
+    Món user đã có khớp với tên (chỉ exact / case / folded): cả danh mục của user rất rộng, khớp fuzzy theo
+    từ chung dễ lấy nhầm món khác ("Cơm gà" -> "Cơm gà xối mỡ"), thà báo lỗi còn hơn ghi sai lịch
+    """
+    found = catalog.match(name)
+    if found is None or found.kind == "fuzzy":
+        return None
+    return found
+
+
+def delete_week(db: Session, user_id: int, start_date: date) -> int:
+    """XÓA các meal plans cũ trong 7 ngày từ start_date - 1 câu DELETE ... WHERE. Trả về số dòng đã xóa."""
+    end_date = start_date + timedelta(days=6)
+    return db.execute(
+        delete(models.MealPlan).where(
+            models.MealPlan.owner_id == user_id,
+            models.MealPlan.date >= start_date,
+            models.MealPlan.date <= end_date
+        ).execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def save_weekly_plan(db: Session, user_id: int, ai_result: Dict[str, Any], start_date: date) -> Dict[str, Any]:
+    """
+    Lưu recipes + meal plans 7 ngày bắt đầu từ start_date (thay lịch cũ trong khoảng đó), KHÔNG commit
+    Trả về nội dung response của /ai/suggest-weekly-plan.
+    """
+    # Log để debug: Kiểm tra tên recipes vs meal_plan
+    recipe_names = [r["name"] for r in ai_result.get("recipes", [])]
+    print(f"[AI] Tên recipes từ AI: {recipe_names}")
+
+    meal_plan_names = [
+        day.get(key, {}).get("name")
+        for day in ai_result.get("meal_plan", [])
+        for _, key in MEAL_TYPES
+    ]
+    missing_names = [name for name in meal_plan_names if name and name not in recipe_names]
+    if missing_names:
+        print(f"[AI] CẢNH BÁO: Có {len(missing_names)} tên trong meal_plan không khớp với recipes: {missing_names}")
+
+    # Lưu recipes vào database
+    resolver = RecipeResolver()
+    catalog = None  # Món user đã có - chỉ đọc khi có tên không khớp món nào của thực đơn
+    try:
+        new_recipes = [
+            recipe_writer.build_recipe(
+                user_id,
+                recipe_writer.ingredients_from_ai(recipe_data),
+                **recipe_writer.recipe_fields_from_ai(recipe_data)
+            )
+            for recipe_data in ai_result["recipes"]
+        ]
+        saved = recipe_writer.add_or_reuse_recipes(db, new_recipes)
+        # Khớp theo tên AI viết (món cũ dùng lại có thể khác hoa thường / khoảng trắng)
+        for new_recipe, (recipe, _) in zip(new_recipes, saved):
+            resolver.add(new_recipe.name, recipe.id)
+        recipes_reused = sum(1 for _, reused in saved if reused)
+        print(f"[AI] Đã lưu {len(saved) - recipes_reused} recipes vào database, dùng lại {recipes_reused} món đã có")
+    except Exception as e:
+        print(f"[AI] Lỗi khi lưu recipes: {str(e)}")
+        raise WeeklyPlanSaveError(f"Lỗi khi lưu recipes vào database: {str(e)}") from e
+
+    # Lưu meal_plans vào database
+    try:
+        deleted_count = delete_week(db, user_id, start_date)
+        print(f"[AI] Đã xóa {deleted_count} meal plans cũ")
+
+        new_plans = []
+        for day_index, day_plan in enumerate(ai_result["meal_plan"]):
+            current_date = start_date + timedelta(days=day_index)
+            for meal_type, key in MEAL_TYPES:
+                recipe_name = day_plan[key]["name"]
+                found = resolver.match(recipe_name)
+                if found is None:
+                    if catalog is None:
+                        catalog = user_catalog(db, user_id)
+                    found = match_existing(catalog, recipe_name)
+                    if found is not None:
+                        print(f"[AI] Dùng món đã có: '{recipe_name}' -> '{found.name}'")
+                if found is None:
+                    print(f"[AI] KHÔNG tìm thấy recipe: '{recipe_name}'")
+                    raise WeeklyPlanSaveError(
+                        f"Không tìm thấy recipe: '{recipe_name}'. "
+                        f"Các recipes có sẵn: {', '.join(resolver.names()[:5])}"
+                    )
+                if found.kind == "fuzzy":
+                    print(f"[AI] Fuzzy match (score {found.score}): '{recipe_name}' -> '{found.name}'")
+                new_plans.append(models.MealPlan(
+                    date=current_date,
+                    meal_type=meal_type,
+                    servings=1,
+                    owner_id=user_id,
+                    recipe_id=found.recipe_id
+                ))
+
+        # Thêm tất cả meal plans 1 lần (INSERT theo lô)
+        db.add_all(new_plans)
+        db.flush()
+        print(f"[AI] Đã tạo {len(new_plans)} meal plans")
+    except Exception as e:
+        print(f"[AI] Lỗi khi lưu meal plans: {str(e)}")
+        raise WeeklyPlanSaveError(f"Lỗi khi lưu meal plans vào database: {str(e)}") from e
+
+    return {
+        "message": "✅ Đã tạo thực đơn tuần và lưu vào database!",
+        "total_calories_per_day": ai_result["total_calories_per_day"],
+        "meal_plan": ai_result["meal_plan"],
+        "recipes_created": len(saved) - recipes_reused,
+        "recipes_reused": recipes_reused,
+        "meal_plans_created": len(new_plans)
+    }
+
+
+def save_local_plan(db: Session, user_id: int, meal_plan: List[Dict[str, Any]], start_date: date) -> int:
+    """
+    Lưu thực đơn của local_planner (món đã có sẵn -> chỉ ghi meal_plans, thay lịch cũ trong 7 ngày), KHÔNG commit
+    Trả về số meal plans đã tạo.
+    """
+    delete_week(db, user_id, start_date)
+    new_plans = [
+        models.MealPlan(
+            date=start_date + timedelta(days=day_index),
+            meal_type=meal_type,
+            servings=1,
+            owner_id=user_id,
+            recipe_id=day_plan[key]["recipe_id"]
+        )
+        for day_index, day_plan in enumerate(meal_plan)
+        for meal_type, key in MEAL_TYPES
+    ]
+    db.add_all(new_plans)
+    db.flush()
+    return len(new_plans)
@@ -0,0 +1,49 @@
+"""
+Tính nhu cầu năng lượng của user (không phụ thuộc Gemini) - dùng chung cho ai_service và local_planner
+
+- BMR theo công thức Mifflin-St Jeor
+- TDEE = BMR x hệ số vận động (ACTIVITY_MULTIPLIERS)
+- Calories mục tiêu = TDEE + điều chỉnh theo mục tiêu (GOAL_ADJUSTMENTS: giảm / giữ / tăng cân)
+"""
+from datetime import date
+
+ACTIVITY_MULTIPLIERS = {
+    "sedentary": 1.2,
+    "light": 1.375,
+    "moderate": 1.55,
+    "active": 1.725,
+    "very_active": 1.9
+}
+
+GOAL_ADJUSTMENTS = {
+    "maintain": 0,
+    "lose": -500,
+    "gain": 500
+}
+
+
+def calculate_bmr(gender: str, weight: float, height: float, age: int) -> float:
+    """Tính BMR (Basal Metabolic Rate) theo công thức Mifflin-St Jeor"""
+    if gender.lower() == "male":
+        bmr = (10 * weight) + (6.25 * height) - (5 * age) + 5
+    else:
+        bmr = (10 * weight) + (6.25 * height) - (5 * age) - 161
+    return round(bmr, 2)
+
+
+def calculate_age(date_of_birth: date) -> int:
+    """Tính tuổi từ ngày sinh"""
+    today = date.today()
+    return today.year - date_of_birth.year - ((today.month, today.day) < (date_of_birth.month, date_of_birth.day))
+
+
+def calculate_tdee(user_data: dict) -> float:
+    """TDEE (Total Daily Energy Expenditure) từ user_data (gender, weight, height, date_of_birth, activity_level)"""
+    age = calculate_age(date.fromisoformat(user_data["date_of_birth"]))
+    bmr = calculate_bmr(user_data["gender"], user_data["weight"], user_data["height"], age)
+    return bmr * ACTIVITY_MULTIPLIERS.get(user_data.get("activity_level", "moderate"), 1.55)
+
+
+def daily_calorie_target(user_data: dict) -> float:
+    """Calories mục tiêu mỗi ngày = TDEE + điều chỉnh theo goal (chưa làm tròn)"""
+    return calculate_tdee(user_data) + GOAL_ADJUSTMENTS.get(user_data.get("goal", "maintain"), 0)
@@ -0,0 +1,37 @@
+"""
+Mã hóa / kiểm tra mật khẩu trên executor riêng, có giới hạn (app/executors.py)
+
+bcrypt tốn ~250 ms CPU mỗi lần (cost 12). Chạy trực tiếp trong route, một đợt đăng nhập dồn dập
+sẽ chiếm hết threadpool / chặn event loop và làm chậm mọi request khác.
+- Hash chạy trên PASSWORD_HASH_WORKERS thread riêng. Thư viện bcrypt nhả GIL khi tính toán nên
+  các thread chạy song song thật, nhưng không bao giờ dùng quá số thread này.
+- Hàng đợi có giới hạn (PASSWORD_HASH_MAX_PENDING): vượt quá -> ExecutorBusy (503)
+  thay vì xếp hàng vô hạn.
+- Đăng nhập thành công với hash cũ (scheme/cost không còn như cấu hình) -> trả về hash mới
+  (CryptContext.verify_and_update) để route lưu lại.
+Cấu hình scheme và cost: PASSWORD_SCHEMES, PASSWORD_BCRYPT_ROUNDS (xem app/utils.py).
+"""
+import os
+from typing import Any, Dict, Optional, Tuple
+from app import utils
+from app.executors import BoundedExecutor
+
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+hasher = BoundedExecutor("password-hash", HASH_WORKERS, MAX_PENDING)
+
+
+async def hash_password(password: str) -> str:
+    return await hasher.run(utils.get_password_hash, password)
+
+
+async def verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    (đúng mật khẩu?, hash mới nếu hash cũ cần nâng cấp - None nếu không cần)
+    """
+    return await hasher.run(utils.pwd_context.verify_and_update, password, hashed_password)
+
+
+def stats() -> Dict[str, Any]:
+    return {"schemes": utils.pwd_context.schemes(), **hasher.stats()}
@@ -0,0 +1,106 @@
+"""
+Tổng hợp đánh giá trên Recipe (rating_count, rating_sum, rating_avg)
+
+- Mỗi lần thêm/sửa/xóa rating: 1 câu UPDATE cộng dồn ngay trong DB
+  (rating_count = rating_count + 1, ...) nên 2 request song song không ghi đè nhau.
+  Gọi trong cùng transaction với thay đổi của bảng ratings (commit chung).
+- Chênh lệch (sao mới - sao cũ, số sao bị xóa) tính từ dòng rating đọc ra: gọi lock_recipe_ratings trước khi
+  đọc để các thay đổi rating của cùng 1 món chạy lần lượt (không tính 2 lần từ cùng giá trị cũ / thêm trùng).
+- reconcile_rating_aggregates: tính lại từ bảng ratings, sửa các món bị lệch
+  (dữ liệu cũ, sửa tay trong DB, ...). Chạy định kỳ bằng reconcile_ratings.py
+  hoặc POST /admin/ratings/reconcile.
+"""
+from typing import Iterable, Optional
+from sqlalchemy import Float, and_, case, cast, func, literal_column, or_, select, update
+from sqlalchemy.orm import Session
+from app import models
+
+RATED_SORTS = ("id", "avg")
+
+# Viết số 0 trực tiếp (không bind param) để khớp điều kiện của partial index
+# ix_recipes_rated_id / ix_recipes_rated_avg (SQLite không dùng partial index với tham số ?)
+is_rated = models.Recipe.rating_count > literal_column("0")
+
+
+def apply_rating_delta(db: Session, recipe_id: int, count_delta: int, stars_delta: int) -> None:
+    """
+    Cộng dồn thay đổi vào tổng hợp đánh giá của 1 món
+    - Thêm rating: (+1, +stars) / Xóa: (-1, -stars) / Sửa số sao: (0, sao_mới - sao_cũ)
+    Vế phải của SET luôn đọc giá trị CŨ của dòng nên rating_avg tính từ các giá trị mới.
+    """
+    if not count_delta and not stars_delta:
+        return
+    new_count = models.Recipe.rating_count + count_delta
+    new_sum = models.Recipe.rating_sum + stars_delta
+    db.execute(
+        update(models.Recipe)
+        .where(models.Recipe.id == recipe_id)
+        .values(
+            rating_count=new_count,
+            rating_sum=new_sum,
+            rating_avg=case((new_count > 0, cast(new_sum, Float) / new_count), else_=None),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def lock_recipe_ratings(db: Session, recipe_id: int) -> bool:
+    """
+    Khóa dòng Recipe (SELECT ... FOR UPDATE) tới hết transaction trước khi đọc rating để thêm/sửa/xóa
+    - Mọi thay đổi rating đều UPDATE dòng này nên khóa cùng 1 thứ tự, không deadlock
+    - SQLite bỏ qua FOR UPDATE (ghi đã tuần tự theo cả file)
+    Trả về False nếu món không tồn tại.
+    """
+    locked = db.execute(
+        select(models.Recipe.id).where(models.Recipe.id == recipe_id).with_for_update()
+    ).first()
+    return locked is not None
+
+
+def rated_sort_keys(sort: str):
+    """
+    Cột sắp xếp cho /recipes/rated: (keys, descending) - dùng cho cả ORDER BY lẫn cursor
+    - sort="id": theo id (mặc định) / sort="avg": điểm trung bình cao nhất trước
+    """
+    if sort == "avg":
+        return [models.Recipe.rating_avg, models.Recipe.id], True
+    return [models.Recipe.id], False
+
+
+def reconcile_rating_aggregates(db: Session, recipe_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Tính lại tổng hợp đánh giá từ bảng ratings cho các món bị lệch (1 câu UPDATE)
+    - recipe_ids: chỉ kiểm tra các món này (mặc định: tất cả)
+    Trả về số món đã được sửa. Không commit - người gọi tự commit.
+    """
+    actual_count = (
+        select(func.count(models.Rating.id))
+        .where(models.Rating.recipe_id == models.Recipe.id)
+        .scalar_subquery()
+    )
+    actual_sum = (
+        select(func.coalesce(func.sum(models.Rating.stars), 0))
+        .where(models.Rating.recipe_id == models.Recipe.id)
+        .scalar_subquery()
+    )
+    actual_avg = (
+        select(cast(func.avg(models.Rating.stars), Float))
+        .where(models.Rating.recipe_id == models.Recipe.id)
+        .scalar_subquery()
+    )
+
+    drifted = or_(
+        models.Recipe.rating_count != actual_count,
+        models.Recipe.rating_sum != actual_sum,
+        and_(models.Recipe.rating_count > 0, models.Recipe.rating_avg.is_(None)),
+    )
+    statement = (
+        update(models.Recipe)
+        .where(drifted)
+        .values(rating_count=actual_count, rating_sum=actual_sum, rating_avg=actual_avg)
+        .execution_options(synchronize_session=False)
+    )
+    if recipe_ids is not None:
+        statement = statement.where(models.Recipe.id.in_(list(recipe_ids)))
+
+    return db.execute(statement).rowcount
@@ -0,0 +1,139 @@
+"""
+Khớp tên món AI viết trong meal_plan với món đã lưu (hoặc với danh sách món sẵn có của user)
+
+Thay cho find_recipe_id cũ (tối đa 4 lần duyệt toàn bộ danh sách cho MỖI bữa + in log từng bước):
+index được dựng 1 lần cho cả thực đơn, mỗi lần tra chỉ đụng tới các món có chung từ.
+Thứ tự khớp (dừng ở bước đầu tiên tìm thấy):
+1. exact: đúng tên (bỏ khoảng trắng 2 đầu) - dict, O(1)
+2. case: không phân biệt hoa thường, khoảng trắng thừa ("Phở  bò" == "phở bò")
+3. folded: bỏ dấu + ký tự lạ ("Pho bo!" == "Phở Bò"), kể cả khác nhau chỉ ở khoảng trắng ("Phởbò" == "Phở bò").
+   Bỏ dấu làm trùng tên khác nghĩa ("Bún bò" / "Bún bơ") -> nếu có món chứa đủ các từ CÓ DẤU của tên cần tìm
+   ("Bún bò Huế") thì ưu tiên món đó
+4. fuzzy: chấm điểm theo số từ chung (đã bỏ dấu) qua index từ -> món; nhận khi chung >= 2 từ hoặc
+   tên 1 từ nằm trong tên kia ("Phở" -> "Phở bò"); bằng điểm -> tỷ lệ từ chung cao hơn, rồi món thêm trước
+Trùng tên sau chuẩn hóa -> giữ món thêm trước.
+"""
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app import models
+from app.services.recipe_writer import normalize_name
+from app.services.search import fold_text
+
+
+class Match(NamedTuple):
+    recipe_id: int
+    name: str  # Tên món được khớp
+    kind: str  # "exact" / "case" / "folded" / "fuzzy"
+    score: float  # 1.0 với các bước khớp chính xác, tỷ lệ từ chung (Jaccard) với fuzzy
+
+
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+def _words(case_key: str) -> Set[str]:
+    """Các từ còn nguyên dấu (chữ thường, bỏ ký tự lạ)"""
+    return set(_WORD_RE.findall(case_key))
+
+
+class RecipeResolver:
+    """Index tên món -> recipe_id, thêm dần bằng add() (VD: từng món trong stream)"""
+
+    def __init__(self, recipes: Iterable[Tuple[str, int]] = ()):
+        self._names: List[str] = []
+        self._ids: List[int] = []
+        self._tokens: List[Set[str]] = []  # Từ đã bỏ dấu
+        self._words: List[Set[str]] = []  # Từ còn dấu
+        self._exact: Dict[str, int] = {}
+        self._case: Dict[str, int] = {}
+        self._folded: Dict[str, int] = {}
+        self._compact: Dict[str, int] = {}
+        self._postings: Dict[str, List[int]] = {}
+        for name, recipe_id in recipes:
+            self.add(name, recipe_id)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def names(self) -> List[str]:
+        return list(self._names)
+
+    def add(self, name: str, recipe_id: int) -> None:
+        name = (name or "").strip()
+        index = len(self._ids)
+        self._names.append(name)
+        self._ids.append(recipe_id)
+        folded = fold_text(name)
+        tokens = set(folded.split())
+        self._tokens.append(tokens)
+        case_key = normalize_name(name)
+        self._words.append(_words(case_key))
+        self._exact.setdefault(name, index)
+        self._case.setdefault(case_key, index)
+        if folded:
+            self._folded.setdefault(folded, index)
+            self._compact.setdefault(folded.replace(" ", ""), index)
+        for token in tokens:
+            self._postings.setdefault(token, []).append(index)
+
+    def _match(self, index: int, kind: str, score: float = 1.0) -> Match:
+        return Match(self._ids[index], self._names[index], kind, score)
+
+    def match(self, name: str) -> Optional[Match]:
+        """Món khớp nhất với tên (kèm cách khớp), None nếu không có món nào đủ giống"""
+        name = (name or "").strip()
+        if not name:
+            return None
+        if name in self._exact:
+            return self._match(self._exact[name], "exact")
+        case_key = normalize_name(name)
+        if case_key in self._case:
+            return self._match(self._case[case_key], "case")
+        folded = fold_text(name)
+        if not folded:
+            return None
+        tokens = set(folded.split())
+        folded_index = self._folded.get(folded, self._compact.get(folded.replace(" ", "")))
+        words = _words(case_key)
+        if folded_index is not None and self._words[folded_index] == words:
+            return self._match(folded_index, "folded")
+
+        # Khác dấu: món chứa đủ các từ có dấu ("Bún bò" -> "Bún bò Huế") đáng tin hơn món trùng khi bỏ dấu ("Bún bơ")
+        candidates = {index for token in tokens for index in self._postings.get(token, ())}
+        containing = [index for index in candidates if words <= self._words[index]]
+        if containing:
+            best = max(containing, key=lambda index: (len(words) / len(self._words[index]), -index))
+            return self._match(best, "fuzzy", round(len(words) / len(self._words[best]), 3))
+        if folded_index is not None:
+            return self._match(folded_index, "folded")
+
+        common = Counter(index for token in tokens for index in self._postings.get(token, ()))
+        best, best_key = None, None
+        for index, shared in common.items():
+            candidate = self._tokens[index]
+            if shared < 2 and shared < min(len(tokens), len(candidate)):
+                continue
+            # Nhiều từ chung hơn -> tỷ lệ từ chung (Jaccard) cao hơn -> thêm trước
+            key = (shared, shared / len(tokens | candidate), -index)
+            if best_key is None or key > best_key:
+                best, best_key = index, key
+        if best is None:
+            return None
+        return self._match(best, "fuzzy", round(best_key[1], 3))
+
+    def resolve(self, name: str) -> Optional[int]:
+        """recipe_id của món khớp nhất, None nếu không có"""
+        found = self.match(name)
+        return found.recipe_id if found else None
+
+
+def user_catalog(db: Session, user_id: int) -> RecipeResolver:
+    """Resolver trên các món user đã có (món mới nhất được ưu tiên khi trùng tên)"""
+    rows = db.execute(
+        select(models.Recipe.name, models.Recipe.id)
+        .where(models.Recipe.owner_id == user_id)
+        .order_by(models.Recipe.id.desc())
+    )
+    return RecipeResolver(rows)
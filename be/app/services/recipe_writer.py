@@ -0,0 +1,186 @@
+"""
+Ghi công thức món ăn theo lô (batch) - dùng chung cho routers recipes và ai
+
+- Tạo món: recipe + ingredients + tags gắn qua relationship rồi flush 1 lần. SQLAlchemy gom
+  INSERT của mỗi bảng thành 1 lô (INSERT ... VALUES (...), (...) RETURNING id), nên số câu lệnh
+  không phụ thuộc số nguyên liệu hay số món. Người gọi commit 1 lần (1 transaction).
+- Sửa món: so sánh (diff) nguyên liệu cũ/mới theo tên - dòng không đổi giữ nguyên,
+  dòng đổi số lượng/đơn vị thì UPDATE, dòng mới INSERT, dòng bị bỏ DELETE.
+- Mỗi món có content_hash = dấu vân tay của tên + tập tên nguyên liệu (đã chuẩn hóa). Món AI tạo
+  trùng dấu vân tay với món user đã có -> dùng lại món cũ, không INSERT thêm (add_or_reuse_recipes).
+"""
+import hashlib
+import unicodedata
+from typing import Any, Dict, Iterable, List, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
+from app import models
+from app.services import search as recipe_search
+from app.services import stats as admin_stats
+from app.services import tags as recipe_tags
+
+DEFAULT_INGREDIENT_NAME = "Nguyên liệu"
+
+
+def parse_amount(value: Any) -> float:
+    """
+    Số lượng nguyên liệu từ AI có thể là chuỗi như "vừa ăn", "tùy ý", "theo khẩu vị"
+    -> không đổi được sang số thì dùng 1.0
+    """
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return 1.0
+
+
+def ingredients_from_ai(recipe_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Chuẩn hóa danh sách nguyên liệu AI trả về thành [{name, amount, unit}]"""
+    return [
+        {
+            "name": ing.get("name", DEFAULT_INGREDIENT_NAME),
+            "amount": parse_amount(ing.get("amount", 0)),
+            "unit": ing.get("unit", ""),
+        }
+        for ing in recipe_data.get("ingredients", [])
+    ]
+
+
+def recipe_fields_from_ai(recipe_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Các cột của Recipe lấy từ 1 món AI trả về"""
+    nutrition = recipe_data["nutrition"]
+    return {
+        "name": recipe_data["name"],
+        "description": recipe_data.get("description", ""),
+        "instructions": recipe_data.get("instructions", ""),
+        "servings": recipe_data.get("servings", 1),
+        "prep_time": recipe_data.get("prep_time"),
+        "calories": nutrition["calories"],
+        "protein": nutrition["protein"],
+        "carbs": nutrition["carbs"],
+        "fat": nutrition["fat"],
+        "tags": recipe_data.get("tags", ""),
+    }
+
+
+def normalize_name(name: str) -> str:
+    """Chữ thường, Unicode NFC, gộp khoảng trắng - GIỮ dấu ("Bún bò" khác "Bún bơ")"""
+    return " ".join(unicodedata.normalize("NFC", name or "").casefold().split())
+
+
+def content_hash(name: str, ingredient_names: Iterable[str]) -> str:
+    """
+    Dấu vân tay nội dung món: tên + tập tên nguyên liệu đã chuẩn hóa (không kể thứ tự, trùng lặp,
+    số lượng, đơn vị) -> sha256 hex
+    """
+    names = sorted({normalize_name(n) for n in ingredient_names} - {""})
+    key = "\n".join([normalize_name(name)] + names)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def refresh_content_hash(recipe: models.Recipe, ingredient_names: Iterable[str]) -> None:
+    """Cập nhật recipe.content_hash - gọi mỗi khi tạo/sửa tên món hoặc nguyên liệu"""
+    recipe.content_hash = content_hash(recipe.name, ingredient_names)
+
+
+def build_recipe(owner_id: int, ingredients: Iterable[Dict[str, Any]], **fields) -> models.Recipe:
+    """
+    Tạo đối tượng Recipe (chưa add vào session) kèm ingredients, search_text và tags
+    - ingredients: [{name, amount, unit}]
+    """
+    recipe = models.Recipe(owner_id=owner_id, **fields)
+    recipe.ingredients = [
+        models.Ingredient(name=ing["name"], amount=ing["amount"], unit=ing["unit"])
+        for ing in ingredients
+    ]
+    recipe_search.refresh_search_text(recipe, [ing.name for ing in recipe.ingredients])
+    refresh_content_hash(recipe, [ing.name for ing in recipe.ingredients])
+    recipe_tags.sync_recipe_tags(recipe)
+    return recipe
+
+
+def add_recipes(db: Session, recipes: List[models.Recipe]) -> List[models.Recipe]:
+    """
+    Thêm nhiều món trong 1 lần flush (có id ngay sau khi gọi), KHÔNG commit
+    Mỗi bảng (recipes, ingredients, recipe_tags) chỉ tốn 1 câu INSERT theo lô.
+    """
+    db.add_all(recipes)
+    db.flush()
+    return recipes
+
+
+def add_or_reuse_recipes(db: Session, recipes: List[models.Recipe]) -> List[Tuple[models.Recipe, bool]]:
+    """
+    Như add_recipes nhưng bỏ qua món trùng content_hash với món đã có của cùng user
+    (hoặc với món đứng trước trong cùng danh sách), KHÔNG commit
+    - Trả về [(món đã lưu, True nếu dùng lại món có sẵn - không INSERT)] theo đúng thứ tự đầu vào
+    - Món cũ được nạp kèm ingredients (đọc được sau khi session đóng / trong AsyncSession)
+    - Số dòng recipes / ingredients tránh được cộng vào bộ đếm ai_recipes_reused / ai_ingredients_reused
+    """
+    existing: Dict[Tuple[Any, str], models.Recipe] = {}
+    owners: Dict[Any, set] = {}
+    for recipe in recipes:
+        owners.setdefault(recipe.owner_id, set()).add(recipe.content_hash)
+    for owner_id, hashes in owners.items():
+        # 1 câu SELECT cho mỗi user (thực tế chỉ 1) nhờ index (owner_id, content_hash); trùng -> món cũ nhất
+        rows = db.execute(
+            select(models.Recipe)
+            .where(models.Recipe.owner_id == owner_id, models.Recipe.content_hash.in_(hashes))
+            .options(selectinload(models.Recipe.ingredients))
+            .order_by(models.Recipe.id.desc())
+        ).scalars()
+        for row in rows:
+            existing[(owner_id, row.content_hash)] = row
+
+    saved: List[Tuple[models.Recipe, bool]] = []
+    new_recipes: List[models.Recipe] = []
+    skipped_ingredients = 0
+    for recipe in recipes:
+        key = (recipe.owner_id, recipe.content_hash)
+        if key in existing:
+            saved.append((existing[key], True))
+            skipped_ingredients += len(recipe.ingredients)
+            continue
+        existing[key] = recipe
+        new_recipes.append(recipe)
+        saved.append((recipe, False))
+
+    if new_recipes:
+        add_recipes(db, new_recipes)
+    reused = len(recipes) - len(new_recipes)
+    if reused:
+        admin_stats.add_to_counter(db, "ai_recipes_reused", reused)
+        admin_stats.add_to_counter(db, "ai_ingredients_reused", skipped_ingredients)
+        print(f"[AI] Dùng lại {reused} món đã có (bớt {reused} recipes + {skipped_ingredients} ingredients)")
+    return saved
+
+
+def _ingredient_key(name: str) -> str:
+    return (name or "").strip().lower()
+
+
+def apply_ingredient_diff(recipe: models.Recipe, ingredients: Iterable[Dict[str, Any]]) -> None:
+    """
+    Cập nhật recipe.ingredients theo danh sách mới mà không xóa hết rồi thêm lại
+    - Ghép cặp nguyên liệu cũ/mới theo tên (không phân biệt hoa thường, theo thứ tự nếu trùng tên)
+    - Giữ nguyên id của các dòng ghép được; chỉ đổi các cột thực sự khác (không đổi -> không UPDATE)
+    - Dòng cũ không còn trong danh sách -> xóa (cascade delete-orphan)
+    """
+    unmatched: Dict[str, List[models.Ingredient]] = {}
+    for ing in recipe.ingredients:
+        unmatched.setdefault(_ingredient_key(ing.name), []).append(ing)
+
+    updated: List[models.Ingredient] = []
+    for data in ingredients:
+        candidates = unmatched.get(_ingredient_key(data["name"]))
+        if candidates:
+            ing = candidates.pop(0)
+            for column in ("name", "amount", "unit"):
+                if getattr(ing, column) != data[column]:
+                    setattr(ing, column, data[column])
+            updated.append(ing)
+        else:
+            updated.append(models.Ingredient(name=data["name"], amount=data["amount"], unit=data["unit"]))
+
+    recipe.ingredients = updated
+    recipe_search.refresh_search_text(recipe, [ing.name for ing in updated])
+    refresh_content_hash(recipe, [ing.name for ing in updated])
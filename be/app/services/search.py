@@ -0,0 +1,85 @@
+"""
+Tìm kiếm công thức món ăn không phân biệt dấu (Phở bò == pho bo)
+
+- Cột recipes.search_text lưu văn bản đã "gấp dấu" (fold): tên + mô tả + tên nguyên liệu,
+  chữ thường, bỏ dấu tiếng Việt, chỉ giữ các từ (token) cách nhau 1 khoảng trắng.
+- PostgreSQL: cột sinh tự động search_vector = to_tsvector('simple', search_text) + index GIN
+  (không cần extension), khớp tiền tố từng từ, xếp hạng bằng ts_rank.
+- SQLite: bảng ảo FTS5 recipes_fts (đồng bộ bằng trigger), xếp hạng bằng bm25.
+- DB khác: LIKE trên search_text (không có index, chỉ để chạy được).
+"""
+import re
+import unicodedata
+from typing import Iterable, List
+from sqlalchemy import func, literal_column, table, column
+from sqlalchemy.orm import Query
+from app import models
+
+# Đối tượng chỉ có trên 1 loại DB (tạo trong migration 0003, không khai báo trong models)
+recipes_fts = table("recipes_fts", column("rowid"), column("rank"))  # SQLite FTS5
+search_vector = literal_column("recipes.search_vector")  # PostgreSQL tsvector
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fold_text(value: str) -> str:
+    """
+    Chuẩn hóa văn bản để so khớp: bỏ dấu, chữ thường, tách từ
+    VD: "Phở Bò (Hà Nội)" -> "pho bo ha noi"
+    """
+    if not value:
+        return ""
+    # "đ" không phải ký tự tổ hợp nên NFKD không tách được -> thay thủ công
+    value = value.replace("đ", "d").replace("Đ", "D")
+    value = unicodedata.normalize("NFKD", value)
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    return " ".join(_TOKEN_RE.findall(value.lower())).replace("_", " ")
+
+
+def fold_tokens(value: str) -> List[str]:
+    """Danh sách từ đã chuẩn hóa (bỏ trùng, giữ thứ tự)"""
+    return list(dict.fromkeys(fold_text(value).split()))
+
+
+def build_search_text(name: str, description: str = None, ingredient_names: Iterable[str] = ()) -> str:
+    """Ghép tên + mô tả + tên nguyên liệu thành 1 chuỗi đã chuẩn hóa"""
+    parts = [name or "", description or ""] + [n or "" for n in ingredient_names]
+    return " ".join(filter(None, (fold_text(part) for part in parts)))
+
+
+def refresh_search_text(recipe: "models.Recipe", ingredient_names: Iterable[str]) -> None:
+    """Cập nhật recipe.search_text - gọi mỗi khi tạo/sửa món hoặc nguyên liệu"""
+    recipe.search_text = build_search_text(recipe.name, recipe.description, ingredient_names)
+
+
+def apply_search(query: Query, term: str) -> Query:
+    """
+    Lọc query Recipe theo từ khóa và sắp xếp theo độ liên quan
+    Mọi từ trong term phải xuất hiện (AND), mỗi từ khớp tiền tố/chuỗi con.
+    """
+    tokens = fold_tokens(term)
+    if not tokens:
+        return query
+
+    dialect = query.session.get_bind().dialect.name
+
+    if dialect == "sqlite":
+        # FTS5: "pho"* "bo"* -> tất cả từ phải khớp tiền tố
+        match = " ".join(f'"{token}"*' for token in tokens)
+        return query.join(
+            recipes_fts, recipes_fts.c.rowid == models.Recipe.id
+        ).filter(
+            literal_column("recipes_fts").op("MATCH")(match)
+        ).order_by(recipes_fts.c.rank, models.Recipe.id)
+
+    if dialect == "postgresql":
+        # Cột search_vector chỉ có trên PostgreSQL (generated column, migration 0003)
+        vector = search_vector
+        tsquery = func.to_tsquery("simple", " & ".join(f"{token}:*" for token in tokens))
+        return query.filter(vector.op("@@")(tsquery)).order_by(
+            func.ts_rank(vector, tsquery).desc(), models.Recipe.id
+        )
+
+    for token in tokens:
+        query = query.filter(models.Recipe.search_text.like(f"%{token}%"))
+    return query
@@ -1,7 +1,7 @@
+from sqlalchemy import Float, cast, exists, func
 from sqlalchemy.orm import Session
 from app import models
 from datetime import date
-from collections import defaultdict
 
 def generate_shopping_list(db: Session, user_id: int, start_date: date, end_date: date) -> dict:
     """
@@ -16,34 +16,63 @@ def generate_shopping_list(db: Session, user_id: int, start_date: date, end_date
     Returns:
         dict chứa danh sách nguyên liệu đã gộp
     """
-    # Lấy tất cả meal plans trong khoảng thời gian
-    meal_plans = db.query(models.MealPlan).filter(
+    # Gộp nguyên liệu bằng 1 query JOIN + GROUP BY (MealPlan ⋈ Recipe ⋈ Ingredient)
+    # Mỗi nhóm là (tên, đơn vị, món ăn) nên số dòng trả về chỉ phụ thuộc số món khác nhau,
+    # không phụ thuộc số ngày trong khoảng thời gian.
+    multiplier = cast(models.MealPlan.servings, Float) / models.Recipe.servings
+    rows = db.query(
+        models.Ingredient.name,
+        models.Ingredient.unit,
+        models.Recipe.name.label("recipe_name"),
+        func.sum(models.Ingredient.amount * multiplier).label("amount"),
+        func.min(models.MealPlan.id).label("first_plan_id"),
+        func.min(models.Ingredient.id).label("first_ingredient_id"),
+        func.max(models.MealPlan.id).label("last_plan_id"),
+        func.max(models.Ingredient.id).label("last_ingredient_id"),
+    ).join(
+        models.Recipe, models.MealPlan.recipe_id == models.Recipe.id
+    ).join(
+        models.Ingredient, models.Ingredient.recipe_id == models.Recipe.id
+    ).filter(
         models.MealPlan.owner_id == user_id,
         models.MealPlan.date >= start_date,
         models.MealPlan.date <= end_date
+    ).group_by(
+        models.Ingredient.name,
+        models.Ingredient.unit,
+        models.Recipe.id,
+        models.Recipe.name
+    ).order_by(
+        "first_plan_id", "first_ingredient_id"
     ).all()
     
-    if not meal_plans:
-        return {"items": [], "message": "Chưa có kế hoạch bữa ăn nào"}
+    if not rows:
+        has_plans = db.query(
+            exists().where(
+                models.MealPlan.owner_id == user_id,
+                models.MealPlan.date >= start_date,
+                models.MealPlan.date <= end_date
+            )
+        ).scalar()
+        if not has_plans:
+            return {"items": [], "message": "Chưa có kế hoạch bữa ăn nào"}
     
-    # Gộp nguyên liệu theo tên + đơn vị
-    ingredient_map = defaultdict(lambda: {"amount": 0, "unit": "", "recipes": []})
-    
-    for plan in meal_plans:
-        recipe = plan.recipe
-        if not recipe:
-            continue
-        
-        # Nhân khẩu phần
-        multiplier = plan.servings / recipe.servings
-        
-        for ing in recipe.ingredients:
-            key = f"{ing.name.lower()}_{ing.unit.lower()}"
-            ingredient_map[key]["name"] = ing.name
-            ingredient_map[key]["amount"] += ing.amount * multiplier
-            ingredient_map[key]["unit"] = ing.unit
-            if recipe.name not in ingredient_map[key]["recipes"]:
-                ingredient_map[key]["recipes"].append(recipe.name)
+    # Gộp theo tên + đơn vị (không phân biệt hoa thường)
+    # - Thứ tự items và recipes theo lần xuất hiện đầu tiên (meal plan id, ingredient id)
+    # - name/unit lấy theo lần xuất hiện cuối cùng
+    ingredient_map = {}
+    for row in rows:
+        key = f"{row.name.lower()}_{row.unit.lower()}"
+        last_seen = (row.last_plan_id, row.last_ingredient_id)
+        data = ingredient_map.get(key)
+        if data is None:
+            data = ingredient_map[key] = {"amount": 0, "recipes": {}, "last_seen": None}
+        data["amount"] += row.amount or 0
+        data["recipes"].setdefault(row.recipe_name, None)
+        if data["last_seen"] is None or last_seen > data["last_seen"]:
+            data["last_seen"] = last_seen
+            data["name"] = row.name
+            data["unit"] = row.unit
     
     # Chuyển về list
     shopping_items = [
@@ -51,7 +80,7 @@ def generate_shopping_list(db: Session, user_id: int, start_date: date, end_date
             "name": data["name"],
             "amount": round(data["amount"], 2),
             "unit": data["unit"],
-            "recipes": data["recipes"]
+            "recipes": list(data["recipes"])
         }
         for key, data in ingredient_map.items()
     ]
@@ -0,0 +1,122 @@
+"""
+Thống kê tổng quan cho trang admin
+
+COUNT(*) trên PostgreSQL phải quét cả bảng -> chậm dần khi bảng lên hàng triệu dòng.
+Bảng stats_counters giữ sẵn các con số. Trigger trong DB ghi lại mỗi thay đổi số dòng khi INSERT/DELETE
+(users: cả khi đổi is_active/role) - kể cả ghi hàng loạt hay sửa thẳng trong DB (migration 0007, 0012).
+- Trigger không UPDATE stats_counters mà INSERT 1 dòng (tên, chênh lệch) vào stats_counter_deltas: UPDATE
+  1 dòng dùng chung trong transaction của người ghi làm mọi request ghi vào cùng bảng chờ khóa dòng đó tới
+  khi commit (và có thể deadlock khi ghi các bảng theo thứ tự ngược nhau); INSERT không chờ ai.
+- read_stats gộp các dòng chờ vào stats_counters (fold_deltas, trong transaction của trang admin - có cache
+  ADMIN_STATS_CACHE_TTL phía trước) rồi đọc: vài câu lệnh trên bảng nhỏ, không phụ thuộc kích thước các bảng.
+
+recount_stats: đếm lại chính xác bằng COUNT(*) (chậm) và ghi đè bộ đếm - dùng khi nghi ngờ lệch.
+Bộ đếm sự kiện (APP_COUNTERS) do code ứng dụng cộng dồn (add_to_counter), không đếm lại được.
+"""
+from collections import defaultdict
+from typing import Dict
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+from app import models
+
+STAT_NAMES = (
+    "total_users",
+    "total_recipes",
+    "total_meal_plans",
+    "total_ratings",
+    "total_shopping_items",
+    "active_users",
+    "admin_users",
+)
+# Số dòng recipes / ingredients KHÔNG phải ghi nhờ dùng lại món AI trùng content_hash (recipe_writer)
+APP_COUNTERS = (
+    "ai_recipes_reused",
+    "ai_ingredients_reused",
+)
+
+
+def fold_deltas(db: Session) -> int:
+    """
+    Gộp các thay đổi đã commit trong stats_counter_deltas vào stats_counters (DELETE ... RETURNING rồi
+    UPDATE từng bộ đếm), KHÔNG commit. 2 lần gộp cùng lúc không cộng trùng: dòng đã bị lần kia xóa thì bỏ qua.
+    Trả về số dòng đã gộp.
+    """
+    rows = db.execute(
+        delete(models.StatsCounterDelta)
+        .returning(models.StatsCounterDelta.name, models.StatsCounterDelta.delta)
+        .execution_options(synchronize_session=False)
+    ).all()
+    totals: Dict[str, int] = defaultdict(int)
+    for name, delta in rows:
+        totals[name] += delta
+    # Theo thứ tự tên: các lần gộp cùng lúc khóa bộ đếm cùng 1 thứ tự, không deadlock
+    for name in sorted(totals):
+        if totals[name]:
+            db.execute(
+                update(models.StatsCounter)
+                .where(models.StatsCounter.name == name)
+                .values(value=models.StatsCounter.value + totals[name])
+            )
+    return len(rows)
+
+
+def read_stats(db: Session) -> Dict[str, int]:
+    """Gộp các thay đổi đang chờ rồi đọc toàn bộ bộ đếm, KHÔNG commit (người gọi commit để lưu phần đã gộp)"""
+    fold_deltas(db)
+    rows = db.execute(select(models.StatsCounter.name, models.StatsCounter.value)).all()
+    values = {name: value for name, value in rows}
+    return {name: int(values.get(name, 0)) for name in STAT_NAMES + APP_COUNTERS}
+
+
+def add_to_counter(db: Session, name: str, amount: int) -> None:
+    """Cộng amount vào bộ đếm (1 dòng trong stats_counter_deltas, cùng transaction với người gọi), KHÔNG commit"""
+    if amount:
+        db.execute(insert(models.StatsCounterDelta).values(name=name, delta=amount))
+
+
+def recount_stats(db: Session) -> Dict[str, int]:
+    """
+    Đếm lại chính xác (1 câu SELECT với các subquery COUNT) rồi ghi vào stats_counters
+    Thay đổi chưa gộp mà câu SELECT thấy đã nằm trong COUNT -> bộ đếm = COUNT - phần đó (fold_deltas cộng lại sau);
+    khóa các bộ đếm trước để fold_deltas chạy cùng lúc không cộng vào giá trị sắp bị ghi đè.
+    Không commit - người gọi tự commit.
+    """
+    db.execute(
+        select(models.StatsCounter.name)
+        .where(models.StatsCounter.name.in_(STAT_NAMES))
+        .order_by(models.StatsCounter.name)
+        .with_for_update()
+    ).all()
+
+    def count(model, *conditions):
+        return select(func.count()).select_from(model).where(*conditions).scalar_subquery()
+
+    def pending(name):
+        return (
+            select(func.coalesce(func.sum(models.StatsCounterDelta.delta), 0))
+            .where(models.StatsCounterDelta.name == name)
+            .scalar_subquery()
+        )
+
+    counts = {
+        "total_users": count(models.User),
+        "total_recipes": count(models.Recipe),
+        "total_meal_plans": count(models.MealPlan),
+        "total_ratings": count(models.Rating),
+        "total_shopping_items": count(models.ShoppingListItem),
+        "active_users": count(models.User, models.User.is_active == True),
+        "admin_users": count(models.User, models.User.role == "admin"),
+    }
+    row = db.execute(select(
+        *(counts[name].label(name) for name in STAT_NAMES),
+        *(pending(name).label(f"{name}_pending") for name in STAT_NAMES),
+    )).one()._asdict()
+
+    exact = {name: row[name] for name in STAT_NAMES}
+    for name, value in exact.items():
+        db.execute(
+            update(models.StatsCounter)
+            .where(models.StatsCounter.name == name)
+            .values(value=value - row[f"{name}_pending"])
+        )
+    return exact
@@ -0,0 +1,60 @@
+"""
+Thẻ phân loại món ăn (tags) dạng chuẩn hóa
+
+Recipe.tags vẫn giữ chuỗi gốc để hiển thị (VD: "Breakfast,Low-Carb"), còn bảng recipe_tags
+lưu từng thẻ đã chuẩn hóa ("breakfast", "low carb") để lọc chính xác bằng index:
+"Carb" KHÔNG còn khớp với "Low-Carb", và lọc nhiều thẻ hỗ trợ AND (all) / OR (any).
+"""
+from typing import List
+from sqlalchemy import func, select
+from sqlalchemy.orm import Query
+from app import models
+from app.services.search import fold_text
+
+TAG_MODES = ("all", "any")
+
+
+def normalize_tag(tag: str) -> str:
+    """Chuẩn hóa 1 thẻ: bỏ dấu, chữ thường, "Low-Carb" -> "low carb" """
+    return fold_text(tag)
+
+
+def parse_tags(tags: str) -> List[str]:
+    """Tách chuỗi "Breakfast, Low-Carb" thành danh sách thẻ chuẩn hóa (bỏ trùng, giữ thứ tự)"""
+    if not tags:
+        return []
+    normalized = (normalize_tag(tag) for tag in tags.split(","))
+    return list(dict.fromkeys(tag for tag in normalized if tag))
+
+
+def sync_recipe_tags(recipe: "models.Recipe") -> None:
+    """
+    Đồng bộ recipe.tag_links với chuỗi recipe.tags - gọi mỗi khi tạo/sửa món
+    Chỉ thêm/xóa các thẻ thay đổi, không xóa hết rồi thêm lại.
+    """
+    wanted = parse_tags(recipe.tags)
+    current = {link.tag: link for link in recipe.tag_links}
+
+    for tag, link in current.items():
+        if tag not in wanted:
+            recipe.tag_links.remove(link)
+    for tag in wanted:
+        if tag not in current:
+            recipe.tag_links.append(models.RecipeTag(tag=tag))
+
+
+def apply_tag_filter(query: Query, tags: str, mode: str = "all") -> Query:
+    """
+    Lọc query Recipe theo danh sách thẻ
+    - mode="all": món phải có TẤT CẢ các thẻ
+    - mode="any": món có ÍT NHẤT 1 thẻ
+    """
+    wanted = parse_tags(tags)
+    if not wanted:
+        return query
+
+    matching = select(models.RecipeTag.recipe_id).where(models.RecipeTag.tag.in_(wanted))
+    if mode == "all" and len(wanted) > 1:
+        matching = matching.group_by(models.RecipeTag.recipe_id).having(func.count() == len(wanted))
+
+    return query.filter(models.Recipe.id.in_(matching))
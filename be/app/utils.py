@@ -1,10 +1,15 @@
 from passlib.context import CryptContext
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from typing import Optional
 from jose import jwt, JWTError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from app.database import get_db  # Import ở đầu
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db, get_async_db  # Import ở đầu
+from app.cache import TTLCache
 import os
 from dotenv import load_dotenv
 
@@ -15,11 +20,20 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "chuoi_bi_mat_mac_dinh_khong_ai_biet")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 480  # Token hết hạn sau 8 giờ (thay vì 30 phút)
+# token_version hiện tại của mỗi user được cache trong bộ nhớ N giây (0 = luôn đọc DB).
+# Thu hồi token trên process khác (nhiều worker) có hiệu lực chậm tối đa N giây.
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "30"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Scheme mã hóa mật khẩu: scheme đầu tiên dùng cho hash mới, các scheme sau chỉ để kiểm tra hash cũ
+# (tự nâng cấp khi đăng nhập, xem app/services/passwords.py). VD: PASSWORD_SCHEMES=bcrypt,pbkdf2_sha256
+PASSWORD_SCHEMES = [name.strip() for name in os.getenv("PASSWORD_SCHEMES", "bcrypt").split(",") if name.strip()]
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+
+pwd_context = CryptContext(schemes=PASSWORD_SCHEMES, deprecated="auto", bcrypt__rounds=PASSWORD_BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 # --- 1. XỬ LÝ MẬT KHẨU ---
+# Hàm đồng bộ (chặn ~250 ms CPU) - route dùng bản async trong app/services/passwords.py
 def verify_password(plain_password, hashed_password):
     """Kiểm tra mật khẩu nhập vào có khớp với DB không"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -41,39 +55,156 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-# --- 3. XÁC THỰC USER TỪ TOKEN ---
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def create_user_token(user) -> str:
     """
-    Lấy thông tin user hiện tại từ token
-    Dùng làm dependency cho các API cần đăng nhập
+    Token đăng nhập mang sẵn thông tin để phân quyền (không cần đọc bảng users mỗi request):
+    sub (email), uid, role, active, ver (token_version)
     """
-    from app import models  # Import ở đây để tránh circular import
-    
-    credentials_exception = HTTPException(
+    return create_access_token(data={
+        "sub": user.email,
+        "uid": user.id,
+        "role": user.role or "user",
+        "active": user.is_active is not False,
+        "ver": user.token_version or 0,
+    })
+
+@dataclass(frozen=True)
+class TokenUser:
+    """
+    User hiện tại lấy từ claims của JWT (KHÔNG phải models.User)
+    Route cần thông tin profile (tên, chiều cao, cân nặng, ...) dùng get_current_user_profile(_async).
+    """
+    id: int
+    email: str
+    role: str
+    is_active: bool
+    token_version: int
+
+    @classmethod
+    def from_user(cls, user) -> "TokenUser":
+        return cls(user.id, user.email, user.role or "user", user.is_active is not False, user.token_version or 0)
+
+# Cache user_id -> token_version hiện tại (None = user không còn tồn tại)
+_token_versions = TTLCache(ttl_seconds=AUTH_CACHE_TTL)
+
+def bump_token_version(user) -> None:
+    """Thu hồi mọi token đã cấp cho user (không commit - sau khi commit gọi invalidate_token_version)"""
+    user.token_version = (user.token_version or 0) + 1
+
+def invalidate_token_version(user_id: int) -> None:
+    """Xóa token_version đã cache của user - gọi SAU khi commit thay đổi role/is_active/xóa user"""
+    _token_versions.invalidate(user_id)
+
+def _credentials_exception(detail: str = "Token không hợp lệ hoặc đã hết hạn"):
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Token không hợp lệ hoặc đã hết hạn",
+        detail=detail,
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+def _decode_token(token: str) -> dict:
     try:
         # Giải mã token
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
+        raise _credentials_exception()
+    if payload.get("sub") is None:
+        raise _credentials_exception()
+    return payload
+
+def _token_user_from_claims(payload: dict) -> Optional[TokenUser]:
+    """Token mới -> TokenUser; token cũ (chỉ có sub=email) -> None"""
+    if "uid" not in payload or "ver" not in payload:
+        return None
+    return TokenUser(
+        id=int(payload["uid"]),
+        email=payload["sub"],
+        role=payload.get("role", "user"),
+        is_active=bool(payload.get("active", True)),
+        token_version=int(payload["ver"]),
+    )
+
+def _cached_token_version(user_id: int):
+    """(True, version) nếu có trong cache, (False, None) nếu phải đọc DB"""
+    cached = _token_versions.get(user_id)
+    return (True, cached[0]) if cached is not None else (False, None)
+
+def _check_token_user(token_user: TokenUser, current_version: Optional[int]) -> TokenUser:
+    if current_version is None or current_version != token_user.token_version:
+        raise _credentials_exception("Phiên đăng nhập đã hết hiệu lực, vui lòng đăng nhập lại")
+    if not token_user.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Tài khoản đã bị khóa")
+    return token_user
+
+# --- 3. XÁC THỰC USER TỪ TOKEN ---
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> TokenUser:
+    """
+    Lấy user hiện tại từ claims của token
+    Dùng làm dependency cho các API cần đăng nhập
+    - Chỉ đọc token_version (theo khóa chính, có cache AUTH_CACHE_TTL) để kiểm tra token chưa bị thu hồi
+    - Token cũ (chỉ có email) -> đọc user theo email như trước
+    """
+    from app import models  # Import ở đây để tránh circular import
+    
+    payload = _decode_token(token)
+    token_user = _token_user_from_claims(payload)
+    if token_user is None:
+        user = db.query(models.User).filter(models.User.email == payload["sub"]).first()
+        if user is None:
+            raise _credentials_exception()
+        token_user = TokenUser.from_user(user)
+        return _check_token_user(token_user, token_user.token_version)
+    
+    found, version = _cached_token_version(token_user.id)
+    if not found:
+        version = db.query(models.User.token_version).filter(models.User.id == token_user.id).scalar()
+        _token_versions.set(token_user.id, version)
+    return _check_token_user(token_user, version)
+
+def get_current_user_profile(current_user: TokenUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Đọc đầy đủ models.User của user hiện tại (cùng session với route -> sửa rồi commit được)"""
+    from app import models  # Import ở đây để tránh circular import
     
-    # Tìm user trong database
-    user = db.query(models.User).filter(models.User.email == email).first()
+    user = db.get(models.User, current_user.id)
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    return user
+
+# --- 3b. XÁC THỰC USER TỪ TOKEN (bản async cho các route dùng AsyncSession) ---
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> TokenUser:
+    """Giống get_current_user nhưng truy vấn bằng AsyncSession (không chặn event loop)"""
+    from app import models  # Import ở đây để tránh circular import
+    
+    payload = _decode_token(token)
+    token_user = _token_user_from_claims(payload)
+    if token_user is None:
+        user = (await db.execute(select(models.User).where(models.User.email == payload["sub"]))).scalars().first()
+        if user is None:
+            raise _credentials_exception()
+        token_user = TokenUser.from_user(user)
+        return _check_token_user(token_user, token_user.token_version)
     
+    found, version = _cached_token_version(token_user.id)
+    if not found:
+        version = await db.scalar(select(models.User.token_version).where(models.User.id == token_user.id))
+        _token_versions.set(token_user.id, version)
+    return _check_token_user(token_user, version)
+
+async def get_current_user_profile_async(
+    current_user: TokenUser = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Giống get_current_user_profile nhưng dùng AsyncSession"""
+    from app import models  # Import ở đây để tránh circular import
+    
+    user = await db.get(models.User, current_user.id)
+    if user is None:
+        raise _credentials_exception()
     return user
 
 # --- 4. KIỂM TRA ADMIN ROLE ---
-def get_admin_user(current_user = Depends(get_current_user)):
-    """Kiểm tra user có phải admin không"""
+def get_admin_user(current_user: TokenUser = Depends(get_current_user)):
+    """Kiểm tra user có phải admin không (theo role trong token)"""
     if current_user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark tải các route /ai/* chạy hoàn toàn offline (model giả - app/services/llm.py, LLM_BACKEND=fake)
+
+- Model giả phát lại các phản hồi đã ghi (recordings/ai_responses.jsonl, gồm cả JSON lỗi: markdown, comment,
+  dấu phẩy thừa, thực đơn bị cắt) với độ trễ LLM_FAKE_LATENCY giây và tỷ lệ lỗi LLM_FAKE_ERROR_RATE,
+  qua pool 2 key giả (app/services/llm_pool.py: lỗi -> thử lại / đổi key, 429 -> ngắt key LLM_QUOTA_COOLDOWN giây)
+- Chạy app trên uvicorn thật (localhost, stream SSE thật) và gửi REQUESTS_PER_ROUTE request cho mỗi route
+  (generate-recipe, search-recipes, suggest-weekly-plan + 2 bản stream), tối đa CONCURRENCY request cùng lúc;
+  trong lúc đó liên tục gọi GET /recipes/ để đo độ trễ của request thường
+- In bảng: số request, thành công, lỗi AI (HTTP 500 / sự kiện error của stream), 503 (hàng đợi AI đầy / hết key),
+  độ trễ p50 / p95 / max, số request / giây
+- ĐẠT khi: chỉ có 200 / 500 / 503, số request lỗi (500 / 503) không vượt số lỗi model giả đã tiêm (JSON lỗi đã
+  ghi đều đọc được, pool thử lại bớt được lỗi), thực đơn tuần thành công đều lưu lịch ăn,
+  GET /recipes/ p95 < MAX_PROBE_P95_MS
+
+Chạy: python bench_ai_routes.py
+(đổi tải bằng biến môi trường: LLM_FAKE_LATENCY=2 LLM_FAKE_ERROR_RATE=0.2 python bench_ai_routes.py)
+LƯU Ý: script tạo 1 user thử nghiệm (kèm món, lịch ăn) rồi xóa đi khi xong
+-> chỉ chạy trên DB thử nghiệm (đã `alembic upgrade head`), KHÔNG chạy trên DB thật.
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("LLM_FAKE_LATENCY", "0.5")
+os.environ.setdefault("LLM_FAKE_ERROR_RATE", "0.1")
+os.environ.setdefault("LLM_FAKE_SEED", "42")
+os.environ.setdefault("GEMINI_API_KEYS", "fake-key-1,fake-key-2")
+os.environ.setdefault("LLM_QUOTA_COOLDOWN", "2")
+
+import httpx
+import numpy as np
+import uvicorn
+from app.database import SessionLocal
+from app import models, utils
+from app.services import ai_service
+from app.services import deletion as recipe_deletion
+from main import app
+
+# Fix encoding for Windows
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+PORT = 8766
+REQUESTS_PER_ROUTE = 12
+CONCURRENCY = 16
+MAX_PROBE_P95_MS = 500
+TEST_EMAIL = "bench-ai-routes@example.com"
+FIRST_WEEK = date(2030, 1, 7)
+INGREDIENTS = [["thịt gà", "gạo", "tỏi"], ["đậu phụ", "cà chua"], ["thịt heo", "bún", "rau sống"]]
+QUERIES = ["món sáng nhanh gọn", "món chay nhiều đạm", "món giảm cân"]
+
+# (tên, đường dẫn, body theo số thứ tự request, stream?)
+ROUTES = [
+    ("generate-recipe", "/ai/generate-recipe",
+     lambda i: {"ingredients": INGREDIENTS[i % len(INGREDIENTS)], "no_cache": True}, False),
+    ("search-recipes", "/ai/search-recipes",
+     lambda i: {"query": QUERIES[i % len(QUERIES)], "no_cache": True}, False),
+    ("suggest-weekly-plan", "/ai/suggest-weekly-plan",
+     lambda i: {"start_date": (FIRST_WEEK + timedelta(weeks=i)).isoformat(), "no_cache": True}, False),
+    ("generate-recipe/stream", "/ai/generate-recipe/stream",
+     lambda i: {"ingredients": INGREDIENTS[i % len(INGREDIENTS)], "no_cache": True}, True),
+    ("suggest-weekly-plan/stream", "/ai/suggest-weekly-plan/stream",
+     lambda i: {"start_date": (FIRST_WEEK + timedelta(weeks=100 + i)).isoformat(), "no_cache": True}, True),
+]
+
+def setup_user():
+    db = SessionLocal()
+    try:
+        cleanup(db)
+        user = models.User(email=TEST_EMAIL, hashed_password="x", full_name="Bench AI routes", gender="male",
+                           date_of_birth=date(1992, 3, 3), height=172, weight=68)
+        db.add(user)
+        db.commit()
+        return utils.create_user_token(user)
+    finally:
+        db.close()
+
+def cleanup(db):
+    user = db.query(models.User).filter(models.User.email == TEST_EMAIL).first()
+    if user:
+        recipe_deletion.delete_user(db, user.id, cascade=True)
+        db.commit()
+
+def start_server():
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=PORT, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+async def call(client, headers, path, body, stream):
+    """(kết quả, ms, lịch ăn đã lưu): kết quả = "ok" / "ai_error" / "busy" / "HTTP <mã>" """
+    started = time.perf_counter()
+    if not stream:
+        response = await client.post(path, json=body, headers=headers)
+        elapsed = (time.perf_counter() - started) * 1000
+        outcome = {200: "ok", 500: "ai_error", 503: "busy"}.get(response.status_code, f"HTTP {response.status_code}")
+        saved = response.json().get("meal_plans_created") if response.status_code == 200 else None
+        return outcome, elapsed, saved
+
+    outcome, saved, event = None, None, None
+    async with client.stream("POST", path, json=body, headers=headers) as response:
+        if response.status_code != 200:
+            outcome = {503: "busy"}.get(response.status_code, f"HTTP {response.status_code}")
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: ") and event in ("done", "error"):
+                data = json.loads(line[len("data: "):])
+                if event == "error":
+                    outcome = "busy" if data.get("status") == 503 else "ai_error"
+                else:
+                    outcome, saved = "ok", data.get("meal_plans_created")
+    return outcome or "no_done", (time.perf_counter() - started) * 1000, saved
+
+async def run(token):
+    headers = {"Authorization": f"Bearer {token}"}
+    limit = asyncio.Semaphore(CONCURRENCY)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", timeout=300) as client:
+        async def one(route, i):
+            label, path, body, stream = route
+            async with limit:
+                return label, await call(client, headers, path, body(i), stream)
+
+        # Xen kẽ các route để tải trộn lẫn như thực tế
+        tasks = [asyncio.create_task(one(route, i)) for i in range(REQUESTS_PER_ROUTE) for route in ROUTES]
+        probe_ms = []
+        while not all(task.done() for task in tasks):
+            started = time.perf_counter()
+            response = await client.get("/recipes/?limit=5", headers=headers)
+            probe_ms.append((time.perf_counter() - started) * 1000 if response.status_code == 200 else float("inf"))
+            await asyncio.sleep(0.05)
+        return await asyncio.gather(*tasks), probe_ms
+
+def main():
+    pool = ai_service.model
+    fakes = [member.backend for member in pool.members]
+    print(f"[INFO] Model: {pool.model_name} x {len(fakes)} key, độ trễ {fakes[0].latency}s ± {fakes[0].jitter}s, "
+          f"lỗi {fakes[0].error_rate:.0%}, {CONCURRENCY} request cùng lúc "
+          f"(AI_MAX_CONCURRENCY={ai_service.AI_MAX_CONCURRENCY})")
+    token = setup_user()
+    server, thread = start_server()
+    try:
+        started = time.perf_counter()
+        results, probe_ms = asyncio.run(run(token))
+        elapsed = time.perf_counter() - started
+    finally:
+        server.should_exit = True
+        thread.join()
+        db = SessionLocal()
+        try:
+            cleanup(db)
+        finally:
+            db.close()
+
+    print("=" * 96)
+    print(f"{'Route':<28} | {'n':>3} | {'ok':>3} | {'lỗi AI':>6} | {'503':>3} | {'khác':>4} | "
+          f"{'p50 ms':>7} | {'p95 ms':>7} | {'max ms':>7}")
+    print("-" * 96)
+    outcomes = []
+    for label, *_ in ROUTES:
+        rows = [result for name, result in results if name == label]
+        timings = [ms for _, ms, _ in rows]
+        counts = {key: sum(outcome == key for outcome, _, _ in rows) for key in ("ok", "ai_error", "busy")}
+        other = len(rows) - sum(counts.values())
+        print(f"{label:<28} | {len(rows):>3} | {counts['ok']:>3} | {counts['ai_error']:>6} | {counts['busy']:>3} | "
+              f"{other:>4} | {np.percentile(timings, 50):>7.0f} | {np.percentile(timings, 95):>7.0f} | "
+              f"{max(timings):>7.0f}")
+        outcomes.extend((label, outcome, saved) for outcome, _, saved in rows)
+    print("=" * 96)
+    injected = sum(fake.errors for fake in fakes)
+    print(f"[INFO] {len(results)} request trong {elapsed:.1f}s ({len(results) / elapsed:.1f} request/s), "
+          f"model giả: {sum(fake.calls for fake in fakes)} lời gọi, {injected} lỗi tiêm vào, "
+          f"pool đổi backend / thử lại {pool.failovers} lần")
+    print(f"[INFO] GET /recipes/ trong lúc tải: {len(probe_ms)} request, p95 {np.percentile(probe_ms, 95):.0f} ms, "
+          f"max {max(probe_ms):.0f} ms")
+    print(f"[INFO] Hàng đợi AI: {ai_service.ai_executor.stats()}")
+
+    failed = sum(outcome in ("ai_error", "busy") for _, outcome, _ in outcomes)
+    weekly_saved = [saved for label, outcome, saved in outcomes if "weekly" in label and outcome == "ok"]
+    checks = [
+        (all(outcome in ("ok", "ai_error", "busy") for _, outcome, _ in outcomes), "chỉ có 200 / 500 / 503"),
+        (failed <= injected, f"số request lỗi ({failed}) <= số lỗi model giả tiêm vào ({injected})"),
+        (bool(weekly_saved) and all(saved for saved in weekly_saved), "thực đơn tuần thành công đều lưu lịch ăn"),
+        (np.percentile(probe_ms, 95) < MAX_PROBE_P95_MS, f"GET /recipes/ p95 < {MAX_PROBE_P95_MS} ms trong lúc tải"),
+    ]
+    print()
+    for ok, label in checks:
+        print(f"{'✅' if ok else '❌'} {label}")
+    sys.exit(0 if all(ok for ok, _ in checks) else 1)
+
+if __name__ == "__main__":
+    main()
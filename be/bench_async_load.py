@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark tải đồng thời: route async (AsyncSession) so với bản đồng bộ (Session + threadpool)
+- async: GET /recipes/{id} thật của app (await DB, không chiếm thread)
+- sync:  bản sao đồng bộ của cùng route, đăng ký tạm trong script tại GET /bench/sync-recipes/{id}
+         (chạy trên threadpool APP_THREADPOOL_SIZE, mỗi request giữ 1 thread + 1 kết nối)
+Mỗi mức đồng thời (SỐ REQUEST ĐANG CHỜ cùng lúc) in ra: throughput, p50/p95, số thread bận
+cao nhất và thời gian chờ lấy kết nối từ pool (app/db_pool.py).
+Request được gửi thẳng vào app qua httpx.ASGITransport (không qua mạng/uvicorn) trên 1 event loop.
+Khi số request đồng thời > số thread, bản sync có thể hết kết nối: Session (get_db) giữ kết nối tới khi
+response được serialize - bước này cũng cần 1 thread, trong khi các thread đã bị request mới chiếm
+và đang chờ pool -> lỗi "QueuePool limit ... timed out" (script đặt DB_POOL_TIMEOUT=5 để không chờ lâu).
+
+Chạy: python bench_async_load.py [mức_1 mức_2 ...]   (mặc định 50 200 1000)
+LƯU Ý: script tạo 1 món thử nghiệm rồi xóa đi khi xong
+-> chỉ chạy trên DB thử nghiệm (đã `alembic upgrade head`), KHÔNG chạy trên DB thật.
+"""
+import asyncio
+import os
+import sys
+import time
+
+# Request chờ kết nối quá 5 giây -> tính là lỗi (mặc định 30 giây làm benchmark chạy rất lâu)
+os.environ.setdefault("DB_POOL_TIMEOUT", "5")
+
+from anyio import to_thread
+from fastapi import Depends, HTTPException
+import httpx
+from sqlalchemy.orm import Session
+from app.database import engine, async_engine, SessionLocal, get_db
+from app import models, schemas, loaders, db_pool
+from app.services import recipe_writer
+from main import app
+
+# Fix encoding for Windows
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+LEVELS = [int(arg) for arg in sys.argv[1:]] or [50, 200, 1000]
+REQUESTS_PER_LEVEL = 2  # Mỗi "người dùng ảo" gửi 2 request -> tổng = 2 x mức đồng thời (tối thiểu 200)
+BENCH_NAME = "Món thử tải đồng thời"
+
+@app.get("/bench/sync-recipes/{recipe_id}", response_model=schemas.Recipe, include_in_schema=False)
+def sync_get_recipe(recipe_id: int, db: Session = Depends(get_db)):
+    """Bản đồng bộ của GET /recipes/{id} (trước khi chuyển sang AsyncSession)"""
+    recipe = db.query(models.Recipe).options(*loaders.recipe_options()).filter(models.Recipe.id == recipe_id).first()
+    if not recipe:
+        raise HTTPException(status_code=404, detail="Không tìm thấy công thức này")
+    return recipe
+
+def setup_recipe():
+    db = SessionLocal()
+    try:
+        recipe = recipe_writer.build_recipe(
+            None,
+            [{"name": f"Nguyên liệu {j}", "amount": 10 + j, "unit": "gram"} for j in range(8)],
+            name=BENCH_NAME, servings=2, tags="Lunch"
+        )
+        recipe_writer.add_recipes(db, [recipe])
+        db.commit()
+        return recipe.id
+    finally:
+        db.close()
+
+def cleanup(recipe_id):
+    db = SessionLocal()
+    try:
+        recipe = db.get(models.Recipe, recipe_id)
+        if recipe:
+            db.delete(recipe)
+            db.commit()
+    finally:
+        db.close()
+
+def reset_wait_stats(eng):
+    if isinstance(eng.pool, db_pool._TimedPoolMixin):
+        eng.pool.wait_stats = db_pool.PoolWaitStats()
+
+def wait_stats(eng):
+    if isinstance(eng.pool, db_pool._TimedPoolMixin):
+        stats = eng.pool.wait_stats.snapshot()
+        return f"{stats['p95_wait_ms']:.1f}/{stats['max_wait_ms']:.1f}"
+    return "-"
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+async def run_level(client, path, concurrency, eng):
+    """Gửi `concurrency` luồng request cùng lúc, trả về (req/s, p50, p95, lỗi, thread bận cao nhất)"""
+    limiter = to_thread.current_default_thread_limiter()
+    total = max(200, concurrency * REQUESTS_PER_LEVEL)
+    remaining = iter(range(total))
+    latencies, errors = [], 0
+    peak_threads = 0
+    done = asyncio.Event()
+
+    async def sample_threads():
+        nonlocal peak_threads
+        while not done.is_set():
+            peak_threads = max(peak_threads, limiter.borrowed_tokens)
+            await asyncio.sleep(0.001)
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                response = await client.get(path)
+                failed = response.status_code != 200
+            except Exception:  # ASGITransport ném lại lỗi của app (VD: hết thời gian chờ pool)
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            errors += failed
+
+    reset_wait_stats(eng)
+    sampler = asyncio.create_task(sample_threads())
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    done.set()
+    await sampler
+
+    latencies.sort()
+    return total / elapsed, percentile(latencies, 0.5), percentile(latencies, 0.95), errors, peak_threads
+
+async def bench(recipe_id):
+    # ASGITransport không chạy lifespan -> tự đặt số thread như main.lifespan
+    to_thread.current_default_thread_limiter().total_tokens = db_pool.THREADPOOL_SIZE
+    transport = httpx.ASGITransport(app=app)
+    modes = [
+        ("async", f"/recipes/{recipe_id}", async_engine.sync_engine),
+        ("sync", f"/bench/sync-recipes/{recipe_id}", engine),
+    ]
+    print("=" * 86)
+    print(f"{'mode':<6} | {'đồng thời':>9} | {'req/s':>8} | {'p50 ms':>8} | {'p95 ms':>8} | "
+          f"{'lỗi':>4} | {'thread':>6} | {'chờ pool p95/max ms':>19}")
+    print("-" * 86)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for name, path, eng in modes:
+                await client.get(path)  # Khởi động pool trước khi đo
+            for concurrency in LEVELS:
+                for name, path, eng in modes:
+                    rps, p50, p95, errors, threads = await run_level(client, path, concurrency, eng)
+                    print(f"{name:<6} | {concurrency:>9} | {rps:>8.0f} | {p50:>8.1f} | {p95:>8.1f} | "
+                          f"{errors:>4} | {threads:>6} | {wait_stats(eng):>19}")
+    finally:
+        await async_engine.dispose()
+    print("=" * 86)
+
+def main():
+    print(f"[INFO] Database: {engine.dialect.name}, threadpool: {db_pool.THREADPOOL_SIZE} thread")
+    recipe_id = setup_recipe()
+    try:
+        asyncio.run(bench(recipe_id))
+    finally:
+        cleanup(recipe_id)
+
+if __name__ == "__main__":
+    main()
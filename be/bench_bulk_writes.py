@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark số câu lệnh SQL (round trip) của các API ghi dữ liệu khi số nguyên liệu / số món tăng dần
+- POST /recipes/                          (tạo món)
+- PUT /recipes/{id}                       (sửa món - diff nguyên liệu)
+- POST /shopping/items/from-recipe/{id}   (thêm nguyên liệu vào danh sách mua sắm)
+- POST /ai/suggest-weekly-plan            (lưu thực đơn AI - AI được thay bằng dữ liệu giả; gửi lại lần 2:
+                                           các món trùng nội dung được dùng lại, không INSERT)
+Kỳ vọng (PostgreSQL): số câu lệnh mỗi request là HẰNG SỐ, không tăng theo N.
+SQLite không trả RETURNING theo đúng thứ tự khi INSERT nhiều dòng, nên SQLAlchemy vẫn INSERT
+từng nguyên liệu (DB nằm trong process, không tốn round trip mạng) -> số câu lệnh tăng theo N.
+
+Chạy: python bench_bulk_writes.py
+LƯU Ý: script tạo 1 user thử nghiệm rồi xóa đi khi xong
+-> chỉ chạy trên DB thử nghiệm (đã `alembic upgrade head`), KHÔNG chạy trên DB thật.
+"""
+import contextlib
+import io
+import sys
+import time
+from datetime import date
+from fastapi import Depends
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import engine, async_engine, SessionLocal, get_async_db
+from app import models
+from app.utils import get_current_user_async
+from app.services import ai_service
+from main import app
+
+# Fix encoding for Windows
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+SIZES = [5, 20, 50]
+BENCH_EMAIL = "bench-bulk-writes@example.com"
+
+query_count = 0
+
+def _count_queries(conn, cursor, statement, parameters, context, executemany):
+    global query_count
+    query_count += 1
+
+# Các router dùng engine async, các bước chuẩn bị/dọn dẹp dùng engine đồng bộ
+event.listen(engine, "before_cursor_execute", _count_queries)
+event.listen(async_engine.sync_engine, "before_cursor_execute", _count_queries)
+
+def recipe_payload(n_ingredients, suffix=""):
+    return {
+        "name": f"Món thử {n_ingredients}{suffix}",
+        "description": "Benchmark ghi theo lô",
+        "servings": 2,
+        "tags": "Breakfast,Low-Carb",
+        "ingredients": [
+            {"name": f"Nguyên liệu {j}", "amount": 10 + j, "unit": "gram"}
+            for j in range(n_ingredients)
+        ],
+    }
+
+def fake_weekly_result(n_recipes, n_ingredients):
+    """Kết quả AI giả: n_recipes món, 7 ngày x 3 bữa xoay vòng các món"""
+    recipes = [
+        {
+            "name": f"Món AI {n_recipes}-{i}",
+            "description": "",
+            "instructions": "",
+            "servings": 1,
+            "prep_time": 15,
+            "nutrition": {"calories": 400, "protein": 20, "carbs": 50, "fat": 10},
+            "tags": "Lunch",
+            "ingredients": [
+                {"name": f"Nguyên liệu {j}", "amount": "vừa ăn" if j == 0 else 10 + j, "unit": "gram"}
+                for j in range(n_ingredients)
+            ],
+        }
+        for i in range(n_recipes)
+    ]
+    meal_plan = [
+        {meal: {"name": recipes[(day * 3 + k) % n_recipes]["name"]}
+         for k, meal in enumerate(["breakfast", "lunch", "dinner"])}
+        for day in range(7)
+    ]
+    return {"total_calories_per_day": 1200, "meal_plan": meal_plan, "recipes": recipes}
+
+def measure(call):
+    global query_count
+    query_count = 0
+    started = time.perf_counter()
+    response = call()
+    elapsed = (time.perf_counter() - started) * 1000
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.status_code}: {response.text}")
+    return response.json(), query_count, elapsed
+
+def setup_user():
+    db = SessionLocal()
+    try:
+        cleanup(db)
+        user = models.User(
+            email=BENCH_EMAIL, hashed_password="x",
+            date_of_birth=date(1995, 1, 1), weight=60, height=165, gender="female"
+        )
+        db.add(user)
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+def cleanup(db: Session):
+    user = db.query(models.User).filter(models.User.email == BENCH_EMAIL).first()
+    if not user:
+        return
+    db.query(models.ShoppingListItem).filter(models.ShoppingListItem.user_id == user.id).delete()
+    db.query(models.MealPlan).filter(models.MealPlan.owner_id == user.id).delete()
+    for recipe in db.query(models.Recipe).filter(models.Recipe.owner_id == user.id):
+        db.delete(recipe)
+    db.delete(user)
+    db.commit()
+
+def main():
+    print(f"[INFO] Database: {engine.dialect.name}")
+    user_id = setup_user()
+
+    async def current_user(db: AsyncSession = Depends(get_async_db)):
+        return await db.get(models.User, user_id)
+    app.dependency_overrides[get_current_user_async] = current_user
+    # Dùng `with` để mọi request chạy trên cùng 1 event loop (kết nối async gắn với loop)
+    client = TestClient(app).__enter__()
+
+    print("=" * 72)
+    print(f"{'API':<38} | {'N':>4} | {'queries':>8} | {'ms':>8}")
+    print("-" * 72)
+    try:
+        for n in SIZES:
+            recipe, queries, ms = measure(lambda: client.post("/recipes/", json=recipe_payload(n)))
+            print(f"{'POST /recipes/':<38} | {n:>4} | {queries:>8} | {ms:>8.1f}")
+
+            # Sửa món: đổi 1 nửa số lượng, bỏ 1 nguyên liệu, thêm 1 nguyên liệu mới
+            payload = recipe_payload(n, " (sửa)")
+            for j, ing in enumerate(payload["ingredients"]):
+                ing["amount"] += j % 2
+            payload["ingredients"] = payload["ingredients"][1:] + [{"name": "Rau thơm", "amount": 1, "unit": "bó"}]
+            updated, queries, ms = measure(lambda: client.put(f"/recipes/{recipe['id']}", json=payload))
+            assert len(updated["ingredients"]) == n
+            print(f"{'PUT /recipes/{id} (diff)':<38} | {n:>4} | {queries:>8} | {ms:>8.1f}")
+
+            result, queries, ms = measure(lambda: client.post(f"/shopping/items/from-recipe/{recipe['id']}"))
+            assert len(result["items"]) == n
+            print(f"{'POST /shopping/items/from-recipe/{id}':<38} | {n:>4} | {queries:>8} | {ms:>8.1f}")
+
+        for n in [3, 7, 21]:
+            async def fake_ai(user_data, use_cache=True, n_recipes=n):
+                return fake_weekly_result(n_recipes, 8)
+            ai_service.suggest_weekly_meal_plan_with_recipes = fake_ai
+            with contextlib.redirect_stdout(io.StringIO()):  # Bỏ log [AI] của router
+                result, queries, ms = measure(lambda: client.post(
+                    "/ai/suggest-weekly-plan", json={"start_date": "2025-01-06"}
+                ))
+            assert result["recipes_created"] == n and result["meal_plans_created"] == 21
+            print(f"{'POST /ai/suggest-weekly-plan (món)':<38} | {n:>4} | {queries:>8} | {ms:>8.1f}")
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                result, queries, ms = measure(lambda: client.post(
+                    "/ai/suggest-weekly-plan", json={"start_date": "2025-01-06"}
+                ))
+            assert result["recipes_created"] == 0 and result["recipes_reused"] == n
+            print(f"{'POST /ai/suggest-weekly-plan (lặp lại)':<38} | {n:>4} | {queries:>8} | {ms:>8.1f}")
+    finally:
+        app.dependency_overrides.clear()
+        client.__exit__(None, None, None)
+        db = SessionLocal()
+        try:
+            cleanup(db)
+        finally:
+            db.close()
+    print("=" * 72)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark đọc JSON lỗi do model trả về: cách cũ (_clean_json_text + sửa 1 lỗi tại vị trí json.loads báo)
+so với app/services/json_repair.py (1 lượt đọc, sửa trên đường đọc)
+
+- Bộ mẫu: các kiểu lỗi đã gặp trong phản hồi của model (markdown, comment, dấu phẩy thừa/thiếu,
+  "https://" và "}{" trong chuỗi, dấu nháy không escape, xuống dòng trong chuỗi, văn bản bị cắt...)
+  trên 1 thực đơn tuần cỡ thật (~10 món, 7 ngày)
+- Mỗi mẫu: ĐÚNG khi kết quả bằng dữ liệu gốc (mẫu bị cắt: giữ được các món hoàn chỉnh, không có món dở),
+  SAI khi parse được nhưng nội dung bị đổi, LỖI khi không parse được; thời gian trung bình mỗi lần parse
+- Độ dài tăng dần (nhiều lỗi thiếu dấu phẩy): thời gian của json_repair tăng tuyến tính
+
+Chạy: python bench_json_repair.py (không cần DB, không gọi AI)
+"""
+import json
+import re
+import sys
+import time
+from app.services import json_repair
+
+# Fix encoding for Windows
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+REPEAT = 20
+SCALES = [10, 50, 200]
+
+
+# --- CÁCH CŨ (bản sao của ai_service trước khi dùng json_repair) ---
+def _fix_json_at_position(text: str, error_pos: int) -> str:
+    if error_pos < len(text):
+        char_at_error = text[error_pos]
+        prev_char = text[error_pos - 1] if error_pos > 0 else ''
+        if char_at_error == '"' and prev_char in ['}', ']', '0', '1', '2', '3', '4', '5', '6', '7', '8', '9']:
+            return text[:error_pos] + ',' + text[error_pos:]
+        if char_at_error == '{' and prev_char == '}':
+            return text[:error_pos] + ',' + text[error_pos:]
+    return text
+
+def _clean_json_text(text: str) -> str:
+    if text.startswith('\ufeff'):
+        text = text[1:]
+    text = re.sub(r'//.*?$', '', text, flags=re.MULTILINE)
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.DOTALL)
+    text = re.sub(r',(\s*[}\]])', r'\1', text)
+    text = re.sub(r'"\s*\n\s*"', '",\n"', text)
+    text = re.sub(r'}\s*\n\s*{', '},\n{', text)
+    text = re.sub(r']\s*\n\s*\[', '],\n[', text)
+    text = re.sub(r'}\s*{', '},{', text)
+    text = re.sub(r'}\s*\[', '},[', text)
+    text = re.sub(r']\s*{', '],{', text)
+    text = re.sub(r'(\d|true|false|null)\s+(")', r'\1,\2', text)
+    text = re.sub(r'(})\s+(")', r'\1,\2', text)
+    text = re.sub(r'(])\s+(")', r'\1,\2', text)
+    return text
+
+def old_loads(result_text: str):
+    """Luồng cũ của suggest_weekly_meal_plan_with_recipes: cắt markdown, làm sạch, sửa 1 lỗi, parse lại"""
+    if "```" in result_text:
+        start = result_text.find("{")
+        end = result_text.rfind("}") + 1
+        if start != -1 and end != 0:
+            result_text = result_text[start:end]
+    result_text = _clean_json_text(result_text)
+    try:
+        return json.loads(result_text)
+    except json.JSONDecodeError as parse_error:
+        return json.loads(_fix_json_at_position(result_text, parse_error.pos))
+
+
+# --- BỘ MẪU ---
+def weekly_plan(n_recipes: int = 10, description: str = "Món ăn số {i}", instructions: str = "Bước 1: Sơ chế\nBước 2: Nấu chín") -> dict:
+    return {
+        "total_calories_per_day": 2100,
+        "recipes": [
+            {
+                "name": f"Món {i}",
+                "description": description.format(i=i),
+                "instructions": instructions,
+                "servings": 1,
+                "prep_time": 20,
+                "ingredients": [{"name": f"Nguyên liệu {j}", "amount": 100, "unit": "gram"} for j in range(4)],
+                "nutrition": {"calories": 600 + i, "protein": 30, "carbs": 70.5, "fat": 15},
+                "tags": "Lunch",
+            }
+            for i in range(n_recipes)
+        ],
+        "meal_plan": [
+            {"day": day, "breakfast": {"name": "Món 0"}, "lunch": {"name": "Món 1"}, "dinner": {"name": "Món 2"}}
+            for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+        ],
+    }
+
+def pretty(data) -> str:
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+PLAN = weekly_plan()
+TEXT = pretty(PLAN)
+URL_PLAN = weekly_plan(description="Món {i}, xem https://vi.wikipedia.org/wiki/Phở")
+BRACES_PLAN = weekly_plan(instructions="Bước 1: Trộn {sốt}{rau}\nBước 2: Nấu chín")
+QUOTED_PLAN = weekly_plan(instructions='Bước 1: Sơ chế "sạch"\nBước 2: Nấu chín')
+EXTRA_KEY_PLAN = weekly_plan()
+EXTRA_KEY_PLAN["recipes"][0]["ingredients"][0]["note"] = "thái mỏng"
+
+def complete_recipes(result) -> bool:
+    """Văn bản bị cắt giữa các món: còn ít nhất 1 món, mọi món còn lại đều đầy đủ"""
+    recipes = result.get("recipes", []) if isinstance(result, dict) else []
+    return bool(recipes) and all(recipe in PLAN["recipes"] for recipe in recipes)
+
+def complete_days(result) -> bool:
+    """Văn bản bị cắt trong meal_plan: đủ món, các ngày còn lại đều đầy đủ"""
+    return (isinstance(result, dict) and result.get("recipes") == PLAN["recipes"]
+            and 0 < len(result.get("meal_plan", [])) < 7
+            and all(day in PLAN["meal_plan"] for day in result["meal_plan"]))
+
+# (tên, văn bản model trả về, kết quả đúng hoặc hàm kiểm tra)
+CORPUS = [
+    ("JSON hợp lệ trong ```json", "```json\n" + TEXT + "\n```", PLAN),
+    ("Lời dẫn trước / sau", "Đây là thực đơn của bạn:\n" + TEXT + "\nChúc ngon miệng!", PLAN),
+    ("Dấu phẩy thừa", TEXT.replace('"tags": "Lunch"', '"tags": "Lunch",').replace("\n  ]", ",\n  ]"), PLAN),
+    ("Comment // và /* */", TEXT.replace('"servings": 1,', '"servings": 1, // 1 người ăn')
+     .replace('"total_calories_per_day": 2100,', '/* mục tiêu */ "total_calories_per_day": 2100,'), PLAN),
+    ("Thiếu dấu phẩy giữa các món (}{)", TEXT.replace("},\n    {\n      \"name\"", "}\n    {\n      \"name\""), PLAN),
+    ("Thiếu dấu phẩy cùng dòng", json.dumps(PLAN, ensure_ascii=False)
+     .replace('"servings": 1, ', '"servings": 1 ').replace('"prep_time": 20, ', '"prep_time": 20 '), PLAN),
+    ("Thiếu dấu phẩy sau chuỗi", TEXT.replace('"unit": "gram"', '"unit": "gram" "note": "thái mỏng"', 1), EXTRA_KEY_PLAN),
+    ("\"https://\" trong chuỗi", pretty(URL_PLAN), URL_PLAN),
+    ("\"}{\" trong chuỗi", pretty(BRACES_PLAN), BRACES_PLAN),
+    ("Dấu nháy không escape", pretty(QUOTED_PLAN).replace('\\"', '"'), QUOTED_PLAN),
+    ("Xuống dòng thật trong chuỗi", TEXT.replace("\\n", "\n"), PLAN),
+    ("Văn bản bị cắt giữa món", TEXT[:len(TEXT) // 3], complete_recipes),
+    ("Văn bản bị cắt trong meal_plan", TEXT[:len(TEXT) - 200], complete_days),
+]
+
+
+# --- ĐO ---
+def judge(parse, text, expected):
+    try:
+        result = parse(text)
+    except (ValueError, TypeError):
+        return "LỖI"
+    ok = expected(result) if callable(expected) else result == expected
+    return "ĐÚNG" if ok else "SAI"
+
+def timed(parse, text, repeat=REPEAT) -> float:
+    """Thời gian trung bình mỗi lần parse (ms), lần lỗi vẫn được tính"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        try:
+            parse(text)
+        except (ValueError, TypeError):
+            pass
+    return (time.perf_counter() - started) / repeat * 1000
+
+def missing_commas(n_recipes: int) -> str:
+    """Thực đơn n món, thiếu dấu phẩy giữa MỌI cặp món và mọi cặp nguyên liệu"""
+    text = pretty(weekly_plan(n_recipes))
+    return text.replace("},\n    {", "}\n    {").replace("},\n        {", "}\n        {")
+
+def main():
+    print(f"{'Mẫu':<36} {'Cách cũ':>8} {'ms':>7}   {'json_repair':>11} {'ms':>7}")
+    totals = {"old": 0, "new": 0}
+    for name, text, expected in CORPUS:
+        old_verdict, new_verdict = judge(old_loads, text, expected), judge(json_repair.loads, text, expected)
+        totals["old"] += old_verdict == "ĐÚNG"
+        totals["new"] += new_verdict == "ĐÚNG"
+        print(f"{name:<36} {old_verdict:>8} {timed(old_loads, text):>7.2f}   "
+              f"{new_verdict:>11} {timed(json_repair.loads, text):>7.2f}")
+    print(f"\n[INFO] Đúng: cách cũ {totals['old']}/{len(CORPUS)}, json_repair {totals['new']}/{len(CORPUS)}")
+
+    print(f"\n{'Số món (thiếu mọi dấu phẩy)':<28} {'Ký tự':>9} {'Cách cũ':>8} {'ms':>7}   "
+          f"{'json_repair ms':>15} {'µs / KB':>8}")
+    per_kb = []
+    for n_recipes in SCALES:
+        text = missing_commas(n_recipes)
+        elapsed = timed(json_repair.loads, text, repeat=5)
+        per_kb.append(elapsed * 1000 / (len(text) / 1024))
+        print(f"{n_recipes:<28} {len(text):>9} {judge(old_loads, text, weekly_plan(n_recipes)):>8} "
+              f"{timed(old_loads, text, repeat=5):>7.2f}   {elapsed:>15.2f} {per_kb[-1]:>8.1f}")
+
+    checks = [
+        (totals["new"] == len(CORPUS), "json_repair đọc đúng mọi mẫu"),
+        (totals["new"] > totals["old"], "json_repair đọc đúng nhiều mẫu hơn cách cũ"),
+        (max(per_kb) < min(per_kb) * 2, "thời gian tăng tuyến tính theo độ dài (µs / KB gần như không đổi)"),
+    ]
+    print()
+    for ok, label in checks:
+        print(f"{'✅' if ok else '❌'} {label}")
+    sys.exit(0 if all(ok for ok, _ in checks) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark lập thực đơn tuần không dùng AI (app/services/local_planner.py, "mode": "local")
+
+- Tạo danh mục N_RECIPES món công khai giả (tên + nguyên liệu tiếng Việt, dinh dưỡng ngẫu nhiên có seed,
+  ~10% món thiếu protein/carbs/fat) + USER_RECIPES món riêng của user
+- Lần đầu: nạp danh mục công khai vào bộ nhớ (đọc DB + dựng index từ -> món)
+- Các lần sau (như mỗi request): đọc món của user + lập 7 ngày x 3 bữa + lưu meal plans (rollback)
+  cho vài hồ sơ (giữ cân / giảm cân + ăn chay / tăng cân + low carb + không tôm)
+- Kiểm tra: mỗi lần < 100 ms, calories mỗi ngày lệch mục tiêu trung bình < 5%, thực đơn chay không có
+  món thịt / hải sản, không lặp món trong 1 ngày
+
+Chạy: python bench_local_planner.py
+(Mặc định dùng SQLite in-memory. Script tạo bảng rồi DROP toàn bộ bảng khi xong, nên với DATABASE_URL
+khác phải đặt thêm BENCH_DROP_TABLES=1 để xác nhận đây là DB thử nghiệm bỏ đi được - KHÔNG chạy trên DB thật)
+"""
+import os
+import sys
+import time
+from datetime import date
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import numpy as np
+from sqlalchemy import insert, make_url
+from app.database import engine, SessionLocal
+from app import models
+from app.services import local_planner, meal_plan_writer
+
+# Fix encoding for Windows
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+N_RECIPES = 50_000
+USER_RECIPES = 200
+REPEAT = 20
+LIMIT_MS = 100
+START_DATE = date(2025, 1, 6)
+
+BASES = [("Cơm", "Gạo"), ("Bún", "Bún tươi"), ("Phở", "Bánh phở"), ("Miến", "Miến dong"), ("Cháo", "Gạo nếp"),
+         ("Xôi", "Gạo nếp"), ("Bánh mì", "Bánh mì"), ("Salad", "Xà lách"), ("Canh", "Bí đao"), ("Gỏi", "Rau thơm")]
+# (tên trong món, nguyên liệu, loại)
+PROTEINS = [("gà", "Thịt gà", "meat"), ("bò", "Thịt bò", "meat"), ("heo", "Thịt heo", "meat"),
+            ("cá", "Cá basa", "seafood"), ("tôm", "Tôm sú", "seafood"), ("đậu phụ", "Đậu phụ", "veg"),
+            ("nấm", "Nấm rơm", "veg"), ("trứng", "Trứng", "veg")]
+VEGETABLES = ["Cà chua", "Rau muống", "Cải ngọt", "Bơ", "Hành lá", "Tỏi", "Gừng", "Cà rốt", "Dưa leo", "Đậu que"]
+TAGS = ["Breakfast", "Lunch", "Dinner", "Lunch,Dinner", ""]
+
+PROFILES = [
+    ("Giữ cân", {"goal": "maintain", "dietary_preferences": ""}),
+    ("Giảm cân + ăn chay", {"goal": "lose", "dietary_preferences": "Ăn chay"}),
+    ("Tăng cân + low carb, không tôm", {"goal": "gain", "dietary_preferences": "low carb, không tôm"}),
+]
+BASE_USER = {"gender": "female", "weight": 60, "height": 165, "date_of_birth": "1995-01-01",
+             "activity_level": "moderate"}
+
+
+def seed(db) -> tuple:
+    """N_RECIPES món công khai + USER_RECIPES món của 1 user (INSERT theo lô). Trả về (user_id, loại đạm theo id)"""
+    user = models.User(email="bench-planner@example.com", hashed_password="x")
+    db.add(user)
+    db.flush()
+
+    rng = np.random.default_rng(42)
+    total = N_RECIPES + USER_RECIPES
+    calories = rng.uniform(150, 900, total)
+    shares = rng.dirichlet([3, 5, 3], total)  # Tỷ lệ năng lượng protein / carbs / fat của từng món
+    grams = calories[:, None] * shares / local_planner.KCAL_PER_GRAM
+    missing = rng.random(total) < 0.1
+
+    recipes, ingredients, kinds = [], [], {}
+    for i in range(total):
+        recipe_id = i + 1
+        base, base_ingredient = BASES[i % len(BASES)]
+        word, protein_ingredient, kind = PROTEINS[rng.integers(len(PROTEINS))]
+        kinds[recipe_id] = kind
+        protein, carbs, fat = (None, None, None) if missing[i] else (round(float(g), 1) for g in grams[i])
+        recipes.append({
+            "id": recipe_id, "name": f"{base} {word} {i}", "servings": 1,
+            "calories": round(float(calories[i])), "protein": protein, "carbs": carbs, "fat": fat,
+            "tags": TAGS[i % len(TAGS)], "owner_id": user.id if i >= N_RECIPES else None,
+        })
+        names = [base_ingredient, protein_ingredient] + [VEGETABLES[j] for j in rng.choice(len(VEGETABLES), 3, replace=False)]
+        ingredients.extend({"recipe_id": recipe_id, "name": name, "amount": 100, "unit": "gram"} for name in names)
+    db.execute(insert(models.Recipe), recipes)
+    db.execute(insert(models.Ingredient), ingredients)
+    db.commit()
+    return user.id, kinds
+
+
+def plan_once(db, user_id: int, user_data: dict) -> dict:
+    """1 request: nạp danh mục (công khai từ bộ nhớ) + lập thực đơn + lưu meal plans (rollback)"""
+    catalogs = local_planner.load_catalogs(db, user_id)
+    plan = local_planner.plan_week(catalogs, user_data, START_DATE)
+    meal_plan_writer.save_local_plan(db, user_id, plan["meal_plan"], START_DATE)
+    db.rollback()
+    return plan
+
+
+def is_disposable_database() -> bool:
+    """Chỉ cho phép create_all / drop_all trên SQLite in-memory hoặc DB đã được đánh dấu BENCH_DROP_TABLES=1"""
+    url = make_url(os.environ["DATABASE_URL"])
+    in_memory = url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+    return in_memory or os.getenv("BENCH_DROP_TABLES") == "1"
+
+
+def main():
+    if not is_disposable_database():
+        print("❌ DATABASE_URL không phải SQLite in-memory: script sẽ DROP toàn bộ bảng khi xong.")
+        print("   Chỉ chạy trên DB thử nghiệm bỏ đi được, đặt BENCH_DROP_TABLES=1 để xác nhận.")
+        sys.exit(2)
+    print(f"[INFO] Database: {engine.dialect.name}, {N_RECIPES} món công khai + {USER_RECIPES} món của user")
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        user_id, kinds = seed(db)
+        print(f"[INFO] Tạo dữ liệu: {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        local_planner.load_catalogs(db, user_id)
+        print(f"[INFO] Nạp danh mục công khai vào bộ nhớ (lần đầu): {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        print("=" * 84)
+        print(f"{'Hồ sơ':<32} | {'kcal/ngày':>9} | {'lệch TB':>7} | {'món hợp lệ':>10} | {'TB ms':>6} | {'max ms':>6}")
+        print("-" * 84)
+        checks = []
+        for label, profile in PROFILES:
+            user_data = {**BASE_USER, **profile}
+            timings = []
+            for _ in range(REPEAT):
+                started = time.perf_counter()
+                plan = plan_once(db, user_id, user_data)
+                timings.append((time.perf_counter() - started) * 1000)
+
+            target = plan["total_calories_per_day"]
+            errors = [abs(day["totals"]["calories"] - target) / target for day in plan["meal_plan"]]
+            print(f"{label:<32} | {target:>9} | {np.mean(errors):>6.1%} | {plan['candidates']:>10} | "
+                  f"{np.mean(timings):>6.1f} | {max(timings):>6.1f}")
+
+            chosen = [[day[key]["recipe_id"] for _, key in meal_plan_writer.MEAL_TYPES] for day in plan["meal_plan"]]
+            checks.append((max(timings) < LIMIT_MS, f"{label}: mỗi lần < {LIMIT_MS} ms"))
+            checks.append((np.mean(errors) < 0.05, f"{label}: calories mỗi ngày lệch mục tiêu trung bình < 5%"))
+            checks.append((all(len(set(day)) == len(day) for day in chosen), f"{label}: không lặp món trong 1 ngày"))
+            if "chay" in profile["dietary_preferences"].lower():
+                vegetarian = all(kinds[recipe_id] == "veg" for day in chosen for recipe_id in day)
+                checks.append((vegetarian, f"{label}: không có món thịt / hải sản"))
+        print("=" * 84)
+
+        print()
+        for ok, name in checks:
+            print(f"{'✅' if ok else '❌'} {name}")
+    finally:
+        db.close()
+        models.Base.metadata.drop_all(bind=engine)
+    sys.exit(0 if all(ok for ok, _ in checks) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark tìm kiếm món ăn không dấu trên catalog lớn (mặc định 100.000 món)
+
+Chạy: python bench_recipe_search.py [số_món]
+LƯU Ý: script chèn dữ liệu giả vào DATABASE_URL rồi xóa đi khi xong
+-> chỉ chạy trên DB thử nghiệm (đã `alembic upgrade head`), KHÔNG chạy trên DB thật.
+"""
+import random
+import sys
+import time
+from sqlalchemy import text
+from app.database import SessionLocal, engine
+from app import models
+from app.services import search as recipe_search
+
+# Fix encoding for Windows
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+N_RECIPES = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+BATCH_SIZE = 5_000
+REPEAT = 20
+
+DISHES = ["Phở", "Bún", "Cơm", "Cháo", "Bánh mì", "Miến", "Hủ tiếu", "Gỏi", "Canh", "Lẩu", "Xôi", "Mì"]
+MAINS = ["bò", "gà", "heo", "cá", "tôm", "mực", "vịt", "đậu hũ", "nấm", "trứng", "sườn", "chả"]
+STYLES = ["Hà Nội", "Sài Gòn", "Huế", "chua ngọt", "nướng", "xào", "kho tộ", "hấp", "chiên giòn", "rau củ"]
+INGREDIENTS = ["Hành lá", "Tỏi", "Ớt", "Nước mắm", "Gừng", "Rau mùi", "Chanh", "Tiêu", "Sả", "Đường"]
+
+QUERIES = ["pho bo", "bun cha", "ga nuong", "tom chua ngot", "dau hu nam", "banh mi", "sườn", "ca kho to", "xyz khong co"]
+
+def seed(db):
+    """Chèn N_RECIPES món giả (owner_id = NULL), trả về danh sách id để xóa sau"""
+    rng = random.Random(42)
+    created_ids = []
+    for start in range(0, N_RECIPES, BATCH_SIZE):
+        rows = []
+        for i in range(start, min(start + BATCH_SIZE, N_RECIPES)):
+            name = f"{rng.choice(DISHES)} {rng.choice(MAINS)} {rng.choice(STYLES)}"
+            description = f"Món ngon số {i}"
+            ingredient_names = rng.sample(INGREDIENTS, 3)
+            rows.append({
+                "name": name,
+                "description": description,
+                "servings": 1,
+                "search_text": recipe_search.build_search_text(name, description, ingredient_names),
+            })
+        result = db.execute(models.Recipe.__table__.insert().returning(models.Recipe.id), rows)
+        created_ids.extend(result.scalars().all())
+        db.commit()
+        print(f"   ... đã chèn {len(created_ids)}/{N_RECIPES} món", end="\r")
+    print()
+    return created_ids
+
+def main():
+    print(f"[INFO] Database: {engine.dialect.name}, số món: {N_RECIPES}")
+    db = SessionLocal()
+    created_ids = []
+    try:
+        created_ids = seed(db)
+        if engine.dialect.name == "postgresql":
+            db.execute(text("ANALYZE recipes"))
+            db.commit()
+
+        print("=" * 70)
+        print(f"{'Từ khóa':<18} {'Kết quả':>8} {'p50 (ms)':>10} {'max (ms)':>10}")
+        print("-" * 70)
+        for term in QUERIES:
+            timings = []
+            for _ in range(REPEAT):
+                started = time.perf_counter()
+                query = recipe_search.apply_search(db.query(models.Recipe.id, models.Recipe.name), term)
+                results = query.limit(20).all()
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            print(f"{term:<18} {len(results):>8} {timings[len(timings) // 2]:>10.2f} {timings[-1]:>10.2f}")
+        print("=" * 70)
+    finally:
+        db.rollback()
+        for start in range(0, len(created_ids), BATCH_SIZE):
+            db.query(models.Recipe).filter(
+                models.Recipe.id.in_(created_ids[start:start + BATCH_SIZE])
+            ).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+
+if __name__ == "__main__":
+    main()
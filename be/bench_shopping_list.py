@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark generate_shopping_list: so sánh cách cũ (lazy-load từng meal plan)
+với query JOIN + GROUP BY hiện tại khi khoảng thời gian tăng dần.
+
+Chạy: python bench_shopping_list.py
+(Mặc định dùng SQLite in-memory. Script tạo bảng rồi DROP toàn bộ bảng khi xong, nên với DATABASE_URL
+khác phải đặt thêm BENCH_DROP_TABLES=1 để xác nhận đây là DB thử nghiệm bỏ đi được - KHÔNG chạy trên DB thật)
+"""
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import event, make_url
+from app.database import engine, SessionLocal
+from app import models
+from app.services.shopping import generate_shopping_list
+
+# Fix encoding for Windows
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+START_DATE = date(2025, 1, 1)
+RANGES = [7, 30, 90, 365]
+N_RECIPES = 40
+N_INGREDIENTS = 8
+
+query_count = 0
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count_queries(conn, cursor, statement, parameters, context, executemany):
+    global query_count
+    query_count += 1
+
+def generate_shopping_list_naive(db, user_id, start_date, end_date):
+    """
+    Bản cũ (trước khi gộp bằng SQL) - dùng để so sánh kết quả và chi phí
+    Sắp xếp rõ ràng theo (meal plan id, ingredient id) như generate_shopping_list: thứ tự items / recipes
+    là thứ tự xuất hiện đầu tiên (không ORDER BY thì thứ tự phụ thuộc index DB chọn)
+    """
+    meal_plans = db.query(models.MealPlan).filter(
+        models.MealPlan.owner_id == user_id,
+        models.MealPlan.date >= start_date,
+        models.MealPlan.date <= end_date
+    ).order_by(models.MealPlan.id).all()
+
+    if not meal_plans:
+        return {"items": [], "message": "Chưa có kế hoạch bữa ăn nào"}
+
+    ingredient_map = defaultdict(lambda: {"amount": 0, "unit": "", "recipes": []})
+    for plan in meal_plans:
+        recipe = plan.recipe
+        if not recipe:
+            continue
+        multiplier = plan.servings / recipe.servings
+        for ing in sorted(recipe.ingredients, key=lambda ing: ing.id):
+            key = f"{ing.name.lower()}_{ing.unit.lower()}"
+            ingredient_map[key]["name"] = ing.name
+            ingredient_map[key]["amount"] += ing.amount * multiplier
+            ingredient_map[key]["unit"] = ing.unit
+            if recipe.name not in ingredient_map[key]["recipes"]:
+                ingredient_map[key]["recipes"].append(recipe.name)
+
+    shopping_items = [
+        {"name": d["name"], "amount": round(d["amount"], 2), "unit": d["unit"], "recipes": d["recipes"]}
+        for d in ingredient_map.values()
+    ]
+    return {
+        "items": shopping_items,
+        "total_items": len(shopping_items),
+        "date_range": f"{start_date} to {end_date}"
+    }
+
+def seed(db):
+    """Tạo 1 user, N_RECIPES món (nguyên liệu trùng tên giữa các món) và 3 bữa/ngày trong 1 năm"""
+    user = models.User(email="bench@example.com", hashed_password="x")
+    db.add(user)
+    db.flush()
+
+    recipes = []
+    for i in range(N_RECIPES):
+        recipe = models.Recipe(name=f"Món {i}", servings=1 + i % 3, owner_id=user.id)
+        recipe.ingredients = [
+            models.Ingredient(
+                name=f"Nguyên liệu {(i + j) % 25}" if j % 2 else f"NGUYÊN LIỆU {(i + j) % 25}",
+                amount=10 + j,
+                unit="gram"
+            )
+            for j in range(N_INGREDIENTS)
+        ]
+        recipes.append(recipe)
+    db.add_all(recipes)
+    db.flush()
+
+    for day in range(max(RANGES)):
+        for k, meal_type in enumerate(["Breakfast", "Lunch", "Dinner"]):
+            db.add(models.MealPlan(
+                date=START_DATE + timedelta(days=day),
+                meal_type=meal_type,
+                servings=1 + (day + k) % 4,
+                owner_id=user.id,
+                recipe_id=recipes[(day * 3 + k * 7) % N_RECIPES].id
+            ))
+    db.commit()
+    return user.id
+
+def measure(fn, user_id, days):
+    global query_count
+    db = SessionLocal()
+    try:
+        query_count = 0
+        started = time.perf_counter()
+        result = fn(db, user_id, START_DATE, START_DATE + timedelta(days=days - 1))
+        elapsed = (time.perf_counter() - started) * 1000
+        return result, query_count, elapsed
+    finally:
+        db.close()
+
+def is_disposable_database() -> bool:
+    """Chỉ cho phép create_all / drop_all trên SQLite in-memory hoặc DB đã được đánh dấu BENCH_DROP_TABLES=1"""
+    url = make_url(os.environ["DATABASE_URL"])
+    in_memory = url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+    return in_memory or os.getenv("BENCH_DROP_TABLES") == "1"
+
+def main():
+    if not is_disposable_database():
+        print("❌ DATABASE_URL không phải SQLite in-memory: script sẽ DROP toàn bộ bảng khi xong.")
+        print("   Chỉ chạy trên DB thử nghiệm bỏ đi được, đặt BENCH_DROP_TABLES=1 để xác nhận.")
+        sys.exit(2)
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        user_id = seed(db)
+    finally:
+        db.close()
+
+    print("=" * 72)
+    print(f"{'Số ngày':>8} | {'Cũ: queries':>12} {'ms':>9} | {'Mới: queries':>13} {'ms':>9} | Kết quả")
+    print("-" * 72)
+    for days in RANGES:
+        old_result, old_queries, old_ms = measure(generate_shopping_list_naive, user_id, days)
+        new_result, new_queries, new_ms = measure(generate_shopping_list, user_id, days)
+        same = "✅ giống" if old_result == new_result else "❌ KHÁC"
+        print(f"{days:>8} | {old_queries:>12} {old_ms:>9.1f} | {new_queries:>13} {new_ms:>9.1f} | {same}")
+    print("=" * 72)
+
+    models.Base.metadata.drop_all(bind=engine)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script kiểm tra các query hay dùng (hot path) có dùng index hay không - dựa trên EXPLAIN
+Chạy sau khi đã `alembic upgrade head`: python check_indexes.py
+
+- PostgreSQL: EXPLAIN với enable_seqscan = off (bảng nhỏ thì planner luôn chọn
+  Seq Scan, tắt đi để kiểm tra index CÓ THỂ được dùng)
+- SQLite: EXPLAIN QUERY PLAN
+"""
+import sys
+from datetime import date
+from sqlalchemy import or_, text, tuple_
+from sqlalchemy.orm import Session
+from app.database import engine
+from app import models
+from app.services import search as recipe_search
+from app.services import tags as recipe_tags
+from app.services import ratings as recipe_ratings
+
+# Fix encoding for Windows
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+def hot_queries(db: Session):
+    """(mô tả, query, index mong đợi) - giống điều kiện lọc trong các router"""
+    is_postgresql = db.get_bind().dialect.name == "postgresql"
+    return [
+        (
+            "Lịch ăn của user theo khoảng ngày (/plans/, /shopping/list)",
+            db.query(models.MealPlan).filter(
+                models.MealPlan.owner_id == 1,
+                models.MealPlan.date >= date(2025, 1, 1),
+                models.MealPlan.date <= date(2025, 1, 31)
+            ),
+            "ix_meal_plans_owner_date_meal_type",
+        ),
+        (
+            "Kiểm tra trùng bữa (POST /plans/)",
+            db.query(models.MealPlan).filter(
+                models.MealPlan.owner_id == 1,
+                models.MealPlan.date == date(2025, 1, 1),
+                models.MealPlan.meal_type == "Lunch"
+            ),
+            "ix_meal_plans_owner_date_meal_type",
+        ),
+        (
+            "Lịch ăn tham chiếu món (DELETE /recipes/{id})",
+            db.query(models.MealPlan).filter(models.MealPlan.recipe_id == 1),
+            "ix_meal_plans_recipe_id",
+        ),
+        (
+            "Đánh giá của user cho món (POST /recipes/{id}/ratings)",
+            db.query(models.Rating).filter(
+                models.Rating.user_id == 1,
+                models.Rating.recipe_id == 1
+            ),
+            "ix_ratings_recipe_user",
+        ),
+        (
+            "Shopping items theo món (POST /shopping/items/from-recipe/{id})",
+            db.query(models.ShoppingListItem).filter(
+                models.ShoppingListItem.user_id == 1,
+                models.ShoppingListItem.recipe_id == 1
+            ),
+            "ix_shopping_items_user_recipe_purchased",
+        ),
+        (
+            "Nguyên liệu của món (eager-load ingredients)",
+            db.query(models.Ingredient).filter(models.Ingredient.recipe_id.in_([1, 2, 3])),
+            "ix_ingredients_recipe_id",
+        ),
+        (
+            "Món của tôi (GET /recipes/?my_only=true)",
+            db.query(models.Recipe).filter(models.Recipe.owner_id == 1),
+            "ix_recipes_owner_id",
+        ),
+        (
+            "Món công khai theo tên (partial index owner_id IS NULL)",
+            db.query(models.Recipe).filter(
+                models.Recipe.owner_id.is_(None),
+                models.Recipe.name == "Phở bò"
+            ),
+            "ix_recipes_public_name",
+        ),
+        (
+            "Món của tôi + món công khai (GET /recipes/)",
+            db.query(models.Recipe).filter(
+                or_(models.Recipe.owner_id == 1, models.Recipe.owner_id.is_(None))
+            ),
+            "ix_recipes_owner_id",
+        ),
+        (
+            "Tìm kiếm không dấu (GET /recipes/?search=pho bo)",
+            recipe_search.apply_search(db.query(models.Recipe), "pho bo"),
+            "ix_recipes_search_vector" if is_postgresql else "recipes_fts",
+        ),
+        (
+            "Lọc theo tags (GET /recipes/?tags=breakfast,low-carb)",
+            recipe_tags.apply_tag_filter(db.query(models.Recipe), "Breakfast,Low-Carb"),
+            "ix_recipe_tags_tag_recipe",
+        ),
+        (
+            "Món đã được đánh giá (GET /recipes/rated)",
+            db.query(models.Recipe).filter(recipe_ratings.is_rated).order_by(models.Recipe.id).limit(100),
+            "ix_recipes_rated_id",
+        ),
+        (
+            "Món đã được đánh giá, điểm cao nhất trước (GET /recipes/rated?sort=avg)",
+            db.query(models.Recipe).filter(recipe_ratings.is_rated).order_by(
+                models.Recipe.rating_avg.desc(), models.Recipe.id.desc()
+            ).limit(100),
+            "ix_recipes_rated_avg",
+        ),
+        (
+            "Phân trang cursor lịch ăn (GET /admin/meal-plans?cursor=...)",
+            db.query(models.MealPlan).filter(
+                tuple_(models.MealPlan.date, models.MealPlan.id) < tuple_(date(2025, 1, 15), 100)
+            ).order_by(models.MealPlan.date.desc(), models.MealPlan.id.desc()).limit(20),
+            # SQLite: index (date) đã ngầm chứa rowid (= id) nên có thể dùng thay cho (date, id)
+            "ix_meal_plans_date_id" if is_postgresql else "ix_meal_plans_date",
+        ),
+        (
+            "Phân trang cursor đánh giá của món (GET /recipes/{id}/ratings?cursor=...)",
+            db.query(models.Rating).filter(
+                models.Rating.recipe_id == 1,
+                models.Rating.id < 100
+            ).order_by(models.Rating.id.desc()).limit(20),
+            "ix_ratings_recipe_id_id",
+        ),
+    ]
+
+def explain(connection, query) -> str:
+    compiled = query.statement.compile(
+        dialect=connection.dialect,
+        compile_kwargs={"render_postcompile": True}
+    )
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+
+    if connection.dialect.name == "postgresql":
+        rows = connection.exec_driver_sql(f"EXPLAIN {compiled.string}", params).fetchall()
+        return "\n".join(row[0] for row in rows)
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled.string}", params).fetchall()
+    return "\n".join(str(row[-1]) for row in rows)
+
+def main():
+    print(f"[INFO] Database: {engine.dialect.name}")
+    print("=" * 70)
+
+    failed = 0
+    with engine.connect() as connection:
+        if connection.dialect.name == "postgresql":
+            connection.execute(text("SET enable_seqscan = off"))
+
+        db = Session(bind=connection)
+        for description, query, expected_index in hot_queries(db):
+            plan = explain(connection, query)
+            ok = expected_index in plan
+            failed += 0 if ok else 1
+            print(f"{'[OK]  ' if ok else '[FAIL]'} {description}")
+            print(f"       index mong đợi: {expected_index}")
+            for line in plan.splitlines():
+                print(f"       | {line}")
+        db.close()
+
+    print("=" * 70)
+    if failed:
+        print(f"[ERROR] {failed} query không dùng index mong đợi. Đã chạy `alembic upgrade head` chưa?")
+        sys.exit(1)
+    print("[OK] Tất cả query hot path đều dùng index")
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,45 @@
 import os
 import uvicorn
+from contextlib import asynccontextmanager
+from anyio import to_thread
 from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 import json
+import math
 
 # 1. Import kết nối DB
-from app.database import engine
-from app import models 
+from app.database import check_schema_version, async_engine, async_replica_engine, replica_engine
+from app.db_routing import (
+    STICKY_COOKIE, STICKY_HEADER, STICKY_SECONDS, WRITE_METHODS, client_key, record_write
+)
+from app.executors import BUSY_DETAIL, ExecutorBusy
+from app.db_pool import THREADPOOL_SIZE
 
 # 2. Import các Router (API)
 from app.routers import auth, recipes, plans, ai, shopping, admin
 
 load_dotenv()
 
-# 3. Tạo bảng Database tự động
-models.Base.metadata.create_all(bind=engine)
+# 3. Kiểm tra phiên bản schema (bảng được tạo/cập nhật bằng `alembic upgrade head`)
+check_schema_version()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Số thread chạy các route đồng bộ - khớp với kích thước pool kết nối DB (app/db_pool.py)
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    yield
+    # Đóng các kết nối của engine async (gắn với event loop đang tắt)
+    await async_engine.dispose()
+    if async_replica_engine is not None:
+        await async_replica_engine.dispose()
 
 app = FastAPI(
     title="Meal Planner API",
     description="API quản lý thực đơn với AI Assistant (Google Gemini)",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Middleware để đảm bảo response UTF-8 (chỉ thêm charset, không override content-type)
@@ -38,6 +56,29 @@ async def add_utf8_header(request, call_next):
             response.headers["Content-Type"] = "application/json; charset=utf-8"
     return response
 
+# Read replica: client vừa ghi thành công -> các request đọc tiếp theo của client đó đọc từ primary
+# trong DB_REPLICA_STICKY_SECONDS giây (read-your-writes, xem app/db_routing.py)
+# Token ký trong header + cookie: request đọc tới worker / máy chủ khác vẫn biết client vừa ghi
+@app.middleware("http")
+async def track_writes_for_replica(request, call_next):
+    response = await call_next(request)
+    if replica_engine is not None and request.method in WRITE_METHODS and response.status_code < 400:
+        token = record_write(client_key(request))
+        response.headers[STICKY_HEADER] = token
+        response.set_cookie(STICKY_COOKIE, token, max_age=math.ceil(STICKY_SECONDS), httponly=True, samesite="lax")
+    return response
+
+# Executor riêng (hash mật khẩu, gọi AI) đầy hàng đợi -> 503, client thử lại sau (app/executors.py)
+@app.exception_handler(ExecutorBusy)
+async def executor_busy_handler(request, exc: ExecutorBusy):
+    print(f"[BUSY] {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": BUSY_DETAIL},
+        # Hết key / model AI (app/services/llm_pool.py): chờ tới khi có backend dùng lại được
+        headers={"Retry-After": str(getattr(exc, "retry_after", 2))},
+    )
+
 # Cấu hình CORS
 origins = [
     "http://127.0.0.1:5500",
@@ -53,6 +94,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[STICKY_HEADER],  # fe/js/api.js đọc token read-your-writes
 )
 
 # --- 4. KÍCH HOẠT CÁC ROUTER ---
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script đồng bộ lại tổng hợp đánh giá (rating_count, rating_sum, rating_avg) của các món
+từ bảng ratings - chạy định kỳ (VD: cron mỗi đêm) hoặc sau khi sửa dữ liệu trực tiếp trong DB
+
+Chạy: python reconcile_ratings.py
+"""
+import sys
+from sqlalchemy.orm import sessionmaker
+from dotenv import load_dotenv
+from app.database import engine
+from app.services.ratings import reconcile_rating_aggregates
+
+# Fix encoding for Windows
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+# Load .env
+load_dotenv()
+
+def main():
+    Session = sessionmaker(bind=engine)
+    session = Session()
+
+    try:
+        fixed = reconcile_rating_aggregates(session)
+        session.commit()
+        if fixed:
+            print(f"✅ Đã sửa tổng hợp đánh giá của {fixed} món bị lệch")
+        else:
+            print("✅ Tổng hợp đánh giá đã khớp, không có món nào cần sửa")
+    except Exception as e:
+        session.rollback()
+        print(f"❌ Lỗi khi đồng bộ: {str(e)}")
+        sys.exit(1)
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,15 @@
 """
 Script kiểm tra Gemini API key và tìm key còn requests
 Chạy: python test_ai.py
+(Khi chạy app không cần tìm key bằng tay: đặt nhiều key vào GEMINI_API_KEYS, pool tự bỏ qua key hết quota
+- xem app/services/llm_pool.py và GET /admin/ai-backends)
+Chạy offline (không gọi Gemini, không cần mạng): LLM_BACKEND=fake python test_ai.py
+(thêm LLM_FAKE_ERROR_RATE=0.5 để thử nhánh key hết quota / lỗi - xem app/services/llm.py)
 """
 
-import google.generativeai as genai
 import os
 from dotenv import load_dotenv
+from app.services import llm
 
 # Load environment
 load_dotenv()
@@ -23,8 +27,7 @@ def test_api_key(api_key, index):
         return False, "Key trống"
     
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.0-flash')
+        model = llm.create_backend('gemini-2.0-flash', api_key=api_key)
         
         # Test với prompt đơn giản
         response = model.generate_content("Say hello in 3 words")
@@ -58,17 +61,16 @@ def list_available_models():
             print("⚠️  Không có API key để kiểm tra models")
             return
         
-        genai.configure(api_key=api_key)
+        backend = llm.create_backend('gemini-2.0-flash', api_key=api_key)
         print("\n📋 DANH SÁCH MODELS KHẢ DỤNG:")
         print("-" * 50)
         
         count = 0
-        for m in genai.list_models():
-            if 'generateContent' in m.supported_generation_methods:
-                print(f"   • {m.name}")
-                count += 1
-                if count >= 10:  # Chỉ hiện 10 models đầu
-                    break
+        for name in backend.list_models():
+            print(f"   • {name}")
+            count += 1
+            if count >= 10:  # Chỉ hiện 10 models đầu
+                break
         
         print(f"\n   Tổng: {count} models")
         
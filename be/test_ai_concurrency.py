@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test: các API khác vẫn phục vụ bình thường khi nhiều lời gọi AI đang chạy
+
+- Thay model.generate_content bằng hàm giả CHẶN (time.sleep) giống SDK thật: mỗi lời gọi mất
+  FAKE_AI_SECONDS giây, không gọi Gemini, không tốn quota.
+- Gửi AI_REQUESTS request POST /ai/search-recipes cùng lúc (no_cache: luôn gọi AI), trong lúc đó liên tục gọi
+  GET /recipes/ và GET /auth/me, đo độ trễ lớn nhất.
+- ĐẠT khi: các request thường không bị chặn theo thời gian AI (độ trễ lớn nhất < 1 giây), các lời gọi AI
+  chạy tối đa AI_MAX_CONCURRENCY cùng lúc và đều thành công.
+- Bỏ chờ giữa chừng (asyncio.wait_for hết giờ, client ngắt kết nối): việc trên thread vẫn chạy nên vẫn giữ chỗ
+  trong max_pending (executor đầy -> ExecutorBusy), số việc đang chờ không âm.
+
+Chạy: python test_ai_concurrency.py
+LƯU Ý: script tạo 1 user thử nghiệm rồi xóa đi khi xong
+-> chỉ chạy trên DB thử nghiệm (đã `alembic upgrade head`), KHÔNG chạy trên DB thật.
+"""
+import asyncio
+import json
+import math
+import sys
+import threading
+import time
+import httpx
+from app.database import SessionLocal
+from app import models, utils
+from app.executors import BoundedExecutor, ExecutorBusy
+from app.services import ai_service
+from main import app
+
+# Fix encoding for Windows
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+FAKE_AI_SECONDS = 2.0
+AI_REQUESTS = ai_service.AI_MAX_CONCURRENCY * 2
+MAX_PROBE_MS = 1000
+TEST_EMAIL = "test-ai-concurrency@example.com"
+
+class FakeResponse:
+    text = json.dumps([{"name": "Cháo yến mạch", "description": "", "calories": 300,
+                        "protein": 10, "carbs": 50, "fat": 5, "tags": "Breakfast"}], ensure_ascii=False)
+
+in_flight = 0
+peak_in_flight = 0
+lock = threading.Lock()
+
+def fake_generate_content(prompt, **kwargs):
+    """Giống SDK thật: chặn thread gọi trong suốt thời gian chờ model"""
+    global in_flight, peak_in_flight
+    with lock:
+        in_flight += 1
+        peak_in_flight = max(peak_in_flight, in_flight)
+    try:
+        time.sleep(FAKE_AI_SECONDS)
+        return FakeResponse()
+    finally:
+        with lock:
+            in_flight -= 1
+
+def setup_user():
+    db = SessionLocal()
+    try:
+        cleanup(db)
+        user = models.User(email=TEST_EMAIL, hashed_password="x", full_name="Test AI")
+        db.add(user)
+        db.commit()
+        return utils.create_user_token(user)
+    finally:
+        db.close()
+
+def cleanup(db):
+    db.query(models.User).filter(models.User.email == TEST_EMAIL).delete()
+    db.commit()
+
+async def run(token):
+    headers = {"Authorization": f"Bearer {token}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=120) as client:
+        ai_tasks = [
+            asyncio.create_task(client.post("/ai/search-recipes", json={"query": "món sáng", "no_cache": True}, headers=headers))
+            for _ in range(AI_REQUESTS)
+        ]
+        await asyncio.sleep(0.2)  # Đợi các lời gọi AI bắt đầu chạy
+
+        probe_ms = []
+        probe_errors = 0
+        while not all(task.done() for task in ai_tasks):
+            for path in ("/recipes/?limit=5", "/auth/me"):
+                started = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                probe_ms.append((time.perf_counter() - started) * 1000)
+                probe_errors += response.status_code != 200
+            await asyncio.sleep(0.05)
+
+        ai_responses = await asyncio.gather(*ai_tasks)
+        return ai_responses, probe_ms, probe_errors
+
+async def abandoned_waits():
+    """(executor vẫn đầy sau khi mọi coroutine chờ bỏ đi?, stats lúc đó, stats sau khi các việc chạy xong)"""
+    executor = BoundedExecutor("test-abandoned", workers=2, max_pending=2)
+    for _ in range(2):
+        try:
+            await asyncio.wait_for(executor.run(time.sleep, 0.5), 0.05)
+        except asyncio.TimeoutError:
+            pass
+    abandoned = executor.stats()
+    try:
+        await executor.run(time.sleep, 0)
+        still_full = False
+    except ExecutorBusy:
+        still_full = True
+    await asyncio.sleep(0.6)
+    return still_full, abandoned, executor.stats()
+
+def main():
+    still_full, abandoned, drained = asyncio.run(abandoned_waits())
+    print(f"[INFO] Bỏ chờ giữa chừng: lúc bỏ {abandoned}, sau khi xong {drained}")
+
+    ai_service.model.generate_content = fake_generate_content
+    token = setup_user()
+    try:
+        started = time.perf_counter()
+        ai_responses, probe_ms, probe_errors = asyncio.run(run(token))
+        elapsed = time.perf_counter() - started
+    finally:
+        db = SessionLocal()
+        try:
+            cleanup(db)
+        finally:
+            db.close()
+
+    ai_ok = sum(response.status_code == 200 for response in ai_responses)
+    expected_elapsed = math.ceil(AI_REQUESTS / ai_service.AI_MAX_CONCURRENCY) * FAKE_AI_SECONDS
+    print(f"[INFO] AI: {ai_ok}/{AI_REQUESTS} thành công, tối đa {peak_in_flight} lời gọi cùng lúc "
+          f"(giới hạn {ai_service.AI_MAX_CONCURRENCY}), tổng {elapsed:.1f}s (kỳ vọng ~{expected_elapsed:.0f}s)")
+    print(f"[INFO] Request khác trong lúc chờ AI: {len(probe_ms)} request, lỗi {probe_errors}, "
+          f"độ trễ lớn nhất {max(probe_ms):.0f} ms")
+    print(f"[INFO] Hàng đợi AI: {ai_service.ai_executor.stats()}")
+
+    checks = [
+        (ai_ok == AI_REQUESTS, "mọi lời gọi AI thành công"),
+        (peak_in_flight <= ai_service.AI_MAX_CONCURRENCY, "số lời gọi AI cùng lúc không vượt giới hạn"),
+        (len(probe_ms) > 0 and probe_errors == 0, "request khác trả 200 trong lúc chờ AI"),
+        (max(probe_ms) < MAX_PROBE_MS, f"request khác không bị chặn (< {MAX_PROBE_MS} ms)"),
+        (still_full and abandoned["running"] == 2 and abandoned["queued"] >= 0 and drained["queued"] == 0,
+         "bỏ chờ giữa chừng: việc vẫn chạy giữ chỗ trong hàng đợi, số đang chờ không âm"),
+    ]
+    for ok, label in checks:
+        print(f"{'✅' if ok else '❌'} {label}")
+    sys.exit(0 if all(ok for ok, _ in checks) else 1)
+
+if __name__ == "__main__":
+    main()
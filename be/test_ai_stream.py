@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test: POST /ai/suggest-weekly-plan/stream gửi món đầu tiên ngay khi AI viết xong, không chờ cả tuần
+
+- Thay model.generate_content bằng hàm giả viết JSON thực đơn tuần từ từ (CHARS_PER_CHUNK ký tự mỗi
+  CHUNK_SECONDS giây, tổng ~8 giây) - không gọi Gemini, không tốn quota.
+- Chạy app trên uvicorn thật (localhost) vì httpx.ASGITransport gom cả response rồi mới trả về.
+- So sánh: thời điểm nhận sự kiện recipe / day đầu tiên của bản stream với thời gian của bản thường.
+- ĐẠT khi: món đầu tiên tới trong MAX_FIRST_RECIPE_SECONDS giây, đủ 7 ngày được lưu vào lịch.
+
+Chạy: python test_ai_stream.py
+LƯU Ý: script tạo 1 user thử nghiệm (kèm món, lịch ăn) rồi xóa đi khi xong
+-> chỉ chạy trên DB thử nghiệm (đã `alembic upgrade head`), KHÔNG chạy trên DB thật.
+"""
+import json
+import sys
+import threading
+import time
+from datetime import date
+import httpx
+import uvicorn
+from app.database import SessionLocal
+from app import models, utils
+from app.services import ai_service
+from app.services import deletion as recipe_deletion
+from main import app
+
+# Fix encoding for Windows
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+PORT = 8765
+CHARS_PER_CHUNK = 60
+CHUNK_SECONDS = 0.05
+MAX_FIRST_RECIPE_SECONDS = 2.0
+TEST_EMAIL = "test-ai-stream@example.com"
+
+WEEKLY_PLAN = {
+    "total_calories_per_day": 2000,
+    "recipes": [
+        {
+            "name": f"Món thử {i}",
+            "description": "Món ăn thử nghiệm " * 10,
+            "instructions": "Bước 1: Sơ chế\nBước 2: Nấu chín\n" * 5,
+            "servings": 1,
+            "prep_time": 20,
+            "ingredients": [{"name": f"Nguyên liệu {j}", "amount": 100, "unit": "gram"} for j in range(4)],
+            "nutrition": {"calories": 600 + i, "protein": 30, "carbs": 70, "fat": 15},
+            "tags": "Lunch",
+        }
+        for i in range(10)
+    ],
+    "meal_plan": [
+        {
+            "day": day,
+            "breakfast": {"name": f"Món thử {index % 10}"},
+            "lunch": {"name": f"Món thử {(index + 1) % 10}"},
+            "dinner": {"name": f"Món thử {(index + 2) % 10}"},
+        }
+        for index, day in enumerate(["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"])
+    ],
+}
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+def fake_generate_content(prompt, stream=False, **kwargs):
+    """Giống model thật: văn bản được viết ra từ từ, bản thường chờ viết xong mới trả về"""
+    text = "```json\n" + json.dumps(WEEKLY_PLAN, ensure_ascii=False, indent=2) + "\n```"
+    chunks = [text[i:i + CHARS_PER_CHUNK] for i in range(0, len(text), CHARS_PER_CHUNK)]
+    if not stream:
+        time.sleep(len(chunks) * CHUNK_SECONDS)
+        return FakeChunk(text)
+
+    def generate():
+        for chunk in chunks:
+            time.sleep(CHUNK_SECONDS)
+            yield FakeChunk(chunk)
+    return generate()
+
+def setup_user():
+    db = SessionLocal()
+    try:
+        cleanup(db)
+        user = models.User(email=TEST_EMAIL, hashed_password="x", full_name="Test AI stream", gender="female",
+                           date_of_birth=date(1995, 5, 5), height=160, weight=55)
+        db.add(user)
+        db.commit()
+        return utils.create_user_token(user)
+    finally:
+        db.close()
+
+def cleanup(db):
+    user = db.query(models.User).filter(models.User.email == TEST_EMAIL).first()
+    if user:
+        recipe_deletion.delete_user(db, user.id, cascade=True)
+        db.commit()
+
+def start_server():
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=PORT, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+def run(token):
+    headers = {"Authorization": f"Bearer {token}"}
+    body = {"start_date": "2030-01-07", "no_cache": True}
+    with httpx.Client(base_url=f"http://127.0.0.1:{PORT}", timeout=120) as client:
+        started = time.perf_counter()
+        first_seen, counts, done = {}, {}, None
+        with client.stream("POST", "/ai/suggest-weekly-plan/stream", json=body, headers=headers) as response:
+            event = None
+            for line in response.iter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                    first_seen.setdefault(event, time.perf_counter() - started)
+                    counts[event] = counts.get(event, 0) + 1
+                elif line.startswith("data: ") and event == "done":
+                    done = json.loads(line[len("data: "):])
+        stream_total = time.perf_counter() - started
+
+        started = time.perf_counter()
+        blocking = client.post("/ai/suggest-weekly-plan", json={**body, "start_date": "2030-01-14"}, headers=headers)
+        blocking_total = time.perf_counter() - started
+    return first_seen, counts, done, stream_total, blocking.status_code, blocking_total
+
+def main():
+    ai_service.model.generate_content = fake_generate_content
+    token = setup_user()
+    server, thread = start_server()
+    try:
+        first_seen, counts, done, stream_total, blocking_status, blocking_total = run(token)
+    finally:
+        server.should_exit = True
+        thread.join()
+        db = SessionLocal()
+        try:
+            cleanup(db)
+        finally:
+            db.close()
+
+    print(f"[INFO] Stream: món đầu tiên sau {first_seen.get('recipe', float('nan')):.2f}s, "
+          f"ngày đầu tiên sau {first_seen.get('day', float('nan')):.2f}s, xong sau {stream_total:.2f}s")
+    print(f"[INFO] Số sự kiện: {counts}")
+    print(f"[INFO] Bản thường (/ai/suggest-weekly-plan): HTTP {blocking_status} sau {blocking_total:.2f}s")
+
+    checks = [
+        (first_seen.get("recipe", float("inf")) < MAX_FIRST_RECIPE_SECONDS,
+         f"món đầu tiên tới trong {MAX_FIRST_RECIPE_SECONDS:.0f} giây"),
+        (first_seen.get("recipe", float("inf")) < blocking_total / 2, "món đầu tiên tới sớm hơn nhiều so với bản thường"),
+        (done is not None and done["days"] == 7 and done["meal_plans_created"] == 21, "đủ 7 ngày / 21 bữa được lưu"),
+        (blocking_status == 200, "bản thường vẫn hoạt động"),
+    ]
+    for ok, label in checks:
+        print(f"{'✅' if ok else '❌'} {label}")
+    sys.exit(0 if all(ok for ok, _ in checks) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,13 @@
 """
 Test TẤT CẢ models của Gemini để tìm model nào còn quota
+(Khi chạy app: liệt kê các model dự phòng trong LLM_MODELS, pool tự chuyển model - app/services/llm_pool.py)
+Chạy offline (không gọi Gemini, không cần mạng): LLM_BACKEND=fake python test_all_models.py
 """
 
-import google.generativeai as genai
 import os
 from dotenv import load_dotenv
 import time
+from app.services import llm
 
 load_dotenv()
 
@@ -19,8 +21,7 @@ API_KEYS = [
 def test_model_with_key(model_name, api_key):
     """Test 1 model với 1 key"""
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(model_name)
+        model = llm.create_backend(model_name, api_key=api_key)
         
         # Test với prompt siêu ngắn để tiết kiệm quota
         response = model.generate_content("Hi")
@@ -41,13 +42,8 @@ def main():
     print("=" * 70)
     
     # Lấy tất cả models
-    genai.configure(api_key=API_KEYS[0])
-    all_models = []
-    
     print("📋 Đang lấy danh sách models...")
-    for m in genai.list_models():
-        if 'generateContent' in m.supported_generation_methods:
-            all_models.append(m.name)
+    all_models = llm.create_backend("gemini-2.0-flash", api_key=API_KEYS[0]).list_models()
     
     print(f"✅ Tìm thấy {len(all_models)} models\n")
     
@@ -108,8 +104,7 @@ def main():
         print(f"   Key: {best['key']}")
         print("\n📝 Thêm vào .env:")
         print(f"   GEMINI_API_KEY={best['key']}")
-        print("\n📝 Update trong ai_service.py:")
-        print(f"   model = genai.GenerativeModel('{best['model']}')")
+        print(f"   LLM_MODELS={best['model']}  # Model đầu tiên trong pool (app/services/llm_pool.py)")
         
     else:
         print("\n❌ TẤT CẢ MODELS ĐỀU HẾT QUOTA HOẶC LỖI!")
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test: pool key x model AI (app/services/llm_pool.py) giữ độ trễ và tỷ lệ lỗi trong giới hạn khi 1 key hết quota
+
+Dùng model giả (app/services/llm.py, FakeBackend: phát lại recordings/ai_responses.jsonl) - không gọi Gemini,
+không cần mạng / key / database. Các tình huống:
+1. 1 key hết quota (luôn 429) + 1 key lỗi 5xx ngẫu nhiên + 1 model dự phòng: REQUESTS lời gọi từ THREADS thread
+   -> không lời gọi nào lỗi, key hết quota không bị gọi nữa sau 429 đầu tiên (breaker mở), p95 gần bằng độ trễ model
+2. Mọi key hết quota -> báo LLMUnavailable (503 + Retry-After) ngay, không chờ hết timeout;
+   mọi key lỗi 5xx tới hết LLM_MAX_ATTEMPTS lần thử -> cũng LLMUnavailable (không ném lỗi gốc thành 500)
+3. Key lỗi liên tiếp -> breaker mở, hết thời gian nghỉ -> half-open, 1 request thử thành công -> dùng lại
+4. Key chạm giới hạn request/phút -> chuyển sang key kế tiếp, không gọi để nhận 429
+5. Stream: 429 trước chunk đầu tiên -> chuyển backend; lỗi giữa chừng -> báo lỗi (không gửi lại từ đầu)
+
+Chạy: python test_llm_pool.py
+"""
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from app.services import llm
+from app.services.llm_pool import LLMPool, LLMUnavailable, PoolMember
+
+# Fix encoding for Windows
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+LATENCY = 0.05
+REQUESTS = 200
+THREADS = 8
+TIMEOUT = 30
+PROMPT = "Bạn là đầu bếp chuyên nghiệp. Hãy tạo 1 công thức món ăn từ các nguyên liệu sau: gà, gạo"
+QUOTA_ERROR = ("429 Resource has been exhausted (e.g. check quota).",)
+SERVER_ERROR = ("500 An internal error has occurred.",)
+
+RECORDINGS = llm.load_recordings(llm.LLM_FAKE_RECORDINGS)
+
+
+def fake(name: str, error_rate: float = 0.0, errors=llm.FAKE_ERRORS) -> llm.FakeBackend:
+    return llm.FakeBackend(name, RECORDINGS, latency=LATENCY, jitter=LATENCY / 5, error_rate=error_rate,
+                           seed=1, errors=errors)
+
+
+def call(pool: LLMPool, stream: bool = False):
+    """(văn bản hoặc None, lỗi hoặc None, giây)"""
+    started = time.perf_counter()
+    try:
+        response = pool.generate_content(PROMPT, stream=stream, request_options={"timeout": TIMEOUT})
+        text = "".join(chunk.text for chunk in response) if stream else response.text
+        return text, None, time.perf_counter() - started
+    except Exception as error:
+        return None, error, time.perf_counter() - started
+
+
+def scenario_failover(checks):
+    exhausted = PoolMember(fake("gemini-2.0-flash", 1.0, QUOTA_ERROR), "gemini-2.0-flash#1")
+    flaky = PoolMember(fake("gemini-2.0-flash", 0.2, SERVER_ERROR), "gemini-2.0-flash#2")
+    fallback = PoolMember(fake("gemma-3-4b-it"), "gemma-3-4b-it#1")
+    pool = LLMPool([exhausted, flaky, fallback])
+    with ThreadPoolExecutor(THREADS) as executor:
+        results = list(executor.map(lambda _: call(pool), range(REQUESTS)))
+    errors = [error for _, error, _ in results if error]
+    timings = [seconds for _, _, seconds in results]
+    p95 = np.percentile(timings, 95)
+    print(f"[INFO] 1. {REQUESTS} lời gọi: lỗi {len(errors)}, p50 {np.percentile(timings, 50) * 1000:.0f} ms, "
+          f"p95 {p95 * 1000:.0f} ms, max {max(timings) * 1000:.0f} ms, đổi backend {pool.failovers} lần")
+    for member in pool.members:
+        print(f"       {member.label:<20} {member.state:<9} request {member.requests:>3}, thành công {member.successes:>3}")
+    checks.append((not errors, "1 key hết quota + 1 key lỗi 5xx: không lời gọi nào lỗi"))
+    # Chỉ các lời gọi đã bắt đầu trước khi 429 đầu tiên trả về (tối đa THREADS) tới được key hết quota
+    checks.append((exhausted.requests <= THREADS and exhausted.state == "open",
+                   f"key hết quota bị gọi tối đa {THREADS} lần (các lời gọi đang chạy cùng lúc), sau đó breaker mở"))
+    checks.append((p95 < LATENCY * 4, f"p95 < {LATENCY * 4 * 1000:.0f} ms (độ trễ model {LATENCY * 1000:.0f} ms)"))
+
+
+def scenario_all_exhausted(checks):
+    pool = LLMPool([PoolMember(fake("gemini-2.0-flash", 1.0, QUOTA_ERROR), f"gemini-2.0-flash#{i}") for i in (1, 2)])
+    results = [call(pool) for _ in range(20)]
+    unavailable = [error for _, error, _ in results if isinstance(error, LLMUnavailable)]
+    slowest = max(seconds for _, _, seconds in results)
+    retry_after = unavailable[-1].retry_after if unavailable else None
+    print(f"[INFO] 2. Mọi key hết quota: {len(unavailable)}/20 LLMUnavailable, chậm nhất {slowest * 1000:.0f} ms, "
+          f"Retry-After {retry_after}s")
+    checks.append((len(unavailable) == 20, "mọi key hết quota -> LLMUnavailable (503)"))
+    checks.append((slowest < LATENCY * 3, "báo lỗi ngay, không chờ hết timeout"))
+    checks.append((retry_after is not None and retry_after >= 10, "Retry-After theo thời gian nghỉ của key"))
+
+    pool = LLMPool([PoolMember(fake("gemini-2.0-flash", 1.0, SERVER_ERROR), f"gemini-2.0-flash#{i}") for i in (1, 2)])
+    _, error, _ = call(pool)
+    print(f"[INFO] 2. Mọi key lỗi 5xx: {type(error).__name__}, lỗi cuối: {getattr(error, 'last_error', None)}")
+    checks.append((isinstance(error, LLMUnavailable) and error.retry_after >= 1 and error.last_error is not None,
+                   "mọi key lỗi 5xx tới hết số lần thử -> LLMUnavailable (503 + Retry-After)"))
+
+
+def scenario_half_open(checks):
+    broken = PoolMember(fake("gemini-2.0-flash", 1.0, SERVER_ERROR), "gemini-2.0-flash#1",
+                        breaker_threshold=2, cooldown=0.3)
+    fallback = PoolMember(fake("gemma-3-4b-it"), "gemma-3-4b-it#1")
+    pool = LLMPool([broken, fallback])
+    results = [call(pool) for _ in range(5)]
+    opened = broken.state == "open" and broken.requests == 2
+    broken.backend.error_rate = 0.0  # Key hoạt động lại
+    time.sleep(0.35)
+    recovered = call(pool)
+    print(f"[INFO] 3. Key lỗi 5xx: bị gọi {broken.requests} lần rồi ngắt, sau thời gian nghỉ: {broken.state}, "
+          f"thành công {broken.successes}")
+    checks.append((all(error is None for _, error, _ in results) and opened,
+                   "lỗi 5xx liên tiếp -> breaker mở sau LLM_BREAKER_THRESHOLD lần, lời gọi chuyển sang backend khác"))
+    checks.append((recovered[1] is None and broken.state == "closed" and broken.successes == 1,
+                   "hết thời gian nghỉ -> 1 request thử thành công -> dùng lại key"))
+
+
+def scenario_rate_limit(checks):
+    limited = PoolMember(fake("gemini-2.0-flash"), "gemini-2.0-flash#1", rpm=5)
+    fallback = PoolMember(fake("gemini-2.0-flash"), "gemini-2.0-flash#2")
+    pool = LLMPool([limited, fallback])
+    results = [call(pool) for _ in range(12)]
+    print(f"[INFO] 4. Giới hạn 5 request/phút: key 1 nhận {limited.requests}, key 2 nhận {fallback.requests}")
+    checks.append((all(error is None for _, error, _ in results) and limited.requests == 5 and fallback.requests == 7,
+                   "chạm giới hạn request/phút -> dùng key kế tiếp"))
+
+
+def scenario_stream(checks):
+    pool = LLMPool([PoolMember(fake("gemini-2.0-flash", 1.0, QUOTA_ERROR), "gemini-2.0-flash#1"),
+                    PoolMember(fake("gemma-3-4b-it"), "gemma-3-4b-it#1")])
+    text, error, _ = call(pool, stream=True)
+    expected = RECORDINGS["recipe"][0]
+    checks.append((error is None and text == expected, "stream: 429 trước chunk đầu tiên -> chuyển backend, đủ văn bản"))
+
+    pool = LLMPool([PoolMember(fake("gemini-2.0-flash", 1.0, SERVER_ERROR), "gemini-2.0-flash#1"),
+                    PoolMember(fake("gemma-3-4b-it"), "gemma-3-4b-it#1")])
+    _, error, _ = call(pool, stream=True)
+    checks.append((error is not None and pool.members[1].requests == 0,
+                   "stream: lỗi giữa chừng -> báo lỗi, không gửi lại từ đầu bằng backend khác"))
+    print(f"[INFO] 5. Stream lỗi giữa chừng: {error}")
+
+
+def main():
+    checks = []
+    scenario_failover(checks)
+    scenario_all_exhausted(checks)
+    scenario_half_open(checks)
+    scenario_rate_limit(checks)
+    scenario_stream(checks)
+    print()
+    for ok, label in checks:
+        print(f"{'✅' if ok else '❌'} {label}")
+    sys.exit(0 if all(ok for ok, _ in checks) else 1)
+
+if __name__ == "__main__":
+    main()
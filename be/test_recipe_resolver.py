@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test: khớp tên món trong thực đơn tuần AI (app/services/recipe_resolver.py, meal_plan_writer.save_weekly_plan)
+
+Dùng SQLite in-memory, không gọi AI. Các tình huống:
+1. RecipeResolver: đúng tên / khác hoa thường, khoảng trắng / không dấu / fuzzy theo từ chung;
+   "Bún bò" ưu tiên "Bún bò Huế" hơn "Bún bơ" (trùng khi bỏ dấu)
+2. save_weekly_plan: meal_plan dùng món không có trong "recipes" của AI nhưng user đã có (khác hoa thường,
+   không dấu) -> dùng món cũ; món chỉ giống 1 phần (fuzzy) hoặc không có -> WeeklyPlanSaveError
+
+Chạy: python test_recipe_resolver.py
+"""
+import os
+import sys
+from datetime import date
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.database import engine, SessionLocal
+from app import models
+from app.services import meal_plan_writer
+from app.services.recipe_resolver import RecipeResolver
+
+# Fix encoding for Windows
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+START_DATE = date(2025, 1, 6)
+NUTRITION = {"calories": 500, "protein": 25, "carbs": 60, "fat": 15}
+
+
+def scenario_resolver(checks):
+    resolver = RecipeResolver([("Phở bò tái", 1), ("Bún bơ", 2), ("Bún bò Huế", 3), ("Cơm gà xối mỡ", 4)])
+    cases = [
+        ("Phở bò tái", 1, "exact"),
+        ("  phở  BÒ tái ", 1, "case"),
+        ("Pho bo tai", 1, "folded"),
+        ("Bún bò", 3, "fuzzy"),
+        ("Cơm gà", 4, "fuzzy"),
+    ]
+    for name, recipe_id, kind in cases:
+        found = resolver.match(name)
+        ok = found is not None and found.recipe_id == recipe_id and found.kind == kind
+        print(f"[INFO] 1. '{name}' -> {found}")
+        checks.append((ok, f"resolver: '{name}' -> món {recipe_id} ({kind})"))
+    checks.append((resolver.match("Lẩu thái") is None, "resolver: tên không có từ chung -> None"))
+
+
+def ai_result(names):
+    """Kết quả AI giả: 1 món mới "Canh chua cá", meal_plan 7 ngày x 3 bữa dùng lần lượt các tên"""
+    recipe = {"name": "Canh chua cá", "nutrition": NUTRITION, "ingredients": [{"name": "Cá", "amount": 200, "unit": "g"}]}
+    day = {"breakfast": {"name": names[0]}, "lunch": {"name": names[1]}, "dinner": {"name": names[2]}}
+    return {"recipes": [recipe], "meal_plan": [dict(day) for _ in range(7)], "total_calories_per_day": 1500}
+
+
+def scenario_existing_catalog(checks):
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        user = models.User(email="resolver@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        pho = models.Recipe(name="Phở bò tái", owner_id=user.id, **NUTRITION)
+        com = models.Recipe(name="Cơm gà xối mỡ", owner_id=user.id, **NUTRITION)
+        db.add_all([pho, com])
+        db.flush()
+
+        result = meal_plan_writer.save_weekly_plan(db, user.id, ai_result(["phở bò tái", "Canh chua cá", "Pho bo tai"]),
+                                                   START_DATE)
+        plans = db.query(models.MealPlan).filter(models.MealPlan.owner_id == user.id).all()
+        breakfasts = {plan.recipe_id for plan in plans if plan.meal_type == "Breakfast"}
+        dinners = {plan.recipe_id for plan in plans if plan.meal_type == "Dinner"}
+        print(f"[INFO] 2. Đã lưu {result['meal_plans_created']} meal plans, bữa sáng {breakfasts}, bữa tối {dinners}")
+        checks.append((result["meal_plans_created"] == 21 and breakfasts == {pho.id} and dinners == {pho.id},
+                       "save_weekly_plan: tên món user đã có (khác hoa thường / không dấu) -> dùng món cũ"))
+        db.rollback()
+
+        for names, label in ((["Cơm gà", "Canh chua cá", "Canh chua cá"], "chỉ giống 1 phần (fuzzy)"),
+                             (["Lẩu thái", "Canh chua cá", "Canh chua cá"], "không có")):
+            try:
+                meal_plan_writer.save_weekly_plan(db, user.id, ai_result(names), START_DATE)
+                error = None
+            except meal_plan_writer.WeeklyPlanSaveError as e:
+                error = e
+            print(f"[INFO] 2. '{names[0]}': {error}")
+            checks.append((error is not None, f"save_weekly_plan: tên {label} trong món user đã có -> WeeklyPlanSaveError"))
+            db.rollback()
+    finally:
+        db.close()
+        models.Base.metadata.drop_all(bind=engine)
+
+
+def main():
+    if os.environ["DATABASE_URL"] != "sqlite://":
+        print("❌ Chỉ chạy trên SQLite in-memory (script tạo rồi DROP toàn bộ bảng), bỏ DATABASE_URL đi")
+        sys.exit(2)
+    checks = []
+    scenario_resolver(checks)
+    scenario_existing_catalog(checks)
+    print()
+    for ok, label in checks:
+        print(f"{'✅' if ok else '❌'} {label}")
+    sys.exit(0 if all(ok for ok, _ in checks) else 1)
+
+if __name__ == "__main__":
+    main()
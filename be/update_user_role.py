@@ -8,7 +8,7 @@ import sys
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 from app.database import engine
-from app import models
+from app import models, utils
 
 # Fix encoding for Windows
 if sys.platform == 'win32':
@@ -40,6 +40,9 @@ def update_user_role(email: str, new_role: str = "admin"):
         # Cập nhật role
         old_role = user.role
         user.role = new_role
+        if old_role != new_role:
+            # Role nằm trong JWT -> thu hồi token cũ (server nhận ra sau tối đa AUTH_CACHE_TTL giây)
+            utils.bump_token_version(user)
         
         # Lưu thay đổi
         session.commit()
@@ -48,6 +51,8 @@ def update_user_role(email: str, new_role: str = "admin"):
         print(f"\n✅ Đã cập nhật thành công!")
         print(f"   Role cũ: {old_role}")
         print(f"   Role mới: {user.role}")
+        if old_role != new_role:
+            print("   ⚠️  User cần đăng nhập lại để nhận quyền mới")
         
         return True
         
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Worker chạy các job AI nền trong bảng ai_jobs (POST /ai/jobs/weekly-plan) - xem app/services/ai_jobs.py
+
+- Mỗi process chạy tối đa --concurrency job cùng lúc (AI_JOB_CONCURRENCY, mặc định 2); lời gọi
+  Gemini vẫn đi qua executor AI của process (AI_MAX_CONCURRENCY)
+- --processes N: chạy N process worker (mặc định AI_JOB_PROCESSES hoặc 1). Có thể chạy thêm worker
+  trên máy khác cùng DATABASE_URL - PostgreSQL chia job bằng FOR UPDATE SKIP LOCKED
+- Hàng đợi trống -> chờ AI_JOB_POLL_SECONDS giây (mặc định 1) rồi hỏi lại; định kỳ trả các job
+  quá AI_JOB_TIMEOUT giây (worker chết giữa chừng) về hàng đợi
+- Ctrl+C / SIGTERM: ngừng nhận job mới, chờ các job đang chạy xong rồi thoát
+
+Chạy: python worker.py [--processes 2] [--concurrency 4]
+(cần `alembic upgrade head` như server API)
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+from dotenv import load_dotenv
+from app.database import async_engine, check_schema_version
+from app.services import ai_jobs
+
+# Fix encoding for Windows
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+# Load .env
+load_dotenv()
+
+CONCURRENCY = int(os.getenv("AI_JOB_CONCURRENCY", "2"))
+PROCESSES = int(os.getenv("AI_JOB_PROCESSES", "1"))
+POLL_SECONDS = float(os.getenv("AI_JOB_POLL_SECONDS", "1"))
+RECLAIM_SECONDS = 60  # Kiểm tra job quá hạn mỗi phút
+
+
+async def _sleep_or_stop(stop: asyncio.Event, seconds: float) -> None:
+    try:
+        await asyncio.wait_for(stop.wait(), timeout=seconds)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def work(concurrency: int, stop: asyncio.Event) -> None:
+    """Vòng lặp của 1 process: nhận job khi còn slot, chạy song song tối đa concurrency job"""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    running = set()
+    loop = asyncio.get_running_loop()
+    next_reclaim = 0.0
+    print(f"[WORKER] {worker_id} bắt đầu (tối đa {concurrency} job cùng lúc)")
+
+    while not stop.is_set():
+        if len(running) >= concurrency:
+            await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            continue
+        try:
+            if loop.time() >= next_reclaim:
+                next_reclaim = loop.time() + RECLAIM_SECONDS
+                await ai_jobs.reclaim_stale()
+            job = await ai_jobs.claim_next(worker_id)
+        except Exception as e:
+            # DB tạm thời lỗi -> chờ rồi thử lại, không dừng worker
+            print(f"[WORKER] Lỗi đọc hàng đợi: {e}")
+            job = None
+        if job is None:
+            await _sleep_or_stop(stop, POLL_SECONDS)
+            continue
+        task = asyncio.create_task(ai_jobs.run(job))
+        running.add(task)
+        task.add_done_callback(running.discard)
+
+    if running:
+        print(f"[WORKER] {worker_id} đang chờ {len(running)} job chạy xong...")
+        await asyncio.gather(*running, return_exceptions=True)
+    await async_engine.dispose()
+    print(f"[WORKER] {worker_id} đã dừng")
+
+
+def run_process(concurrency: int) -> None:
+    """Điểm vào của mỗi process worker"""
+    async def main():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: loop.call_soon_threadsafe(stop.set))
+        await work(concurrency, stop)
+
+    asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker chạy job AI nền (bảng ai_jobs)")
+    parser.add_argument("--processes", type=int, default=PROCESSES, help="Số process worker")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="Số job cùng lúc mỗi process")
+    args = parser.parse_args()
+
+    check_schema_version()
+    if args.processes <= 1:
+        run_process(args.concurrency)
+        return
+
+    # spawn: mỗi process tự tạo engine / executor riêng (không dùng chung kết nối DB qua fork)
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_process, args=(args.concurrency,), name=f"ai-worker-{index}")
+        for index in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+
+    def forward(sig, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()  # SIGTERM -> process con dừng nhận job, chạy nốt job đang làm
+
+    signal.signal(signal.SIGINT, forward)
+    signal.signal(signal.SIGTERM, forward)
+    for process in processes:
+        process.join()
+    print(f"[WORKER] Đã dừng {len(processes)} process")
+
+
+if __name__ == "__main__":
+    main()
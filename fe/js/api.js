@@ -1,10 +1,29 @@
 // API Calls cho Meal Planner
 const API_URL = CONFIG.API_URL;
 
+// Read-your-writes (server có read replica, xem be/app/db_routing.py): response của request ghi mang token
+// ký X-Read-Your-Writes, gửi lại ở các request sau -> đọc từ DB chính, thấy ngay dữ liệu vừa ghi
+// dù request rơi vào worker / máy chủ khác. Token hết hạn sau vài giây (server tự bỏ qua).
+const READ_YOUR_WRITES_HEADER = "X-Read-Your-Writes";
+
+function withReadYourWrites(headers) {
+  const sticky = sessionStorage.getItem("read_your_writes");
+  return sticky ? { ...headers, [READ_YOUR_WRITES_HEADER]: sticky } : headers;
+}
+
+function rememberReadYourWrites(response) {
+  storeReadYourWrites(response.headers.get(READ_YOUR_WRITES_HEADER));
+}
+
+// Stream ghi dữ liệu sau khi đã gửi header -> server gửi token mới trong sự kiện (trường read_your_writes)
+function storeReadYourWrites(sticky) {
+  if (sticky) sessionStorage.setItem("read_your_writes", sticky);
+}
+
 // Helper function
 async function apiCall(endpoint, options = {}) {
   const token = localStorage.getItem("token");
-  const headers = {
+  let headers = {
     "Content-Type": "application/json",
     ...options.headers,
   };
@@ -12,6 +31,7 @@ async function apiCall(endpoint, options = {}) {
   if (token && !options.noAuth) {
     headers["Authorization"] = `Bearer ${token}`;
   }
+  headers = withReadYourWrites(headers);
 
   let response;
   try {
@@ -25,6 +45,7 @@ async function apiCall(endpoint, options = {}) {
       "Không thể kết nối đến server. Vui lòng kiểm tra kết nối mạng hoặc đảm bảo backend đang chạy."
     );
   }
+  rememberReadYourWrites(response);
 
   // Nếu có option ignore404 và status là 404, trả về null ngay lập tức
   if (!response.ok && options.ignore404 && response.status === 404) {
@@ -73,6 +94,13 @@ async function apiCall(endpoint, options = {}) {
   return data;
 }
 
+// Phân trang cursor: trả về { items, next_cursor } (next_cursor = null khi đã hết)
+// cursor = "" -> trang đầu, các trang sau gửi lại next_cursor của trang trước
+async function apiGetPage(endpoint, params = {}, cursor = "") {
+  const query = new URLSearchParams({ ...params, cursor }).toString();
+  return apiCall(`${endpoint}?${query}`);
+}
+
 // Auth APIs
 async function apiLogin(email, password) {
   const formData = new URLSearchParams();
@@ -107,14 +135,13 @@ async function apiGetCurrentUser() {
 }
 
 // Recipe APIs
-async function apiGetRecipes(params = {}) {
-  const query = new URLSearchParams(params).toString();
-  return apiCall(`/recipes/?${query}`);
+// Các danh sách món / đánh giá trả về 1 trang { items, next_cursor } (mặc định 100 mục), tải thêm khi cần
+async function apiGetRecipes(params = {}, cursor = "") {
+  return apiGetPage("/recipes/", params, cursor);
 }
 
-async function apiGetRatedRecipes(params = {}) {
-  const query = new URLSearchParams(params).toString();
-  return apiCall(`/recipes/rated?${query}`);
+async function apiGetRatedRecipes(params = {}, cursor = "") {
+  return apiGetPage("/recipes/rated", params, cursor);
 }
 
 async function apiGetRecipe(id) {
@@ -157,8 +184,8 @@ async function apiGetMyRating(id) {
   return result; // Sẽ trả về null nếu 404, hoặc data nếu thành công
 }
 
-async function apiGetRecipeRatings(id) {
-  return apiCall(`/recipes/${id}/ratings`);
+async function apiGetRecipeRatings(id, cursor = "") {
+  return apiGetPage(`/recipes/${id}/ratings`, {}, cursor);
 }
 
 async function apiDeleteMyRating(id) {
@@ -249,13 +276,88 @@ async function apiSearchRecipes(query) {
   });
 }
 
+// AI stream (Server-Sent Events): gọi onEvent(tên sự kiện, dữ liệu) ngay khi server gửi từng phần
+// EventSource không gửi được POST + header Authorization -> đọc response.body bằng fetch
+// Sự kiện "error" (lỗi giữa chừng) được ném thành Error như apiCall
+async function apiStream(endpoint, body, onEvent) {
+  const token = localStorage.getItem("token");
+  let response;
+  try {
+    response = await fetch(`${API_URL}${endpoint}`, {
+      method: "POST",
+      headers: withReadYourWrites({
+        "Content-Type": "application/json",
+        Authorization: `Bearer ${token}`,
+      }),
+      body: JSON.stringify(body),
+    });
+  } catch (error) {
+    throw new Error(
+      "Không thể kết nối đến server. Vui lòng kiểm tra kết nối mạng hoặc đảm bảo backend đang chạy."
+    );
+  }
+  rememberReadYourWrites(response);
+
+  if (!response.ok) {
+    let detail = `HTTP ${response.status}: ${response.statusText}`;
+    try {
+      detail = (await response.json()).detail || detail;
+    } catch (e) {}
+    const error = new Error(detail);
+    error.status = response.status;
+    throw error;
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Mỗi sự kiện kết thúc bằng 1 dòng trống
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = "message";
+      const dataLines = [];
+      for (const line of block.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) dataLines.push(line.slice(6));
+      }
+      if (dataLines.length === 0) continue;
+
+      const data = JSON.parse(dataLines.join("\n"));
+      if (event === "error") {
+        const error = new Error(data.detail);
+        error.status = data.status;
+        throw error;
+      }
+      storeReadYourWrites(data.read_your_writes);
+      await onEvent(event, data);
+    }
+  }
+}
+
+async function apiGenerateRecipeStream(ingredients, onEvent) {
+  return apiStream("/ai/generate-recipe/stream", { ingredients }, onEvent);
+}
+
+async function apiSuggestWeeklyPlanStream(request, onEvent) {
+  return apiStream("/ai/suggest-weekly-plan/stream", request, onEvent);
+}
+
 // Admin APIs
-async function apiGetAdminStats() {
-  return apiCall("/admin/stats");
+// refresh = true: bỏ qua cache phía server (dùng ngay sau khi thêm/xóa dữ liệu)
+async function apiGetAdminStats(refresh = false) {
+  return apiCall(`/admin/stats${refresh ? "?refresh=true" : ""}`);
 }
 
-async function apiGetAllUsers(skip = 0, limit = 100) {
-  return apiCall(`/admin/users?skip=${skip}&limit=${limit}`);
+async function apiGetAllUsers(cursor = "", limit = 100) {
+  return apiGetPage("/admin/users", { limit }, cursor);
 }
 
 async function apiGetUser(userId) {
@@ -269,24 +371,27 @@ async function apiUpdateUser(userId, data) {
   });
 }
 
-async function apiDeleteUser(userId) {
-  return apiCall(`/admin/users/${userId}`, {
+// cascade = true: xóa luôn dữ liệu liên kết (server xử lý trong 1 transaction)
+async function apiDeleteUser(userId, cascade = false) {
+  return apiCall(`/admin/users/${userId}${cascade ? "?cascade=true" : ""}`, {
     method: "DELETE",
   });
 }
 
-async function apiGetAllRecipes(skip = 0, limit = 100) {
-  return apiCall(`/admin/recipes?skip=${skip}&limit=${limit}`);
+// Các danh sách admin trả về 1 trang { items, next_cursor }, tải thêm khi cần
+async function apiGetAllRecipes(cursor = "", limit = 100) {
+  return apiGetPage("/admin/recipes", { limit }, cursor);
 }
 
-async function apiDeleteRecipeAdmin(recipeId) {
-  return apiCall(`/admin/recipes/${recipeId}`, {
+// cascade = true: xóa luôn dữ liệu liên kết (server xử lý trong 1 transaction)
+async function apiDeleteRecipeAdmin(recipeId, cascade = false) {
+  return apiCall(`/admin/recipes/${recipeId}${cascade ? "?cascade=true" : ""}`, {
     method: "DELETE",
   });
 }
 
-async function apiGetAllMealPlans(skip = 0, limit = 100) {
-  return apiCall(`/admin/meal-plans?skip=${skip}&limit=${limit}`);
+async function apiGetAllMealPlans(cursor = "", limit = 100) {
+  return apiGetPage("/admin/meal-plans", { limit }, cursor);
 }
 
 async function apiDeleteMealPlanAdmin(planId) {
@@ -295,8 +400,8 @@ async function apiDeleteMealPlanAdmin(planId) {
   });
 }
 
-async function apiGetAllRatings(skip = 0, limit = 100) {
-  return apiCall(`/admin/ratings?skip=${skip}&limit=${limit}`);
+async function apiGetAllRatings(cursor = "", limit = 100) {
+  return apiGetPage("/admin/ratings", { limit }, cursor);
 }
 
 async function apiDeleteRatingAdmin(ratingId) {
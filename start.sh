@@ -8,6 +8,7 @@ SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 cleanup() {
     echo -e "\n🛑 Đang tắt các tiến trình..."
     kill $BACKEND_PID 2>/dev/null || true
+    kill $WORKER_PID 2>/dev/null || true
     exit
 }
 trap cleanup SIGINT
@@ -22,10 +23,16 @@ cd "$SCRIPT_DIR/be"
 # Kiểm tra nếu venv tồn tại
 if [ -d "venv" ]; then
     source venv/bin/activate
+    # Cập nhật schema database (Alembic) trước khi chạy server
+    alembic upgrade head
     # Dùng 0.0.0.0 để Windows dễ truy cập
     uvicorn main:app --reload --host 0.0.0.0 --port 8000 &
     BACKEND_PID=$!
     echo "✅ Backend PID: $BACKEND_PID"
+    # Worker chạy job AI nền (POST /ai/jobs/weekly-plan)
+    python worker.py &
+    WORKER_PID=$!
+    echo "✅ Worker PID: $WORKER_PID"
 else
     echo "❌ Không tìm thấy venv tại $SCRIPT_DIR/be"
     exit 1